@@ -12,9 +12,14 @@
 # python eva.py -v httpd tst/basic2.evc
 #
 # eva -v init -i tst/praxi.vcd tst/praxi.evc
+# eva -v init --append tst/praxi_more.vcd tst/praxi.evc
 # eva -v httpd tst/praxi
+# curl --compressed 'localhost:8080/api?a=Cex&u=0&fmt=bin' # Data of a view.
 #
 # eva -rv init -i tst/tinn.vcd tst/tinn.evc
+#
+# eva -v init --shard -i tst/praxi.vcd tst/praxi.evc # Coordinator.
+# eva -v worker tst/praxi # More workers, on any host sharing tst/praxi.eva/
 # python -OO eva.py -v httpd tst/tinn
 
 # Standard library imports
@@ -31,6 +36,7 @@ from dmppl.experiments.eva.eva_common import __version__, paths, initPaths, \
     metricNames
 from dmppl.experiments.eva.eva_init import evaInit
 from dmppl.experiments.eva.eva_httpd import evaHttpd
+from dmppl.experiments.eva.eva_shard import evaShardWorker
 
 # {{{ argparser
 
@@ -56,7 +62,10 @@ argparser.add_argument("--info",
 argparser.add_argument("-j", "--n_jobs",
     type=int,
     default=-2,
-    help="Number of parallel jobs.")
+    help="Number of parallel jobs."
+         " For httpd, this is the number of worker processes."
+         " With one worker, or -p 0, rows of tables are calculated by this"
+         " number of processes.")
 
 argparser.add_argument("-r", "--purge",
     default=False,
@@ -73,6 +82,46 @@ argparser_init.add_argument("-i", "--input",
     default=None,
     help="Input VCD file, STDIN if not supplied.")
 
+argparser_init.add_argument("--clean",
+    default=False,
+    action='store_true',
+    help="Fully read and clean input VCD before extracting measurements. "
+         "Only required when input timechunks are not in time order.")
+
+argparser_init.add_argument("--vcd",
+    default=False,
+    action='store_true',
+    help="Also write extracted measurements to signals.vcd, "
+         "which is only useful for debugging.")
+
+argparser_init.add_argument("--precompute",
+    default=False,
+    action='store_true',
+    help="Calculate results for every window in parallel, "
+         "so that httpd only needs to read from cube/.")
+
+argparser_init.add_argument("--shard",
+    default=False,
+    action='store_true',
+    help="Like --precompute, but split into shards of (window, X-block, "
+         "Y-block) under shard/, within the memory budget of config maxmem. "
+         "Shards are also calculated by any `eva worker` processes on "
+         "other hosts sharing the same directory.")
+
+argparser_init.add_argument("--resume",
+    default=False,
+    action='store_true',
+    help="Skip extraction and resume an interrupted --precompute, "
+         "or --shard, using the existing database.")
+
+argparser_init.add_argument("--append",
+    type=str,
+    default=None,
+    help="Input VCD file which continues the input of existing results. "
+         "Extraction continues from the last timestamp, without reprocessing "
+         "previous input. "
+         "Cannot be used with --vcd.")
+
 def argparseHttpdPort(s): # {{{
     p = int(s)
     if not (2**10 <= p < 2**16 or 0 == p):
@@ -91,6 +140,24 @@ argparser_httpd.add_argument("-p", "--httpd-port",
     default=8080,
     help="TCP port for server. Use 0 for STDOUT.")
 
+argparser_httpd.add_argument("-t", "--httpd-timeout",
+    type=float,
+    default=60.0,
+    help="Seconds before a calculation is abandoned by the server."
+         " Use 0 for no timeout.")
+
+argparser_httpd.add_argument("--cache-mem",
+    type=int,
+    default=2**28,
+    help="Bytes of calculated results kept in memory by each process."
+         " Use 0 to disable.")
+
+argparser_httpd.add_argument("--cache-disk",
+    type=int,
+    default=2**30,
+    help="Bytes of calculated results kept on disk under cache/."
+         " Use 0 to disable.")
+
 argparser_httpd.add_argument("-a",
     type=str,
     default=metricNames[0],
@@ -118,6 +185,20 @@ argparser_httpd.add_argument("-u",
     default=None,
     help="Non-negative integer time in a(x|y;u), e.g. 9876")
 
+argparser_httpd.add_argument("--page",
+    type=str, # Int conversion performed later for consistency with HTTPD.
+    default=None,
+    help="Non-negative integer page of a table varying u over rows.")
+
+argparser_httpd.add_argument("--rows-per-page",
+    type=str, # Int conversion performed later for consistency with HTTPD.
+    default=None,
+    help="Non-negative integer number of windows in each page of a table"
+         " varying u over rows. Use 0 for all windows on one page.")
+
+argparser_worker = subparsers.add_parser("worker",
+    help=("Calculate shards queued by init --shard, until none remain."))
+
 # }}} argparser
 
 def main(args): # {{{
@@ -131,6 +212,7 @@ def main(args): # {{{
     ret = {
         "init": evaInit,
         "httpd": evaHttpd,
+        "worker": evaShardWorker,
     }[args.command](args)
 
     return ret
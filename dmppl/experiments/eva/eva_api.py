@@ -0,0 +1,243 @@
+# -*- coding: utf8 -*-
+
+# Standard library imports
+import hashlib
+import json
+import struct
+
+# PyPI library imports
+import numpy as np
+
+# Project imports
+# NOTE: Roundabout import path for eva_common necessary for unittest.
+from dmppl.experiments.eva.eva_common import metricNames, nWinPages
+
+# Data API responses are a dict of metadata and a dict of named ndarrays,
+# encoded either as compact JSON or as a binary buffer of typed arrays.
+#
+# JSON is a single object with the arrays as nested lists under "arrays", and
+# NaN or infinite values as null.
+#
+# Binary is laid out for zero-copy access from JavaScript typed arrays:
+#   0:      magic, b"EVAB"
+#   4:      uint32 little-endian length N of the header
+#   8:      header, UTF-8 JSON of the metadata, padded with spaces
+#   8+N...  each array, little-endian, at an offset which is a multiple of 8
+# The header has the array descriptions under "arrays" as a list of dicts
+# with keys name, dtype, shape, offset, where offset is from the start of the
+# buffer.
+
+apiFormats = {
+    "json": "application/json; charset=utf-8",
+    "bin": "application/octet-stream",
+}
+
+apiMagic = b"EVAB"
+apiAlign = 8
+
+def apiTable(a, b, u, x, y, cfg, dsfDeltas, vcdInfo, tableData,
+             page=0, rowsPerPage=0): # {{{
+    '''Return (<meta>, <arrays>) for the data of a table view.
+
+    fnUXY has shape (<nFns>, <nRows>, <nDeltas>) with columns in the order of
+    dsfDeltas.
+    xEx and yEx are the expectations of sibling measures, as returned by
+    calculateTableData.
+    Rows vary by window start time, given in the array varCol, or by
+    measure, given by name in the metadata.
+    Windows are split into pages of rowsPerPage, where 0 is all windows.
+    '''
+    xEx, yEx, fnUXY, varCol = tableData
+
+    meta = {
+        "view": "table",
+        'a': a, 'b': b, 'u': u, 'x': x, 'y': y,
+        "fxbits": cfg.fxbits,
+        "dsfDeltas": [[int(sf), int(d)] for sf,d in dsfDeltas],
+    }
+
+    arrays = {
+        "fnUXY": np.asarray(fnUXY),
+        "xEx": np.asarray(xEx),
+        "yEx": np.asarray(yEx),
+    }
+
+    if u is None:
+        arrays["varCol"] = np.asarray(varCol, dtype=np.uint32)
+        meta["page"] = page
+        meta["rowsPerPage"] = rowsPerPage
+        meta["nPages"] = 1 if 0 == rowsPerPage else \
+            nWinPages(vcdInfo["firstTime"], vcdInfo["lastTime"],
+                      cfg.windowsize, cfg.windowoverlap, rowsPerPage)
+    else:
+        meta["varCol"] = list(varCol)
+
+    return meta, arrays
+# }}} def apiTable
+
+def apiEdges(a, b, u, cfg, dsfDeltas, vcdInfo, edges): # {{{
+    '''Return (<meta>, <arrays>) for the edges of a network view.
+
+    Edges are held column-wise with one element per edge, and measures are
+    referenced by index into measureNames in the metadata.
+    '''
+    measureNames = vcdInfo["unitIntervalVarNames"]
+    measureIdxs = {nm: i for i,nm in enumerate(measureNames)}
+
+    meta = {
+        "view": "edges",
+        'a': a, 'b': b, 'u': u,
+        "fxbits": cfg.fxbits,
+        "dsfDeltas": [[int(sf), int(d)] for sf,d in dsfDeltas],
+        "measureNames": list(measureNames),
+    }
+
+    # Edges hold floats, whichever implementation calculated them.
+    valueDtype = np.float64
+
+    def col(key, dtype): # {{{
+        return np.array([e[key] for e in edges], dtype=dtype)
+    # }}} def col
+
+    arrays = {
+        "dstIdx": np.array([measureIdxs[e["dstName"]] for e in edges],
+                           dtype=np.uint32),
+        "srcIdx": np.array([measureIdxs[e["srcName"]] for e in edges],
+                           dtype=np.uint32),
+        "srcDelta": col("srcDelta", np.int32),
+        "sampleFactor": col("sampleFactor", np.uint32),
+        "dstEx": col("dstEx", valueDtype),
+        "srcEx": col("srcEx", valueDtype),
+    }
+    arrays.update({nm: col(nm, valueDtype) for nm in metricNames})
+
+    return meta, arrays
+# }}} def apiEdges
+
+def jsonList(arr): # {{{
+    '''Return nested lists of an ndarray with non-finite values as None.
+    '''
+    if arr.dtype.kind != 'f':
+        return arr.tolist()
+
+    ret = arr.astype(object)
+    ret[~np.isfinite(arr)] = None
+
+    return ret.tolist()
+# }}} def jsonList
+
+def apiJson(meta, arrays): # {{{
+    '''Return bytes of compact JSON.
+    '''
+    obj = dict(meta)
+    obj["arrays"] = {nm: jsonList(arr) for nm,arr in arrays.items()}
+
+    return json.dumps(obj, separators=(',', ':'), allow_nan=False) \
+        .encode("utf-8")
+# }}} def apiJson
+
+def apiBinary(meta, arrays): # {{{
+    '''Return bytes of the binary typed array format.
+    '''
+    leArrays = [(nm, np.ascontiguousarray(arr,
+                                          dtype=arr.dtype.newbyteorder('<'))) \
+                for nm,arr in arrays.items()]
+
+    def descs(start): # {{{
+        ret_, offset = [], start
+        for nm,arr in leArrays:
+            ret_.append({
+                "name": nm,
+                "dtype": arr.dtype.str,
+                "shape": list(arr.shape),
+                "offset": offset,
+            })
+            offset += -(-arr.nbytes // apiAlign) * apiAlign
+        return ret_
+    # }}} def descs
+
+    def header(start): # {{{
+        h = dict(meta)
+        h["arrays"] = descs(start)
+        return json.dumps(h, separators=(',', ':')).encode("utf-8")
+    # }}} def header
+
+    # Header length depends on the offsets, which depend on header length, so
+    # increase the start of arrays until the header fits before it.
+    start = apiAlign
+    while True:
+        hdr = header(start)
+        fitStart = -(-(8 + len(hdr)) // apiAlign) * apiAlign
+        if fitStart <= start:
+            break
+        start = fitStart
+    hdr += b' ' * (start - 8 - len(hdr))
+
+    ret_ = [apiMagic, struct.pack("<I", len(hdr)), hdr]
+    for _,arr in leArrays:
+        b = arr.tobytes()
+        ret_.append(b)
+        ret_.append(b'\0' * (-len(b) % apiAlign))
+
+    return b''.join(ret_)
+# }}} def apiBinary
+
+def apiBinaryLoads(buf): # {{{
+    '''Return (<meta>, <arrays>) from bytes of the binary typed array format.
+
+    Arrays are read-only views of buf.
+    '''
+    assert buf[:4] == apiMagic, buf[:4]
+    nBytesHeader, = struct.unpack("<I", buf[4:8])
+
+    meta = json.loads(buf[8:8+nBytesHeader].decode("utf-8"))
+
+    arrays = {}
+    for d in meta.pop("arrays"):
+        dtype = np.dtype(d["dtype"])
+        count = int(np.prod(d["shape"], dtype=np.int64))
+        arrays[d["name"]] = np.frombuffer(buf, dtype=dtype, count=count,
+                                          offset=d["offset"]) \
+                              .reshape(d["shape"])
+
+    return meta, arrays
+# }}} def apiBinaryLoads
+
+def apiEncode(fmt, meta, arrays): # {{{
+    '''Return bytes of (<meta>, <arrays>) in format fmt.
+    '''
+    assert fmt in apiFormats, fmt
+
+    return apiJson(meta, arrays) if "json" == fmt else apiBinary(meta, arrays)
+# }}} def apiEncode
+
+def apiEtag(fingerprint, request, encoding=None): # {{{
+    '''Return a quoted ETag for a data API request.
+
+    Responses depend only on the request and on the fingerprint of cfg and
+    the database, so the ETag is known before any calculation.
+    Each content encoding is a different representation so has its own ETag.
+    '''
+    h = hashlib.sha1()
+    h.update(fingerprint.encode("utf-8"))
+    h.update(repr(sorted(request.items())).encode("utf-8"))
+    h.update(repr(encoding).encode("utf-8"))
+
+    return '"%s"' % h.hexdigest()
+# }}} def apiEtag
+
+def etagMatches(etag, ifNoneMatch): # {{{
+    '''Return True if etag satisfies an If-None-Match header value.
+    '''
+    if ifNoneMatch is None:
+        return False
+
+    tags = [t.strip() for t in ifNoneMatch.split(',')]
+
+    # Weak comparison, as required for If-None-Match.
+    return '*' in tags or \
+        etag in [t[2:] if t.startswith("W/") else t for t in tags]
+# }}} def etagMatches
+
+if __name__ == "__main__":
+    assert False, "Not a standalone script."
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+# Benchmarks of eva over the traces bundled in tst/, reporting the time of
+# each phase and peak RSS as JSON so performance can be compared across
+# changes.
+#
+# Run like:
+#    eva-bench -v -o bench.json                  # All traces.
+#    eva-bench -v -t basic2 praxi -s 1 2 4 -o -  # Longer synthetic variants.
+# tinn is by far the heaviest, taking minutes rather than seconds.
+#
+# Each (trace, scale) runs in a separate process so that peak RSS isn't
+# polluted by any previous benchmark.
+
+# Standard library imports
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+# PyPI library imports
+import numpy as np
+import toml
+
+# Local library imports
+from dmppl.base import run, verb, joinP, mkDirP, Bunch
+
+# Project imports
+# NOTE: Roundabout import path for eva_common necessary for unittest.
+from dmppl.experiments.eva.eva_common import __version__, appPaths, paths, \
+    initPaths, loadCfg, loadVcdInfo, winStartTimes
+from dmppl.experiments.eva.eva_init import evaInit
+from dmppl.experiments.eva.eva_precompute import evaPrecompute
+from dmppl.experiments.eva.eva_stats import RequestStats, collectStats, \
+    wallTime
+import dmppl.experiments.eva.eva_httpd as httpd
+
+# Version-specific imports
+# Peak RSS is only available on Unix.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Directory of bundled traces.
+benchTstDir = joinP(os.path.dirname(os.path.realpath(__file__)), "tst")
+
+# { <name>: (<VCD>, <EVC>), ... }
+# basic0.evc and basic1.evc only exercise the EVC parser, without a VCD.
+benchTraces = {
+    "basic2": ("basic2.vcd", "basic2.evc"),
+    "praxi":  ("praxi_7k.vcd", "praxi.evc"),
+    "tinn":   ("tinn.vcd", "tinn.evc"),
+}
+
+# Number of windows, evenly spaced over the trace, where network graphs are
+# requested.
+benchNU = 3
+
+# {{{ argparser
+
+argparser = argparse.ArgumentParser(
+    description = "eva-bench - Benchmark eva over the bundled traces.",
+    formatter_class = argparse.ArgumentDefaultsHelpFormatter
+)
+
+argparser.add_argument("-t", "--traces",
+    type=str,
+    nargs='+',
+    default=sorted(benchTraces.keys()),
+    choices=sorted(benchTraces.keys()),
+    help="Names of bundled traces to benchmark.")
+
+argparser.add_argument("-s", "--scales",
+    type=int,
+    nargs='+',
+    default=[1],
+    help="Synthetic variants of each trace, repeated this many times.")
+
+argparser.add_argument("-j", "--n_jobs",
+    type=int,
+    default=1,
+    help="Number of parallel jobs, as for eva.")
+
+argparser.add_argument("--precompute",
+    default=False,
+    action='store_true',
+    help="Also benchmark precomputing, so requests read from cube/.")
+
+argparser.add_argument("-o", "--output",
+    type=str,
+    default='-',
+    help="Filename of JSON report, or - for STDOUT.")
+
+argparser.add_argument("--workdir",
+    type=str,
+    default=None,
+    help="Directory for scaled traces and results, otherwise a temporary"
+         " directory which is removed afterwards.")
+
+# }}} argparser
+
+def peakRss(): # {{{
+    '''Return peak RSS in bytes of this process and any waited-for children,
+       or None if not available.
+    '''
+    if resource is None:
+        return None
+
+    # Linux reports KiB, macOS reports bytes.
+    unit = 1 if "darwin" == sys.platform else 1024
+
+    return unit * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+# }}} def peakRss
+
+def benchTimed(fn, *args): # {{{
+    '''Call fn, returning its result and a dict of wall time, CPU time
+       including children, and peak RSS so far.
+    '''
+    cpuTime = lambda: sum(os.times()[:4])
+
+    wall0, cpu0 = wallTime(), cpuTime()
+    ret = fn(*args)
+    wall1, cpu1 = wallTime(), cpuTime()
+
+    t = {
+        "wall": wall1 - wall0,
+        "cpu": cpu1 - cpu0,
+        "peakRss": peakRss(),
+    }
+    return ret, t
+# }}} def benchTimed
+
+def scaledVcd(fnamei, fnameo, scale, timestep=1): # {{{
+    '''Write a synthetic VCD which repeats the timechunks of another scale
+       times, each copy shifted to follow the previous.
+
+    Lines in the body beginning with $ are keywords like $dumpvars or
+    $comment, which are only kept in the first copy.
+    Copies are shifted by a multiple of timestep so that cfg.timestep samples
+    the same times in each.
+    '''
+    assert isinstance(scale, int), type(scale)
+    assert 1 <= scale, scale
+    assert isinstance(timestep, int), type(timestep)
+    assert 1 <= timestep, timestep
+
+    with open(fnamei, 'r') as fd:
+        lines = fd.read().splitlines()
+
+    bodyIdx = 1 + next(i for i,line in enumerate(lines) \
+                       if line.split() == ["$enddefinitions", "$end"])
+    header, body = lines[:bodyIdx], lines[bodyIdx:]
+
+    times = [int(line[1:]) for line in body if line.startswith('#')]
+    assert 0 < len(times), fnamei
+    period = -(-(max(times) - min(times) + 1) // timestep) * timestep
+
+    with open(fnameo, 'w') as fd:
+        fd.write('\n'.join(header) + '\n')
+
+        for i in range(scale):
+            for line in body:
+                if line.startswith('#'):
+                    line = '#%d' % (int(line[1:]) + i * period)
+                elif line.startswith('$') and 0 < i:
+                    continue
+
+                fd.write(line + '\n')
+
+    return
+# }}} def scaledVcd
+
+def benchRequests(cfg, vcdInfo): # {{{
+    '''Return a list of (<view>, <request>) covering network graphs at
+       several u, tables varying u, and tables varying x or y.
+    '''
+    measureNames = vcdInfo["unitIntervalVarNames"]
+    x, y = measureNames[0], measureNames[-1]
+
+    winUs = winStartTimes(vcdInfo["firstTime"], vcdInfo["lastTime"],
+                          cfg.windowsize, cfg.windowoverlap)
+    us = sorted(set(winUs[(len(winUs) - 1) * i // max(1, benchNU - 1)] \
+                    for i in range(benchNU)))
+
+    requests = \
+        [("netgraph", {"a": "Cex", "u": str(u)}) for u in us] + \
+        [("netgraph", {"a": "Cov", "b": "Dep", "u": str(u)}) for u in us] + \
+        [
+            ("tableU", {"a": "Cex", "x": x, "y": y}),
+            ("tableU", {"a": "Cov", "b": "Dep", "x": x, "y": y}),
+            ("tableY", {"a": "Cex", "u": str(us[0]), "x": x}),
+            ("tableX", {"a": "Cov", "b": "Dep", "u": str(us[-1]), "y": y}),
+        ]
+
+    ret = []
+    for view,r in requests:
+        request = {k: None for k in ('a', 'b', 'u', 'x', 'y')}
+        request.update(r)
+        ret.append((view, request))
+
+    return ret
+# }}} def benchRequests
+
+def benchTrace(name, scale, workdir, nJobs, precompute): # {{{
+    '''Benchmark one trace at one scale, returning a dict for the report.
+    '''
+    fnameVcd, fnameEvc = benchTraces[name]
+    stem = joinP(workdir, "%s_x%d" % (name, scale))
+
+    initPaths(stem)
+
+    evcConfig = toml.load(joinP(benchTstDir, fnameEvc)).get("config", {})
+    timestep = evcConfig.get("timestep",
+                             toml.load(appPaths.configDefault)["timestep"])
+
+    shutil.copyfile(joinP(benchTstDir, fnameEvc), stem + ".evc")
+    scaledVcd(joinP(benchTstDir, fnameVcd), stem + ".vcd", scale, timestep)
+
+    shutil.rmtree(paths.outdir, ignore_errors=True)
+
+    phases = {}
+
+    args = Bunch({
+        "info": False,
+        "input": stem + ".vcd",
+        "clean": False,
+        "vcd": False,
+        "precompute": False,
+        "resume": False,
+        "append": None,
+        "n_jobs": nJobs,
+    })
+    _, phases["init"] = benchTimed(evaInit, args)
+
+    cfg = loadCfg()
+    vcdInfo = loadVcdInfo()
+
+    if precompute:
+        _, phases["precompute"] = benchTimed(evaPrecompute, cfg, nJobs)
+
+    # Responses are generated as served, rather than standalone files.
+    httpdArgs = Bunch({
+        "info": False,
+        "n_jobs": nJobs,
+        "httpd_port": 8080,
+        "httpd_timeout": 0,
+        "cache_mem": 2**28,
+        "cache_disk": 0,
+    })
+
+    def evaluate(request): # {{{
+        with collectStats(RequestStats()) as stats:
+            html = httpd.evaHtmlString(httpdArgs, cfg, request)
+        return len(html), stats
+    # }}} def evaluate
+
+    requests_ = []
+    for view,request in benchRequests(cfg, vcdInfo):
+        verb("Requesting %s %s... " % (name, request), end='')
+
+        # Cold requests calculate results, then warm requests hit the cache.
+        httpd.resultCache = None
+        r = {"view": view, "request": request}
+        for k in ("cold", "warm"):
+            (nBytes, stats), t = benchTimed(evaluate, request)
+            t["stages"] = stats.asDict()
+            r[k] = t
+        r["nBytes"] = nBytes
+        requests_.append(r)
+
+        verb("Done")
+
+    httpd.resultCache = None
+
+    ret = {
+        "trace": name,
+        "scale": scale,
+        "nMeasures": len(vcdInfo["unitIntervalVarNames"]),
+        "nTimechunks": vcdInfo["nTimechunks"],
+        "firstTime": vcdInfo["firstTime"],
+        "lastTime": vcdInfo["lastTime"],
+        "phases": phases,
+        "requests": requests_,
+        "peakRss": peakRss(),
+    }
+    return ret
+# }}} def benchTrace
+
+def benchTraceProcess(conn, *args): # {{{
+    '''Entry point of the process running each benchTrace.
+    '''
+    conn.send(benchTrace(*args))
+    conn.close()
+# }}} def benchTraceProcess
+
+def benchReport(traces, scales, workdir, nJobs=1, precompute=False): # {{{
+    '''Return a dict of the whole report, suitable for JSON.
+    '''
+    benchmarks_ = []
+    for name in traces:
+        for scale in scales:
+            verb("Benchmarking %s at scale %d..." % (name, scale))
+
+            connParent, connChild = multiprocessing.Pipe(duplex=False)
+            p = multiprocessing.Process(target=benchTraceProcess,
+                args=(connChild, name, scale, workdir, nJobs, precompute))
+            p.start()
+            connChild.close()
+            try:
+                benchmarks_.append(connParent.recv())
+            except EOFError:
+                raise RuntimeError("Benchmark of %s failed." % name)
+            finally:
+                p.join()
+
+    ret = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "nCpus": multiprocessing.cpu_count(),
+        "nJobs": nJobs,
+        "benchmarks": benchmarks_,
+    }
+    return ret
+# }}} def benchReport
+
+def main(args): # {{{
+
+    workdir = tempfile.mkdtemp() if args.workdir is None else args.workdir
+    mkDirP(workdir)
+
+    try:
+        report = benchReport(args.traces, args.scales, workdir,
+                             args.n_jobs, args.precompute)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+    s = json.dumps(report, indent=2, sort_keys=True)
+    if '-' == args.output:
+        print(s)
+    else:
+        with open(args.output, 'w') as fd:
+            fd.write(s + '\n')
+
+    return 0
+# }}} def main
+
+def entryPoint(argv=sys.argv):
+    return run(__name__, argv=argv)
+
+if __name__ == "__main__":
+    sys.exit(entryPoint())
@@ -0,0 +1,315 @@
+# -*- coding: utf8 -*-
+
+# Standard library imports
+from collections import OrderedDict
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+
+# PyPI library imports
+import numpy as np
+
+# Local library imports
+from dmppl.base import verb, joinP, mkDirP
+
+# Project imports
+# NOTE: Roundabout import path for eva_common necessary for unittest.
+from dmppl.experiments.eva.eva_common import paths, loadVcdInfo
+
+# On-disk results are never unpickled, since the cache directory may be
+# shared with other users, e.g. over NFS.
+# Results are encoded by type:
+#   ndarray:    .npy
+#   tuple:      .npz with each element under "a<i>", or "l<i>" for lists
+#               such as varCol of table data, which are restored as lists
+#   otherwise:  UTF-8 JSON, e.g. lists of edges
+# Files are read back with np.load(allow_pickle=False) or json.loads,
+# distinguished by the magic at the start of .npy and .npz (zip) files.
+npyMagic = b"\x93NUMPY"
+npzMagic = b"PK\x03\x04"
+
+# When the on-disk results exceed the budget, the least recently used are
+# removed down to this fraction of the budget, so the directory is only
+# scanned once per several puts.
+diskLowWater = 0.75
+
+def resultFingerprint(cfg): # {{{
+    '''Return a string which changes whenever cfg or the binary database
+       changes, invalidating every previously cached result.
+
+    The database is written, or appended to, by evaInit which finishes with
+    signals.info.toml, so its modification time and size are used rather
+    than reading every file.
+    '''
+    assert paths._INITIALIZED
+
+    stats = [os.stat(fname) for fname in (paths.fname_meainfo,
+                                          paths.dname_mea)]
+
+    h = hashlib.sha1()
+    h.update(repr(sorted(cfg.__dict__.items())).encode("utf-8"))
+    h.update(repr([(st.st_mtime, st.st_size) for st in stats]).encode("utf-8"))
+
+    return h.hexdigest()
+# }}} def resultFingerprint
+
+def dumpsResult(value): # {{{
+    '''Return bytes of a result, without pickle.
+    '''
+    if isinstance(value, np.ndarray):
+        f = io.BytesIO()
+        np.save(f, value, allow_pickle=False)
+        ret = f.getvalue()
+    elif isinstance(value, tuple):
+        arrays = {("l%d" if isinstance(v, list) else "a%d") % i: np.asarray(v) \
+                  for i,v in enumerate(value)}
+        for k,arr in arrays.items():
+            assert 'O' != arr.dtype.kind, k # Would be pickled by savez.
+        f = io.BytesIO()
+        np.savez(f, **arrays)
+        ret = f.getvalue()
+    else:
+        ret = json.dumps(value).encode("utf-8")
+
+    return ret
+# }}} def dumpsResult
+
+def loadsResult(b): # {{{
+    '''Return a result from bytes written by dumpsResult.
+
+    Raise ValueError if b is not a valid encoding.
+    '''
+    if b.startswith(npyMagic):
+        ret = np.load(io.BytesIO(b), allow_pickle=False)
+    elif b.startswith(npzMagic):
+        try:
+            with np.load(io.BytesIO(b), allow_pickle=False) as npz:
+                items = sorted((int(k[1:]), k[0], npz[k]) for k in npz.files)
+        except zipfile.BadZipFile as e:
+            raise ValueError(str(e))
+        ret = tuple(v.tolist() if 'l' == t else v for _,t,v in items)
+    else:
+        ret = json.loads(b.decode("utf-8"))
+
+    return ret
+# }}} def loadsResult
+
+class ResultCache(object): # {{{
+    '''Two-level cache of calculated results.
+
+    Level 1 is an in-memory LRU, private to each process.
+    Level 2 is a directory of encoded results under paths.dname_cache,
+    shared by all processes reading the same .eva directory.
+    Each level is bounded by a budget in bytes, where 0 disables that level.
+    The size of each result is taken as the length of its encoding.
+
+    A running total of bytes on disk is kept, so the directory is only
+    scanned when the total exceeds the budget.
+    Results put by other processes are not in the total until the next scan.
+
+    Entries are kept under the fingerprint of cfg and the database so stale
+    results are never returned, and the on-disk entries of any other
+    fingerprint are removed.
+    '''
+
+    def __init__(self, memBytes, diskBytes): # {{{
+        assert paths._INITIALIZED
+        assert isinstance(memBytes, int), type(memBytes)
+        assert isinstance(diskBytes, int), type(diskBytes)
+        assert 0 <= memBytes, memBytes
+        assert 0 <= diskBytes, diskBytes
+
+        self.memBytes = memBytes
+        self.diskBytes = diskBytes
+
+        # { (fingerprint, key): (nBytes, value), ... }
+        self.mem = OrderedDict()
+        self.memUsed = 0
+
+        # Bytes on disk under the current fingerprint, None until scanned.
+        self.diskUsed = None
+
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        self.vcdInfo = None
+    # }}} def __init__
+
+    def validate(self, cfg): # {{{
+        '''Check the fingerprint, called once per request.
+
+        Return the fingerprint for use in keys.
+        '''
+        fingerprint = resultFingerprint(cfg)
+
+        with self.lock:
+            if fingerprint != self.fingerprint:
+                self.fingerprint = fingerprint
+                self.vcdInfo = None
+                self.mem.clear()
+                self.memUsed = 0
+                self.diskUsed = None
+
+                if 0 < self.diskBytes:
+                    self.purgeDisk(fingerprint)
+
+        return fingerprint
+    # }}} def validate
+
+    def loadVcdInfo(self, fingerprint): # {{{
+        '''Return signals.info.toml, only reading it once per fingerprint so
+           it is kept for the lifetime of the server.
+        '''
+        with self.lock:
+            vcdInfo = self.vcdInfo \
+                if fingerprint == self.fingerprint else None
+
+        if vcdInfo is None:
+            vcdInfo = loadVcdInfo()
+
+            with self.lock:
+                if fingerprint == self.fingerprint:
+                    self.vcdInfo = vcdInfo
+
+        return vcdInfo
+    # }}} def loadVcdInfo
+
+    def dname(self, fingerprint): # {{{
+        return joinP(paths.dname_cache, fingerprint)
+    # }}} def dname
+
+    def fname(self, fingerprint, key): # {{{
+        h = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return joinP(self.dname(fingerprint), h + ".result")
+    # }}} def fname
+
+    def purgeDisk(self, fingerprint): # {{{
+        '''Remove on-disk results for any other fingerprint.
+        '''
+        if not os.path.isdir(paths.dname_cache):
+            return
+
+        for d in os.listdir(paths.dname_cache):
+            if d != fingerprint:
+                verb("Removing stale cache %s" % d)
+                shutil.rmtree(joinP(paths.dname_cache, d), ignore_errors=True)
+    # }}} def purgeDisk
+
+    def evictDisk(self, fingerprint): # {{{
+        '''Scan on-disk results to find the total, then if over budget,
+           remove the least recently used down to the low water mark.
+        '''
+        d = self.dname(fingerprint)
+
+        entries_ = []
+        for fname in os.listdir(d):
+            try:
+                st = os.stat(joinP(d, fname))
+            except OSError:
+                continue # Removed by another process.
+            entries_.append((st.st_mtime, st.st_size, fname))
+
+        used_ = sum(sz for _,sz,_ in entries_)
+        if used_ > self.diskBytes:
+            for _,sz,fname in sorted(entries_):
+                if used_ <= self.diskBytes * diskLowWater:
+                    break
+
+                try:
+                    os.remove(joinP(d, fname))
+                except OSError:
+                    pass
+                used_ -= sz
+
+        with self.lock:
+            self.diskUsed = used_
+    # }}} def evictDisk
+
+    def memPut(self, k, nBytes, value): # {{{
+        if nBytes > self.memBytes:
+            return
+
+        with self.lock:
+            if k in self.mem:
+                self.memUsed -= self.mem.pop(k)[0]
+
+            self.mem[k] = (nBytes, value)
+            self.memUsed += nBytes
+
+            while self.memUsed > self.memBytes:
+                _, (evictedBytes, _) = self.mem.popitem(last=False)
+                self.memUsed -= evictedBytes
+    # }}} def memPut
+
+    def get(self, fingerprint, key): # {{{
+        '''Return cached value, or None if not found.
+        '''
+        k = (fingerprint, key)
+
+        with self.lock:
+            if k in self.mem:
+                nBytes, value = self.mem.pop(k)
+                self.mem[k] = (nBytes, value) # Most recently used.
+                return value
+
+        if 0 == self.diskBytes:
+            return None
+
+        fname = self.fname(fingerprint, key)
+        try:
+            with open(fname, 'rb') as fd:
+                b = fd.read()
+            os.utime(fname, None) # Most recently used.
+        except (IOError, OSError):
+            return None
+
+        try:
+            value = loadsResult(b)
+        except ValueError:
+            return None # Not written by this cache.
+        self.memPut(k, len(b), value)
+
+        return value
+    # }}} def get
+
+    def put(self, fingerprint, key, value): # {{{
+        '''Store value in both levels, then return value.
+        '''
+        if 0 == self.memBytes and 0 == self.diskBytes:
+            return value
+
+        b = dumpsResult(value)
+
+        self.memPut((fingerprint, key), len(b), value)
+
+        if len(b) > self.diskBytes:
+            return value
+
+        # Write then rename so other processes never read partial results.
+        d = self.dname(fingerprint)
+        mkDirP(d)
+        fd, tmpFname = tempfile.mkstemp(dir=d, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b)
+        os.rename(tmpFname, self.fname(fingerprint, key))
+
+        with self.lock:
+            scan = self.diskUsed is None
+            if not scan:
+                self.diskUsed += len(b)
+                scan = self.diskUsed > self.diskBytes
+
+        if scan:
+            self.evictDisk(fingerprint)
+
+        return value
+    # }}} def put
+
+# }}} class ResultCache
+
+if __name__ == "__main__":
+    assert False, "Not a standalone script."
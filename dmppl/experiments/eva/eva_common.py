@@ -2,11 +2,17 @@
 # -*- coding: utf8 -*-
 
 # Standard library imports
+from contextlib import contextmanager
 from functools import partial
 import inspect
+import io
+import multiprocessing
 import os
+import random
+import shutil
 import struct
 import sys
+import threading
 
 # PyPI library imports
 import toml
@@ -15,9 +21,13 @@ import toml
 from dmppl.base import dbg, verb, Bunch, Fragile, \
     fnameAppendExt, joinP, mkDirP, utf8NameToHtml
 from dmppl.fx import *
-from dmppl.math import powsineCoeffs, isEven
+from dmppl.math import powsineCoeffs, isEven, subsample
 from dmppl.nd import *
-from dmppl.vcd import VcdReader, detypeVarName
+from dmppl.toml import loadToml, saveToml
+
+# Project imports
+# NOTE: Roundabout import path for eva_stats necessary for unittest.
+from dmppl.experiments.eva.eva_stats import stageTimer, countStat
 
 __version__ = "0.1.0"
 
@@ -29,6 +39,10 @@ if int(__version__.split('.')[-1]) != 0:
 appPaths = Bunch()
 paths = Bunch()
 
+# Check of whether the calculation in each thread has been abandoned, set by
+# abandonCheck().
+_abandon = threading.local()
+
 def initPaths(argsEvcPath): # {{{
     '''Populate some convenient variables from args.
     '''
@@ -49,24 +63,57 @@ def initPaths(argsEvcPath): # {{{
     paths.fname_cln = joinP(outdir, "clean.vcd")
     paths.fname_mea = joinP(outdir, "signals.vcd")
     paths.fname_meainfo = joinP(outdir, "signals.info.toml")
+    paths.fname_meastate = joinP(outdir, "signals.state.toml")
+    paths.fname_meatimes = joinP(outdir, "signals.times.npy")
     paths.dname_mea = joinP(outdir, "signals")
+    paths.dname_pyramid = joinP(outdir, "pyramid")
     paths.dname_identicon = joinP(outdir, "identicon")
+    paths.dname_cache = joinP(outdir, "cache")
+    paths.fname_cubeinfo = joinP(outdir, "cube.info.toml")
+    paths.dname_cube = joinP(outdir, "cube")
+    paths.dname_shard = joinP(outdir, "shard")
 
     paths._INITIALIZED = True
 
     return
 # }}} def initPaths
 
+@contextmanager
+def abandonCheck(fn): # {{{
+    '''Call fn from pollAbandon() within long calculations in this thread.
+
+    fn raises an exception to abandon the calculation, e.g. when the client
+    of a request has disconnected.
+    '''
+    prev = getattr(_abandon, "fn", None)
+    _abandon.fn = fn
+    try:
+        yield
+    finally:
+        _abandon.fn = prev
+# }}} def abandonCheck
+
+def pollAbandon(): # {{{
+    '''Call the function set by abandonCheck(), if any.
+    '''
+    fn = getattr(_abandon, "fn", None)
+    if fn is not None:
+        fn()
+    return
+# }}} def pollAbandon
+
 def loadCfg(): # {{{
     '''Return config extracted from EVC and VCD.
 
     CFG is assumed to be sane, written by initCfg().
+    Keys added to configDefault since initCfg() take their default value.
     '''
     assert paths._INITIALIZED
 
     verb("Loading CFG... ", end='')
 
     cfg = Bunch()
+    cfg.__dict__.update(loadToml(appPaths.configDefault))
     cfg.__dict__.update(toml.load(paths.fname_cfg))
 
     verb("Done")
@@ -88,6 +135,121 @@ def loadEvcx(): # {{{
     return evcx
 # }}} def loadEvcx
 
+def appendNpy(fname, idx, arr): # {{{
+    '''Replace elements from idx onwards of the 1D array in a .npy file with
+       arr, only writing the header and arr.
+
+    The header is rewritten in place where its padding allows, otherwise the
+    whole file is written again.
+    Return a read-only memory-mapped ndarray of the result.
+    '''
+    fmt = np.lib.format
+
+    with open(fname, 'r+b') as fd:
+        version = fmt.read_magic(fd)
+        rdHeader = fmt.read_array_header_1_0 if (1, 0) == version else \
+                   fmt.read_array_header_2_0
+        shape, fortranOrder, dtype = rdHeader(fd)
+        offset = fd.tell()
+
+        assert 1 == len(shape), shape
+        assert 0 <= idx <= shape[0], (idx, shape)
+
+        arr = np.asarray(arr, dtype=dtype)
+        assert 1 == len(arr.shape), arr.shape
+
+        header = io.BytesIO()
+        wrHeader = fmt.write_array_header_1_0 if (1, 0) == version else \
+                   fmt.write_array_header_2_0
+        wrHeader(header, {
+            "descr": fmt.dtype_to_descr(dtype),
+            "fortran_order": fortranOrder,
+            "shape": (idx + len(arr),),
+        })
+
+        if len(header.getvalue()) == offset:
+            fd.seek(0)
+            fd.write(header.getvalue())
+            fd.seek(offset + idx * dtype.itemsize)
+            fd.write(arr.tobytes())
+            fd.truncate()
+            arr = None
+        else:
+            fd.seek(offset)
+            arr = np.concatenate((np.fromfile(fd, dtype=dtype, count=idx),
+                                  arr))
+
+    if arr is not None:
+        np.save(fname, arr)
+
+    return np.load(fname, mmap_mode='r')
+# }}} def appendNpy
+
+def saveVcdInfo(vcdInfo): # {{{
+    '''Save metadata of the binary database, as returned by meaVcd.
+
+    Timechunk times are saved as NumPy binary, leaving only small fields in
+    signals.info.toml which is written last.
+    With appendIdx, as returned by meaVcd with append, timechunkTimes replace
+    saved times from appendIdx onwards, so only the new times are written.
+    '''
+    assert paths._INITIALIZED
+
+    times = np.asarray(vcdInfo["timechunkTimes"], dtype=np.int64)
+    appendIdx = vcdInfo.get("appendIdx")
+    if appendIdx is None:
+        np.save(paths.fname_meatimes, times)
+    elif os.path.isfile(paths.fname_meatimes):
+        times = appendNpy(paths.fname_meatimes, appendIdx, times)
+    else:
+        # Results from before signals.times.npy have the full list.
+        times = np.concatenate((loadTimechunkTimes()[:appendIdx], times))
+        np.save(paths.fname_meatimes, times)
+
+    info = {k: v for k,v in vcdInfo.items() \
+            if k not in ("timechunkTimes", "appendIdx")}
+    info.update({
+        "nTimechunks": len(times),
+        "firstTime": int(times[0]) if 0 < len(times) else 0,
+        "lastTime": int(times[-1]) if 0 < len(times) else 0,
+    })
+    saveToml(info, paths.fname_meainfo)
+
+    return
+# }}} def saveVcdInfo
+
+def loadVcdInfo(): # {{{
+    '''Return dict of metadata from signals.info.toml, without the full list
+       of timechunk times.
+    '''
+    assert paths._INITIALIZED
+
+    ret = toml.load(paths.fname_meainfo)
+
+    # Results from before signals.times.npy have the full list.
+    times = ret.pop("timechunkTimes", None)
+    if times is not None:
+        ret.update({
+            "nTimechunks": len(times),
+            "firstTime": times[0] if 0 < len(times) else 0,
+            "lastTime": times[-1] if 0 < len(times) else 0,
+        })
+
+    return ret
+# }}} def loadVcdInfo
+
+def loadTimechunkTimes(): # {{{
+    '''Return read-only memory-mapped ndarray of every timechunk time.
+    '''
+    assert paths._INITIALIZED
+
+    if not os.path.isfile(paths.fname_meatimes):
+        return np.asarray(toml.load(paths.fname_meainfo)["timechunkTimes"],
+                          dtype=np.int64)
+
+    return np.load(paths.fname_meatimes, mmap_mode='r')
+# }}} def loadTimechunkTimes
+
 metricNames = [
     "Cex",
     "Cls",
@@ -98,10 +260,33 @@ metricNames = [
     "Tmt",
 ]
 
-def metric(name, winSize, winAlpha, nBits=0): # {{{
+def metricWindow(winSize, winAlpha, nBits=0, trusted=False): # {{{
+    '''Return window coefficients, and keyword arguments, common to every
+       metric implementation.
+
+    With nBits, coefficients are in fixed point and w_Area is in the units
+    used by fxEx().
+    With trusted, elementwise asserts are skipped on every call, which is
+    only for inputs already validated by rdEvs() or SparseEvs.
+    '''
+    w = powsineCoeffs(winSize, winAlpha)
+
+    kw = {"trusted": True} if trusted else {}
+    if 0 == nBits:
+        kw["w_Area"] = np.sum(w)
+    else:
+        w = fxFromFloat(w, nBits=nBits)
+        kw["nBits"] = nBits
+        kw["w_Area"] = np.sum(w, dtype=np.int64) + len(w)
+
+    return w, kw
+# }}} def metricWindow
+
+def metric(name, winSize, winAlpha, nBits=0, trusted=False): # {{{
     '''Take attributes of a metric, return a callable implementation.
 
     E.g. Use like: metric("foo")(x, y)
+    See metricWindow() for trusted.
 
     NOTE: Ex isn't really a metric but it's a convenient place to choose between
     implementations by nBits.
@@ -109,24 +294,72 @@ def metric(name, winSize, winAlpha, nBits=0): # {{{
     if name is None:
         return None
 
-    w = powsineCoeffs(winSize, winAlpha)
+    w, kw = metricWindow(winSize, winAlpha, nBits, trusted)
 
-    assert 0 == nBits, "TODO: Implement fx*()"
     assert name in metricNames or name in ["Ex"], name
     fs = {
-        "Ex":  partial(fxEx  if 0 < nBits else ndEx,  w, nBits=nBits),
-        "Cex": partial(fxCex if 0 < nBits else ndCex, w, nBits=nBits),
-        "Cls": partial(fxCls if 0 < nBits else ndCls, w, nBits=nBits),
-        "Cos": partial(fxCos if 0 < nBits else ndCos, w, nBits=nBits),
-        "Cov": partial(fxCov if 0 < nBits else ndCov, w, nBits=nBits),
-        "Dep": partial(fxDep if 0 < nBits else ndDep, w, nBits=nBits),
-        "Ham": partial(fxHam if 0 < nBits else ndHam, w, nBits=nBits),
-        "Tmt": partial(fxTmt if 0 < nBits else ndTmt, w, nBits=nBits),
+        "Ex":  partial(fxEx  if 0 < nBits else ndEx,  w, **kw),
+        "Cex": partial(fxCex if 0 < nBits else ndCex, w, **kw),
+        "Cls": partial(fxCls if 0 < nBits else ndCls, w, **kw),
+        "Cos": partial(fxCos if 0 < nBits else ndCos, w, **kw),
+        "Cov": partial(fxCov if 0 < nBits else ndCov, w, **kw),
+        "Dep": partial(fxDep if 0 < nBits else ndDep, w, **kw),
+        "Ham": partial(fxHam if 0 < nBits else ndHam, w, **kw),
+        "Tmt": partial(fxTmt if 0 < nBits else ndTmt, w, **kw),
     }
 
     return fs[name]
 # }}} def metric
 
+def allMetrics(winSize, winAlpha, nBits=0, trusted=False): # {{{
+    '''Return a callable implementation of every metric at once.
+
+    E.g. Use like: allMetrics(...)(x, y)["Cov"]
+    See metricWindow() for trusted.
+    '''
+    w, kw = metricWindow(winSize, winAlpha, nBits, trusted)
+
+    return partial(fxAllMetrics if 0 < nBits else ndAllMetrics, w, **kw)
+# }}} def allMetrics
+
+def allMetricsMatrix(winSize, winAlpha, trusted=False): # {{{
+    '''Return a callable implementation of every metric between every row of
+       X and every row of Y, for floating point only.
+
+    E.g. Use like: allMetricsMatrix(...)(X, Y)["Cov"][i][j]
+    See metricWindow() for trusted.
+    '''
+    w, kw = metricWindow(winSize, winAlpha, 0, trusted)
+
+    return partial(ndAllMetricsMatrix, w, **kw)
+# }}} def allMetricsMatrix
+
+def metricToFloat(x, nBits=0): # {{{
+    '''Return results of metric() or allMetrics() as floats.
+
+    Fixed point results are converted for display, and for anything else
+    outside the calculation of metrics.
+    '''
+    return x if 0 == nBits else fxToFloat(x, nBits=nBits)
+# }}} def metricToFloat
+
+def metricBound(name, nBits=0): # {{{
+    '''Return a callable upper bound of a metric, from only E[X] and E[Y],
+       or None if no useful bound is known.
+
+    E.g. Use like: metricBound("Cov")(x_Ex, y_Ex)
+    '''
+    if name is None or 0 < nBits:
+        return None
+
+    fs = {
+        "Cov": ndCovBound,
+        "Dep": ndDepBound,
+    }
+
+    return fs.get(name, None)
+# }}} def metricBound
+
 mapMetricNameToHtml = {
     "Ex":   utf8NameToHtml("MATHEMATICAL DOUBLE-STRUCK CAPITAL E"), # E[x]
     "Cex":  utf8NameToHtml("MATHEMATICAL DOUBLE-STRUCK CAPITAL E"), # E[x|y]
@@ -212,6 +445,19 @@ def cfgDsfDeltas(cfg): # {{{
     return dsfDeltas(cfg.windowsize, cfg.deltabk, cfg.deltafw, cfg.deltazoom)
 # }}} def cfgDsfDeltas
 
+def nWorkersFromJobs(nJobs): # {{{
+    '''Number of worker processes from n_jobs, using joblib's convention
+       where negative numbers are relative to the number of CPUs.
+    '''
+    assert isinstance(nJobs, int), type(nJobs)
+    assert 0 != nJobs, nJobs
+
+    ret = nJobs if 0 < nJobs else \
+          max(1, multiprocessing.cpu_count() + 1 + nJobs)
+
+    return ret
+# }}} def nWorkersFromJobs
+
 def meaDtype(name): # {{{
     # [(t,v), ...] OR [t, ...]
     # timestamp: Big-endian, unsigned long (32b)
@@ -230,6 +476,58 @@ def meaDtype(name): # {{{
     return tp, strideBytes, structFmt
 # }}} def meaDtype
 
+def evsDtypes(fxbits=0): # {{{
+    '''Return dtypes of EVS for binary and real measures, as rdEvs.
+    '''
+    return \
+        np.bool_ if fxbits == 0 else fxDtype(fxbits), \
+        np.float32 if fxbits == 0 else fxDtype(fxbits)
+# }}} def evsDtypes
+
+def evsItemsize(nm, fxbits=0): # {{{
+    '''Return number of bytes per sample of a measure, as read by rdEvs.
+    '''
+    bDtype, rDtype = evsDtypes(fxbits)
+    dtype = rDtype if nm.startswith("normal.") else bDtype
+    return np.dtype(dtype).itemsize
+# }}} def evsItemsize
+
+def maxmemBlocks(items, nBytes, maxmem, maxLen=0): # {{{
+    '''Split a list of items into consecutive blocks where the total number
+       of bytes in each block is within maxmem.
+
+    nBytes is the number of bytes of each item, either an int for all items
+    or a list of equal length to items.
+    Blocks are filled greedily, each with at least one item, so an item
+    larger than maxmem is in a block by itself.
+    0 for maxmem or maxLen means unlimited.
+    Return a list of lists.
+    '''
+    items = list(items)
+    nBytes = nBytes if isinstance(nBytes, list) else [nBytes] * len(items)
+    assert len(items) == len(nBytes), (len(items), len(nBytes))
+    assert 0 <= maxmem, maxmem
+    assert 0 <= maxLen, maxLen
+
+    ret_ = []
+    block_, blockBytes_ = [], 0
+    for item,n in zip(items, nBytes):
+        isFull = (0 < maxmem and maxmem < blockBytes_ + n) or \
+                 (0 < maxLen and maxLen <= len(block_))
+
+        if isFull and 0 < len(block_):
+            ret_.append(block_)
+            block_, blockBytes_ = [], 0
+
+        block_.append(item)
+        blockBytes_ += n
+
+    if 0 < len(block_):
+        ret_.append(block_)
+
+    return ret_
+# }}} def maxmemBlocks
+
 mapMeasureTypeToSiblingTypes = {
     "event":     ("orig",),
     "bstate":    ("orig", "refl", "rise", "fall",),
@@ -264,12 +562,12 @@ def isUnitIntervalMeasure(name): # {{{
     return ret
 # }}} def isUnitIntervalMeasure
 
-def meaDbFromVcd(): # {{{
-    '''Apply post-processing steps to stage0.
-
-    Extract changes from signals.vcd into fast-to-read binary form.
+class MeaDbWriter(object): # {{{
+    '''Write changes of measurements into fast-to-read binary form.
 
-    signals.vcd has only 2 datatypes: bit, real
+    Use like VcdWriter, but with a list of measurement names instead of a
+    header, then write timechunks of (time, names, values).
+    Only unit interval measurements are written, others are silently ignored.
 
     Assume initial state for all measurements is 0.:
     All timestamps are 32b non-negative integers.
@@ -277,50 +575,232 @@ def meaDbFromVcd(): # {{{
         bit: Ordered sequence of timestamps.
         real: Ordered sequence of (timestamp, value) pairs.
             All values are 32b IEEE754 floats, OR 32b(zext) fx.
+
+    With appendTime, the existing database is continued instead of being
+    replaced, discarding any changes at or after appendTime.
     '''
-    verb("Creating binary database from VCD... ", end='')
+    def __init__(self, names, appendTime=None):
+        self.names = [nm for nm in names if isUnitIntervalMeasure(nm)]
+        self.appendTime = appendTime
+
+    def wrTimechunk(self, timechunk): # {{{
+        newTime, changedVars, newValues = timechunk
+
+        for nm,newValue in zip(changedVars, newValues):
+            fd = self.fds.get(nm, None)
+            if fd is None:
+                continue
+
+            tp, _, structFmt = meaDtype(nm)
+
+            # Values are rounded to the same precision as signals.vcd so the
+            # database is identical whether or not it is read from VCD.
+            if tp is float and not isinstance(newValue, str):
+                newValue = "%0.06f" % newValue
+
+            v, p = tp(newValue), self.prevValues[nm]
+
+            if v != p:
+                _packArgs = [newTime, v] if tp is float else [newTime]
+                fd.write(struct.pack(structFmt, *_packArgs))
+                self.prevValues[nm] = v
+
+        return
+    # }}} def wrTimechunk
+
+    def __enter__(self):
+        mkDirP(paths.dname_mea)
+
+        if self.appendTime is None:
+            self.fds = {nm: open(joinP(paths.dname_mea, nm), 'wb') \
+                        for nm in self.names}
+            self.prevValues = {nm: 0 for nm in self.names}
+        else:
+            self.fds, self.prevValues = {}, {}
+            for nm in self.names:
+                self.fds[nm], self.prevValues[nm] = self.openAppend(nm)
+
+        return self
+
+    def openAppend(self, nm): # {{{
+        '''Truncate one existing file to appendTime, and return the open file
+           positioned at the end with the value of the last change.
+        '''
+        tp, strideBytes, _ = meaDtype(nm)
+
+        fd = open(joinP(paths.dname_mea, nm), 'r+b')
+
+        changes = np.fromfile(fd, dtype=[("t", ">u4"), ("v", ">f4")] \
+                                        if tp is float else ">u4")
+        ts = changes["t"] if tp is float else changes
+        n = int(np.searchsorted(ts, self.appendTime, side="left"))
+
+        fd.truncate(n * strideBytes)
+        fd.seek(0, os.SEEK_END)
+
+        # Values are written with the same precision as signals.vcd, which
+        # is recovered exactly from 32b floats in [0, 1].
+        if 0 == n:
+            prevValue = 0
+        elif tp is float:
+            prevValue = float("%0.06f" % changes["v"][n-1])
+        else:
+            prevValue = n % 2
+
+        return fd, prevValue
+    # }}} def openAppend
+
+    def __exit__(self, type, value, traceback):
+        for _,fd in self.fds.items():
+            fd.close()
 
-    mkDirP(paths.dname_mea)
+# }}} class MeaDbWriter
 
-    with VcdReader(paths.fname_mea) as vcdi:
+def pyramidPrng(dsf): # {{{
+    '''Return the fixed PRNG used to subsample one level of the pyramid.
 
-        # Stage0 file has bijective map between varId and varName by
-        # construction, so take first (only) name for convenience.
-        _mapVarIdToName = {varId: detypeVarName(nms[0]) \
-                           for varId,nms in vcdi.mapVarIdToNames.items()}
-        mapVarIdToName = {varId: nm \
-                          for varId,nm in _mapVarIdToName.items() \
-                          if isUnitIntervalMeasure(nm)}
+    Seeding with the downsample factor means rebuilding a level always gives
+    identical results.
+    '''
+    prng = random.Random(dsf)
+    prng.next = partial(prng.randrange, 0, dsf)
+    return prng
+# }}} def pyramidPrng
+
+def wrMeaChanges(fname, name, evs, startTime=0, prevValue=0): # {{{
+    '''Write an ndarray of samples from startTime in the same binary format
+       as MeaDbWriter.
+
+    From time 0, the file is created assuming initial state 0.
+    Otherwise the file is continued, where prevValue is the sample before
+    startTime.
+    '''
+    tp, _, _ = meaDtype(name)
 
-        fds = {nm: open(joinP(paths.dname_mea, nm), 'wb') \
-             for varId,nm in mapVarIdToName.items()}
+    # Indices where the value differs from the previous sample.
+    prev = np.concatenate(([prevValue], evs[:-1])).astype(evs.dtype)
+    idxs = np.flatnonzero(evs != prev)
 
-        prevValues = {varId: 0 for varId in mapVarIdToName.keys()}
+    if tp is float:
+        changes = np.empty(len(idxs), dtype=[("t", ">u4"), ("v", ">f4")])
+        changes["t"] = idxs + startTime
+        changes["v"] = evs[idxs]
+    else:
+        changes = (idxs + startTime).astype(">u4")
 
-        for newTime, changedVarIds, newValues in vcdi.timechunks:
-            for varId,newValue in zip(changedVarIds, newValues):
-                nm = mapVarIdToName.get(varId, None)
-                if nm is None:
-                    continue
+    with open(fname, 'wb' if 0 == startTime else 'ab') as fd:
+        fd.write(changes.tobytes())
 
-                tp, _, structFmt = meaDtype(nm)
-                v, p = tp(newValue), prevValues[varId]
+    return
+# }}} def wrMeaChanges
+
+# Limit on the number of samples read at once while writing a pyramid level.
+pyramidBatchSamples = 2**24
+
+def pyramidChunks(nTimes, dsf): # {{{
+    '''Return the number of measurements per batch, and the list of
+       [startTime, finishTime) chunks, for reading one level of the pyramid
+       within pyramidBatchSamples.
+
+    Subsampling a chunk gives the same result as the corresponding slice of
+    subsampling the whole time range, when:
+      - Chunks start at a multiple of dsf**2, so the XOR offsets align.
+      - The final chunk holds at least dsf samples, so padding by reflection
+        is the same.
+    Chunks are therefore a multiple of dsf**2, and any shorter tail takes the
+    last dsf**2 samples of the chunk before, or is joined onto it.
+    '''
+    unit = dsf**2
+    chunkLen = max(unit, pyramidBatchSamples // unit * unit)
+
+    nBatch = max(1, pyramidBatchSamples // min(chunkLen, nTimes))
+
+    chunks_ = [(t, min(t + chunkLen, nTimes)) \
+               for t in range(0, nTimes, chunkLen)]
+
+    if 1 < len(chunks_) and nTimes - chunks_[-1][0] < unit:
+        _ = chunks_.pop()
+        startTime, finishTime = chunks_[-1]
+        if unit < finishTime - startTime:
+            chunks_[-1:] = [(startTime, finishTime - unit),
+                            (finishTime - unit, nTimes)]
+        else:
+            chunks_[-1] = (startTime, nTimes)
+
+    return nBatch, chunks_
+# }}} def pyramidChunks
+
+def meaPyramid(cfg): # {{{
+    '''Write any missing levels of the multi-resolution pyramid.
+
+    Each level holds every measurement subsampled by one of the downsample
+    factors used by cfg, in the same binary format as the base database, so
+    network graphs can read windows at any downsample factor directly with
+    rdEvs(..., dsf=<factor>).
+    Levels are subsampled over the whole time range so they are aligned to
+    time 0, rather than to the start of any particular window.
+    The base database is read in batches of measurements and chunks of time,
+    see pyramidChunks, so memory usage doesn't grow with the length of input.
+    '''
+    assert paths._INITIALIZED
 
-                if v != p:
-                    _packArgs = [newTime, v] if tp is float else [newTime]
-                    bs = struct.pack(structFmt, *_packArgs)
-                    fds[nm].write(bs)
-                    prevValues[varId] = v
+    vcdInfo = loadVcdInfo()
+    measureNames = vcdInfo["unitIntervalVarNames"]
+    nTimes = vcdInfo["lastTime"] + 1
+
+    for dsf in sorted(set(dsf for dsf,_ in cfgDsfDeltas(cfg) if 1 < dsf)):
+        dname = joinP(paths.dname_pyramid, str(dsf))
+        if os.path.isdir(dname):
+            continue
+
+        verb("Creating pyramid level %d... " % dsf, end='')
+
+        # Write then rename so an interrupted run never leaves a partial
+        # level.
+        tmpDname = dname + ".tmp"
+        shutil.rmtree(tmpDname, ignore_errors=True)
+        mkDirP(tmpDname)
+
+        # Batches of measurements and chunks of time to limit memory usage.
+        # Every chunk uses a fresh PRNG, as does every row of a chunk, so
+        # batching doesn't affect the result.
+        nBatch, chunks = pyramidChunks(nTimes, dsf)
+        for i in range(0, len(measureNames), nBatch):
+            batch = measureNames[i:i+nBatch]
+            prevValues_ = {nm: 0 for nm in batch}
+
+            for startTime,finishTime in chunks:
+                evs = rdEvs(batch, startTime, finishTime)
+
+                # Stack measurements with a common dtype, then subsample all
+                # rows in one call.
+                for dtype in set(evs[nm].dtype for nm in batch):
+                    nms = [nm for nm in batch if evs[nm].dtype == dtype]
+                    sfEvs = subsample(np.stack([evs[nm] for nm in nms]), dsf,
+                                      prng=pyramidPrng(dsf), axis=1)
+                    for nm,row in zip(nms, sfEvs):
+                        wrMeaChanges(joinP(tmpDname, nm), nm, row,
+                                     startTime // dsf, prevValues_[nm])
+                        prevValues_[nm] = row[-1]
+
+        os.rename(tmpDname, dname)
+
+        verb("Done")
 
-        for _,fd in fds.items():
-            fd.close()
+    return
+# }}} def meaPyramid
 
-    verb("Done")
+def meaFname(name, dsf=1): # {{{
+    '''Return path to the binary database of one measurement.
 
-    return
-# }}} def meaDbFromVcd
+    dsf=1 is the base database written by evaInit, and other downsample
+    factors are levels of the pyramid written by meaPyramid.
+    '''
+    return joinP(paths.dname_mea, name) if 1 == dsf else \
+           joinP(paths.dname_pyramid, str(dsf), name)
+# }}} def meaFname
 
-def meaSearch(name, targetTime, precNotSucc=True): # {{{
+def meaSearch(name, targetTime, precNotSucc=True, dsf=1): # {{{
     '''Return offset of nearest timestamp.
 
     Offset is number of timestamps, not number of bytes.
@@ -349,7 +829,7 @@ def meaSearch(name, targetTime, precNotSucc=True): # {{{
 
     t_, offset_ = None, -1
 
-    with open(joinP(paths.dname_mea, name), 'rb') as fd:
+    with open(meaFname(name, dsf), 'rb') as fd:
         while True:
             # Offset *before* reading timestamp.
             offset_ = fd.tell() // strideBytes
@@ -413,9 +893,19 @@ def meaSearch(name, targetTime, precNotSucc=True): # {{{
     return ret
 # }}} def meaSearch
 
-def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
+def rdEvs(names, startTime, finishTime, fxbits=0, dsf=1): # {{{
     '''Read EVent Samples (sanitized data written by evaInit to
        foo.eva/signals/*) in [startTime, finishTime), and return as ndarrays.
+
+    With dsf other than 1, read from that level of the pyramid where times
+    are in units of dsf samples, timed as the subsample stage.
+    '''
+    with stageTimer("rdEvs" if 1 == dsf else "subsample"):
+        return _rdEvs(names, startTime, finishTime, fxbits, dsf)
+# }}} def rdEvs
+
+def _rdEvs(names, startTime, finishTime, fxbits, dsf): # {{{
+    '''Implementation of rdEvs.
     '''
     names = set(names)
     assert paths._INITIALIZED
@@ -432,26 +922,26 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
         [nm for nm in names if nm.startswith("normal.")]
 
     bStartOffsets, rStartOffsets = \
-        (meaSearch(nm, startTime) for nm in bNames), \
-        (meaSearch(nm, startTime) for nm in rNames)
+        (meaSearch(nm, startTime, dsf=dsf) for nm in bNames), \
+        (meaSearch(nm, startTime, dsf=dsf) for nm in rNames)
 
     # Axis0 corresponds to order of names.
     bShape, rShape = \
         (len(bNames), fIdx), \
         (len(rNames), fIdx)
 
-    bDtype, rDtype = \
-        np.bool, \
-        np.float32 if fxbits == 0 else fxDtype(fxbits)
+    bDtype, rDtype = evsDtypes(fxbits)
+
+    # Fixed point has no zero so False is the point closest to it.
+    bOne = True if fxbits == 0 else 2**fxbits - 1
 
     # Fully allocate memory before any filling to ensure there is enough.
     bEvs, rEvs = \
         np.zeros(bShape, dtype=bDtype), \
         np.zeros(rShape, dtype=rDtype)
 
-    bStructFmt, rStructFmt = \
-        ">L", \
-        ">Lf" if fxbits == 0 else ">LL"
+    # Real values are always stored as floats, converted on reading.
+    bStructFmt, rStructFmt = ">L", ">Lf"
 
     bStrideBytes, rStrideBytes = 4, 8
 
@@ -459,7 +949,7 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
     for i,(nm,startOffset) in enumerate(zip(bNames, bStartOffsets)): # {{{
         prevIdx, prevValue = 0, False
 
-        with Fragile(open(joinP(paths.dname_mea, nm), 'rb')) as fd:
+        with Fragile(open(meaFname(nm, dsf), 'rb')) as fd:
             o_ = max(0, startOffset)
             fd.seek(o_ * bStrideBytes)
 
@@ -472,8 +962,11 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
 
             while tIdx < fIdx:
                 if prevValue: # Initialised to 0, only update bool if necessary.
-                    bEvs[i][prevIdx:tIdx] = prevValue
-                prevIdx, prevValue = tIdx, v
+                    bEvs[i][prevIdx:tIdx] = bOne
+
+                # First change may be before startTime, where a negative
+                # index would wrap around.
+                prevIdx, prevValue = max(0, tIdx), v
 
                 bs = fd.read(bStrideBytes) # Read timestamp.
                 if len(bs) != bStrideBytes:
@@ -482,15 +975,17 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
                 tIdx = t - startTime
                 o_ += 1
 
+        countStat("bytesRead", (o_ - max(0, startOffset)) * bStrideBytes)
+
         if prevValue: # Initialised to 0, only update bool if necessary.
-            bEvs[i][prevIdx:] = prevValue
+            bEvs[i][prevIdx:] = bOne
     # }}} infer/copy/fill bEvs
 
     # Fill by infer/copy real values from signals.vcd to ndarray.
     for i,(nm,startOffset) in enumerate(zip(rNames, rStartOffsets)): # {{{
         prevIdx, prevValue = 0, 0.0
 
-        with Fragile(open(joinP(paths.dname_mea, nm), 'rb')) as fd:
+        with Fragile(open(meaFname(nm, dsf), 'rb')) as fd:
             o_ = max(0, startOffset)
             fd.seek(o_ * rStrideBytes)
 
@@ -504,7 +999,10 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
             while tIdx < fIdx:
                 rEvs[i][prevIdx:tIdx] = prevValue \
                     if fxbits == 0 else fxFromFloat(prevValue, nBits=fxbits)
-                prevIdx, prevValue = tIdx, v
+
+                # First change may be before startTime, where a negative
+                # index would wrap around.
+                prevIdx, prevValue = max(0, tIdx), v
 
                 bs = fd.read(rStrideBytes) # Read timestamp.
                 if len(bs) != rStrideBytes:
@@ -513,10 +1011,19 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
                 tIdx = t - startTime
                 o_ += 1
 
+        countStat("bytesRead", (o_ - max(0, startOffset)) * rStrideBytes)
+
         rEvs[i][prevIdx:] = prevValue \
             if fxbits == 0 else fxFromFloat(prevValue, nBits=fxbits)
     # }}} infer/copy/fill rEvs
 
+    # Validate once here so that metric() implementations can skip
+    # elementwise checks on every call.
+    # Bits are in range by construction, as are fixed point by dtype.
+    if 0 == fxbits:
+        assert np.all(np.logical_and(0.0 <= rEvs, rEvs <= 1.0)), \
+            "Real values outside [0, 1]"
+
     mapNameToDatarow = {nm: (bEvs if bNotR else rEvs)[i]
                         for bNotR,i,nm in \
                          ([(True,  i, nm) for i, nm in enumerate(bNames)] + \
@@ -533,7 +1040,7 @@ def rdEvs(names, startTime, finishTime, fxbits=0): # {{{
         assert expectedLen == row.shape[0], (nm, expectedLen, row.shape)
 
     return mapNameToDatarow
-# }}} def rdEvs
+# }}} def _rdEvs
 
 mapSiblingTypeToHtml = {
     "orig": 'f', #utf8NameToHtml("MIDDLE DOT"),
@@ -587,10 +1094,37 @@ def measureSiblings(nm): # {{{
     return siblings
 # }}} def measureSiblings
 
-def winStartTimes(startTime, finishTime, winSize, winOverlap): # {{{
-    return list(range(startTime, finishTime, winSize - winOverlap))
+def winStartTimes(startTime, finishTime, winSize, winOverlap,
+                  page=0, rowsPerPage=0): # {{{
+    '''Return start times of windows in [startTime, finishTime).
+
+    With rowsPerPage, only the windows on that page are returned, counting
+    pages from 0, without generating the preceding windows.
+    '''
+    winStride = winSize - winOverlap
+
+    if 0 == rowsPerPage:
+        return list(range(startTime, finishTime, winStride))
+
+    assert 0 < rowsPerPage, rowsPerPage
+    assert 0 <= page, page
+
+    pageStartTime = startTime + page * rowsPerPage * winStride
+    pageFinishTime = min(finishTime, pageStartTime + rowsPerPage * winStride)
+
+    return list(range(pageStartTime, pageFinishTime, winStride))
 # }}} def winStartTimes
 
+def nWinPages(startTime, finishTime, winSize, winOverlap, rowsPerPage): # {{{
+    '''Return the number of pages of windows from winStartTimes, at least 1.
+    '''
+    assert 0 < rowsPerPage, rowsPerPage
+
+    nWins = len(range(startTime, finishTime, winSize - winOverlap))
+
+    return max(1, -(-nWins // rowsPerPage))
+# }}} def nWinPages
+
 def timeToEvsIdx(t, evsStartTime): # {{{
     '''
     Time:
@@ -608,8 +1142,11 @@ def timeToEvsIdx(t, evsStartTime): # {{{
     return t - evsStartTime
 # }}} def timeToEvsIdx
 
-def evaLink(a, b, u, x, y, txt, escapeQuotes=False): # {{{
+def evaLink(a, b, u, x, y, txt, escapeQuotes=False,
+            page=None, rowsPerPage=None): # {{{
     '''Return the link to a data view.
+
+    page and rowsPerPage only apply to tables varying u over rows.
     '''
     assert a is None or isinstance(a, str), type(a)
     assert b is None or isinstance(b, str), type(b)
@@ -621,6 +1158,9 @@ def evaLink(a, b, u, x, y, txt, escapeQuotes=False): # {{{
     assert u is None or isinstance(u, int), type(u)
     assert x is None or isinstance(x, str), type(x)
     assert y is None or isinstance(y, str), type(y)
+    assert page is None or isinstance(page, int), type(page)
+    assert rowsPerPage is None or isinstance(rowsPerPage, int), \
+        type(rowsPerPage)
 
     assert isinstance(txt, str), type(txt)
 
@@ -641,6 +1181,12 @@ def evaLink(a, b, u, x, y, txt, escapeQuotes=False): # {{{
     if y is not None:
         parts_.append("y=" + str(y))
 
+    if page is not None:
+        parts_.append("page=" + str(page))
+
+    if rowsPerPage is not None:
+        parts_.append("rowsPerPage=" + str(rowsPerPage))
+
     ret = (
         '<a href=',
         '&quot;' if escapeQuotes else '"',
@@ -3,23 +3,42 @@
 
 # Standard library imports
 from itertools import product
+import signal
+import sys
 
 # PyPI library imports
 import numpy as np
 
 # Local library imports
-from dmppl.math import l2Norm
-from dmppl.base import dbg, info, verb, joinP, rdTxt, utf8NameToHtml
+from dmppl.math import l2Norm, powsineCoeffs
+from dmppl.fx import fxDtype
+from dmppl.nd import ndAbsDiff, ndHadp, ndMetricsFromEx, ndRollingEx
+from dmppl.base import dbg, info, verb, joinP, rdTxt, utf8NameToHtml, Bunch
 from dmppl.color import rgb1D, rgb2D
+from dmppl.identicon import identiconSpriteSvg
 
 # Project imports
 # NOTE: Roundabout import path for eva_common necessary for unittest.
 from dmppl.experiments.eva.eva_common import \
     paths, \
     measureNameParts, measureSiblings, nSibsMax, mapSiblingTypeToHtml, \
-    metricNames, metric, mapMetricNameToHtml, evaLink, \
-    winStartTimes, rdEvs, timeToEvsIdx
-
+    metricNames, metric, metricToFloat, mapMetricNameToHtml, evaLink, \
+    winStartTimes, nWinPages, timeToEvsIdx, initPaths, nWorkersFromJobs, \
+    rdEvs, evsDtypes, evsItemsize, maxmemBlocks, pollAbandon
+from dmppl.experiments.eva.eva_sparse import SparseEvs, clMetric
+from dmppl.experiments.eva.eva_stats import countStat
+
+# Version-specific imports
+# Shared memory requires Python3.8+, otherwise rows are filled serially.
+if sys.version_info >= (3, 8):
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+else:
+    ProcessPoolExecutor, shared_memory = None, None
+
+# Default number of rows in each page of a table varying u over rows, which
+# bounds the memory and time of each request regardless of trace length.
+tableRowsPerPage = 1024
 
 def sliderControls(): # {{{
     ret = '''\
@@ -143,7 +162,8 @@ def evaTitleAny(fn, u, x, y, fnIsEx): # {{{
     return evaTitleFmt(fnIsEx).format(fn=fn, x=x, y=y, u=u)
 # }}} def evaTitleAny
 
-def tableTitleRow(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
+def tableTitleRow(a, b, u, x, y, cfg, dsfDeltas, vcdInfo,
+                  page=0, rowsPerPage=0): # {{{
     '''Return a string with HTML <tr>.
     '''
     measureNames = vcdInfo["unitIntervalVarNames"]
@@ -151,12 +171,30 @@ def tableTitleRow(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
     nDeltas = len(dsfDeltas)
 
     # NOTE: u may be 0 --> Cannot use "if u".
-    if u is None:
+    if u is None and 0 == rowsPerPage:
         # Possibly overestimate colspanTitle but browsers handle it properly.
         # No need for prev/next navigation since u varies over rows.
         colspanTitle = 8 + nDeltas
 
         navPrevNext = ''
+    elif u is None:
+        # Navigate between pages of windows, rather than windows.
+        colspanTitle = 8 + nDeltas - 5
+
+        nPages = nWinPages(vcdInfo["firstTime"], vcdInfo["lastTime"],
+                           cfg.windowsize, cfg.windowoverlap, rowsPerPage)
+
+        navPrevNext = ' '.join((
+            '<th class="nav_u" colspan="5">',
+            evaLink(a, b, u, x, y, "prev",
+                    page=page - 1, rowsPerPage=rowsPerPage) \
+                if 0 < page else '',
+            '%d/%d' % (page + 1, nPages),
+            evaLink(a, b, u, x, y, "next",
+                    page=page + 1, rowsPerPage=rowsPerPage) \
+                if page + 1 < nPages else '',
+            '</th>',
+        ))
     else:
         assert isinstance(u, int), type(u)
         # Exactly choose colspan of whole table, then take off some to make
@@ -418,83 +456,28 @@ def tableHeaderRows(a, b, u, x, y, dsfDeltas, exSibRow): # {{{
     return '\n'.join(r.strip() for r in ret)
 # }}} def tableHeaderRows
 
-def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
-    '''Read in relevant portion of EVS and calculate values for table cells.
-
-    Relevant names:
-      varying u, fixed x, fixed y:
-          x siblings
-          y siblings
-      varying x or y, fixed u:
-          all
+def tableCells(tbl, rowNums): # {{{
+    '''Generate the position of each cell in rows of fnUXY, for all columns.
 
-    Relevant times:
-      varying u, fixed x, fixed y:
-          all
-      varying x or y, fixed u:
-          [u-deltabk, u+windowsize+deltafw)
+    (<rowNum>, <colNum>, <keyX>, <startIdxX>, <keyY>, <startIdxY>)
     '''
-    measureNames = vcdInfo["unitIntervalVarNames"]
-
-    firstTime = vcdInfo["timechunkTimes"][0]
-    lastTime = vcdInfo["timechunkTimes"][-1]
-
-    winUs = winStartTimes(firstTime, lastTime,
-                          cfg.windowsize, cfg.windowoverlap) \
-                if u is None else None
-
-    evsStartTime = (firstTime if u is None else u) - cfg.deltabk
-    evsFinishTime = ((max(winUs[-1], firstTime) + cfg.windowsize) \
-                      if u is None else \
-                      u + cfg.windowsize) + cfg.deltafw + 1
-
-    # Read in all relevant data to one structure.
-    evsNames = (measureSiblings(x) + measureSiblings(y)) \
-        if u is None else measureNames
-    evs = rdEvs(evsNames, evsStartTime, evsFinishTime, cfg.fxbits)
+    cfg, u, x, y = tbl.cfg, tbl.u, tbl.x, tbl.y
+    evsExpectedLen = tbl.evsFinishTime - tbl.evsStartTime # debug only
 
-    evsExpectedLen = evsFinishTime - evsStartTime # debug only
-    for nm,row in evs.items():
-        assert 1 == len(row.shape), (nm, row.shape)
-        assert evsExpectedLen == row.shape[0], (nm, evsExpectedLen, row.shape)
+    for rowNum,colNum in product(rowNums, range(len(tbl.dsfDeltas))):
 
-    # Each row in evs is guaranteed to be of the same correct length.
-    for nm,row in evs.items():
-        assert nm in measureNames, (nm, measureNames)
-        assert row.shape == (evsFinishTime - evsStartTime,), \
-            (row.shape, evsStartTime, evsFinishTime)
-
-    aMetric, bMetric = \
-        metric(a, cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits), \
-        metric(b, cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits)
-    fns = (aMetric, bMetric) if b else (aMetric,)
-    nFns = len(fns)
-
-    nRows = len(winUs) if u is None else len(measureNames)
-    nCols = len(dsfDeltas) # Columns in fnUXY, not the sibling sections.
-    fnUXYShape = (nFns, nRows, nCols)
-
-    # All result arrays have the same dtype.
-    dtype = np.float32 if 0 == cfg.fxbits else fxDtype(cfg.fxbits)
-
-    # Allocate then fill main result array.
-    # TODO: parallelize by n_jobs
-    fnUXY = np.empty(fnUXYShape, dtype=dtype)
-    fnUXYIter = product(range(nFns), range(nRows), range(nCols))
-    for fnNum,rowNum,colNum in fnUXYIter:
-
-        dsf, delta = dsfDeltas[colNum]
+        dsf, delta = tbl.dsfDeltas[colNum]
         assert isinstance(dsf, int), type(dsf)
         assert isinstance(delta, int), type(delta)
 
         keyX, keyY = \
-            (x if x else measureNames[rowNum]), \
-            (y if y else measureNames[rowNum])
+            (x if x else tbl.measureNames[rowNum]), \
+            (y if y else tbl.measureNames[rowNum])
 
         # When u is varying, each row selects a window.
         # When u is fixed, evs only holds data for that window
-        startIdxX = timeToEvsIdx(winUs[rowNum] if u is None else u,
-                                     evsStartTime)
+        startIdxX = timeToEvsIdx(tbl.winUs[rowNum] if u is None else u,
+                                     tbl.evsStartTime)
         startIdxY = startIdxX + delta
         finishIdxX, finishIdxY = \
             (startIdxX + cfg.windowsize), \
@@ -507,21 +490,290 @@ def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
             (startIdxX, finishIdxX, evsExpectedLen)
         assert 0 <= startIdxY < finishIdxY < evsExpectedLen, \
             (startIdxY, finishIdxY, evsExpectedLen)
-        assert cfg.windowsize == (finishIdxX - startIdxX), \
-            (cfg.windowsize, startIdxX, finishIdxX)
-        assert cfg.windowsize == (finishIdxY - startIdxY), \
-            (cfg.windowsize, startIdxY, finishIdxY)
-
-        evsX, evsY = \
-            evs[keyX][startIdxX:finishIdxX], \
-            evs[keyY][startIdxY:finishIdxY]
+
+        yield rowNum, colNum, keyX, startIdxX, keyY, startIdxY
+# }}} def tableCells
+
+def fillFnUXY(fnUXY, tbl, evs, rowNums): # {{{
+    '''Fill rows of the main result array of calculateTableData.
+    '''
+    cfg = tbl.cfg
+    names = (tbl.a, tbl.b) if tbl.b else (tbl.a,)
+
+    fns = tuple(metric(nm, cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits,
+                       trusted=True) \
+                for nm in names)
+
+    # Equivalent implementations on change lists, used for sparse windows.
+    clFns = tuple(clMetric(nm, cfg.windowsize, cfg.windowalpha) \
+                  for nm in names)
+
+    for rowNum,colNum,keyX,startIdxX,keyY,startIdxY in \
+            tableCells(tbl, rowNums):
+        pollAbandon()
+
+        sparse, evsX, evsY = \
+            evs.pair(keyX, startIdxX, keyY, startIdxY, cfg.windowsize)
         assert 1 == len(evsX.shape) == len(evsY.shape), \
             (evsX.shape, evsY.shape)
-        assert evsX.shape == evsY.shape, (evsX.shape, evsY.shape, startIdxX, finishIdxX)
+        assert sparse or evsX.shape == evsY.shape, \
+            (evsX.shape, evsY.shape, startIdxX, keyX)
+
+        for fnNum,fn in enumerate(clFns if sparse else fns):
+            fnUXY[fnNum][rowNum][colNum] = fn(evsX, evsY)
 
-        fnUXY[fnNum][rowNum][colNum] = fns[fnNum](evsX, evsY)
+    return
+# }}} def fillFnUXY
+
+# State of each worker process, initialized by tableWorkerInit.
+tableWorker = Bunch()
+
+def tableWorkerInit(fnameEvc, tbl, shms): # {{{
+    '''Initialize a worker process by attaching to shared memory.
+
+    shms is a dict of {<key>: (<shared memory name>, <shape>, <dtype>)},
+    where keys are "fnUXY", "bEvs", "rEvs".
+    '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-    expectation = metric("Ex", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits)
+    if not getattr(paths, "_INITIALIZED", False):
+        initPaths(fnameEvc)
+
+    tableWorker.tbl = tbl
+    tableWorker.shms = {k: shared_memory.SharedMemory(name=shmName) \
+                        for k,(shmName,_,_) in shms.items()}
+    arrs = {k: np.ndarray(shape, dtype=dtype, buffer=tableWorker.shms[k].buf) \
+            for k,(_,shape,dtype) in shms.items()}
+
+    # Change lists are small enough to read again in each worker, but dense
+    # rows are only views into shared memory.
+    tableWorker.evs = SparseEvs(tbl.evsNames,
+                                tbl.evsStartTime, tbl.evsFinishTime,
+                                tbl.cfg.fxbits)
+    tableWorker.evs.denseEvs.update(zip(tbl.bDenseNames, arrs["bEvs"]))
+    tableWorker.evs.denseEvs.update(zip(tbl.rDenseNames, arrs["rEvs"]))
+
+    tableWorker.fnUXY = arrs["fnUXY"]
+
+    return
+# }}} def tableWorkerInit
+
+def tableWorkerFill(rowStart, rowFinish): # {{{
+    '''Fill a block of rows directly into shared memory.
+    '''
+    fillFnUXY(tableWorker.fnUXY, tableWorker.tbl, tableWorker.evs,
+              range(rowStart, rowFinish))
+    return
+# }}} def tableWorkerFill
+
+def parallelFnUXY(tbl, evs, nWorkers): # {{{
+    '''Return the main result array of calculateTableData, filled by a pool
+       of worker processes.
+
+    Dense rows of evs are copied into shared memory once, and each worker
+    writes results directly into a shared fnUXY, so only the bounds of each
+    block of rows are sent to workers.
+    Many rows per block keeps the overhead per task low, with a few blocks
+    per worker to balance load.
+    '''
+    cfg = tbl.cfg
+    nRows = tbl.fnUXYShape[1]
+
+    # Find which rows must be dense before any workers start.
+    denseNames = set()
+    for _,_,keyX,startIdxX,keyY,startIdxY in tableCells(tbl, range(nRows)):
+        if evs.pairChanges(keyX, startIdxX, keyY, startIdxY,
+                           cfg.windowsize) is None:
+            denseNames.update((keyX, keyY))
+
+    tbl = Bunch(dict(tbl.__dict__,
+        bDenseNames=sorted(nm for nm in denseNames \
+                           if not nm.startswith("normal.")),
+        rDenseNames=sorted(nm for nm in denseNames \
+                           if nm.startswith("normal.")),
+    ))
+
+    evsLen = tbl.evsFinishTime - tbl.evsStartTime
+    bDtype, rDtype = evsDtypes(cfg.fxbits)
+    layout = {
+        "fnUXY": (tbl.fnUXYShape, tbl.dtype),
+        "bEvs": ((len(tbl.bDenseNames), evsLen), np.dtype(bDtype)),
+        "rEvs": ((len(tbl.rDenseNames), evsLen), np.dtype(rDtype)),
+    }
+
+    shms_ = {}
+    try:
+        arrs = {}
+        for k,(shape,dtype) in layout.items():
+            nBytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+            shms_[k] = shared_memory.SharedMemory(create=True, size=nBytes)
+            arrs[k] = np.ndarray(shape, dtype=dtype, buffer=shms_[k].buf)
+
+        # Fill one row at a time to avoid a second full copy.
+        for k,names in (("bEvs", tbl.bDenseNames), ("rEvs", tbl.rDenseNames)):
+            for i,nm in enumerate(names):
+                arrs[k][i] = evs.dense(nm)
+                evs.denseEvs[nm] = arrs[k][i]
+
+        shms = {k: (shms_[k].name, shape, dtype) \
+                for k,(shape,dtype) in layout.items()}
+
+        nBlocks = min(nRows, 4 * nWorkers)
+        bounds = [(nRows * i) // nBlocks for i in range(nBlocks + 1)]
+
+        with ProcessPoolExecutor(nWorkers,
+                                 initializer=tableWorkerInit,
+                                 initargs=(paths.fname_evc, tbl, shms)) as pool:
+            _ = list(pool.map(tableWorkerFill, bounds[:-1], bounds[1:]))
+
+        ret = np.array(arrs["fnUXY"])
+
+        # Views into shared memory must not outlive it, so any rows required
+        # later are read again.
+        for nm in tbl.bDenseNames + tbl.rDenseNames:
+            del evs.denseEvs[nm]
+        del arrs
+    finally:
+        for shm in shms_.values():
+            shm.close()
+            shm.unlink()
+
+    return ret
+# }}} def parallelFnUXY
+
+def rollingTableData(a, b, x, y, cfg, dsfDeltas, winUs): # {{{
+    '''Return (<xEx>, <yEx>, <fnUXY>) of calculateTableData for a table
+       varying u over rows, from rolling windows over consecutive rows.
+
+    Every row is a window of the same pair of measures, so E[X], E[Y], E[X*Y]
+    and the other expectations required by the metrics are evaluated for all
+    windows of a column together with ndRollingEx, instead of each cell
+    taking a weighted sum over its own window.
+    Rows are evaluated in blocks of at most tableRowsPerPage windows, and
+    within cfg.maxmem bytes, so that the dense EVS of each block, and their
+    cumulative sums, bound memory.
+    '''
+    assert 0 == cfg.fxbits, cfg.fxbits
+    assert 0 < len(winUs), winUs
+
+    w = powsineCoeffs(cfg.windowsize, cfg.windowalpha)
+    kw = {"trusted": True, "w_Area": np.sum(w)}
+
+    names = (a, b) if b else (a,)
+    xSibs, ySibs = measureSiblings(x), measureSiblings(y)
+
+    nRows = len(winUs)
+    fnUXY = np.empty((len(names), nRows, len(dsfDeltas)), dtype=np.float32)
+    xEx = np.empty((nRows, len(xSibs)), dtype=np.float32)
+    yEx = np.empty((nRows, len(ySibs)), dtype=np.float32)
+
+    # Each row adds a stride of samples of every sibling to the span, and of
+    # each term with its float64 cumulative sum.
+    nTerms = 7
+    winStride = max(1, cfg.windowsize - cfg.windowoverlap)
+    rowBytes = winStride * \
+        (sum(evsItemsize(nm) for nm in set(xSibs + ySibs)) +
+         nTerms * (np.dtype(np.float32).itemsize +
+                   np.dtype(np.float64).itemsize))
+
+    rowStart = 0
+    for blockUs in maxmemBlocks(winUs, rowBytes, cfg.maxmem,
+                                maxLen=tableRowsPerPage):
+        rowFinish = rowStart + len(blockUs)
+
+        evsStartTime = blockUs[0] - cfg.deltabk
+        evsFinishTime = blockUs[-1] + cfg.windowsize + cfg.deltafw + 1
+        evs = rdEvs(sorted(set(xSibs + ySibs)), evsStartTime, evsFinishTime,
+                    cfg.fxbits)
+
+        starts = np.array([timeToEvsIdx(t, evsStartTime) for t in blockUs])
+
+        for sibs,arr in ((xSibs, xEx), (ySibs, yEx)):
+            for colNum,nm in enumerate(sibs):
+                arr[rowStart:rowFinish, colNum] = \
+                    ndRollingEx(w, evs[nm], starts, **kw)
+
+        # Align Y with X for each delta, over the span of the block's windows.
+        lo, hi = starts[0], starts[-1] + cfg.windowsize
+        xs = evs[x][lo:hi]
+        for colNum,(dsf,delta) in enumerate(dsfDeltas):
+            pollAbandon()
+            ys = evs[y][lo+delta:hi+delta]
+            xDiffY = ndAbsDiff(xs, ys)
+            terms = np.stack((xs, ys,
+                              ndHadp(xs, ys),
+                              xDiffY,
+                              ndHadp(xDiffY, xDiffY),
+                              ndHadp(xs, xs),
+                              ndHadp(ys, ys)))
+
+            mets = ndMetricsFromEx(*ndRollingEx(w, terms, starts - lo, **kw))
+
+            for fnNum,nm in enumerate(names):
+                fnUXY[fnNum, rowStart:rowFinish, colNum] = mets[nm]
+
+        rowStart = rowFinish
+
+    return xEx, yEx, fnUXY
+# }}} def rollingTableData
+
+def cellTableData(a, b, u, x, y, cfg, dsfDeltas, measureNames, winUs,
+                  nJobs=1): # {{{
+    '''Return (<xEx>, <yEx>, <fnUXY>) of calculateTableData, in the dtype
+       of the metrics, from each cell evaluated over its own window.
+
+    With u fixed, rows vary over all measures, otherwise rows are the
+    windows starting at winUs.
+    '''
+    # Only read the time span of these rows, plus delta margins.
+    evsStartTime = (winUs[0] if u is None else u) - cfg.deltabk
+    evsFinishTime = (winUs[-1] if u is None else u) + \
+        cfg.windowsize + cfg.deltafw + 1
+
+    # Read in all relevant data to one structure.
+    # Rows are only expanded to dense arrays where windows have many changes.
+    evsNames = (measureSiblings(x) + measureSiblings(y)) \
+        if u is None else measureNames
+
+    evs = SparseEvs(evsNames, evsStartTime, evsFinishTime, cfg.fxbits)
+
+    nFns = 2 if b else 1
+    nRows = len(winUs) if u is None else len(measureNames)
+    nCols = len(dsfDeltas) # Columns in fnUXY, not the sibling sections.
+
+    # All result arrays have the same dtype.
+    dtype = np.float32 if 0 == cfg.fxbits else fxDtype(cfg.fxbits)
+
+    # Everything required to fill any rows of fnUXY, except evs.
+    tbl = Bunch({
+        "a": a,
+        "b": b,
+        "u": u,
+        "x": x,
+        "y": y,
+        "cfg": cfg,
+        "dsfDeltas": dsfDeltas,
+        "measureNames": measureNames,
+        "winUs": winUs,
+        "evsNames": evsNames,
+        "evsStartTime": evsStartTime,
+        "evsFinishTime": evsFinishTime,
+        "fnUXYShape": (nFns, nRows, nCols),
+        "dtype": np.dtype(dtype),
+    })
+
+    # Allocate then fill main result array.
+    nWorkers = min(nRows, nWorkersFromJobs(nJobs))
+    if 1 < nWorkers and shared_memory is not None:
+        fnUXY = parallelFnUXY(tbl, evs, nWorkers)
+    else:
+        fnUXY = np.empty(tbl.fnUXYShape, dtype=dtype)
+        fillFnUXY(fnUXY, tbl, evs, range(nRows))
+    countStat("pairsEvaluated", nRows * nCols)
+
+    expectation = metric("Ex", cfg.windowsize, cfg.windowalpha,
+                         nBits=cfg.fxbits, trusted=True)
+    clExpectation = clMetric("Ex", cfg.windowsize, cfg.windowalpha)
 
     def sibEx(s): # {{{
         '''Allocate then fill a sibling expectation array.
@@ -535,7 +787,11 @@ def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
         nRowsEx = 1 if s and not (x and y) else nRows
         nColsEx = len(siblings) if s else nSibsMax
 
-        arr = np.empty((nRowsEx, nColsEx), dtype=dtype)
+        # Padding beyond the siblings of each measure is NaN, or zero for
+        # fixed point which calculateTableData replaces with NaN.
+        arr = np.full((nRowsEx, nColsEx),
+                      np.nan if np.issubdtype(dtype, np.floating) else 0,
+                      dtype=dtype)
         sibExIter = product(range(nRowsEx), range(nColsEx))
 
         for rowNum,colNum in sibExIter:
@@ -549,16 +805,15 @@ def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
                 if colNum < len(rowSiblings):
                     key = rowSiblings[colNum]
                 else:
-                    # NOTE: The uninitialized value should never be used.
                     continue
 
             startIdx = timeToEvsIdx(winUs[rowNum] if u is None else u,
                                         evsStartTime)
-            finishIdx = startIdx + cfg.windowsize
 
-            evsRow = evs[key][startIdx:finishIdx]
+            sparse, evsRow = evs.single(key, startIdx, cfg.windowsize)
 
-            arr[rowNum][colNum] = expectation(evsRow)
+            arr[rowNum][colNum] = \
+                (clExpectation if sparse else expectation)(evsRow)
 
         return arr
     # }}} def sibEx
@@ -566,8 +821,6 @@ def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
     xEx = sibEx(x)
     yEx = sibEx(y)
 
-    varCol = winUs if u is None else measureNames
-
     if x and y:
         assert xEx.shape == (nRows, len(measureSiblings(x))), xEx.shape
         assert yEx.shape == (nRows, len(measureSiblings(y))), yEx.shape
@@ -580,6 +833,88 @@ def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo): # {{{
     else:
         assert False
 
+    return xEx, yEx, fnUXY
+# }}} def cellTableData
+
+def calculateTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo,
+                       nJobs=1, page=0, rowsPerPage=0): # {{{
+    '''Read in relevant portion of EVS and calculate values for table cells.
+
+    Relevant names:
+      varying u, fixed x, fixed y:
+          x siblings
+          y siblings
+      varying x or y, fixed u:
+          all
+
+    Relevant times:
+      varying u, fixed x, fixed y:
+          all, or only windows on page when rowsPerPage is non-zero
+      varying x or y, fixed u:
+          [u-deltabk, u+windowsize+deltafw)
+
+    Rows of the main result array are calculated by nJobs worker processes,
+    using joblib's convention for negative numbers.
+    Tables varying u over rows are instead calculated by rollingTableData,
+    except with fixed point.
+    Tables varying u over rows are read and calculated in consecutive blocks
+    of rows, each within cfg.maxmem bytes of EVS, and the results joined.
+    Results are returned as floats, whichever implementation is used.
+    '''
+    measureNames = vcdInfo["unitIntervalVarNames"]
+
+    firstTime = vcdInfo["firstTime"]
+    lastTime = vcdInfo["lastTime"]
+
+    winUs = winStartTimes(firstTime, lastTime,
+                          cfg.windowsize, cfg.windowoverlap,
+                          page, rowsPerPage) \
+                if u is None else None
+    assert u is not None or 0 < len(winUs), (page, rowsPerPage)
+
+    evsNames = (measureSiblings(x) + measureSiblings(y)) \
+        if u is None else measureNames
+    for nm in evsNames:
+        assert nm in measureNames, (nm, measureNames)
+
+    # Consecutive windows of the same pair are evaluated together.
+    if u is None and 0 == cfg.fxbits:
+        xEx, yEx, fnUXY = rollingTableData(a, b, x, y, cfg, dsfDeltas, winUs)
+        countStat("pairsEvaluated", len(winUs) * len(dsfDeltas))
+        return xEx, yEx, fnUXY, winUs
+
+    if u is None:
+        # Each row adds a stride of samples of every sibling to the span.
+        winStride = max(1, cfg.windowsize - cfg.windowoverlap)
+        rowBytes = winStride * \
+            sum(evsItemsize(nm, cfg.fxbits) for nm in evsNames)
+
+        blocks = [cellTableData(a, b, u, x, y, cfg, dsfDeltas, measureNames,
+                                blockUs, nJobs) \
+                  for blockUs in maxmemBlocks(winUs, rowBytes, cfg.maxmem)]
+
+        # With u varying, x and y are fixed so every result has a row for
+        # each window.
+        xEx, yEx, fnUXY = \
+            (np.concatenate(arrs, axis=axis) \
+             for arrs,axis in zip(zip(*blocks), (0, 0, 1)))
+    else:
+        xEx, yEx, fnUXY = cellTableData(a, b, u, x, y, cfg, dsfDeltas,
+                                        measureNames, winUs, nJobs)
+
+    varCol = winUs if u is None else measureNames
+
+    if 0 < cfg.fxbits:
+        xEx, yEx, fnUXY = (metricToFloat(arr, nBits=cfg.fxbits) \
+                             .astype(np.float32) \
+                           for arr in (xEx, yEx, fnUXY))
+
+        # Padding of rows of measures with fewer siblings.
+        for ex,s in ((xEx, x), (yEx, y)):
+            if u is not None and not s:
+                for rowNum,nm in enumerate(measureNames):
+                    ex[rowNum, len(measureSiblings(nm)):] = np.nan
+
     return xEx, yEx, fnUXY, varCol
 # }}} def calculateTableData
 
@@ -648,7 +983,8 @@ def measureCompactHtml(name): # {{{
     spanFmt = '<span class="compact %s">%s%s</span>'
 
     mt, st, bn = measureNameParts(name)
-    icon = rdTxt(joinP(paths.dname_identicon, bn + ".svg"))
+    icon = identiconSpriteSvg(bn, fill="darkgray",
+                              cacheDir=paths.dname_identicon)
 
     return spanFmt % (mt, icon, mapSiblingTypeToHtml[st])
 # }}} def measureCompactHtml
@@ -710,33 +1046,35 @@ def tableDataRows(a, b, u, x, y, cfg, vcdInfo, exSib, varCol, fnUXY): # {{{
         return '\n'.join(ret)
     # }}} def tableDataRow
 
-    return '\n'.join(tableDataRow(rowNum) for rowNum in range(nRows))
+    return (tableDataRow(rowNum) for rowNum in range(nRows))
 # }}} def tableDataRows
 
 def htmlTable(a, b, u, x, y,
               cfg, dsfDeltas, vcdInfo,
-              exSibRow, exSib, varCol, fnUXY): # {{{
-    ret_ = []
-    ret_.append(sliderControls())
-    ret_.append('<table>')
+              exSibRow, exSib, varCol, fnUXY,
+              page=0, rowsPerPage=0): # {{{
+    '''Generate strings of HTML for a table, one for each row of data.
+    '''
+    yield sliderControls()
+    yield '<table>'
 
     # Top-most row with title (with nav popovers), and prev/next.
-    ret_.append(tableTitleRow(a, b, u, x, y,
-                              cfg, dsfDeltas, vcdInfo))
+    yield tableTitleRow(a, b, u, x, y,
+                        cfg, dsfDeltas, vcdInfo,
+                        page, rowsPerPage)
 
     # Column headers with delta values. Both hi and lo rows.
-    ret_.append(tableHeaderRows(a, b, u, x, y,
-                                dsfDeltas,
-                                exSibRow))
+    yield tableHeaderRows(a, b, u, x, y,
+                          dsfDeltas,
+                          exSibRow)
 
     # Main data rows.
-    ret_.append(tableDataRows(a, b, u, x, y,
-                              cfg, vcdInfo,
-                              exSib, varCol, fnUXY))
-
-    ret_.append('</table>')
+    for s in tableDataRows(a, b, u, x, y,
+                           cfg, vcdInfo,
+                           exSib, varCol, fnUXY):
+        yield s
 
-    return ret_
+    yield '</table>'
 # }}} def htmlTable
 
 if __name__ == "__main__":
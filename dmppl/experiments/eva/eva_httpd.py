@@ -3,35 +3,52 @@
 
 # Standard library imports
 from itertools import chain
+import json
+import multiprocessing
 import os
+import select
+import signal
+import socket
 import sys
+import threading
 import time
+import traceback
+import zlib
 
 # PyPI library imports
-import toml
 import numpy as np
 
 # Local library imports
-from dmppl.base import dbg, info, verb, joinP, tmdiff, rdTxt
+from dmppl.base import dbg, info, verb, joinP, tmdiff, rdTxt, Bunch
 
 # Project imports
 # NOTE: Roundabout import path for eva_common necessary for unittest.
 from dmppl.experiments.eva.eva_common import \
-    appPaths, paths, metricNames, cfgDsfDeltas, loadCfg, evaLink
+    appPaths, paths, initPaths, metricNames, cfgDsfDeltas, loadCfg, evaLink, \
+    meaPyramid, nWorkersFromJobs, nWinPages, abandonCheck
 from dmppl.experiments.eva.eva_html_table import \
-    calculateTableData, htmlTable, evaTitleText
+    calculateTableData, htmlTable, evaTitleText, tableRowsPerPage
 from dmppl.experiments.eva.eva_svg_netgraph import \
     calculateEdges, svgNetgraph
+from dmppl.experiments.eva.eva_cache import ResultCache, resultFingerprint
+from dmppl.experiments.eva.eva_api import \
+    apiFormats, apiTable, apiEdges, apiEncode, apiEtag, etagMatches
+from dmppl.experiments.eva.eva_precompute import cubeTableData, cubeEdges
+from dmppl.experiments.eva.eva_stats import \
+    RequestStats, StatsTotals, collectStats, requestStats, stageTimer, \
+    timedIter, countStat
 
 # Version-specific imports
 version_help = "Python 2.7 or 3.4+ required."
 if sys.version_info[0] == 2:
     assert sys.version_info[1] >= 7, version_help
     from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
     from urlparse import parse_qs
 elif sys.version_info[0] == 3:
     assert sys.version_info[1] >= 4, version_help
     from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
     from urllib.parse import parse_qs
 else:
     assert False, version_help
@@ -40,8 +57,33 @@ class EvaHTMLException(Exception): # {{{
     pass
 # }}} class EvaHTMLException
 
-def htmlTopFmt(body, inlineJs=True, inlineCss=True, bodyOnly=False): # {{{
-    '''Return a string with HTML headers for JS and CSS.
+class EvaHTTPCancelled(Exception): # {{{
+    pass
+# }}} class EvaHTTPCancelled
+
+class EvaHTTPTimeout(Exception): # {{{
+    pass
+# }}} class EvaHTTPTimeout
+
+class EvaHTTPWorkerError(Exception): # {{{
+    pass
+# }}} class EvaHTTPWorkerError
+
+# Initialized by evaResultCache(), once per process.
+resultCache = None
+resultCacheLock = threading.Lock()
+
+# Period in seconds between checks for timeout or client disconnection while
+# waiting for a worker to calculate a response.
+httpdPollPeriod = 0.1
+
+# Streamed responses are sent in chunks of at least this many bytes, unless
+# the next part is slow to generate.
+httpdChunkBytes = 2**14
+
+def htmlTopChunks(body, inlineJs=True, inlineCss=True, bodyOnly=False): # {{{
+    '''Generate strings of HTML with headers for JS and CSS, where body is an
+       iterable of strings which is only consumed as required.
     '''
 
     fnamesJs = (joinP(appPaths.share, fname) for fname in \
@@ -63,24 +105,51 @@ def htmlTopFmt(body, inlineJs=True, inlineCss=True, bodyOnly=False): # {{{
                ('<link rel="stylesheet" type="text/css" href="%s">' % fname)
                for fname in fnamesCss)
 
-    ret = '\n'.join(body) \
-        if bodyOnly else \
-        '\n'.join(r.strip() for r in (
+    head = () if bodyOnly else (
           '<!DOCTYPE html>',
           '<html>',
           '  <head>',
           '\n'.join(chain(jsTxts, cssTxts)),
           '  </head>',
           '  <body>',
-          '\n'.join(body),
+    )
+
+    tail = () if bodyOnly else (
           '  </body>',
           '</html>',
-        ))
-    return ret
+    )
+
+    sep = ''
+    for r in chain((r.strip() for r in head), body, (r.strip() for r in tail)):
+        yield sep + r
+        sep = '\n'
+# }}} def htmlTopChunks
+
+def htmlTopFmt(body, inlineJs=True, inlineCss=True, bodyOnly=False): # {{{
+    '''Return a string with HTML headers for JS and CSS.
+    '''
+    return ''.join(htmlTopChunks(body, inlineJs, inlineCss, bodyOnly))
 # }}} def htmlTopFmt
 
-def evaHtmlString(args, cfg, request): # {{{
-    '''Return a string of HTML.
+def evaResultCache(args): # {{{
+    '''Return the ResultCache for this process, created on first use.
+    '''
+    global resultCache
+
+    with resultCacheLock:
+        if resultCache is None:
+            resultCache = ResultCache(args.cache_mem, args.cache_disk)
+
+    return resultCache
+# }}} def evaResultCache
+
+def evaViewData(args, cfg, request, lazy=False): # {{{
+    '''Resolve a request to a view and return a Bunch of its parameters and
+       results, either tableData or edges.
+
+    With lazy, edges which aren't already available may be a generator which
+    calculates each edge as it's consumed, and puts them all in the cache
+    when exhausted.
 
     a     b     -->
     None  None  Default values
@@ -137,7 +206,11 @@ def evaHtmlString(args, cfg, request): # {{{
         assert False
 
 
-    vcdInfo = toml.load(paths.fname_meainfo)
+    # Results, and signals.info.toml, are only recalculated when cfg or the
+    # database has changed.
+    cache = evaResultCache(args)
+    fingerprint = cache.validate(cfg)
+    vcdInfo = cache.loadVcdInfo(fingerprint)
 
     if u is None and x is None and y is None:
         # Default values
@@ -192,22 +265,119 @@ def evaHtmlString(args, cfg, request): # {{{
     else:
         assert False
 
+    # Tables varying u over rows are split into pages of windows.
+    # rowsPerPage of 0 puts every window on one page.
+    if u is None:
+        page = int(request.get("page") or 0)
+        rowsPerPage = tableRowsPerPage \
+            if request.get("rowsPerPage") is None else \
+            int(request["rowsPerPage"])
+        assert 0 <= rowsPerPage, rowsPerPage
+
+        if 0 > rowsPerPage:
+            raise EvaHTMLException
+
+        nPages = 1 if 0 == rowsPerPage else \
+            nWinPages(vcdInfo["firstTime"], vcdInfo["lastTime"],
+                      cfg.windowsize, cfg.windowoverlap, rowsPerPage)
+        assert 0 <= page < nPages, (page, nPages)
+
+        if not (0 <= page < nPages):
+            raise EvaHTMLException
+    else:
+        page, rowsPerPage = 0, 0
+
     # Every view varies delta - tables by horizontal, networks by edges.
     dsfDeltas = cfgDsfDeltas(cfg) # [(<downsample factor>, <delta>), ...]
 
     # Sort by delta value, not by downsampling factor.
     dsfDeltas.sort(key=lambda dsf_d: dsf_d[1])
 
+    # Precomputed results are preferred, then cached results, before
+    # calculating on demand.
+    if tableNotNetwork:
+        cacheKey = ("table", a, b, u, x, y, page, rowsPerPage)
+        tableData = cubeTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo,
+                                  page, rowsPerPage)
+        if tableData is None:
+            tableData = cache.get(fingerprint, cacheKey)
+        if tableData is not None:
+            countStat("cacheHits")
+        else:
+            with stageTimer("metrics"):
+                calculated = calculateTableData(a, b, u, x, y,
+                                                cfg, dsfDeltas, vcdInfo,
+                                                nJobs=args.n_jobs,
+                                                page=page,
+                                                rowsPerPage=rowsPerPage)
+            tableData = cache.put(fingerprint, cacheKey, calculated)
+        edges = None
+
+    else:
+        cacheKey = ("edges", a, b, u)
+        edges = cubeEdges(a, b, u, cfg, dsfDeltas, vcdInfo)
+        if edges is None:
+            edges = cache.get(fingerprint, cacheKey)
+        if edges is not None:
+            countStat("cacheHits")
+        elif lazy:
+            edges = cachedEdges(cache, fingerprint, cacheKey,
+                                timedIter("metrics",
+                                          calculateEdges(a, b, u, cfg,
+                                                         dsfDeltas, vcdInfo)))
+        else:
+            edges = cache.put(fingerprint, cacheKey,
+                              list(timedIter("metrics",
+                                             calculateEdges(a, b, u, cfg,
+                                                            dsfDeltas,
+                                                            vcdInfo))))
+        tableData = None
+
+    ret = Bunch({
+        'a': a, 'b': b, 'u': u, 'x': x, 'y': y,
+        "page": page,
+        "rowsPerPage": rowsPerPage,
+        "tableNotNetwork": tableNotNetwork,
+        "dsfDeltas": dsfDeltas,
+        "vcdInfo": vcdInfo,
+        "fingerprint": fingerprint,
+        "tableData": tableData,
+        "edges": edges,
+    })
+    return ret
+# }}} def evaViewData
+
+def cachedEdges(cache, fingerprint, cacheKey, edges): # {{{
+    '''Generate edges, then put them all in the cache.
+    '''
+    ret_ = []
+    for edge in edges:
+        ret_.append(edge)
+        yield edge
+
+    cache.put(fingerprint, cacheKey, ret_)
+# }}} def cachedEdges
+
+def evaHtmlChunks(args, cfg, request, lazy=False): # {{{
+    '''Return a generator of strings of HTML.
+
+    The request is resolved before returning, so invalid requests raise
+    EvaHTMLException before anything is generated.
+    With lazy, network graphs may be calculated while they're generated.
+    See evaViewData for how requests are resolved to views.
+    '''
+    view = evaViewData(args, cfg, request, lazy)
+    a, b, u, x, y = view.a, view.b, view.u, view.x, view.y
+    dsfDeltas, vcdInfo = view.dsfDeltas, view.vcdInfo
+
     # Avoid inline JS or CSS for browser caching, but use for standalone files.
     inlineHead = (args.httpd_port == 0)
 
     # Specific case for returning standalone SVG.
-    bodyOnly = (args.httpd_port == 0) and not tableNotNetwork
+    bodyOnly = (args.httpd_port == 0) and not view.tableNotNetwork
 
-    if tableNotNetwork:
-        xEx, yEx, fnUXY, varCol = \
-            calculateTableData(a, b, u, x, y,
-                               cfg, dsfDeltas, vcdInfo)
+    if view.tableNotNetwork:
+        xEx, yEx, fnUXY, varCol = view.tableData
 
         _exSibRow, exSib = \
             (np.empty((1, 0)),
@@ -220,62 +390,569 @@ def evaHtmlString(args, cfg, request): # {{{
 
         body = htmlTable(a, b, u, x, y,
                          cfg, dsfDeltas, vcdInfo,
-                         exSibRow, exSib, varCol, fnUXY)
+                         exSibRow, exSib, varCol, fnUXY,
+                         view.page, view.rowsPerPage)
 
     else:
-        edges = calculateEdges(a, b, u,
-                               cfg, dsfDeltas, vcdInfo)
-
-        body = svgNetgraph(u, cfg, vcdInfo, edges) \
+        body = svgNetgraph(u, cfg, vcdInfo, view.edges) \
             if bodyOnly else \
-            htmlNetgraph(a, b, u, cfg, vcdInfo, edges)
+            htmlNetgraph(a, b, u, cfg, vcdInfo, view.edges)
+
+    return htmlTopChunks(body, inlineHead, inlineHead, bodyOnly)
+# }}} def evaHtmlChunks
+
+def evaHtmlChunksLazy(args, cfg, request): # {{{
+    '''Like evaHtmlChunks with lazy, for calculateResponse.
+    '''
+    return evaHtmlChunks(args, cfg, request, lazy=True)
+# }}} def evaHtmlChunksLazy
 
-    return htmlTopFmt(body, inlineHead, inlineHead, bodyOnly)
+def evaHtmlString(args, cfg, request): # {{{
+    '''Return a string of HTML.
+    '''
+    chunks = evaHtmlChunks(args, cfg, request)
+
+    with stageTimer("html"):
+        return ''.join(chunks)
 # }}} def evaHtmlString
 
+def evaApiBytes(args, cfg, request): # {{{
+    '''Return bytes of the data behind an HTML view, for the data API.
+
+    Requests are resolved to views exactly as for HTML, then encoded in the
+    format given by request["fmt"], see eva_api.
+    '''
+    fmt = request.get("fmt") or "json"
+    assert fmt in apiFormats, fmt
+
+    if fmt not in apiFormats:
+        raise EvaHTMLException
+
+    view = evaViewData(args, cfg, request)
+
+    meta, arrays = \
+        apiTable(view.a, view.b, view.u, view.x, view.y,
+                 cfg, view.dsfDeltas, view.vcdInfo, view.tableData,
+                 view.page, view.rowsPerPage) \
+        if view.tableNotNetwork else \
+        apiEdges(view.a, view.b, view.u,
+                 cfg, view.dsfDeltas, view.vcdInfo, view.edges)
+
+    with stageTimer("html"):
+        return apiEncode(fmt, meta, arrays)
+# }}} def evaApiBytes
+
+def gzipBytes(b): # {{{
+    '''Return b compressed in gzip format, as for Content-Encoding: gzip.
+    '''
+    # Fast compression level since responses are generated for each request.
+    c = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress(b) + c.flush()
+# }}} def gzipBytes
+
 def htmlNetgraph(a, b, u, cfg, vcdInfo, edges): # {{{
+    '''Generate strings of HTML for a network graph.
+    '''
     winStride = cfg.windowsize - cfg.windowoverlap
 
-    ret_ = []
-    ret_.append('<div class="title">')
-    ret_.append(  '<span>')
-    ret_.append(     evaTitleText(a, b, u, None, None))
-    ret_.append(  '</span>')
-    ret_.append('</div>')
-    ret_.append('<div class="controls">')
-    ret_.append(  '<span>')
-    ret_.append(     evaLink(a, b, u - winStride, None, None, "prev"))
-    ret_.append(     evaLink(a, b, u + winStride, None, None, "next"))
-    ret_.append(  '</span>')
-    ret_.append('</div>')
-    ret_.append('<div class="netgraph">')
-    ret_ += svgNetgraph(u, cfg, vcdInfo, edges)
-    ret_.append('</div>')
-    return ret_
+    yield '<div class="title">'
+    yield   '<span>'
+    yield      evaTitleText(a, b, u, None, None)
+    yield   '</span>'
+    yield '</div>'
+    yield '<div class="controls">'
+    yield   '<span>'
+    yield      evaLink(a, b, u - winStride, None, None, "prev")
+    yield      evaLink(a, b, u + winStride, None, None, "next")
+    yield   '</span>'
+    yield '</div>'
+    yield '<div class="netgraph">'
+    for s in svgNetgraph(u, cfg, vcdInfo, edges):
+        yield s
+    yield '</div>'
 # }}} def htmlNetgraph
 
-class EvaHTTPServer(HTTPServer): # {{{
+def evaWorkerInit(fnameEvc): # {{{
+    '''Initialize a worker process to calculate responses.
+
+    Workers are stopped by the server on KeyboardInterrupt, so only the server
+    should handle SIGINT.
+    '''
+    global resultCache, resultCacheLock
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if not getattr(paths, "_INITIALIZED", False):
+        initPaths(fnameEvc)
+
+    # Forked while other threads may hold the lock.
+    resultCache, resultCacheLock = None, threading.Lock()
+
+    return
+# }}} def evaWorkerInit
+
+def evaWorker(fn, args, cfg, request): # {{{
+    '''Generate the messages of fn(args, cfg, request), run in a worker
+       process, and the RequestStats collected while running it.
+
+    fn is evaHtmlChunks or evaApiBytes, returning either an iterable of
+    strings or bytes.
+    Strings are collected into chunks as they're generated, in the same way
+    as sendChunks, so the server can send each chunk on before the remainder
+    is generated.
+      ("invalid", None)         Request raised EvaHTMLException.
+      ("ok", None)              Request is valid, chunks follow.
+      ("chunk", <str|bytes>)
+      ("done", <RequestStats>)
+    '''
+    assert paths._INITIALIZED
+
+    with collectStats(RequestStats()) as stats:
+        try:
+            ret = fn(args, cfg, request)
+        except EvaHTMLException:
+            yield ("invalid", None)
+            return
+
+        yield ("ok", None)
+
+        if isinstance(ret, bytes):
+            yield ("chunk", ret)
+        else:
+            buf_, nBuf, tmFlush = [], 0, time.time()
+            for s in timedIter("html", ret):
+                buf_.append(s)
+                nBuf += len(s)
+
+                if nBuf < httpdChunkBytes and \
+                   (time.time() - tmFlush) < httpdPollPeriod:
+                    continue
+
+                yield ("chunk", ''.join(buf_))
+                buf_, nBuf, tmFlush = [], 0, time.time()
+
+            yield ("chunk", ''.join(buf_))
+
+    yield ("done", stats)
+# }}} def evaWorker
+
+def evaWorkerLoop(conn, fnameEvc): # {{{
+    '''Main loop of a worker process, calculating one response at a time
+       from requests received on conn, and sending back the messages of
+       evaWorker.
+
+    Other exceptions are sent back as ("error", <traceback>), so the worker
+    continues with the next request.
+    '''
+    evaWorkerInit(fnameEvc)
+
+    while True:
+        try:
+            fn, args, cfg, request = conn.recv()
+        except EOFError:
+            break # Pipe closed by server.
+
+        try:
+            for msg in evaWorker(fn, args, cfg, request):
+                conn.send(msg)
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+    return
+# }}} def evaWorkerLoop
+
+class EvaWorkerPool(object): # {{{
+    '''Worker processes which each calculate one response at a time,
+       streaming it back through a pipe as it's generated.
+
+    Each worker is a tuple of (<Process>, <Connection>).
+    A worker whose response is abandoned part way through is terminated
+    rather than returned to the pool, since it would otherwise continue
+    calculating a response which nobody reads, and a new worker is started in
+    its place by the next acquire().
+    '''
+
+    def __init__(self, nWorkers, fnameEvc): # {{{
+        assert isinstance(nWorkers, int), type(nWorkers)
+        assert 0 < nWorkers, nWorkers
+
+        self.nWorkers = nWorkers
+        self.fnameEvc = fnameEvc
+
+        self.cond = threading.Condition()
+        self.workers_ = set()
+
+        # Started before any handler threads.
+        self.idle_ = [self.start() for _ in range(nWorkers)]
+    # }}} def __init__
+
+    def start(self): # {{{
+        conn, childConn = multiprocessing.Pipe()
+        p = multiprocessing.Process(target=evaWorkerLoop,
+                                    args=(childConn, self.fnameEvc))
+        p.daemon = True
+        p.start()
+        childConn.close()
+
+        worker = (p, conn)
+        self.workers_.add(worker)
+
+        return worker
+    # }}} def start
+
+    def acquire(self, timeout): # {{{
+        '''Return an idle worker, or None if none is available within
+           timeout seconds.
+        '''
+        with self.cond:
+            if 0 == len(self.idle_) and len(self.workers_) >= self.nWorkers:
+                self.cond.wait(timeout)
+
+            if 0 < len(self.idle_):
+                ret = self.idle_.pop()
+            elif len(self.workers_) < self.nWorkers:
+                ret = self.start() # Replace a terminated worker.
+            else:
+                ret = None
+
+        return ret
+    # }}} def acquire
+
+    def release(self, worker): # {{{
+        '''Return a worker which has finished its response to the pool.
+        '''
+        with self.cond:
+            self.idle_.append(worker)
+            self.cond.notify()
+    # }}} def release
+
+    def discard(self, worker): # {{{
+        '''Terminate a worker whose response has been abandoned.
+        '''
+        p, conn = worker
+        p.terminate()
+        p.join()
+        conn.close()
+
+        with self.cond:
+            self.workers_.discard(worker)
+            self.cond.notify()
+    # }}} def discard
+
+    def shutdown(self): # {{{
+        with self.cond:
+            workers, self.workers_, self.idle_ = self.workers_, set(), []
+
+        for p,conn in workers:
+            p.terminate()
+            conn.close()
+        for p,_ in workers:
+            p.join()
+    # }}} def shutdown
+
+# }}} class EvaWorkerPool
+
+class EvaHTTPServer(ThreadingMixIn, HTTPServer): # {{{
+    '''Handle each request in a separate thread so that slow calculations
+       don't block other users, or requests for CSS and JS.
+
+    Calculations are dispatched to a pool of worker processes which all read
+    the same binary database in paths.dname_mea.
+    With only one job, calculations are performed in the handler threads.
+    '''
+
+    daemon_threads = True
+
+    # Initialized by serve_forever()
+    pool, poolArgs, stats = None, None, None
+
     def serve_forever(self, args, cfg):
         self.RequestHandlerClass.args = args
         self.RequestHandlerClass.cfg = cfg
-        HTTPServer.serve_forever(self)
+
+        # Statistics of every calculated response, reported by /stats
+        self.stats = StatsTotals()
+
+        nWorkers = nWorkersFromJobs(args.n_jobs)
+
+        if 1 < nWorkers:
+            verb("Starting %d worker processes..." % nWorkers)
+
+            # Reference back to calling module cannot be pickled.
+            # Workers already share the load so each calculates serially.
+            self.poolArgs = Bunch({k: v for k,v in vars(args).items() \
+                                   if not k.startswith("__")})
+            self.poolArgs.n_jobs = 1
+
+            self.pool = EvaWorkerPool(nWorkers, paths.fname_evc)
+
+        try:
+            HTTPServer.serve_forever(self)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
 # }}} class EvaHTTPServer
 
 class EvaHTTPRequestHandler(BaseHTTPRequestHandler): # {{{
 
+    # Required for chunked transfer encoding, so every response must have
+    # either Content-Length or chunked body.
+    protocol_version = "HTTP/1.1"
+
     # These are initialized by EvaHTTPServer.serve_forever()
     args, cfg = None, None
 
-    def parseGetRequest(self, path): # {{{
+    # Worker calculating the current response, if any.
+    worker_ = None
+
+    def parseGetRequest(self, path,
+                        keys=('a', 'b', 'u', 'x', 'y',
+                              'page', 'rowsPerPage')): # {{{
         '''Parse and sanitize GET path.
         '''
         parsed = parse_qs(path.strip("/?")) # Parse query string.
         ret = {k: (parsed[k][0] if k in parsed.keys() else None) \
-               for k in ('a', 'b', 'u', 'x', 'y')}
+               for k in keys}
         return ret
     # }}} def parseGetRequest
 
+    def clientDisconnected(self): # {{{
+        '''Peek at the socket, without blocking, to detect a closed
+           connection.
+        '''
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            ret = (0 < len(readable)) and \
+                  (0 == len(self.connection.recv(1, socket.MSG_PEEK)))
+        except (socket.error, ValueError):
+            ret = True
+
+        return ret
+    # }}} def clientDisconnected
+
+    def checkAbandoned(self, tmStart): # {{{
+        '''Raise EvaHTTPTimeout if the calculation started at tmStart has
+           taken longer than args.httpd_timeout seconds, or EvaHTTPCancelled
+           if the client has disconnected.
+        '''
+        timeout = self.args.httpd_timeout
+        if 0 < timeout and timeout < (time.time() - tmStart):
+            raise EvaHTTPTimeout
+
+        if self.clientDisconnected():
+            raise EvaHTTPCancelled
+    # }}} def checkAbandoned
+
+    def pollAbandoned(self, tmStart): # {{{
+        '''Return a function for abandonCheck() which calls checkAbandoned at
+           most once every httpdPollPeriod seconds.
+
+        Without a pool of workers, calculations in this thread poll it so
+        that timeout and disconnection are handled as with workers.
+        '''
+        tmPolled_ = [tmStart]
+
+        def poll(): # {{{
+            tmNow = time.time()
+            if httpdPollPeriod < (tmNow - tmPolled_[0]):
+                tmPolled_[0] = tmNow
+                self.checkAbandoned(tmStart)
+            return
+        # }}} def poll
+
+        return poll
+    # }}} def pollAbandoned
+
+    def workerRecv(self, worker, tmStart): # {{{
+        '''Return the next message from a worker, checking for timeout or
+           client disconnection while waiting.
+        '''
+        _, conn = worker
+        while not conn.poll(httpdPollPeriod):
+            self.checkAbandoned(tmStart)
+
+        try:
+            tag, value = conn.recv()
+        except EOFError:
+            raise EvaHTTPWorkerError("Worker exited.")
+
+        if "error" == tag:
+            raise EvaHTTPWorkerError(value)
+
+        return tag, value
+    # }}} def workerRecv
+
+    def workerChunks(self, worker, tmStart): # {{{
+        '''Generate chunks of a response as they're received from a worker,
+           then return the worker to the pool.
+
+        Statistics collected by the worker are merged into those of this
+        request.
+        If the response is abandoned, by timeout, disconnection, or error,
+        the worker is left in self.worker_ to be terminated by do_GET.
+        '''
+        while True:
+            tag, value = self.workerRecv(worker, tmStart)
+            if "chunk" == tag:
+                yield value
+            else:
+                assert "done" == tag, tag
+                break
+
+        if requestStats() is not None:
+            requestStats().merge(value)
+
+        self.worker_ = None
+        self.server.pool.release(worker)
+    # }}} def workerChunks
+
+    def calculateResponse(self, request, fn=evaHtmlChunksLazy): # {{{
+        '''Return an iterable of the chunks of fn(args, cfg, request),
+           calculated by a worker if available.
+
+        fn returns either an iterable of strings or bytes.
+        The request is resolved before returning, so invalid requests raise
+        EvaHTMLException before anything is sent.
+        With a worker, chunks are streamed back as they're generated.
+        Raise EvaHTTPTimeout if the calculation takes longer than
+        args.httpd_timeout seconds, or EvaHTTPCancelled if the client
+        disconnects first, either while waiting for a worker or while
+        generating.
+        Without a worker, the same is raised from the calculation in this
+        thread by pollAbandon(), timed from the start of the request.
+        '''
+        pool = self.server.pool
+        if pool is None:
+            ret = fn(self.args, self.cfg, request)
+            return [ret] if isinstance(ret, bytes) else ret
+
+        tmStart = time.time()
+
+        worker = None
+        while worker is None:
+            worker = pool.acquire(httpdPollPeriod)
+            if worker is None:
+                self.checkAbandoned(tmStart)
+        self.worker_ = worker
+
+        worker[1].send((fn, self.server.poolArgs, self.cfg, request))
+        tag, _ = self.workerRecv(worker, tmStart)
+
+        if "invalid" == tag:
+            self.worker_ = None
+            pool.release(worker)
+            raise EvaHTMLException
+        assert "ok" == tag, tag
+
+        return self.workerChunks(worker, tmStart)
+    # }}} def calculateResponse
+
+    def sendChunks(self, chunks, useGzip=False): # {{{
+        '''End headers and send an iterable of strings as the body.
+
+        For HTTP/1.1 clients the body is sent with chunked transfer encoding,
+        each chunk compressed as it's sent with useGzip, so the client can
+        begin rendering before the remainder is generated.
+        Strings are collected into chunks of httpdChunkBytes, or less when
+        generating takes longer than httpdPollPeriod.
+        Where statistics are collected, Server-Timing is sent as a header
+        with the stages completed before the body, and again as a trailer of
+        chunked bodies with all stages.
+        Raise EvaHTTPCancelled if the client disconnects.
+        '''
+        stats = requestStats()
+
+        z = zlib.compressobj(1, zlib.DEFLATED, 16 + zlib.MAX_WBITS) \
+            if useGzip else None
+
+        if useGzip:
+            self.send_header("Content-Encoding", "gzip")
+
+        if "HTTP/1.1" != self.request_version:
+            with stageTimer("html"):
+                responseBytes = ''.join(chunks).encode("utf-8")
+
+            if useGzip:
+                with stageTimer("send"):
+                    responseBytes = z.compress(responseBytes) + z.flush()
+
+            if stats is not None:
+                self.send_header("Server-Timing", stats.serverTiming())
+            self.send_header("Content-Length", "%d" % len(responseBytes))
+            self.end_headers()
+
+            with stageTimer("send"):
+                self.wfile.write(responseBytes)
+            return
+
+        if stats is not None:
+            self.send_header("Server-Timing", stats.serverTiming())
+            self.send_header("Trailer", "Server-Timing")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def wrChunk(b, final=False): # {{{
+            with stageTimer("send"):
+                if z is not None:
+                    b = z.compress(b) + \
+                        (z.flush() if final else z.flush(zlib.Z_SYNC_FLUSH))
+
+                if 0 < len(b):
+                    self.wfile.write(("%X\r\n" % len(b)).encode("ascii"))
+                    self.wfile.write(b)
+                    self.wfile.write(b"\r\n")
+                self.wfile.flush()
+        # }}} def wrChunk
+
+        # First chunk is sent immediately for a short time to first byte.
+        buf_, nBuf, tmFlush = [], 0, 0.0
+        try:
+            with stageTimer("html"):
+                for s in chunks:
+                    b = s.encode("utf-8")
+                    buf_.append(b)
+                    nBuf += len(b)
+
+                    if nBuf < httpdChunkBytes and \
+                       (time.time() - tmFlush) < httpdPollPeriod:
+                        continue
+
+                    b, buf_, nBuf = b''.join(buf_), [], 0
+                    wrChunk(b)
+                    tmFlush = time.time()
+
+            wrChunk(b''.join(buf_), final=True)
+
+            # Zero length chunk ends the body, followed by any trailer.
+            trailer = "" if stats is None else \
+                "Server-Timing: %s\r\n" % stats.serverTiming()
+            self.wfile.write(b"0\r\n" + trailer.encode("ascii") + b"\r\n")
+            self.wfile.flush()
+
+        except socket.error:
+            raise EvaHTTPCancelled
+
+        return
+    # }}} def sendChunks
+
     def do_GET(self): # {{{
+        '''Respond to GET, collecting statistics for Server-Timing and
+           /stats
+        '''
+        tmStart = time.time()
+        with collectStats(RequestStats()), \
+             abandonCheck(self.pollAbandoned(tmStart)):
+            try:
+                self.respondGET()
+            finally:
+                # Response was abandoned before the worker finished.
+                if self.worker_ is not None:
+                    self.server.pool.discard(self.worker_)
+                    self.worker_ = None
+    # }}} def do_GET
+
+    def respondGET(self): # {{{
 
         # Remove leading / which is usually (always?) present.
         self.path = self.path.lstrip('/')
@@ -317,15 +994,95 @@ class EvaHTTPRequestHandler(BaseHTTPRequestHandler): # {{{
                 self.send_header("Content-Type", "image/x-icon")
             except:
                 self.send_error(404, "Cannot read favicon!")
+                return
+
+        elif self.path == "stats":
+            # Statistics of every calculated response since starting.
+            responseBytes = json.dumps(self.server.stats.asDict(),
+                                       sort_keys=True).encode("utf-8")
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "no-store")
+
+        elif self.path == "api" or self.path.startswith("api?"):
+            # Data API, with the same query as HTML plus fmt.
+            try:
+                request = self.parseGetRequest(self.path[len("api"):],
+                                               ('a', 'b', 'u', 'x', 'y',
+                                                'page', 'rowsPerPage', 'fmt'))
+
+                fmt = request["fmt"] or "json"
+                if fmt not in apiFormats:
+                    raise EvaHTMLException
+
+                useGzip = "gzip" in self.headers.get("Accept-Encoding", "")
+                etag = apiEtag(resultFingerprint(self.cfg), request,
+                               "gzip" if useGzip else None)
+
+                # Responses are unchanged until cfg or the database changes,
+                # so clients can revalidate without any calculation.
+                if etagMatches(etag, self.headers.get("If-None-Match")):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                verb("Calculating API {a,b}(x|y;u) <-- {%s,%s}(%s|%s;%s)..." % (
+                    request['a'],
+                    request['b'],
+                    request['x'],
+                    request['y'],
+                    request['u'],
+                ), end='')
+                responseBytes = \
+                    b''.join(self.calculateResponse(request, evaApiBytes))
+                verb("DONE")
+
+                self.send_response(200)
+                self.send_header("Content-Type", apiFormats[fmt])
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Vary", "Accept-Encoding")
+
+                if useGzip:
+                    with stageTimer("send"):
+                        responseBytes = gzipBytes(responseBytes)
+                    self.send_header("Content-Encoding", "gzip")
+
+                self.send_header("Server-Timing",
+                                 requestStats().serverTiming())
+                self.send_header("Content-Length", "%d" % len(responseBytes))
+                self.end_headers()
+
+                with stageTimer("send"):
+                    self.wfile.write(responseBytes)
+
+                self.server.stats.add(self.path, requestStats())
+                return
+
+            except EvaHTMLException:
+                self.send_error(404, "Invalid API GET request!")
+                return
+
+            except EvaHTTPTimeout:
+                verb("TIMEOUT")
+                self.send_error(503, "Calculation timed out!")
+                return
+
+            except EvaHTTPCancelled:
+                verb("CANCELLED")
+                self.close_connection = True
+                return
 
         elif len(self.path) and not self.path.startswith("?"):
             # Unknown requests.
-            self.send_response(404)
+            self.send_error(404, "Unknown GET request!")
             return
 
         else:
 
-            # Generate HTML string and send OK if inputs are valid.
+            # Generate HTML and send OK if inputs are valid.
             try:
 
                 request = self.parseGetRequest(self.path)
@@ -337,18 +1094,41 @@ class EvaHTTPRequestHandler(BaseHTTPRequestHandler): # {{{
                     request['y'],
                     request['u'],
                 ), end='')
-                response = evaHtmlString(self.args, self.cfg, request)
-                verb("DONE")
+
+                # HTML is sent while it's generated, including edges of
+                # network graphs while they're calculated, either here or in
+                # a worker.
+                chunks = self.calculateResponse(request)
 
                 self.send_response(200)
                 self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Vary", "Accept-Encoding")
+
+                try:
+                    self.sendChunks(chunks,
+                        "gzip" in self.headers.get("Accept-Encoding", ""))
+                except EvaHTTPTimeout:
+                    # Response has begun, so can only end the connection.
+                    raise EvaHTTPCancelled
+                verb("DONE")
 
-                responseBytes = response.encode("utf-8")
+                self.server.stats.add(self.path, requestStats())
+                return
 
             except EvaHTMLException:
                 self.send_error(404, "Invalid GET request!")
                 return
 
+            except EvaHTTPTimeout:
+                verb("TIMEOUT")
+                self.send_error(503, "Calculation timed out!")
+                return
+
+            except EvaHTTPCancelled:
+                verb("CANCELLED")
+                self.close_connection = True
+                return
+
         # Send HTTP headers.
         # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers
         self.send_header("Content-Length", "%d" % len(responseBytes))
@@ -358,7 +1138,7 @@ class EvaHTTPRequestHandler(BaseHTTPRequestHandler): # {{{
         self.wfile.write(responseBytes)
 
         return
-    # }}} def do_GET
+    # }}} def respondGET
 
     def log_message(self, *fnArgs): # {{{
         if self.args.info:
@@ -396,6 +1176,9 @@ def evaHttpd(args): # {{{
     try:
         cfg = loadCfg()
 
+        # Levels may be missing if config.toml has been edited since evaInit.
+        meaPyramid(cfg)
+
         if 0 != args.httpd_port:
             runHttpDaemon(args, cfg)
         else:
@@ -403,7 +1186,9 @@ def evaHttpd(args): # {{{
                        'b': args.b,
                        'u': args.u,
                        'x': args.x,
-                       'y': args.y}
+                       'y': args.y,
+                       'page': args.page,
+                       'rowsPerPage': args.rows_per_page}
             print(evaHtmlString(args, cfg, request))
     except IOError as e:
         msg = "IOError: %s: %s\n" % (e.strerror, e.filename)
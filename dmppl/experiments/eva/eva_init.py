@@ -2,28 +2,36 @@
 # -*- coding: utf8 -*-
 
 # Standard library imports
-from itertools import groupby, product
+from heapq import heapify, heappop, heappush
+from itertools import count, product
 import os
 import re
+import shutil
 import struct
 import sys
 
 # PyPI library imports
+import numpy as np
 import toml
 
 # Local library imports
-from dmppl.base import dbg, info, verb, appendNonDuplicate, Bunch, \
+from dmppl.base import dbg, info, verb, Bunch, \
     indexDefault, mkDirP, joinP
 from dmppl.math import dotp, clipNorm, saveNpy
 from dmppl.toml import loadToml, saveToml
-from dmppl.vcd import VcdReader, VcdWriter, oneBitTypes, detypeVarName
+from dmppl.vcd import VcdReader, VcdWriter, oneBitTypes, intToVarId, \
+    mergeTimechunks
 from dmppl.scripts.vcd_utils import vcdClean
 from dmppl.identicon import identiconSpriteSvg
 
 # Project imports
 # NOTE: Roundabout import path for eva_common necessary for unittest.
 from dmppl.experiments.eva.eva_common import \
-    appPaths, paths, isUnitIntervalMeasure, measureNameParts, meaDbFromVcd
+    appPaths, paths, loadCfg, loadEvcx, isUnitIntervalMeasure, \
+    measureNameParts, MeaDbWriter, meaPyramid, saveVcdInfo, loadVcdInfo, \
+    loadTimechunkTimes
+from dmppl.experiments.eva.eva_precompute import evaPrecompute
+from dmppl.experiments.eva.eva_shard import evaShard
 
 if sys.version_info[0] == 3:
     unicode = str # Compatability with Python2
@@ -101,6 +109,24 @@ The event specifier "%s" uses signal "%s" \
 which cannot be found in the VCD.
 ''' % (name, signal)
 
+class EVCError_VcdOrder(EVCError):
+    '''Timechunks of VCD are out of order.
+    '''
+    def __init__(self, time, prevTime):
+        self.msg = '''
+The timechunk at time %d follows one at time %d.
+Rerun with --clean to reorder the VCD first.
+''' % (time, prevTime)
+
+class EVCError_Append(EVCError):
+    '''Cannot append to existing results.
+    '''
+    def __init__(self, reason):
+        self.msg = '''
+%s
+Rerun without --append to extract the complete VCD.
+''' % reason
+
 # }}} EVCError
 
 def loadEvc(infoFlag): # {{{
@@ -487,14 +513,70 @@ def checkEvcxWithVcd(evcx, vcd, infoFlag): # {{{
 
 # }}} def checkEvcxWithVcd
 
-def meaVcd(instream, evcx, cfg, infoFlag): # {{{
-    '''Filter input data to sanitized VCD (signals.vcd).
+def firHoldGap(history, fir, nGap, lo, hi): # {{{
+    '''Smooth and clipNorm a gap of nGap samples which hold history[0].
+
+    history is the previous FIR inputs, most recent first, as used by
+    interpolateNormal.
+    Return two lists (smoothValues, clipnormValues) of nGap Python floats.
+
+    Taps are accumulated in the same order as dotp so results are identical
+    to smoothing each sample separately.
+    '''
+    nTaps = len(fir)
+    assert len(history) == nTaps-1, (len(history), nTaps)
+    assert 0 < nGap, nGap
+
+    # Oldest first, then held value repeated to cover the gap.
+    xs = np.concatenate((np.asarray(history[::-1], dtype=np.float64),
+                         np.full(nGap, history[0], dtype=np.float64)))
+
+    smoothValues = np.zeros(nGap, dtype=np.float64)
+    for i,f in enumerate(fir):
+        smoothValues += xs[nTaps-1-i:nTaps-1-i+nGap] * f
+
+    _lo = float(min(lo, hi)) # Allow lo > hi
+    _hi = float(max(lo, hi)) # Allow hi < lo
+    clipnormValues = (np.clip(smoothValues, _lo, _hi) - _lo) / (_hi - _lo)
+
+    return smoothValues.tolist(), clipnormValues.tolist()
+# }}} def firHoldGap
+
+def orderedTimechunks(timechunks): # {{{
+    '''Generate timechunks, raising EVCError_VcdOrder where time decreases.
+
+    Without vcdClean, input is only read once so the order is checked while
+    streaming, before mergeTimechunks.
+    '''
+    prevTime_ = None
+    for tc in timechunks:
+        newTime = tc[0]
+        if prevTime_ is not None and newTime < prevTime_:
+            raise EVCError_VcdOrder(newTime, prevTime_)
+        prevTime_ = newTime
+
+        yield tc
+# }}} def orderedTimechunks
+
+def meaVcd(instream, evcx, cfg, infoFlag, wrVcd=False, append=False): # {{{
+    '''Filter input data to sanitized binary database (signals/*), and
+       optionally VCD (signals.vcd).
 
     Extract measurements of interest, at times of interest.
     Perform interpolation for normal measurements.
     Time becomes a straightforward sample index.
     Hierarchy shows raw measures and refl/rise/fall.
 
+    Input is only read once, so cleaning, extraction, and writing the binary
+    database are all performed in a single pass.
+    Return a dict of metadata, as previously read back from signals.vcd.
+
+    The state at the end of input is saved so that with append, the input
+    continues an existing database from the last timestamp, giving the same
+    result as extracting the concatenated input.
+    Input timechunks up to the last timestamp are ignored, and timechunkTimes
+    are only the new times which replace existing times from appendIdx.
+
     NOTE: This initial extraction to filter/clean the dataset is probably the
     most complex part of eva!
     '''
@@ -565,18 +647,29 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
 
         prevIpolTime, prevIpolValues_ = mapVarIdToHistory_[iVarId]
 
-        for t in range(prevIpolTime+1, oTime):
-            assert t < oTime, (t, oTime)
-
-            zs = [prevIpolValues_[0]] + prevIpolValues_
-            prevIpolValues_ = zs[:-1]
-
-            assert len(zs) == len(cfg.fir), zs
-            smoothValue = dotp(zs, cfg.fir)
-            clipnormValue = clipNorm(smoothValue, geq, leq)
-
-            bq_.append((t, "normal.smooth." + nm, smoothValue))
-            bq_.append((t, "normal.orig." + nm, clipnormValue))
+        # Gap between last sample and this timechunk is filled by holding the
+        # most recent sample, so all smoothed values in the gap are calculated
+        # at once.
+        # Once the FIR history is entirely the held value, smoothed values
+        # are constant so only the first len(fir) are changes in the
+        # database, but signals.vcd has every sample.
+        nGap = oTime - (prevIpolTime+1)
+        if 0 < nGap:
+            nChanges = nGap if wrVcd else min(nGap, len(cfg.fir))
+            smoothValues, clipnormValues = \
+                firHoldGap(prevIpolValues_, cfg.fir, nChanges, geq, leq)
+
+            nmSmooth, nmOrig = "normal.smooth." + nm, "normal.orig." + nm
+            for t,smoothValue,clipnormValue in \
+                zip(range(prevIpolTime+1, oTime), smoothValues, clipnormValues):
+                bqChanges = bq_.setdefault(t, {})
+                bqChanges[nmSmooth] = smoothValue
+                bqChanges[nmOrig] = clipnormValue
+
+            # History is now mostly, or entirely, the held value.
+            nHold = min(nGap, len(prevIpolValues_))
+            prevIpolValues_ = [prevIpolValues_[0]] * nHold + \
+                              prevIpolValues_[:len(prevIpolValues_)-nHold]
 
         zs = [prevIpolValues_[0] if newValue is None else newValue] + prevIpolValues_
         mapVarIdToHistory_[iVarId] = (oTime, zs[:-1])
@@ -585,16 +678,78 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
         smoothValue = dotp(zs, cfg.fir)
         clipnormValue = clipNorm(smoothValue, geq, leq)
 
-        nq_.append(("normal.smooth." + nm, smoothValue))
-        nq_.append(("normal.orig." + nm, clipnormValue))
+        nq_["normal.smooth." + nm] = smoothValue
+        nq_["normal.orig." + nm] = clipnormValue
 
     # }}} def interpolateNormal
 
+    varlist = vcdoVarlist(evcx)
+    varNames = [nm for nm,_,_ in varlist]
+
+    # Order matches reading back from signals.vcd, where vars are sorted by
+    # varId.
+    unitIntervalVarNames = \
+        [nm for _,nm in sorted((intToVarId(i), nm) \
+                               for i,nm in enumerate(varNames)) \
+         if isUnitIntervalMeasure(nm)]
+
+    if append:
+        # signals.vcd is only written in a single pass.
+        assert not wrVcd
+
+        # Continue from the saved state, discarding the final flush of
+        # speculative changes which assumed nothing would follow.
+        state = loadToml(paths.fname_meastate)
+        if state is None:
+            raise EVCError_Append("No saved state in %s." % \
+                                  paths.fname_meastate)
+        prevInfo = loadVcdInfo()
+        assert unitIntervalVarNames == prevInfo["unitIntervalVarNames"]
+
+        resumeTime = state["lastTime"]
+        appendTime = resumeTime + 1
+        prevTimes = loadTimechunkTimes()
+
+        # Only the final flush is after the saved state, otherwise the state
+        # is from an older extraction and continuing would lose changes.
+        # Checked before MeaDbWriter truncates anything.
+        if 0 < len(prevTimes) and appendTime < prevTimes[-1]:
+            raise EVCError_Append(
+                "Database ends at time %d, after saved state at time %d." % \
+                (prevTimes[-1], resumeTime))
+        appendIdx = int(np.searchsorted(prevTimes, appendTime))
+        del prevTimes
+    else:
+        state, resumeTime, appendTime, appendIdx = None, -1, None, None
+    timechunkTimes_ = []
+
     # NOTE: VCD input may come from STDIN ==> only read once.
-    with VcdReader(instream) as vcdi, VcdWriter(paths.fname_mea) as vcdo:
+    with VcdReader(instream) as vcdi, \
+         VcdWriter(paths.fname_mea if wrVcd else os.devnull) as vcdo, \
+         MeaDbWriter(varNames, appendTime=appendTime) as meaDb:
         evcxx = checkEvcxWithVcd(evcx, vcdi, infoFlag)
 
-        verb("Extracting measurements to VCD ... ", end='')
+        # VarIds may differ between input files, so state is saved by
+        # hook name without vector select.
+        mapVarIdToHook = {v["hookVarId"]: re.sub(r'\[.*$', '', v["hook"]) \
+                          for nm,v in evcxx.items()}
+        mapHookToVarId = {hk: varId for varId,hk in mapVarIdToHook.items()}
+
+        def wrTimechunk(tc): # {{{
+            '''Write to binary database, and intermediate VCD on request.
+            '''
+            newTime, changedVars, newValues = tc
+
+            if 0 == len(changedVars):
+                return
+
+            timechunkTimes_.append(newTime)
+            meaDb.wrTimechunk(tc)
+            if wrVcd:
+                vcdo.wrTimechunk(tc)
+        # }}} def wrTimechunk
+
+        verb("Extracting measurements ... ", end='')
 
         evcxVarIds = tuple(sorted(list(set(v["hookVarId"] \
                                            for nm,v in evcxx.items()))))
@@ -622,7 +777,16 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
              for varId in evcxVarIds \
              if "normal" in [mea["type"] for mea in mapVarIdToMeasures[varId]]}
 
-        vcdo.wrHeader(vcdoVarlist(evcx),
+        if state is not None:
+            for p in state["prev"]:
+                mapVarIdToPrev_[mapHookToVarId[p["hook"]]] = \
+                    (p["time"], p["value"])
+
+            for h in state["history"]:
+                mapVarIdToHistory_[mapHookToVarId[h["hook"]]] = \
+                    (h["time"], h["values"])
+
+        vcdo.wrHeader(varlist,
                       comment=' '.join((vcdi.vcdComment,
                                         "<<< Extracted by evaInit >>>")),
                       date=vcdi.vcdDate,
@@ -633,15 +797,29 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
         # interleaved with timechunks from vcdi.
         # E.g. event->bit conversion inferring 1 then 0 in consecutive times.
         # Or rise/fall on bstate.
-        # [ (time, name, value) ... ]
+        # Priority queue keyed by time, then by a sequence number so that the
+        # last pushed change to each name wins.
+        # [ (time, seqNum, name, value) ... ]
         # Initialise all measurements to 0, except reflections to 1.
-        fq_ = [(0, nm, int(re.match(r"^[^\.]*\.refl\.", nm) is not None)) \
-               for nm in vcdo.varNames]
+        # Saved changes are in order so new sequence numbers keep priority.
+        fqSeqNums = count()
+        if state is None:
+            fq_ = [(0, next(fqSeqNums), nm,
+                    int(re.match(r"^[^\.]*\.refl\.", nm) is not None)) \
+                   for nm in varNames]
+        else:
+            fq_ = [(q["time"], next(fqSeqNums), q["name"], q["value"]) \
+                   for q in state["fq"]]
+        heapify(fq_)
+
+        def fqPush(t, nm, v): # {{{
+            heappush(fq_, (t, next(fqSeqNums), nm, v))
+        # }}} def fqPush
 
-        lastTime_ = 0
+        lastTime_ = 0 if state is None else state["lastTime"]
 
         # Work through vcdi timechunks putting values into vcdo.
-        for iTc in vcdi.timechunks:
+        for iTc in mergeTimechunks(orderedTimechunks(vcdi.timechunks)):
             iTime, iChangedVarIds, iNewValues = iTc
 
             if iTime < cfg.timestart:
@@ -659,18 +837,29 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
             assert isinstance(oTime, int), type(oTime)
             assert 0 <= oTime, (oTime, iTime, cfg.timestart, cfg.timestep)
 
-            # Current (now) queue of changes which may contain duplicate
-            # varnames with different values.
-            # Only the last appended will be used.
+            # Already in the database being appended to.
+            if oTime <= resumeTime:
+                continue
+
+            # Current (now) queue of changes where the last write to each
+            # name wins.
             # No time field is necessary, all use current timechunk (oTime).
-            # [ (name, value) ... ]
-            nq_ = [(nm, v) for t,nm,v in fq_ if t == oTime]
+            # { name: value, ... }
+            nq_ = {}
 
-            # Extract proper changes from fq_ and put into current queue.
-            # Changes are proper if they are for time before this timechunk.
+            # Backward (past) queue of proper changes, which are for times
+            # before this timechunk.
+            # { time: { name: value, ... }, ... }
+            bq_ = {}
+
+            # Pop changes from fq_ for this timechunk or before.
             # fq_ may still contain future speculative changes.
-            bq_ = [(t,nm,v) for t,nm,v in fq_ if t < oTime]
-            fq_ = [(t,nm,v) for t,nm,v in fq_ if t > oTime]
+            while 0 < len(fq_) and fq_[0][0] <= oTime:
+                t, _, nm, v = heappop(fq_)
+                if t < oTime:
+                    bq_.setdefault(t, {})[nm] = v
+                else:
+                    nq_[nm] = v
 
 
             for iVarId,iNewValue in zip(iChangedVarIds, iNewValues): # {{{
@@ -694,13 +883,13 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
                     if "event" == tp: # {{{
                         if "event" == hookType:
                             # vcdi implies event only occurring at this time.
-                            nq_.append(("event.orig." + nm, 1))
+                            nq_["event.orig." + nm] = 1
 
                             # Speculatively reset to 0 in next time.
-                            fq_.append((oTime+1, "event.orig." + nm, 0))
+                            fqPush(oTime+1, "event.orig." + nm, 0)
                         elif hookType in oneBitTypes:
                             newValue = int(twoStateBool(newValueClean, hookBit))
-                            nq_.append(("event.orig." + nm, newValue))
+                            nq_["event.orig." + nm] = newValue
                         else:
                             # Event measure only made from VCD event, or
                             # 2-state (bit), 4-state types (wire, reg, logic)
@@ -712,15 +901,15 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
                             newValue = twoStateBool(newValueClean, hookBit)
 
                             if prevValue != newValue:
-                                nq_.append(("bstate.orig." + nm, int(newValue)))
-                                nq_.append(("bstate.refl." + nm, int(not newValue)))
+                                nq_["bstate.orig." + nm] = int(newValue)
+                                nq_["bstate.refl." + nm] = int(not newValue)
 
                                 if newValue:
-                                    nq_.append(("bstate.rise." + nm, 1))
-                                    fq_.append((oTime+1, "bstate.rise." + nm, 0))
+                                    nq_["bstate.rise." + nm] = 1
+                                    fqPush(oTime+1, "bstate.rise." + nm, 0)
                                 else:
-                                    nq_.append(("bstate.fall." + nm, 1))
-                                    fq_.append((oTime+1, "bstate.fall." + nm, 0))
+                                    nq_["bstate.fall." + nm] = 1
+                                    fqPush(oTime+1, "bstate.fall." + nm, 0)
                             else:
                                 pass # No change
                         else:
@@ -758,15 +947,15 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
                                      geq <= newValueFloat)
 
                             if prevValue != newValue:
-                                nq_.append(("threshold.orig." + nm, int(newValue)))
-                                nq_.append(("threshold.refl." + nm, int(not newValue)))
+                                nq_["threshold.orig." + nm] = int(newValue)
+                                nq_["threshold.refl." + nm] = int(not newValue)
 
                                 if newValue:
-                                    nq_.append(("threshold.rise." + nm, 1))
-                                    fq_.append((oTime+1, "threshold.rise." + nm, 0))
+                                    nq_["threshold.rise." + nm] = 1
+                                    fqPush(oTime+1, "threshold.rise." + nm, 0)
                                 else:
-                                    nq_.append(("threshold.fall." + nm, 1))
-                                    fq_.append((oTime+1, "threshold.fall." + nm, 0))
+                                    nq_["threshold.fall." + nm] = 1
+                                    fqPush(oTime+1, "threshold.fall." + nm, 0)
                             else:
                                 pass # No change
 
@@ -787,7 +976,7 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
 
                             # NOTE: normal.raw values are not necessarily
                             # in [0, 1]; rather than (-inf, +inf).
-                            nq_.append(("normal.raw." + nm, newValue))
+                            nq_["normal.raw." + nm] = newValue
 
                             interpolateNormal(iVarId, oTime, mea,
                                               mapVarIdToHistory_, nq_, bq_,
@@ -827,102 +1016,146 @@ def meaVcd(instream, evcx, cfg, infoFlag): # {{{
 
 
 
-            # Resolve conflicts from fq_/bq_.
-            # Forward queue is speculative so a proper value from the current
-            # timechunk will take precedence.
-            # I.e. Always use the last appended change.
-            bq_.sort()
-            for fqTime, fqGroup in groupby(bq_, key=(lambda x: x[0])):
-                fqChangedVars, fqNewValues = \
-                    list(zip(*[(nm,v) for _,nm,v in fqGroup]))
-                assert fqTime < oTime, (fqTime, oTime)
-                vcdo.wrTimechunk((fqTime, fqChangedVars, fqNewValues))
+            # Flush out backward queue in time order.
+            # Conflicts are already resolved, since forward queue is
+            # speculative so a proper value from the current timechunk will
+            # take precedence.
+            # I.e. Always use the last written change.
+            for bqTime in sorted(bq_.keys()):
+                assert bqTime < oTime, (bqTime, oTime)
+                bqChanges = bq_[bqTime]
+                wrTimechunk((bqTime,
+                             list(bqChanges.keys()),
+                             list(bqChanges.values())))
 
             # Flush out current (now) queue.
-            if 0 < len(nq_):
-                dedupVars = []
-                for nm,v in nq_:
-                    dedupVars = appendNonDuplicate(dedupVars, (nm,v), replace=True)
-                nqChangedVars, nqNewValues = zip(*dedupVars)
-                vcdo.wrTimechunk((oTime, nqChangedVars, nqNewValues))
+            wrTimechunk((oTime, list(nq_.keys()), list(nq_.values())))
 
             lastTime_ = oTime
 
+        # Save state to continue from, before flushing everything.
+        saveToml({
+            "lastTime": lastTime_,
+            "prev": [{"hook": mapVarIdToHook[varId], "time": t, "value": v} \
+                     for varId,(t,v) in sorted(mapVarIdToPrev_.items())],
+            "history": [{"hook": mapVarIdToHook[varId], "time": t,
+                         "values": vs} \
+                        for varId,(t,vs) in sorted(mapVarIdToHistory_.items())],
+            "fq": [{"time": t, "name": nm, "value": v} \
+                   for t,_,nm,v in sorted(fq_)],
+        }, paths.fname_meastate)
+
         # Events from oneBitTypes cannot be interpolated until after last
         # timechunk.
-        fq_ += [(lastTime_+1, nm, 0) \
-                for nm in vcdo.varNames \
-                if re.match(r"^event.orig\.", nm) is not None]
+        for nm in varNames:
+            if re.match(r"^event.orig\.", nm) is not None:
+                fqPush(lastTime_+1, nm, 0)
 
         # Flush out forward queue after input VCD has been fully processed.
         # Time is set to only one greater than last time in input VCD,
         # regardless of what the time in each fq_ item says.
-        if 0 < len(fq_):
-            dedupVars = []
-            for _,nm,v in fq_:
-                dedupVars = appendNonDuplicate(dedupVars, (nm,v), replace=True)
-            nqChangedVars, nqNewValues = zip(*dedupVars)
-            vcdo.wrTimechunk((lastTime_+1, nqChangedVars, nqNewValues))
+        lq_ = {}
+        while 0 < len(fq_):
+            _, _, nm, v = heappop(fq_)
+            lq_[nm] = v
+        wrTimechunk((lastTime_+1, list(lq_.keys()), list(lq_.values())))
 
         verb("Done") # with
 
-    return
-# }}} def meaVcd
-
-def evaVcdInfo(fname): # {{{
-    '''Read in a VCD and return a dict of metadata.
-    '''
-    ret = {}
-    with VcdReader(fname) as vcdi:
-        #ret["varIds"]   = vcdi.varIds
-        #ret["varNames"] = vcdi.varNames
-        #ret["varSizes"] = vcdi.varSizes
-        #ret["varTypes"] = vcdi.varTypes
-        #ret["comment"] = vcdi.vcdComment
-        #ret["date"]    = vcdi.vcdDate
-        #ret["version"] = vcdi.vcdVersion
-        #ret["timescale"] = ' '.join(vcdi.vcdTimescale)
-
-        varNames = [detypeVarName(nm) for nm in vcdi.varNames]
-        ret["unitIntervalVarNames"] = \
-            [nm for nm in varNames if isUnitIntervalMeasure(nm)]
-
-        ret["timechunkTimes"] = []
-        for tc in vcdi.timechunks:
-            newTime, changedVarIds, newValues = tc
-            ret["timechunkTimes"].append(newTime)
-
+    ret = {
+        "unitIntervalVarNames": unitIntervalVarNames,
+        "timechunkTimes": timechunkTimes_,
+    }
+    if appendIdx is not None:
+        ret["appendIdx"] = appendIdx
     return ret
-# }}} def evaVcdInfo
+# }}} def meaVcd
 
 def createIdenticons(vcdInfo): # {{{
-    '''Produce an identicon for each signal in VCD.
+    '''Produce an identicon for each sibling group of signals in VCD.
+
+    Identicons are kept in foo.eva/identicon/ by content address, so any
+    which already exist from a previous init are not generated again.
     '''
     verb("Creating identicons... ", end='')
 
     mkDirP(paths.dname_identicon)
 
     measureNames = vcdInfo["unitIntervalVarNames"]
+    baseNames = set(measureNameParts(nm)[2] for nm in measureNames)
 
-    for nm in measureNames:
-        measureType, siblingType, baseName = measureNameParts(nm)
-
-        svgStr = identiconSpriteSvg(baseName, fill="darkgray")
-
-        fname = joinP(paths.dname_identicon, baseName + ".svg")
-        with open(fname, 'w') as fd:
-            fd.write(svgStr)
+    for bn in sorted(baseNames):
+        _ = identiconSpriteSvg(bn, fill="darkgray",
+                               cacheDir=paths.dname_identicon)
 
     verb("Done")
 
     return
 # }}} def createIdenticons
 
+def precomputeFromArgs(cfg, args): # {{{
+    '''Precompute results with --precompute, or sharded with --shard.
+    '''
+    if getattr(args, "shard", False):
+        evaShard(cfg, args.n_jobs)
+    elif args.precompute:
+        evaPrecompute(cfg, args.n_jobs)
+
+    return
+# }}} def precomputeFromArgs
+
+def evaInitAppend(args): # {{{
+    '''Read in a VCD which continues the input of an existing result
+       directory, and append to its database.
+
+    EVC and config are taken from the existing result directory.
+    '''
+    assert paths._INITIALIZED
+
+    if args.vcd:
+        raise EVCError_Append("Option --vcd cannot be used with --append, "
+                              "since signals.vcd is only written in a "
+                              "single pass.")
+
+    if loadToml(paths.fname_meastate) is None:
+        raise EVCError_Append("No saved state in %s." % paths.fname_meastate)
+
+    cfg = loadCfg()
+    evcx = loadEvcx()
+
+    if args.clean:
+        verb("Cleaning input VCD... ", end='')
+        vcdClean(args.append, paths.fname_cln)
+        verb("Done")
+        fnameVcdi = paths.fname_cln
+    else:
+        fnameVcdi = args.append
+
+    shutil.rmtree(paths.dname_pyramid, ignore_errors=True)
+    vcdInfo = meaVcd(fnameVcdi, evcx, cfg, args.info, append=True)
+    saveVcdInfo(vcdInfo)
+
+    meaPyramid(cfg)
+
+    precomputeFromArgs(cfg, args)
+
+    return 0
+# }}} def evaInitAppend
+
 def evaInit(args): # {{{
     '''Read in EVC and VCD to create result directory like ./foo.eva/
     '''
     assert paths._INITIALIZED
 
+    if args.resume:
+        # Database already exists, only continue precomputing.
+        args.precompute = True
+        precomputeFromArgs(loadCfg(), args)
+        return 0
+
+    if args.append is not None:
+        return evaInitAppend(args)
+
     evc = loadEvc(args.info)
     checkEvc(evc)
 
@@ -932,23 +1165,30 @@ def evaInit(args): # {{{
 
     evcx = expandEvc(evc, cfg, args.info)
 
-    # Fully read in and copy then clean input data.
-    verb("Cleaning input VCD... ", end='')
-    vcdClean(args.input, paths.fname_cln)
-    verb("Done")
+    if args.clean:
+        # Fully read in and copy then clean input data.
+        # Only required when input timechunks are out of order.
+        verb("Cleaning input VCD... ", end='')
+        vcdClean(args.input, paths.fname_cln)
+        verb("Done")
+        fnameVcdi = paths.fname_cln
+    else:
+        fnameVcdi = args.input
 
-    # VCD-to-VCD: extract, interpolate, clean
-    meaVcd(paths.fname_cln, evcx, cfg, args.info)
-    #vcdClean(paths.fname_mea) # Reduce size of varIds
-    vcdInfo = evaVcdInfo(paths.fname_mea)
-    saveToml(vcdInfo, paths.fname_meainfo)
+    # VCD-to-binaries: clean, extract, interpolate
+    # Any existing pyramid is derived from the previous binaries.
+    shutil.rmtree(paths.dname_pyramid, ignore_errors=True)
+    vcdInfo = meaVcd(fnameVcdi, evcx, cfg, args.info, wrVcd=args.vcd)
+    saveVcdInfo(vcdInfo)
 
-    # VCD-to-binaries
-    meaDbFromVcd()
+    # Subsampled binaries for network graphs.
+    meaPyramid(cfg)
 
     # Identicons
     createIdenticons(vcdInfo)
 
+    precomputeFromArgs(cfg, args)
+
     return 0
 # }}} def evaInit
 
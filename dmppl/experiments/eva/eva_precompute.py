@@ -0,0 +1,515 @@
+# -*- coding: utf8 -*-
+
+# Standard library imports
+import functools
+import os
+import shutil
+
+# PyPI library imports
+from joblib import Parallel, delayed
+import numpy as np
+import toml
+
+# Local library imports
+from dmppl.base import dbg, info, verb, joinP, mkDirP
+from dmppl.toml import saveToml
+
+# Project imports
+# NOTE: Roundabout import path for eva_common necessary for unittest.
+from dmppl.experiments.eva.eva_common import \
+    paths, initPaths, measureNameParts, measureSiblings, nSibsMax, \
+    metricNames, metric, allMetrics, allMetricsMatrix, metricToFloat, \
+    cfgDsfDeltas, winStartTimes, rdEvs, timeToEvsIdx, meaPyramid, \
+    loadVcdInfo, evsItemsize, maxmemBlocks
+from dmppl.experiments.eva.eva_cache import resultFingerprint
+from dmppl.experiments.eva.eva_sparse import SparseEvs, clMetric
+
+# Precomputed cube of results, one window per file, as float32.
+#   cube/<u>.npy    [table/edges, metric, column, x, y]
+#   cube/<u>.ex.npy [row, x]
+#       Row 0 is Ex at full resolution, as used by tables.
+#       Rows 1..nCols are Ex of X, as used by network graph edges.
+#       Rows nCols+1..2*nCols are Ex of Y, as used by network graph edges.
+# Files are written atomically with .ex.npy first, so a window is complete
+# when <u>.npy exists.
+# Results in columns where u+delta is negative are NaN for edges.
+
+def sortedDsfDeltas(cfg): # {{{
+    '''Columns of the cube, sorted by delta value as displayed by httpd.
+    '''
+    dsfDeltas = cfgDsfDeltas(cfg) # [(<downsample factor>, <delta>), ...]
+    dsfDeltas.sort(key=lambda dsf_d: dsf_d[1])
+
+    return dsfDeltas
+# }}} def sortedDsfDeltas
+
+def cubeManifest(cfg, vcdInfo): # {{{
+    '''Return a dict describing the cube which must match exactly for
+       precomputed results to be used.
+    '''
+    ret = {
+        "fingerprint": resultFingerprint(cfg),
+        "metricNames": list(metricNames),
+        "measureNames": list(vcdInfo["unitIntervalVarNames"]),
+        "dsfDeltas": [list(dsf_d) for dsf_d in sortedDsfDeltas(cfg)],
+    }
+    return ret
+# }}} def cubeManifest
+
+def cubeFnames(u): # {{{
+    return joinP(paths.dname_cube, "%d.npy" % u), \
+           joinP(paths.dname_cube, "%d.ex.npy" % u)
+# }}} def cubeFnames
+
+def saveNpyAtomic(arr, fname): # {{{
+    '''Write then rename so an interrupted run never leaves a partial file.
+    '''
+    tmpFname = fname + ".tmp"
+    with open(tmpFname, 'wb') as fd:
+        np.save(fd, arr)
+    os.rename(tmpFname, fname)
+# }}} def saveNpyAtomic
+
+def openNpyAtomic(fname, shape): # {{{
+    '''Return a writable memory-mapped float32 array, filled with NaN, to be
+       renamed into place by closeNpyAtomic.
+
+    Cubes are written through memory maps so that a whole window is never
+    held in memory.
+    '''
+    ret = np.lib.format.open_memmap(fname + ".tmp", mode="w+",
+                                    dtype=np.float32, shape=shape)
+    ret[:] = np.nan
+    return ret
+# }}} def openNpyAtomic
+
+def closeNpyAtomic(arr, fname): # {{{
+    arr.flush()
+    del arr
+    os.rename(fname + ".tmp", fname)
+# }}} def closeNpyAtomic
+
+def precomputeBlocks(cfg, measureNames, idxs): # {{{
+    '''Return blocks of positions in idxs, within cfg.maxmem bytes as
+       estimated by calculateEdges.
+    '''
+    evsLen = cfg.windowsize + cfg.deltabk + cfg.deltafw + 1
+    ret = maxmemBlocks(list(range(len(idxs))),
+                       [4 * evsLen * evsItemsize(measureNames[i], cfg.fxbits) \
+                        for i in idxs],
+                       cfg.maxmem)
+    return ret
+# }}} def precomputeBlocks
+
+def precomputeWindow(u, cfg, dsfDeltas, vcdInfo,
+                     xIdxs=None, yIdxs=None, cube=None): # {{{
+    '''Calculate every metric, for every pair of measures, and every
+       (dsf, delta), for the window starting at u.
+
+    Return (cube, ex) as described at the top of this file.
+    Table results are calculated as in calculateTableData, and edge results
+    as in calculateEdges, reading subsampled measures from the pyramid.
+    Under a memory budget of cfg.maxmem bytes, measures are read in blocks
+    of X and Y as in calculateEdges.
+
+    xIdxs, yIdxs optionally select measures of X and Y by index, giving only
+    the slice cube[..., xIdxs, yIdxs], and filling only the columns of ex
+    for X in rows 0..nCols and for Y in the other rows.
+    cube is optionally an array to fill, e.g. from openNpyAtomic, otherwise
+    it's allocated.
+    '''
+    measureNames = vcdInfo["unitIntervalVarNames"]
+    m = len(measureNames)
+    nCols = len(dsfDeltas)
+    nMetrics = len(metricNames)
+
+    xIdxs = list(range(m)) if xIdxs is None else list(xIdxs)
+    yIdxs = list(range(m)) if yIdxs is None else list(yIdxs)
+
+    shape = (2, nMetrics, nCols, len(xIdxs), len(yIdxs))
+    if cube is None:
+        cube = np.full(shape, np.nan, dtype=np.float32)
+    assert cube.shape == shape, (cube.shape, shape)
+    ex = np.full((1 + 2*nCols, m), np.nan, dtype=np.float32)
+
+    for xPoss in precomputeBlocks(cfg, measureNames, xIdxs):
+        for yPoss in precomputeBlocks(cfg, measureNames, yIdxs):
+            precomputeTile(cube, ex, u, cfg, dsfDeltas, measureNames,
+                           xIdxs, yIdxs, xPoss, yPoss)
+
+    return cube, ex
+# }}} def precomputeWindow
+
+def precomputeTile(cube, ex, u, cfg, dsfDeltas, measureNames,
+                   xIdxs, yIdxs, xPoss, yPoss): # {{{
+    '''Fill cube[..., xPoss, yPoss] and the corresponding columns of ex,
+       for measures at positions xPoss in xIdxs and yPoss in yIdxs.
+
+    Every pair of the tile is evaluated together for each column with
+    allMetricsMatrix, or pair by pair with fixed point.
+    '''
+    nCols = len(dsfDeltas)
+
+    xIdxs = [xIdxs[p] for p in xPoss]
+    yIdxs = [yIdxs[p] for p in yPoss]
+    xNames = [measureNames[i] for i in xIdxs]
+    yNames = [measureNames[j] for j in yIdxs]
+    names = [measureNames[i] for i in sorted(set(xIdxs) | set(yIdxs))]
+
+    # Results are stored as floats, whichever implementation is used.
+    toFloat = functools.partial(metricToFloat, nBits=cfg.fxbits)
+
+    def tileMetrics(winSize): # {{{
+        '''Return a function filling every metric of one table/edges and
+           column of the tile from lists of windows of X and Y.
+        '''
+        if 0 != cfg.fxbits:
+            fnAll = allMetrics(winSize, cfg.windowalpha, nBits=cfg.fxbits,
+                               trusted=True)
+        else:
+            fnAll = allMetricsMatrix(winSize, cfg.windowalpha, trusted=True)
+
+        def fill(tbl, colNum, xs, ys): # {{{
+            if 0 != cfg.fxbits:
+                for p,x in zip(xPoss, xs):
+                    for q,y in zip(yPoss, ys):
+                        mets = fnAll(x, y)
+                        cube[tbl, :, colNum, p, q] = \
+                            [toFloat(mets[nm]) for nm in metricNames]
+            else:
+                mets = fnAll(np.stack(xs), np.stack(ys))
+                for fnNum,nm in enumerate(metricNames):
+                    cube[tbl, fnNum, colNum][np.ix_(xPoss, yPoss)] = mets[nm]
+            return
+        # }}} def fill
+
+        return fill
+    # }}} def tileMetrics
+
+    v = u + cfg.windowsize
+    evsStartTime = u - cfg.deltabk
+    evsFinishTime = v + cfg.deltafw + 1
+    sparseEvs = SparseEvs(names, evsStartTime, evsFinishTime, cfg.fxbits)
+
+    # Tables, at full resolution.
+    # Fixed point is always dense so change list implementations are float.
+    fnEx = metric("Ex", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits,
+                  trusted=True)
+    clFnEx = clMetric("Ex", cfg.windowsize, cfg.windowalpha)
+
+    startIdxX = timeToEvsIdx(u, evsStartTime)
+    for i,nm in zip(xIdxs, xNames):
+        sparse, x = sparseEvs.single(nm, startIdxX, cfg.windowsize)
+        ex[0][i] = clFnEx(x) if sparse else toFloat(fnEx(x))
+
+    # Every measure of this tile is read at full resolution, for tables and
+    # network graphs.
+    evs = {nm: sparseEvs.dense(nm) for nm in names}
+
+    fillMetrics = tileMetrics(cfg.windowsize)
+    xs = [evs[nm][startIdxX:startIdxX+cfg.windowsize] for nm in xNames]
+    for colNum,(dsf,delta) in enumerate(dsfDeltas):
+        startIdxY = startIdxX + delta
+        ys = [evs[nm][startIdxY:startIdxY+cfg.windowsize] for nm in yNames]
+        fillMetrics(0, colNum, xs, ys)
+
+    # Network graph edges, sub-sampled.
+    sfPrev_ = -1 # init
+    for colNum,(sf,d) in enumerate(dsfDeltas):
+        dU, dV = u+d, v+d
+
+        # Ignore negative deltas where relationship can't exist yet.
+        if 0 > dU:
+            continue
+
+        sfWinSize = cfg.windowsize // sf
+        sfD = d // sf
+
+        if sf != sfPrev_:
+            sfPrev_ = sf
+
+            if 1 == sf:
+                sfEvsStartTime, sfEvs = evsStartTime, evs
+            else:
+                sfEvsStartTime = evsStartTime // sf - 1
+                sfEvs = rdEvs(names, sfEvsStartTime,
+                              evsFinishTime // sf + 2, cfg.fxbits, dsf=sf)
+
+            sfU = timeToEvsIdx(u // sf, sfEvsStartTime)
+            sfV = sfU + sfWinSize
+
+            fnEx = metric("Ex", sfWinSize, cfg.windowalpha, nBits=cfg.fxbits,
+                          trusted=True)
+            fillMetrics = tileMetrics(sfWinSize)
+
+            xs = [sfEvs[nm][sfU:sfV] for nm in xNames]
+            x_Exs = [toFloat(fnEx(x)) for x in xs]
+
+        ys = [sfEvs[nm][sfU+sfD:sfV+sfD] for nm in yNames]
+        y_Exs = [toFloat(fnEx(y)) for y in ys]
+
+        ex[1 + colNum][xIdxs] = x_Exs
+        ex[1 + nCols + colNum][yIdxs] = y_Exs
+
+        fillMetrics(1, colNum, xs, ys)
+
+    return
+# }}} def precomputeTile
+
+def precomputeWindowFiles(fnameEvc, u, cfg, dsfDeltas, vcdInfo): # {{{
+    '''Calculate and save one window, run in a worker process.
+    '''
+    if not getattr(paths, "_INITIALIZED", False):
+        initPaths(fnameEvc)
+
+    m = len(vcdInfo["unitIntervalVarNames"])
+    fnameCube, fnameEx = cubeFnames(u)
+
+    cube = openNpyAtomic(fnameCube,
+                         (2, len(metricNames), len(dsfDeltas), m, m))
+    _, ex = precomputeWindow(u, cfg, dsfDeltas, vcdInfo, cube=cube)
+
+    saveNpyAtomic(ex, fnameEx)
+    closeNpyAtomic(cube, fnameCube)
+
+    return u
+# }}} def precomputeWindowFiles
+
+def cubePrepare(cfg): # {{{
+    '''Prepare cube/ for precomputing, discarding any stale results.
+
+    Return (vcdInfo, winUs, todo) where todo is the start times of windows
+    which aren't yet complete.
+    '''
+    assert paths._INITIALIZED
+
+    meaPyramid(cfg)
+
+    vcdInfo = loadVcdInfo()
+    manifest = cubeManifest(cfg, vcdInfo)
+
+    # Results of a different database or cfg are discarded.
+    if os.path.isfile(paths.fname_cubeinfo) and \
+       manifest != toml.load(paths.fname_cubeinfo):
+        verb("Removing stale precomputed results...")
+        shutil.rmtree(paths.dname_cube, ignore_errors=True)
+        os.remove(paths.fname_cubeinfo)
+
+    mkDirP(paths.dname_cube)
+    saveToml(manifest, paths.fname_cubeinfo)
+
+    firstTime = vcdInfo["firstTime"]
+    lastTime = vcdInfo["lastTime"]
+    winUs = winStartTimes(firstTime, lastTime,
+                          cfg.windowsize, cfg.windowoverlap)
+
+    todo = [u for u in winUs if not os.path.isfile(cubeFnames(u)[0])]
+
+    return vcdInfo, winUs, todo
+# }}} def cubePrepare
+
+def evaPrecompute(cfg, nJobs): # {{{
+    '''Precompute results for every window, resuming from any previously
+       completed windows.
+    '''
+    vcdInfo, winUs, todo = cubePrepare(cfg)
+    verb("Precomputing %d of %d windows... " % (len(todo), len(winUs)),
+         end='')
+
+    dsfDeltas = sortedDsfDeltas(cfg)
+    _ = Parallel(n_jobs=nJobs) \
+        (delayed(precomputeWindowFiles)(paths.fname_evc, u,
+                                        cfg, dsfDeltas, vcdInfo) \
+         for u in todo)
+
+    verb("Done")
+
+    return
+# }}} def evaPrecompute
+
+def cubeValid(cfg, dsfDeltas, vcdInfo): # {{{
+    '''Return True if the precomputed cube matches cfg and the database, so
+       any complete windows may be used.
+
+    Checked once per request, rather than for each window.
+    '''
+    if not os.path.isfile(paths.fname_cubeinfo):
+        return False
+
+    manifest = toml.load(paths.fname_cubeinfo)
+    ret = manifest == cubeManifest(cfg, vcdInfo) and \
+          manifest["dsfDeltas"] == [list(dsf_d) for dsf_d in dsfDeltas]
+
+    return ret
+# }}} def cubeValid
+
+def cubeWindow(u): # {{{
+    '''Return memory-mapped (cube, ex) for the window starting at u, or None
+       if it hasn't been precomputed.
+
+    The cube must already be checked with cubeValid.
+    '''
+    fnameCube, fnameEx = cubeFnames(u)
+    if not os.path.isfile(fnameCube):
+        return None
+
+    ret = (np.load(fnameCube, mmap_mode='r'),
+           np.load(fnameEx, mmap_mode='r'))
+
+    return ret
+# }}} def cubeWindow
+
+def loadCube(u, cfg, dsfDeltas, vcdInfo): # {{{
+    '''Return memory-mapped (cube, ex) for the window starting at u, or None
+       if it hasn't been precomputed.
+    '''
+    if not cubeValid(cfg, dsfDeltas, vcdInfo):
+        return None
+
+    return cubeWindow(u)
+# }}} def loadCube
+
+def cubeTableData(a, b, u, x, y, cfg, dsfDeltas, vcdInfo,
+                  page=0, rowsPerPage=0): # {{{
+    '''Return the same as calculateTableData, from slices of the precomputed
+       cube, or None if not available.
+    '''
+    measureNames = vcdInfo["unitIntervalVarNames"]
+
+    if any(s is not None and s not in measureNames for s in (x, y)):
+        return None
+
+    firstTime = vcdInfo["firstTime"]
+    lastTime = vcdInfo["lastTime"]
+
+    winUs = winStartTimes(firstTime, lastTime,
+                          cfg.windowsize, cfg.windowoverlap,
+                          page, rowsPerPage) \
+                if u is None else None
+
+    if not cubeValid(cfg, dsfDeltas, vcdInfo):
+        return None
+
+    cubes = [cubeWindow(w) for w in (winUs if u is None else [u])]
+    if any(c is None for c in cubes):
+        return None
+
+    fnIdxs = [metricNames.index(fn) for fn in ((a, b) if b else (a,))]
+    nFns = len(fnIdxs)
+
+    nRows = len(winUs) if u is None else len(measureNames)
+    nCols = len(dsfDeltas)
+
+    # All result arrays have the same dtype.
+    dtype = np.float32
+
+    fnUXY = np.empty((nFns, nRows, nCols), dtype=dtype)
+    if u is None:
+        # Table varying u over rows.
+        i, j = measureNames.index(x), measureNames.index(y)
+        for rowNum,(cube, _) in enumerate(cubes):
+            fnUXY[:, rowNum, :] = cube[0][fnIdxs, :, i, j]
+    elif x:
+        # Table varying y over rows.
+        i = measureNames.index(x)
+        fnUXY[:] = np.transpose(cubes[0][0][0][fnIdxs, :, i, :], (0, 2, 1))
+    else:
+        # Table varying x over rows.
+        j = measureNames.index(y)
+        fnUXY[:] = np.transpose(cubes[0][0][0][fnIdxs, :, :, j], (0, 2, 1))
+
+    def sibEx(s): # {{{
+        '''Allocate then fill a sibling expectation array, as in
+           calculateTableData.
+        '''
+        siblings = measureSiblings(s) if s else None
+
+        nRowsEx = 1 if s and not (x and y) else nRows
+        nColsEx = len(siblings) if s else nSibsMax
+
+        arr = np.full((nRowsEx, nColsEx), np.nan, dtype=dtype)
+
+        for rowNum in range(nRowsEx):
+            _, ex = cubes[rowNum if u is None else 0]
+
+            keys = siblings if s else measureSiblings(measureNames[rowNum])
+            for colNum,key in enumerate(keys):
+                arr[rowNum][colNum] = ex[0][measureNames.index(key)]
+
+        return arr
+    # }}} def sibEx
+
+    try:
+        xEx = sibEx(x)
+        yEx = sibEx(y)
+    except ValueError:
+        return None # Sibling not in measureNames.
+
+    varCol = winUs if u is None else measureNames
+
+    return xEx, yEx, fnUXY, varCol
+# }}} def cubeTableData
+
+def cubeEdges(a, b, u, cfg, dsfDeltas, vcdInfo): # {{{
+    '''Return a list of the same edges as calculateEdges, from slices of the
+       precomputed cube, or None if not available.
+    '''
+    c = loadCube(u, cfg, dsfDeltas, vcdInfo)
+    if c is None:
+        return None
+
+    cube, ex = c
+    edgesCube = cube[1]
+
+    measureNames = vcdInfo["unitIntervalVarNames"]
+    nCols = len(dsfDeltas)
+
+    baseNames = np.array([measureNameParts(nm)[2] for nm in measureNames])
+    differentBase = (baseNames[:, np.newaxis] != baseNames[np.newaxis, :])
+
+    metricIdxs = {nm: i for i,nm in enumerate(metricNames)}
+    otherMetricNames = set(metricNames) - {a, b}
+
+    epsilonA, epsilonB = \
+        cfg.epsilon[a], \
+        cfg.epsilon[b] if b else None
+
+    ret_ = []
+    for colNum,(sf,d) in enumerate(dsfDeltas):
+
+        # Ignore negative deltas where relationship can't exist yet.
+        if 0 > u+d:
+            continue
+
+        metAs = edgesCube[metricIdxs[a]][colNum]
+        isSignificant = np.logical_and(differentBase, epsilonA < metAs)
+        if b is not None:
+            metBs = edgesCube[metricIdxs[b]][colNum]
+            isSignificant = np.logical_and(isSignificant, epsilonB < metBs)
+
+        # Row-major order matches nested loops over X then Y.
+        # Values are float32 in the cube, but float in edges.
+        for i,j in zip(*np.nonzero(isSignificant)):
+            edge = {nm: float(edgesCube[metricIdxs[nm]][colNum][i][j]) \
+                    for nm in otherMetricNames}
+            edge.update({
+                a: float(metAs[i][j]),
+                'a': a,
+                'b': b,
+                "dstName": measureNames[i],
+                "srcName": measureNames[j],
+                "srcDelta": d,
+                "sampleFactor": sf,
+                "dstEx": float(ex[1 + colNum][i]),
+                "srcEx": float(ex[1 + nCols + colNum][j]),
+            })
+            if b is not None:
+              edge[b] = float(metBs[i][j])
+
+            ret_.append(edge)
+
+    return ret_
+# }}} def cubeEdges
+
+if __name__ == "__main__":
+    assert False, "Not a standalone script."
@@ -0,0 +1,342 @@
+# -*- coding: utf8 -*-
+
+# Standard library imports
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+
+# PyPI library imports
+import numpy as np
+import toml
+
+# Local library imports
+from dmppl.base import dbg, info, verb, joinP, mkDirP
+from dmppl.toml import saveToml
+
+# Project imports
+# NOTE: Roundabout import path for eva_common necessary for unittest.
+from dmppl.experiments.eva.eva_common import \
+    paths, initPaths, loadCfg, loadVcdInfo, metricNames, nWorkersFromJobs, \
+    evsItemsize, maxmemBlocks
+from dmppl.experiments.eva.eva_precompute import \
+    sortedDsfDeltas, cubeManifest, cubePrepare, cubeFnames, saveNpyAtomic, \
+    openNpyAtomic, closeNpyAtomic, precomputeWindow
+
+# Sharded precompute, where the work of evaPrecompute is split into shards of
+# (window, X-block, Y-block) which are calculated by any number of workers.
+# Workers may be local processes, or processes on other hosts which share
+# the foo.eva directory, e.g. over NFS.
+#   shard/manifest.toml                   Copy of cube.info.toml
+#   shard/todo/<u>.<xBlock>.<yBlock>.toml  Queued shard {u, xIdxs, yIdxs}
+#   shard/claim/<u>.<xBlock>.<yBlock>.toml Shard claimed by a worker.
+#   shard/part/<u>.<xBlock>.<yBlock>.npy   cube[..., xIdxs, yIdxs], float32
+#   shard/part/<u>.<xBlock>.<yBlock>.ex.npy
+#       Ex with only columns of xIdxs, or yIdxs for rows of Ex of Y, filled.
+# A worker claims a shard by renaming it from todo/ to claim/, which is
+# atomic so each shard is calculated by only one worker.
+# Parts are written atomically before the claim is removed.
+# The coordinator merges the parts of each complete window into cube/, as
+# written by evaPrecompute, then removes them.
+
+# Seconds before a claimed shard without a part is assumed to belong to a
+# dead worker, and queued again.
+shardClaimTimeout = 3600.0
+
+# Seconds between the coordinator checking for complete windows.
+shardPollInterval = 0.2
+
+class ShardWorkerError(Exception): # {{{
+    '''A local worker process started by evaShard failed.
+    '''
+    pass
+# }}} class ShardWorkerError
+
+def shardName(u, xBlockIdx, yBlockIdx): # {{{
+    return "%d.%d.%d" % (u, xBlockIdx, yBlockIdx)
+# }}} def shardName
+
+def shardFnames(name): # {{{
+    '''Return a dict of the paths of a shard in each state.
+    '''
+    ret = {
+        "todo": joinP(paths.dname_shard, "todo", name + ".toml"),
+        "claim": joinP(paths.dname_shard, "claim", name + ".toml"),
+        "part": joinP(paths.dname_shard, "part", name + ".npy"),
+        "partEx": joinP(paths.dname_shard, "part", name + ".ex.npy"),
+    }
+    return ret
+# }}} def shardFnames
+
+def shardBlocks(cfg, measureNames): # {{{
+    '''Return blocks of measure indices for X and Y, within cfg.maxmem bytes
+       as estimated by calculateEdges.
+    '''
+    evsLen = cfg.windowsize + cfg.deltabk + cfg.deltafw + 1
+    ret = maxmemBlocks(range(len(measureNames)),
+                       [4 * evsLen * evsItemsize(nm, cfg.fxbits) \
+                        for nm in measureNames],
+                       cfg.maxmem)
+    return ret
+# }}} def shardBlocks
+
+def shardEnqueue(cfg): # {{{
+    '''Queue shards of every incomplete window which aren't already queued,
+       claimed, or calculated.
+
+    Return (vcdInfo, todo, blocks) where todo is the start times of windows
+    which aren't yet complete.
+    '''
+    vcdInfo, winUs, todo = cubePrepare(cfg)
+
+    # Shards of a different database or cfg are discarded.
+    manifest = cubeManifest(cfg, vcdInfo)
+    fnameManifest = joinP(paths.dname_shard, "manifest.toml")
+    if os.path.isfile(fnameManifest) and \
+       manifest != toml.load(fnameManifest):
+        verb("Removing stale shards...")
+        shutil.rmtree(paths.dname_shard, ignore_errors=True)
+
+    for d in ("todo", "claim", "part"):
+        mkDirP(joinP(paths.dname_shard, d))
+    saveToml(manifest, fnameManifest)
+
+    blocks = shardBlocks(cfg, vcdInfo["unitIntervalVarNames"])
+
+    for u in todo:
+        for xBlockIdx,xIdxs in enumerate(blocks):
+            for yBlockIdx,yIdxs in enumerate(blocks):
+                name = shardName(u, xBlockIdx, yBlockIdx)
+                fnames = shardFnames(name)
+                if any(os.path.isfile(fnames[k]) \
+                       for k in ("todo", "claim", "part")):
+                    continue
+
+                # Write then rename so workers never read partial shards.
+                tmpFname = joinP(paths.dname_shard, name + ".toml")
+                saveToml({"u": u, "xIdxs": xIdxs, "yIdxs": yIdxs}, tmpFname)
+                os.rename(tmpFname, fnames["todo"])
+
+    return vcdInfo, todo, blocks
+# }}} def shardEnqueue
+
+def shardClaim(): # {{{
+    '''Claim the queued shard of the earliest window.
+
+    Return (<name>, <shard>), or None if the queue is empty.
+    '''
+    dname = joinP(paths.dname_shard, "todo")
+    names = [fname[:-len(".toml")] for fname in os.listdir(dname) \
+             if fname.endswith(".toml")]
+
+    for name in sorted(names, key=lambda nm: [int(i) for i in nm.split('.')]):
+        fnames = shardFnames(name)
+
+        # Claims are timed from now, not when queued, so the time is written
+        # before the claim is visible to shardRequeue.
+        try:
+            os.utime(fnames["todo"], None)
+            os.rename(fnames["todo"], fnames["claim"])
+        except OSError:
+            continue # Claimed by another worker.
+
+        return name, toml.load(fnames["claim"])
+
+    return None
+# }}} def shardClaim
+
+def shardRequeue(timeout=shardClaimTimeout): # {{{
+    '''Queue claimed shards again where the claim is older than timeout
+       seconds, as the worker has presumably died.
+
+    Return the number of shards queued again.
+    '''
+    dname = joinP(paths.dname_shard, "claim")
+    now = time.time()
+
+    ret = 0
+    for fname in os.listdir(dname):
+        fnames = shardFnames(fname[:-len(".toml")])
+        try:
+            if now - os.path.getmtime(fnames["claim"]) < timeout:
+                continue
+
+            if os.path.isfile(fnames["part"]):
+                # Worker died between writing the part and removing claim.
+                os.remove(fnames["claim"])
+            else:
+                os.rename(fnames["claim"], fnames["todo"])
+                ret += 1
+        except OSError:
+            pass # Finished by the worker in the meantime.
+
+    return ret
+# }}} def shardRequeue
+
+def shardWorker(fnameEvc): # {{{
+    '''Calculate queued shards until the queue is empty, run in a worker
+       process on any host.
+
+    Return the number of shards calculated.
+    '''
+    if not getattr(paths, "_INITIALIZED", False):
+        initPaths(fnameEvc)
+
+    cfg = loadCfg()
+    vcdInfo = loadVcdInfo()
+    dsfDeltas = sortedDsfDeltas(cfg)
+
+    ret = 0
+    while True:
+        claimed = shardClaim()
+        if claimed is None:
+            break
+        name, shard = claimed
+
+        cube, ex = precomputeWindow(shard["u"], cfg, dsfDeltas, vcdInfo,
+                                    shard["xIdxs"], shard["yIdxs"])
+
+        fnames = shardFnames(name)
+        saveNpyAtomic(ex, fnames["partEx"])
+        saveNpyAtomic(cube, fnames["part"])
+        os.remove(fnames["claim"])
+
+        ret += 1
+
+    return ret
+# }}} def shardWorker
+
+def shardWorkerProcess(fnameEvc): # {{{
+    '''Entry point of local worker processes started by evaShard.
+    '''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _ = shardWorker(fnameEvc)
+# }}} def shardWorkerProcess
+
+def shardMerge(u, cfg, dsfDeltas, vcdInfo, blocks): # {{{
+    '''Merge the parts of a window into cube/ if every shard is calculated.
+
+    Return True if the window is complete.
+    '''
+    fnameCube, fnameEx = cubeFnames(u)
+    if os.path.isfile(fnameCube):
+        return True
+
+    names = [shardName(u, xBlockIdx, yBlockIdx) \
+             for xBlockIdx in range(len(blocks)) \
+             for yBlockIdx in range(len(blocks))]
+    partFnames = [shardFnames(name) for name in names]
+    if not all(os.path.isfile(fnames["part"]) for fnames in partFnames):
+        return False
+
+    m = len(vcdInfo["unitIntervalVarNames"])
+    nCols = len(dsfDeltas)
+    nMetrics = len(metricNames)
+
+    # The whole window is written through a memory map, so only one part is
+    # held in memory at a time.
+    cube = openNpyAtomic(fnameCube, (2, nMetrics, nCols, m, m))
+    ex = np.full((1 + 2*nCols, m), np.nan, dtype=np.float32)
+
+    fnamesIter = iter(partFnames)
+    for xIdxs in blocks:
+        for yIdxs in blocks:
+            fnames = next(fnamesIter)
+
+            # Blocks from maxmemBlocks are consecutive.
+            xSlice = slice(xIdxs[0], xIdxs[-1] + 1)
+            ySlice = slice(yIdxs[0], yIdxs[-1] + 1)
+
+            cube[..., xSlice, ySlice] = np.load(fnames["part"], mmap_mode='r')
+
+            partEx = np.load(fnames["partEx"])
+            ex[:1 + nCols, xSlice] = partEx[:1 + nCols, xSlice]
+            ex[1 + nCols:, ySlice] = partEx[1 + nCols:, ySlice]
+
+    # Written in the same order as precomputeWindowFiles.
+    saveNpyAtomic(ex, fnameEx)
+    closeNpyAtomic(cube, fnameCube)
+
+    for fnames in partFnames:
+        os.remove(fnames["part"])
+        os.remove(fnames["partEx"])
+
+    return True
+# }}} def shardMerge
+
+def evaShard(cfg, nJobs): # {{{
+    '''Coordinate a sharded precompute, resuming from any previously
+       completed windows or shards.
+
+    Shards are calculated by nJobs local worker processes, using joblib's
+    convention for negative numbers, and by any workers on other hosts
+    started with `eva worker foo`.
+    Complete windows are merged as they become available, so this returns
+    when every window is in cube/.
+    Raise ShardWorkerError if any local worker fails.
+    '''
+    vcdInfo, todo, blocks = shardEnqueue(cfg)
+    verb("Precomputing %d windows in %d shards each... " % \
+         (len(todo), len(blocks)**2), end='')
+
+    dsfDeltas = sortedDsfDeltas(cfg)
+
+    procs_ = [multiprocessing.Process(target=shardWorkerProcess,
+                                      args=(paths.fname_evc,)) \
+              for _ in range(nWorkersFromJobs(nJobs))]
+    for p in procs_:
+        p.start()
+
+    try:
+        remaining_ = list(todo)
+        while True:
+            remaining_ = [u for u in remaining_ \
+                          if not shardMerge(u, cfg, dsfDeltas, vcdInfo,
+                                            blocks)]
+            if 0 == len(remaining_):
+                break
+
+            _ = shardRequeue()
+
+            # A failed worker's claim would otherwise wait for
+            # shardClaimTimeout, and the failure would likely recur.
+            for p in procs_:
+                if p.exitcode not in (None, 0):
+                    raise ShardWorkerError("Worker %d exited with code %d." % \
+                                           (p.pid, p.exitcode))
+
+            # Shards queued again after local workers have finished are
+            # calculated here, otherwise wait for remote workers.
+            if not any(p.is_alive() for p in procs_):
+                _ = shardWorker(paths.fname_evc)
+
+            time.sleep(shardPollInterval)
+    except BaseException:
+        # Interrupted claims are queued again after shardClaimTimeout.
+        for p in procs_:
+            p.terminate()
+        raise
+    finally:
+        for p in procs_:
+            p.join()
+
+    verb("Done")
+
+    return
+# }}} def evaShard
+
+def evaShardWorker(args): # {{{
+    '''Calculate shards queued by evaShard until the queue is empty.
+    '''
+    assert paths._INITIALIZED
+
+    verb("Calculating shards... ", end='')
+    n = shardWorker(paths.fname_evc)
+    verb("Done %d" % n)
+
+    return 0
+# }}} def evaShardWorker
+
+if __name__ == "__main__":
+    assert False, "Not a standalone script."
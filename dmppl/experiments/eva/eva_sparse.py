@@ -0,0 +1,265 @@
+# -*- coding: utf8 -*-
+
+# Standard library imports
+from functools import partial
+import os
+
+# PyPI library imports
+import numpy as np
+
+# Local library imports
+from dmppl.math import powsineCoeffs
+
+# Project imports
+# NOTE: Roundabout import path for eva_common necessary for unittest.
+from dmppl.experiments.eva.eva_common import \
+    paths, metricNames, meaFname, rdEvs
+from dmppl.experiments.eva.eva_stats import timedStage, countStat
+
+# Change lists are an alternative to dense EVS for bits.
+# A change list is a strictly increasing int64 ndarray of sample indices
+# where the bit toggles, like foo.eva/signals/* but relative to the start of
+# a window.
+# Initial value is 0, so values are 1 in [c[0], c[1]), [c[2], c[3]), ...
+# and an odd length means the last interval continues to the end of the
+# window.
+
+# Pairs of windows with fewer changes than this fraction of the window size
+# are calculated from change lists, others from dense EVS.
+sparseDensity = 1.0 / 64
+
+@timedStage("rdEvs")
+def rdChanges(names, startTime, finishTime): # {{{
+    '''Read bit measures in [startTime, finishTime) from foo.eva/signals/*,
+       and return as change lists.
+
+    Only the changes within the time range are read, using a memory map.
+    '''
+    assert paths._INITIALIZED
+    assert isinstance(startTime, int), type(startTime)
+    assert isinstance(finishTime, int), type(finishTime)
+    assert startTime < finishTime, (startTime, finishTime)
+    assert all(not nm.startswith("normal.") for nm in names), names
+
+    ret = {}
+    for nm in names:
+        fname = meaFname(nm)
+
+        if 0 == os.path.getsize(fname):
+            ret[nm] = np.zeros(0, dtype=np.int64)
+            continue
+
+        ts = np.memmap(fname, dtype=">u4", mode='r')
+
+        # Toggles at or before startTime give the initial value.
+        lo = 0 if 0 > startTime else \
+             int(np.searchsorted(ts, startTime, side="right"))
+        hi = int(np.searchsorted(ts, max(0, finishTime), side="left"))
+
+        c = ts[lo:hi].astype(np.int64) - startTime
+        countStat("bytesRead", (hi - lo) * ts.itemsize)
+        ret[nm] = np.concatenate(([0], c)) if 1 == (lo % 2) else c
+
+        del ts
+
+    return ret
+# }}} def rdChanges
+
+def clWindow(c, startIdx, finishIdx): # {{{
+    '''Return change list of the window [startIdx, finishIdx) of change list c.
+    '''
+    lo = int(np.searchsorted(c, startIdx, side="right"))
+    hi = int(np.searchsorted(c, finishIdx, side="left"))
+
+    ret = c[lo:hi] - startIdx
+
+    return np.concatenate(([0], ret)) if 1 == (lo % 2) else ret
+# }}} def clWindow
+
+def clWeightsArea(w): # {{{
+    '''Return cumulative sum of weights w with leading 0.
+
+    Sum of weights in [i, j) is W[j] - W[i].
+    '''
+    return np.concatenate(([0.0], np.cumsum(w, dtype=np.float64)))
+# }}} def clWeightsArea
+
+def clEx(W, c): # {{{
+    '''Expected value, E[X] of a change list.
+
+    Take cumulative weights W from clWeightsArea().
+    Return a scalar.
+    '''
+    n = len(W) - 1
+    starts, ends = c[0::2], c[1::2]
+    if len(ends) < len(starts):
+        ends = np.append(ends, n)
+
+    w_Area = W[n]
+    wHadpX_Area = np.sum(W[ends] - W[starts])
+
+    ret = min(1.0, wHadpX_Area / w_Area) if 0.0 < abs(w_Area) else w_Area
+
+    return ret
+# }}} def clEx
+
+def clHadp(cx, cy): # {{{
+    '''Hadamard product of change lists, (interval intersection).
+    '''
+    ts = np.union1d(cx, cy)
+
+    v = np.logical_and(np.searchsorted(cx, ts, side="right") % 2 == 1,
+                       np.searchsorted(cy, ts, side="right") % 2 == 1)
+    vPrev = np.concatenate(([False], v[:-1]))
+
+    return ts[v != vPrev]
+# }}} def clHadp
+
+def clMetricFromEx(name, x_Ex, y_Ex, xHadpY_Ex): # {{{
+    '''Calculate metric for bits from expectations only.
+
+    Equivalent to the nd* implementations where x,y are bits.
+    E[|X-Y|] = E[X] + E[Y] - 2E[XY] and E[X*X] = E[X].
+    '''
+    if "Cex" == name:
+        ret = np.nan if 0.0 == y_Ex else min(1.0, xHadpY_Ex / y_Ex)
+    elif "Cls" == name:
+        xDiffY_Ex = max(0.0, x_Ex + y_Ex - 2*xHadpY_Ex)
+        ret = 1.0 - np.sqrt(xDiffY_Ex)
+    elif "Cos" == name:
+        ret = 0.0 if 0.0 in [x_Ex, y_Ex] else \
+              min(1.0, xHadpY_Ex / (np.sqrt(x_Ex) * np.sqrt(y_Ex)))
+    elif "Cov" == name:
+        ret = min(1.0, 4 * np.fabs(xHadpY_Ex - (x_Ex * y_Ex)))
+    elif "Dep" == name:
+        x_Cex_Y = clMetricFromEx("Cex", x_Ex, y_Ex, xHadpY_Ex)
+        ret = ((x_Cex_Y - x_Ex) / x_Cex_Y) if x_Cex_Y > x_Ex else 0.0
+    elif "Ham" == name:
+        xDiffY_Ex = max(0.0, x_Ex + y_Ex - 2*xHadpY_Ex)
+        ret = 1.0 - min(1.0, xDiffY_Ex)
+    elif "Tmt" == name:
+        denominator = x_Ex + y_Ex - xHadpY_Ex
+        ret = 0.0 if 0.0 >= denominator else \
+              min(1.0, xHadpY_Ex / denominator)
+    else:
+        assert False, "Unsupported metric: %s" % name
+
+    return ret
+# }}} def clMetricFromEx
+
+def _clMetric(name, W, cx, cy=None): # {{{
+    if "Ex" == name:
+        assert cy is None
+        return clEx(W, cx)
+
+    return clMetricFromEx(name, clEx(W, cx), clEx(W, cy),
+                          clEx(W, clHadp(cx, cy)))
+# }}} def _clMetric
+
+def clMetric(name, winSize, winAlpha): # {{{
+    '''Take attributes of a metric, return a callable implementation which
+       operates on change lists.
+
+    E.g. Use like: clMetric("foo")(cx, cy)
+    '''
+    if name is None:
+        return None
+
+    assert name in metricNames or name in ["Ex"], name
+
+    W = clWeightsArea(powsineCoeffs(winSize, winAlpha))
+
+    return partial(_clMetric, name, W)
+# }}} def clMetric
+
+def isSparse(nChanges, winSize): # {{{
+    return nChanges < (winSize * sparseDensity)
+# }}} def isSparse
+
+class SparseEvs(object): # {{{
+    '''EVS in [startTime, finishTime), held as change lists and only
+       expanded to dense ndarrays where necessary.
+
+    Dense EVS of every measure over long time ranges, or with large
+    windowsize, can dominate memory while most bits rarely change.
+    For each window or pair of windows, the change lists are used when
+    there are few changes, otherwise the dense row for that measure is read
+    with rdEvs and kept.
+    Reals, and fixed point, always use dense rows.
+    '''
+
+    def __init__(self, names, startTime, finishTime, fxbits=0): # {{{
+        self.startTime = startTime
+        self.finishTime = finishTime
+        self.fxbits = fxbits
+
+        bNames = [nm for nm in names if not nm.startswith("normal.")] \
+            if 0 == fxbits else []
+        self.changes = rdChanges(bNames, startTime, finishTime)
+
+        self.denseEvs = {}
+    # }}} def __init__
+
+    def dense(self, nm): # {{{
+        '''Return dense row for the whole time range.
+        '''
+        if nm not in self.denseEvs:
+            self.denseEvs.update(rdEvs([nm], self.startTime, self.finishTime,
+                                       self.fxbits))
+
+        return self.denseEvs[nm]
+    # }}} def dense
+
+    def window(self, nm, startIdx, finishIdx): # {{{
+        '''Return change list of a window, or None if unavailable.
+        '''
+        c = self.changes.get(nm, None)
+
+        return None if c is None else clWindow(c, startIdx, finishIdx)
+    # }}} def window
+
+    def single(self, nm, startIdx, winSize): # {{{
+        '''Return (<sparse>, <evs>) for one window.
+
+        evs is a change list when sparse is True, otherwise a dense ndarray.
+        '''
+        finishIdx = startIdx + winSize
+
+        c = self.window(nm, startIdx, finishIdx)
+        if c is not None and isSparse(len(c), winSize):
+            return True, c
+
+        return False, self.dense(nm)[startIdx:finishIdx]
+    # }}} def single
+
+    def pairChanges(self, nmX, startIdxX, nmY, startIdxY, winSize): # {{{
+        '''Return (<cx>, <cy>) for a pair of windows if they are sparse,
+           otherwise None.
+        '''
+        cx = self.window(nmX, startIdxX, startIdxX + winSize)
+        cy = self.window(nmY, startIdxY, startIdxY + winSize)
+        if cx is not None and cy is not None and \
+           isSparse(len(cx) + len(cy), winSize):
+            return cx, cy
+
+        return None
+    # }}} def pairChanges
+
+    def pair(self, nmX, startIdxX, nmY, startIdxY, winSize): # {{{
+        '''Return (<sparse>, <x>, <y>) for a pair of windows.
+
+        x,y are change lists when sparse is True, otherwise dense ndarrays.
+        '''
+        cs = self.pairChanges(nmX, startIdxX, nmY, startIdxY, winSize)
+        if cs is not None:
+            return (True,) + cs
+
+        return False, \
+            self.dense(nmX)[startIdxX:startIdxX + winSize], \
+            self.dense(nmY)[startIdxY:startIdxY + winSize]
+    # }}} def pair
+
+# }}} class SparseEvs
+
+if __name__ == "__main__":
+    assert False, "Not a standalone script."
@@ -0,0 +1,256 @@
+# -*- coding: utf8 -*-
+
+# Standard library imports
+from collections import deque
+from contextlib import contextmanager
+import functools
+import sys
+import threading
+
+# Version-specific imports
+# Per-thread CPU time requires Python3.7+, otherwise it's per-process.
+if sys.version_info >= (3, 7):
+    from time import perf_counter as wallTime, thread_time as cpuTime
+elif sys.version_info[0] == 3:
+    from time import perf_counter as wallTime, process_time as cpuTime
+else:
+    from time import time as wallTime, clock as cpuTime
+
+# Stages of calculating a response, in order of the pipeline.
+# Times are exclusive, so where stages are nested the time of the inner stage
+# is not counted in the outer, and the sum over stages is the time spent in
+# any of them.
+statsStages = (
+    "rdEvs",        # Reading EVS or change lists from foo.eva/signals/*
+    "subsample",    # Selecting windows of subsampled EVS from the pyramid.
+    "metrics",      # Calculating metrics for tables or edges.
+    "html",         # Generating the response body, HTML or data API.
+    "send",         # Compressing and writing the response body.
+)
+
+statsCounters = (
+    "pairsEvaluated",   # Pairs of windows where metrics are calculated.
+    "pairsPruned",      # Pairs of windows skipped by metric bounds.
+    "bytesRead",        # Bytes read from foo.eva/signals/*
+    "cacheHits",        # Results from ResultCache or precomputed cube.
+)
+
+# Number of recent requests kept by StatsTotals.
+statsNRecent = 64
+
+# Statistics of the request being handled by each thread, set by
+# collectStats().
+_local = threading.local()
+
+class RequestStats(object): # {{{
+    '''Wall and CPU time in each stage, and counters, of one request.
+
+    Stages are entered and left as a stack so that times are exclusive.
+    Only plain dicts are held so that statistics collected in a worker
+    process may be returned to the server and merged.
+    '''
+
+    def __init__(self): # {{{
+        self.wall = dict.fromkeys(statsStages, 0.0)
+        self.cpu = dict.fromkeys(statsStages, 0.0)
+        self.counts = dict.fromkeys(statsCounters, 0)
+
+        # [ [<stage>, <wall start>, <cpu start>], ... ]
+        self.stack_ = []
+    # }}} def __init__
+
+    def __getstate__(self): # {{{
+        # Stages still running in another process are meaningless here.
+        return {k: v for k,v in self.__dict__.items() if k != "stack_"}
+    # }}} def __getstate__
+
+    def __setstate__(self, state): # {{{
+        self.__dict__.update(state)
+        self.stack_ = []
+    # }}} def __setstate__
+
+    def _accrue(self, stage, wallStart, cpuStart, wallNow, cpuNow): # {{{
+        self.wall[stage] += wallNow - wallStart
+        self.cpu[stage] += cpuNow - cpuStart
+    # }}} def _accrue
+
+    def push(self, stage): # {{{
+        '''Enter a stage, pausing any enclosing stage.
+        '''
+        assert stage in statsStages, stage
+        wallNow, cpuNow = wallTime(), cpuTime()
+
+        if 0 < len(self.stack_):
+            self._accrue(*(self.stack_[-1] + [wallNow, cpuNow]))
+
+        self.stack_.append([stage, wallNow, cpuNow])
+    # }}} def push
+
+    def pop(self): # {{{
+        '''Leave the innermost stage, resuming any enclosing stage.
+        '''
+        wallNow, cpuNow = wallTime(), cpuTime()
+
+        self._accrue(*(self.stack_.pop() + [wallNow, cpuNow]))
+
+        if 0 < len(self.stack_):
+            self.stack_[-1][1:] = [wallNow, cpuNow]
+    # }}} def pop
+
+    def merge(self, other): # {{{
+        '''Add the times and counters of other, e.g. from a worker.
+        '''
+        for stage in statsStages:
+            self.wall[stage] += other.wall[stage]
+            self.cpu[stage] += other.cpu[stage]
+
+        for counter in statsCounters:
+            self.counts[counter] += other.counts[counter]
+    # }}} def merge
+
+    def serverTiming(self): # {{{
+        '''Return a string for the Server-Timing HTTP header.
+
+        Durations are wall time in milliseconds, with CPU time in the
+        description, and counters only have a description.
+        https://www.w3.org/TR/server-timing/
+        '''
+        stages = ('%s;dur=%.3f;desc="cpu=%.3f"' % \
+                  (stage, 1e3 * self.wall[stage], 1e3 * self.cpu[stage]) \
+                  for stage in statsStages)
+
+        counters = ('%s;desc="%d"' % (counter, self.counts[counter]) \
+                    for counter in statsCounters)
+
+        return ", ".join(list(stages) + list(counters))
+    # }}} def serverTiming
+
+    def asDict(self): # {{{
+        '''Return a dict for JSON, with times in seconds.
+        '''
+        return {
+            "wall": dict(self.wall),
+            "cpu": dict(self.cpu),
+            "counts": dict(self.counts),
+        }
+    # }}} def asDict
+
+# }}} class RequestStats
+
+class StatsTotals(object): # {{{
+    '''Totals of RequestStats over the lifetime of a server, and the most
+       recent requests, shared by all handler threads.
+    '''
+
+    def __init__(self, nRecent=statsNRecent): # {{{
+        self.lock = threading.Lock()
+        self.nRequests = 0
+        self.totals = RequestStats()
+        self.recent = deque(maxlen=nRecent)
+    # }}} def __init__
+
+    def add(self, path, stats): # {{{
+        with self.lock:
+            self.nRequests += 1
+            self.totals.merge(stats)
+
+            recent = stats.asDict()
+            recent["path"] = path
+            self.recent.append(recent)
+    # }}} def add
+
+    def asDict(self): # {{{
+        '''Return a dict for JSON, with times in seconds.
+        '''
+        with self.lock:
+            ret = self.totals.asDict()
+            ret["nRequests"] = self.nRequests
+            ret["recent"] = list(self.recent)
+
+        return ret
+    # }}} def asDict
+
+# }}} class StatsTotals
+
+def requestStats(): # {{{
+    '''Return the RequestStats being collected by this thread, or None.
+    '''
+    return getattr(_local, "stats", None)
+# }}} def requestStats
+
+@contextmanager
+def collectStats(stats): # {{{
+    '''Context manager for collecting statistics of stageTimer(),
+       timedIter(), and countStat() into stats.
+
+    E.g. Use like:
+        with collectStats(RequestStats()) as stats:
+            ...
+        print(stats.serverTiming())
+    '''
+    prev = requestStats()
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = prev
+# }}} def collectStats
+
+@contextmanager
+def stageTimer(stage): # {{{
+    '''Context manager for timing a stage, or nothing outside of
+       collectStats().
+    '''
+    stats = requestStats()
+    if stats is None:
+        yield
+        return
+
+    stats.push(stage)
+    try:
+        yield
+    finally:
+        stats.pop()
+# }}} def stageTimer
+
+def timedStage(stage): # {{{
+    '''Decorator for timing every call of a function as a stage.
+    '''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stageTimer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+# }}} def timedStage
+
+def timedIter(stage, it): # {{{
+    '''Generate the items of an iterable, timing only the work of producing
+       each item as a stage.
+
+    Lazy generators, e.g. of edges, are consumed while other stages run so
+    the whole lifetime of the generator can't be timed.
+    '''
+    it = iter(it)
+    while True:
+        with stageTimer(stage):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+# }}} def timedIter
+
+def countStat(counter, n=1): # {{{
+    '''Add n to a counter, or nothing outside of collectStats().
+    '''
+    assert counter in statsCounters, counter
+
+    stats = requestStats()
+    if stats is not None:
+        stats.counts[counter] += int(n)
+# }}} def countStat
+
+if __name__ == "__main__":
+    assert False, "Not a standalone script."
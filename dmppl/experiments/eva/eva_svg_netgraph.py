@@ -2,6 +2,7 @@
 # -*- coding: utf8 -*-
 
 # Standard library imports
+import functools
 from itertools import chain
 from math import pi
 
@@ -10,8 +11,8 @@ import numpy as np
 
 # Local library imports
 from dmppl.base import dbg, info, verb, rdTxt, joinP, utf8NameToHtml
-from dmppl.math import ptShift, ptsMkPolygon, subsample, downsample, l2Norm
-from dmppl.fx import fxFromFloat
+from dmppl.math import ptShift, ptsMkPolygon, l2Norm
+from dmppl.fx import fxFromFloat, fxHadp
 from dmppl.color import rgb1D, rgb2D
 from dmppl.identicon import identiconSpriteSvg
 from dmppl.nd import ndHadp
@@ -21,8 +22,10 @@ from dmppl.nd import ndHadp
 from dmppl.experiments.eva.eva_common import \
     paths, measureNameParts, \
     mapSiblingTypeToHtml, siblingIs1stDer, \
-    metricNames, metric, mapMetricNameToHtml, \
-    timeToEvsIdx, rdEvs
+    metricNames, metric, allMetrics, metricBound, metricToFloat, \
+    mapMetricNameToHtml, timeToEvsIdx, rdEvs, evsItemsize, maxmemBlocks, \
+    pollAbandon
+from dmppl.experiments.eva.eva_stats import countStat
 
 # {{{ Static format strings
 
@@ -254,8 +257,41 @@ edgeFmt = ' '.join((
 
 def calculateEdges(a, b, u,
                    cfg, sfDeltas, vcdInfo): # {{{
-
+    '''Generate significant edges of a network graph for the window starting
+       at u, as dicts of metrics and the pair of measures.
+
+    Under a memory budget of cfg.maxmem bytes, measures are read in blocks
+    and each block of X is evaluated against each block of Y in turn.
+    Edges are generated in the same order either way, but with more than one
+    block they're only generated after every pair of blocks is evaluated.
+    '''
     measureNames = vcdInfo["unitIntervalVarNames"]
+    measureIdxs = {nm: i for i,nm in enumerate(measureNames)}
+
+    # Each measure is held at full rate and at one level of the pyramid,
+    # which is at most half as long, for both the X and Y blocks.
+    evsLen = cfg.windowsize + cfg.deltabk + cfg.deltafw + 1
+    blocks = maxmemBlocks(measureNames,
+                          [4 * evsLen * evsItemsize(nm, cfg.fxbits) \
+                           for nm in measureNames],
+                          cfg.maxmem)
+
+    keyedEdges = chain.from_iterable(
+        tileEdges(a, b, u, cfg, sfDeltas, measureIdxs, xNames, yNames) \
+        for xNames in blocks for yNames in blocks)
+
+    if 1 < len(blocks):
+        keyedEdges = sorted(keyedEdges, key=lambda k_e: k_e[0])
+
+    for _,edge in keyedEdges:
+        yield edge
+# }}} def calculateEdges
+
+def tileEdges(a, b, u,
+              cfg, sfDeltas, measureIdxs, xNames, yNames): # {{{
+    '''Generate (<key>, <edge>) of calculateEdges for X in xNames and Y in
+       yNames, where keys sort edges into the order of a single block.
+    '''
 
     # Helper function to implement floats as floats or fixed point.
     implFloat = \
@@ -263,26 +299,43 @@ def calculateEdges(a, b, u,
         if 0 == cfg.fxbits else \
         functools.partial(fxFromFloat, nBits=cfg.fxbits)
 
+    hadp = \
+        ndHadp \
+        if 0 == cfg.fxbits else \
+        functools.partial(fxHadp, nBits=cfg.fxbits)
+
+    # Edges are yielded with floats, whichever implementation is used.
+    toFloat = functools.partial(metricToFloat, nBits=cfg.fxbits)
+
     epsilonA, epsilonB = \
         implFloat(cfg.epsilon[a]), \
         implFloat(cfg.epsilon[b]) if b else None
 
     otherMetricNames = set(metricNames) - {a, b}
 
+    # Upper bounds from only E[X] and E[Y], where available, with allowance
+    # for floating point rounding.
+    boundTolerance = 1e-6
+    bounds = [(fn, epsilon) \
+              for fn,epsilon in ((metricBound(a, cfg.fxbits), epsilonA),
+                                 (metricBound(b, cfg.fxbits), epsilonB)) \
+              if fn is not None]
+
     assert isinstance(u, int), type(u)
     v = u + cfg.windowsize
     evsStartTime = u - cfg.deltabk
     evsFinishTime = v + cfg.deltafw + 1
 
-    # Keep relevant samples in memory.
-    evs = rdEvs(measureNames, evsStartTime, evsFinishTime, cfg.fxbits)
+    # Keep relevant samples of this block in memory.
+    tileNames = sorted(set(xNames) | set(yNames), key=measureIdxs.get)
+    evs = rdEvs(tileNames, evsStartTime, evsFinishTime, cfg.fxbits)
 
     nDeltas = len(sfDeltas)
-    m = len(measureNames)
+    m = len(measureIdxs)
     nPossibleEdges = nDeltas * (m**2 - m) / 2 # TODO? Report progress.
 
     sfPrev_ = -1 # init
-    for sf,d in sfDeltas:
+    for sfDeltaIdx,(sf,d) in enumerate(sfDeltas):
         dU, dV = u+d, v+d
 
         # Ignore negative deltas where relationship can't exist yet.
@@ -296,15 +349,22 @@ def calculateEdges(a, b, u,
         # 3. Size of window = v-u -> sfV-sfU
         sfWinSize = cfg.windowsize // sf
         sfD = d // sf
-        sfU = timeToEvsIdx(u, evsStartTime) // sf
-        sfV = sfU + sfWinSize
 
         # Downsample EVS to get X and Y.
         if sf != sfPrev_:
             sfPrev_ = sf
 
-            # Sub/downsample entire EVS since it will all be used.
-            sfEvs = {nm: subsample(evs[nm], sf) for nm in measureNames}
+            # Read subsampled EVS directly from the pyramid, with one extra
+            # sample either side to cover rounding.
+            if 1 == sf:
+                sfEvsStartTime, sfEvs = evsStartTime, evs
+            else:
+                sfEvsStartTime = evsStartTime // sf - 1
+                sfEvs = rdEvs(tileNames, sfEvsStartTime,
+                              evsFinishTime // sf + 2, cfg.fxbits, dsf=sf)
+
+            sfU = timeToEvsIdx(u // sf, sfEvsStartTime)
+            sfV = sfU + sfWinSize
 
             # Get metric implementations for this window.
             # NOTE: LRU cache is difficult because NumPy arrays aren't hashable.
@@ -315,34 +375,54 @@ def calculateEdges(a, b, u,
             #def fnEx(*args, **kwargs):
             #    return metric("Ex", sfWinSize, cfg.windowalpha,
             #                  nBits=cfg.fxbits)(*args, **kwargs)
-            fnEx = metric("Ex", sfWinSize, cfg.windowalpha, nBits=cfg.fxbits)
-            fnA = metric(a, sfWinSize, cfg.windowalpha, nBits=cfg.fxbits)
-            fnB = metric(b, sfWinSize, cfg.windowalpha, nBits=cfg.fxbits) \
+            fnEx = metric("Ex", sfWinSize, cfg.windowalpha, nBits=cfg.fxbits,
+                          trusted=True)
+            fnA = metric(a, sfWinSize, cfg.windowalpha, nBits=cfg.fxbits,
+                         trusted=True)
+            fnB = metric(b, sfWinSize, cfg.windowalpha, nBits=cfg.fxbits,
+                         trusted=True) \
                 if b is not None else None
-            fnMetrics = \
-                {nm: metric(nm, sfWinSize, cfg.windowalpha, nBits=cfg.fxbits) \
-                 for nm in metricNames}
-
-            xs = {nm: sfEvs[nm][sfU:sfV] for nm in measureNames}
-            x_Exs = {nm: fnEx(xs[nm]) for nm in measureNames}
-
-        ys = {nm: sfEvs[nm][sfU+sfD:sfV+sfD] for nm in measureNames}
-        y_Exs = {nm: fnEx(ys[nm]) for nm in measureNames}
-
-        for nmX in measureNames:
+            fnAll = allMetrics(sfWinSize, cfg.windowalpha, nBits=cfg.fxbits,
+                               trusted=True)
+
+            xs = {nm: sfEvs[nm][sfU:sfV] for nm in xNames}
+            x_Exs = {nm: fnEx(xs[nm]) for nm in xNames}
+
+        ys = {nm: sfEvs[nm][sfU+sfD:sfV+sfD] for nm in yNames}
+        y_Exs = {nm: fnEx(ys[nm]) for nm in yNames}
+
+        # Prune pairs which can't be significant before any elementwise work.
+        # Rarely active measures have small bounds so most pairs are pruned.
+        # isCandidate[<X index>, <Y index>]
+        isCandidate = np.ones((len(xNames), len(yNames)), dtype=np.bool_)
+        if 0 < len(bounds):
+            xExArr = np.array([x_Exs[nm] for nm in xNames])[:, None]
+            yExArr = np.array([y_Exs[nm] for nm in yNames])[None, :]
+            for fnBound,epsilon in bounds:
+                isCandidate &= \
+                    (epsilon < fnBound(xExArr, yExArr) + boundTolerance)
+            countStat("pairsPruned",
+                      isCandidate.size - np.count_nonzero(isCandidate))
+
+        for i,nmX in enumerate(xNames):
+            pollAbandon()
             mtX, stX, bnX = measureNameParts(nmX)
 
+            nmYs = [nm for nm,c in zip(yNames, isCandidate[i]) if c]
+
             # NOTE: Pre-calculating xHadpY_Ex doesn't significantly speedup
             # tinn/Cov+Dep testcase, but doesn't slowdown either.
-            xHadpY_Exs = {nm: fnEx(ndHadp(xs[nmX], ys[nm])) \
-                          for nm in measureNames}
+            xHadpY_Exs = {nm: fnEx(hadp(xs[nmX], ys[nm])) \
+                          for nm in nmYs}
 
-            for nmY in measureNames:
+            for nmY in nmYs:
                 mtY, stY, bnY = measureNameParts(nmY)
 
                 if bnX == bnY:
                     continue
 
+                countStat("pairsEvaluated")
+
                 # Unusual structure only executes fnB() where it has a chance
                 # of producing an overall significant result.
                 metA = fnA(xs[nmX], ys[nmY],
@@ -366,23 +446,23 @@ def calculateEdges(a, b, u,
                 if not isSignificant:
                     continue
 
-                edge = {nm: fnMetrics[nm](xs[nmX], ys[nmY]) \
-                        for nm in otherMetricNames}
+                mets = fnAll(xs[nmX], ys[nmY])
+                edge = {nm: toFloat(mets[nm]) for nm in otherMetricNames}
                 edge.update({
-                    a: metA,
+                    a: toFloat(metA),
                     'a': a,
                     'b': b,
                     "dstName": nmX,
                     "srcName": nmY,
                     "srcDelta": d,
                     "sampleFactor": sf,
-                    "dstEx": x_Exs[nmX],
-                    "srcEx": y_Exs[nmY],
+                    "dstEx": toFloat(x_Exs[nmX]),
+                    "srcEx": toFloat(y_Exs[nmY]),
                 })
                 if b is not None:
-                  edge[b] = metB
+                  edge[b] = toFloat(metB)
 
-                yield edge
+                yield (sfDeltaIdx, measureIdxs[nmX], measureIdxs[nmY]), edge
 
 # NOTE: Parallelizing with joblib is seen to be slower than single core
 # implementation.
@@ -448,11 +528,15 @@ def calculateEdges(a, b, u,
 #
 #            yield edge
 
-# }}} def calculateEdges
+# }}} def tileEdges
 
-def svgNodes(cfg, evs): # {{{
+def svgNodes(cfg, u, measureNames): # {{{
+    '''Return strings of SVG for nodes of a network graph, the canvas size,
+       and the center of each node.
 
-    measureNames = list(evs.keys())
+    Measures are read for the window starting at u in blocks of sibling
+    groups, under a memory budget of cfg.maxmem bytes.
+    '''
     nameParts = [measureNameParts(nm) for nm in measureNames]
 
     baseNames = set(bn for mt,st,bn in nameParts) # One sibgrp per base name.
@@ -479,9 +563,12 @@ def svgNodes(cfg, evs): # {{{
         {nm: ptShift(nodeSibgrpCenters[nm], nodeLocalCenters[nm]) \
          for nm in measureNames}
 
-    metEx = metric("Ex", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits)
-    metCov = metric("Cov", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits)
-    metCex = metric("Cex", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits)
+    metEx = metric("Ex", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits,
+                   trusted=True)
+    metCov = metric("Cov", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits,
+                    trusted=True)
+    metCex = metric("Cex", cfg.windowsize, cfg.windowalpha, nBits=cfg.fxbits,
+                    trusted=True)
 
     # Each node displays blob with 2D color.
     #   orig nodes display colorspace1D( E[orig] )
@@ -499,7 +586,7 @@ def svgNodes(cfg, evs): # {{{
     #   rise nodes print E[rise] and Cex(rise,orig)
     #   fall nodes print E[fall] and Cex(fall,refl)
 
-    def secondStat(nm, mt, st, bn): # {{{
+    def secondStat(evs, nm, mt, st, bn): # {{{
         # NOTE: Logic paired with statsToBlobRgb().
         # NOTE: Logic paired with statsToTitle().
         if "normal" == mt:
@@ -513,13 +600,32 @@ def svgNodes(cfg, evs): # {{{
             }[st]
             ret = metCex(evs[nm], evs[partner])
         else:
-            ret = None
+            return None
 
-        return ret
+        return metricToFloat(ret, nBits=cfg.fxbits)
     # }}} def secondStat
 
-    stats = {nm: ( metEx(evs[nm]), np.nan_to_num(secondStat(nm, mt, st, bn)) ) \
-             for nm,(mt,st,bn) in zip(measureNames, nameParts)}
+    # Siblings are read together as secondStat() may require a partner.
+    sibgrps = {}
+    for nm,(mt,st,bn) in zip(measureNames, nameParts):
+        sibgrps.setdefault(bn, []).append((nm, mt, st, bn))
+
+    sibgrpBlocks = maxmemBlocks(sorted(sibgrps.keys()),
+                                [sum(cfg.windowsize * \
+                                     evsItemsize(nm, cfg.fxbits) \
+                                     for nm,_,_,_ in sibgrps[bn]) \
+                                 for bn in sorted(sibgrps.keys())],
+                                cfg.maxmem)
+
+    stats = {}
+    for block in sibgrpBlocks:
+        blockParts = [p for bn in block for p in sibgrps[bn]]
+        evs = rdEvs([nm for nm,_,_,_ in blockParts],
+                    u, u + cfg.windowsize, cfg.fxbits)
+
+        stats.update({nm: ( metricToFloat(metEx(evs[nm]), nBits=cfg.fxbits),
+                            np.nan_to_num(secondStat(evs, nm, mt, st, bn)) ) \
+                      for nm,mt,st,bn in blockParts})
 
     def statsToBlobRgb(nm, mt, st, bn): # {{{
         statA, statB = stats[nm]
@@ -637,9 +743,8 @@ def svgNodes(cfg, evs): # {{{
          for bn in baseNames}
 
     # Identicons are embedded SVGs scaled and translated into place.
-    #identiconSvgs = \
-    #    {bn: rdTxt(joinP(paths.dname_identicon, bn + ".svg")) \
-    #     for bn in baseNames}
+    # Each is only used once, by its sibling group, so there's nothing to
+    # gain from <symbol> and <use>.
     identiconSvgs = \
         {bn: identiconSpriteSvg(bn, fill="darkgray", parentSvg=False) \
          for bn in baseNames}
@@ -687,11 +792,12 @@ def svgEdges(edges, nodeCenters): # {{{
 # }}} def svgEdges
 
 def svgNetgraph(u, cfg, vcdInfo, edges): # {{{
+    '''Generate strings of SVG for a network graph.
+    '''
     measureNames = vcdInfo["unitIntervalVarNames"]
 
-    evs = rdEvs(measureNames, u, u + cfg.windowsize, cfg.fxbits)
-
-    nodeStrs, (canvasWidth, canvasHeight), nodeCenters = svgNodes(cfg, evs)
+    nodeStrs, (canvasWidth, canvasHeight), nodeCenters = \
+        svgNodes(cfg, u, measureNames)
 
     # Clip the max dimensions to for zooming to work with browsers.
     # 300 is just a reasonable value for 1080p screen.
@@ -703,49 +809,50 @@ def svgNetgraph(u, cfg, vcdInfo, edges): # {{{
     viewBoxWidth, viewBoxHeight = \
         canvasWidth, canvasHeight
 
-    ret_ = []
-    ret_.append(svgRootFmt.format(
+    yield svgRootFmt.format(
         svgWidth="%dmm" % svgWidth,
         svgHeight="%dmm" % svgHeight,
         viewBoxMinX=viewBoxMinX,
         viewBoxMinY=viewBoxMinY,
         viewBoxWidth=viewBoxWidth,
         viewBoxHeight=viewBoxHeight,
-    ))
+    )
 
-    ret_.append(sodipodiNamedview)
+    yield sodipodiNamedview
 
-    ret_.append(topStyle)
+    yield topStyle
 
     # Force background to white
     #ret_.append('<rect fill="white" width="100%%" height="100%%" x="%d" y="%d"/>' \
     #    % (viewBoxMinX, viewBoxMinY))
-    ret_.append('<circle fill="white" r="50%" cx="0%" cy="0%"/>')
+    yield '<circle fill="white" r="50%" cx="0%" cy="0%"/>'
 
     # Layer of vertice/nodes
-    ret_.append(' '.join((
+    yield ' '.join((
       '<g',
         'id="layer1"',
         'inkscape:label="Vertices"',
         'inkscape:groupmode="layer"',
       '>',
-    )))
-    ret_ += list(nodeStrs)
-    ret_.append('</g>')
+    ))
+    for s in nodeStrs:
+        yield s
+    yield '</g>'
 
     # Layer of edge/connections.
-    ret_.append(' '.join((
+    # Edges may be a generator, so each is drawn as soon as it's calculated.
+    yield ' '.join((
       '<g',
         'id="layer2"',
         'inkscape:label="Edges"',
         'inkscape:groupmode="layer"',
       '>',
-    )))
-    ret_ += list(svgEdges(edges, nodeCenters))
-    ret_.append('</g>')
+    ))
+    for s in svgEdges(edges, nodeCenters):
+        yield s
+    yield '</g>'
 
-    ret_.append('</svg>')
-    return ret_
+    yield '</svg>'
 # }}} def svgNetgraph
 
 if __name__ == "__main__":
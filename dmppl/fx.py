@@ -3,6 +3,7 @@ from __future__ import division
 
 import numpy as np
 from .math import isPow2, clog2
+from .nd import ndIsTrusted
 
 '''
 Fixed point format represents the semi-open interval (0, 1].
@@ -173,6 +174,8 @@ def fxAssert(*args, **kwargs): # {{{
 
     Optionally set the eq,leq,geq,lt,gt keywords to an array of the same size
     as the NumPy arrays in args to assert comparison properties.
+
+    Elementwise checks are skipped with trusted, or inside ndTrusted().
     '''
     if __debug__:
 
@@ -185,6 +188,9 @@ def fxAssert(*args, **kwargs): # {{{
         dtype1 = fxDtype(nBits)
         assert a.dtype == dtype1, (a.dtype, dtype1)
 
+        if ndIsTrusted(**kwargs):
+            return
+
         eq = kwargs.get("eq")
         if eq is not None:
             assert a.dtype == eq.dtype, (a.dtype, eq.dtype)
@@ -271,10 +277,10 @@ def fxToFloat(x, **kwargs): # {{{
     fxAssert(x, **kwargs)
     nBits = _fxGetKwargs(**kwargs)
 
-    ret = (x.astype(np.float) + 1) / (2**nBits)
+    ret = (np.asarray(x).astype(np.float64) + 1) / (2**nBits)
 
-    assert 0.0 <= ret <= 1.0, (ret, x, nBits)
-    return ret
+    assert np.all(np.logical_and(0.0 <= ret, ret <= 1.0)), (ret, x, nBits)
+    return ret[()]
 # }}} def fxToFloat
 
 def fxFromFloat(x, **kwargs): # {{{
@@ -437,6 +443,70 @@ def fxPow(x, n, **kwargs): # {{{
     return ret
 # }}} def fxPow
 
+def fxAbsDiff(x, y, **kwargs): # {{{
+    '''Elementwise absolute difference of two NumPy arrays for fixed point
+       (0, 1].
+
+    Take arrays x, y of equal shape and equal dtype.
+    Return an array of same dtype and shape as x and y.
+
+    This is the operation desired:
+      |(x + 1) - (y + 1)| - 1
+    Giving:
+      |x - y| - 1
+    NOTE: Saturates at the point closest to zero, where x equals y.
+    '''
+    fxAssert(x, y, **kwargs)
+
+    nBits = _fxGetKwargs(**kwargs)
+    dtype1 = fxDtype(nBits)
+    dtype2 = fxDtypeLargerSigned(nBits)
+
+    # Convert to something larger and signed in order for abs to work.
+    d = np.abs(x.astype(dtype2) - y.astype(dtype2))
+    ret = np.maximum(0, d - 1).astype(dtype1)
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxAbsDiff
+
+def fxSqrt(x, **kwargs): # {{{
+    '''Elementwise square root of NumPy array for fixed point (0, 1].
+
+    Take array x.
+    Return an array of same dtype and shape as x.
+
+    This is the operation desired:
+      sqrt((x + 1) / 2**nBits) * 2**nBits - 1
+    Rearrange:
+      sqrt((x + 1) * 2**nBits) - 1
+    Integer square root is exact, from a floating point estimate which is
+    corrected by at most one.
+    '''
+    fxAssert(x, **kwargs)
+
+    nBits = _fxGetKwargs(**kwargs)
+    dtype1 = fxDtype(nBits)
+
+    r = _fxIsqrt(_fxNumerator(x) << nBits)
+
+    ret = np.asarray(r - 1).astype(dtype1)[()]
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxSqrt
+
+def _fxIsqrt(m): # {{{
+    '''Elementwise floor of square root of non-negative int64 array m.
+
+    NOTE: m must be less than 2**62 so that squares of the result fit.
+    '''
+    r = np.floor(np.sqrt(m.astype(np.float64))).astype(np.int64)
+    r -= (r * r > m)
+    r += ((r + 1) * (r + 1) <= m)
+    return r
+# }}} def _fxIsqrt
+
 def fxRatio(n, d, **kwargs): # {{{
     '''Return ratio of integers n/d as fixed point (0, 1].
 
@@ -474,6 +544,41 @@ def fxRatio(n, d, **kwargs): # {{{
     return ret
 # }}} def fxRatio
 
+def fxRatios(n, d, **kwargs): # {{{
+    '''Elementwise ratios of non-negative integer arrays n/d as fixed point
+       (0, 1].
+
+    Like fxRatio() on arrays, but exact, and ratios above 1 saturate at 1.
+    Each of nBits steps of restoring division finds one fraction bit, so
+    intermediate values never exceed 2d.
+
+    NOTE: d must be positive and less than 2**62.
+    '''
+    nBits = _fxGetKwargs(**kwargs)
+    dtype1 = fxDtype(nBits)
+
+    n, d = np.asarray(n).astype(np.int64), np.asarray(d).astype(np.int64)
+    assert np.all(0 < d), d
+    assert np.all(0 <= n), n
+
+    isOne = n >= d
+
+    q_ = np.zeros(np.broadcast(n, d).shape, dtype=np.int64)
+    r_ = np.where(isOne, 0, n)
+    for _ in range(nBits):
+        r_ = r_ << 1
+        bit = r_ >= d
+        q_ = (q_ << 1) | bit
+        r_ = r_ - np.where(bit, d, 0)
+
+    # Qn.n format to fx format, where q_ is floor(n * 2**nBits / d).
+    ret = np.where(isOne, 2**nBits - 1, np.maximum(0, q_ - 1)) \
+        .astype(dtype1)[()]
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxRatios
+
 def fxArithMean(X, **kwargs): # {{{
     '''Arithmetic Mean of NumPy array for fixed point (0, 1].
 
@@ -539,56 +644,263 @@ def fxNonNegDeriv(X, **kwargs): # {{{
     return ret
 # }}} def fxNonNegDeriv
 
+def _fxNumerator(x): # {{{
+    '''Return numerators of fixed point (0, 1], over a denominator of
+       2**nBits, as int64.
+    '''
+    return np.asarray(x).astype(np.int64) + 1
+# }}} def _fxNumerator
+
+def fxEx(W, X, **kwargs): # {{{
+    '''Expected value, E[X]
+
+    Take weights W and array X of equal dtype, where the last axis of X has
+    the same length as W.
+    Return a scalar of same dtype as W or X, or an array of the other axes
+    of X.
+
+    Weighted arithmetic mean, where values are normalized by the area of W
+    so any length of window is allowed.
+    This is the operation desired:
+      sum((W+1)(X+1)/2**(2*nBits)) / sum((W+1)/2**nBits) * 2**nBits - 1
+    Rearrange:
+      sum((W+1)(X+1)) / sum(W+1) - 1
+    The quotient is exact, with X+1 split into 16b limbs so that the sums of
+    products fit in int64.
+
+    w_Area optionally provides pre-calculated sum(W+1).
+
+    https://en.wikipedia.org/wiki/Expected_value
+    https://en.wikipedia.org/wiki/Window_function
+    '''
+    assert W.shape == X.shape[-1:], (W.shape, X.shape)
+    fxAssert(np.broadcast_to(W, X.shape), X, **kwargs)
+    nBits = _fxGetKwargs(**kwargs)
+    dtype1 = fxDtype(nBits)
+
+    nW = _fxNumerator(W)
+
+    _w_Area = kwargs.get("w_Area", None)
+    w_Area = np.sum(nW) if _w_Area is None else _w_Area
+    assert 0 < w_Area < 2**46, w_Area
+
+    nX = _fxNumerator(X)
+    wHadpXHi_Area, wHadpXLo_Area = \
+        np.dot(nX >> 16, nW), \
+        np.dot(nX & 0xffff, nW)
+
+    qHi, rHi = np.divmod(wHadpXHi_Area, w_Area)
+    q = (qHi << 16) + (((rHi << 16) + wHadpXLo_Area) // w_Area)
+
+    ret = np.maximum(0, q - 1).astype(dtype1)[()]
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxEx
+
 def fxExpectation(W, X, **kwargs): # {{{
     '''Expected value, E[X]
 
     Take rows W, X of equal length and equal dtype.
     Return a scalar of same dtype as W or X.
 
-    Equivalent to weighted arithmetic mean.
+    Equivalent to weighted arithmetic mean, see fxEx().
 
     https://en.wikipedia.org/wiki/Expected_value
     https://en.wikipedia.org/wiki/Window_function
     '''
     fxAssert(W, X, **kwargs)
 
-    ret = fxArithMean(fxHadp(W, X, **kwargs), **kwargs)
+    ret = fxEx(W, X, **kwargs)
     assert np.isscalar(ret)
 
     return ret
 # }}} def fxExpectation
 
+def fxCex(W, X, Y, **kwargs): # {{{
+    '''Conditional expected value, E[X|Y].
+
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
+
+    y_Ex, xHadpY_Ex optionally provide pre-calculated E[Y], E[X*Y].
+
+    NOTE: This fixed point representation has no 0, so there is no need to
+    check if E[Y] == 0 to avoid NaN.
+    Where E[Y] is close to zero, E[X|Y] breaks down to 1.
+
+    https://en.wikipedia.org/wiki/Bayesian_inference
+    https://en.wikipedia.org/wiki/Bayes%27_theorem
+    https://en.wikipedia.org/wiki/Window_function
+    '''
+    fxAssert(X, Y, **kwargs)
+
+    _y_Ex = kwargs.get("y_Ex", None)
+    y_Ex = fxEx(W, Y, **kwargs) if _y_Ex is None else _y_Ex
+
+    _xHadpY_Ex = kwargs.get("xHadpY_Ex", None)
+    xHadpY_Ex = fxEx(W, fxHadp(X, Y, **kwargs), **kwargs) \
+        if _xHadpY_Ex is None else _xHadpY_Ex
+
+    ret = fxRatios(_fxNumerator(xHadpY_Ex), _fxNumerator(y_Ex), **kwargs)
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxCex
+
 def fxConditional(W, X, Y, **kwargs): # {{{
     '''Calculate E[X|Y]
 
     Take rows W, X, Y of equal length and equal dtype.
     Return a scalar.
 
+    Equivalent to fxCex().
+
     https://en.wikipedia.org/wiki/Bayesian_inference
     https://en.wikipedia.org/wiki/Bayes%27_theorem
     https://en.wikipedia.org/wiki/Window_function
     '''
     fxAssert(W, X, Y, **kwargs)
 
-    Y_Ex = fxExpectation(W, Y, **kwargs)
+    ret = fxCex(W, X, Y, **kwargs)
+    assert np.isscalar(ret)
 
-    xHadpY_Ex = fxExpectation(W, fxHadp(X, Y, **kwargs), **kwargs)
-    fxAssert(Y_Ex, geq=xHadpY_Ex, **kwargs)
+    return ret
+# }}} def fxConditional
 
-    # NOTE: This fixed point representation has no 0, so there is no need to
-    # check if Y_Ex == 0 to avoid NaN.
+def fxHam(W, X, Y, **kwargs): # {{{
+    '''Hamming similarity (weighted) between arrays X and Y.
 
-    ret = fxRatio(xHadpY_Ex+1, Y_Ex+1, **kwargs)
-    assert np.isscalar(ret)
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
 
+    xDiffY_Ex optionally provides pre-calculated E[|X-Y|].
+
+    https://en.wikipedia.org/wiki/Hamming_distance
+    https://en.wikipedia.org/wiki/Window_function
+    '''
+    fxAssert(X, Y, **kwargs)
+
+    _xDiffY_Ex = kwargs.get("xDiffY_Ex", None)
+    xDiffY_Ex = fxEx(W, fxAbsDiff(X, Y, **kwargs), **kwargs) \
+        if _xDiffY_Ex is None else _xDiffY_Ex
+
+    ret = fxReflect(xDiffY_Ex, **kwargs)
+
+    fxAssert(ret, **kwargs)
     return ret
-# }}} def fxConditional
+# }}} def fxHam
+
+def fxTmt(W, X, Y, **kwargs): # {{{
+    '''Tanimoto coefficient (weighted) between arrays X and Y.
+
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
+
+    x_Ex, y_Ex, xHadpY_Ex optionally provide pre-calculated E[X], E[Y],
+    E[X*Y].
+
+    https://en.wikipedia.org/wiki/Jaccard_index
+    https://en.wikipedia.org/wiki/Window_function
+    '''
+    fxAssert(X, Y, **kwargs)
+
+    _x_Ex = kwargs.get("x_Ex", None)
+    x_Ex = fxEx(W, X, **kwargs) if _x_Ex is None else _x_Ex
+
+    _y_Ex = kwargs.get("y_Ex", None)
+    y_Ex = fxEx(W, Y, **kwargs) if _y_Ex is None else _y_Ex
+
+    _xHadpY_Ex = kwargs.get("xHadpY_Ex", None)
+    xHadpY_Ex = fxEx(W, fxHadp(X, Y, **kwargs), **kwargs) \
+        if _xHadpY_Ex is None else _xHadpY_Ex
+
+    nXY = _fxNumerator(xHadpY_Ex)
+    denominator = _fxNumerator(x_Ex) + _fxNumerator(y_Ex) - nXY
+    ret = fxRatios(nXY, np.maximum(1, denominator), **kwargs)
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxTmt
+
+def fxCls(W, X, Y, **kwargs): # {{{
+    '''Euclidean closeness (weighted) between arrays X and Y.
+
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
+
+    xDiffY2_Ex optionally provides pre-calculated E[|X-Y|^2].
+
+    https://en.wikipedia.org/wiki/Closeness_(mathematics)
+    https://en.wikipedia.org/wiki/Euclidean_distance
+    https://en.wikipedia.org/wiki/Window_function
+    '''
+    fxAssert(X, Y, **kwargs)
+
+    _xDiffY2_Ex = kwargs.get("xDiffY2_Ex", None)
+    if _xDiffY2_Ex is None:
+        xDiffY = fxAbsDiff(X, Y, **kwargs)
+        xDiffY2_Ex = fxEx(W, fxHadp(xDiffY, xDiffY, **kwargs), **kwargs)
+    else:
+        xDiffY2_Ex = _xDiffY2_Ex
+
+    ret = fxReflect(fxSqrt(xDiffY2_Ex, **kwargs), **kwargs)
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxCls
+
+def fxCos(W, X, Y, **kwargs): # {{{
+    '''Cosine similarity (weighted) between arrays X and Y.
+
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
+
+    xHadpY_Ex, x_Ex2, y_Ex2 optionally provide pre-calculated E[X*Y],
+    E[X^2], E[Y^2].
+    Cos is zero where E[X^2] or E[Y^2] is close to zero.
+
+    https://en.wikipedia.org/wiki/Cosine_similarity
+    https://en.wikipedia.org/wiki/Window_function
+    '''
+    fxAssert(X, Y, **kwargs)
+
+    _xHadpY_Ex = kwargs.get("xHadpY_Ex", None)
+    xHadpY_Ex = fxEx(W, fxHadp(X, Y, **kwargs), **kwargs) \
+        if _xHadpY_Ex is None else _xHadpY_Ex
+
+    _x_Ex2 = kwargs.get("x_Ex2", None)
+    x_Ex2 = fxEx(W, fxHadp(X, X, **kwargs), **kwargs) \
+        if _x_Ex2 is None else _x_Ex2
+
+    _y_Ex2 = kwargs.get("y_Ex2", None)
+    y_Ex2 = fxEx(W, fxHadp(Y, Y, **kwargs), **kwargs) \
+        if _y_Ex2 is None else _y_Ex2
+
+    # sqrt(E[X^2]) * sqrt(E[Y^2]) = sqrt(E[X^2] * E[Y^2])
+    # Numerators are multiplied exactly, rather than rounding E[X^2] * E[Y^2]
+    # to fixed point before the root, so the norm has nBits of precision.
+    xyNorm = _fxIsqrt(_fxNumerator(x_Ex2) * _fxNumerator(y_Ex2))
+
+    # Cos is zero where either norm is close to zero, like ndCos().
+    isZero = (0 == x_Ex2) | (0 == y_Ex2)
+    ret = np.where(isZero, fxZero(**kwargs),
+                   fxRatios(_fxNumerator(xHadpY_Ex), xyNorm, **kwargs))[()]
+
+    fxAssert(ret, **kwargs)
+    return ret
+# }}} def fxCos
 
 def fxDep(W, X, Y, **kwargs): # {{{
     '''Calculate Dep(X,Y)
 
-    Take rows W, X, Y of equal length, and a threshold epsilon.
-    Return a scalar.
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
+
+    x_Ex, y_Ex, xHadpY_Ex optionally provide pre-calculated E[X], E[Y],
+    E[X*Y].
+    Dep is zero where E[X] or E[Y] is close to zero, or where E[X*Y] is less
+    than E[X]E[Y].
 
     https://arxiv.org/abs/1905.06386 Visualizations for Understanding SoC Behaviour
     https://arxiv.org/abs/1905.12465 Relationship Detection Metrics for Binary SoC Data
@@ -597,80 +909,134 @@ def fxDep(W, X, Y, **kwargs): # {{{
     https://en.wikipedia.org/wiki/Independence_(probability_theory)
     https://en.wikipedia.org/wiki/Conditional_independence
     '''
-    fxAssert(W, X, Y, **kwargs)
-    nBits = _fxGetKwargs(**kwargs)
-    dtype1 = fxDtype(nBits)
+    fxAssert(X, Y, **kwargs)
 
-    X_Ex = fxExpectation(W, X, **kwargs)
+    _x_Ex = kwargs.get("x_Ex", None)
+    x_Ex = fxEx(W, X, **kwargs) if _x_Ex is None else _x_Ex
 
-    if 0 == X_Ex: # NOTE: Close to zero, not equal to zero.
-        return fxZero(**kwargs)
+    _y_Ex = kwargs.get("y_Ex", None)
+    y_Ex = fxEx(W, Y, **kwargs) if _y_Ex is None else _y_Ex
 
-    Y_Ex = fxExpectation(W, Y, **kwargs)
+    _xHadpY_Ex = kwargs.get("xHadpY_Ex", None)
+    xHadpY_Ex = fxEx(W, fxHadp(X, Y, **kwargs), **kwargs) \
+        if _xHadpY_Ex is None else _xHadpY_Ex
 
-    if 0 == Y_Ex: # NOTE: Close to zero, not equal to zero.
-        return fxZero(**kwargs)
+    XY_Ex = fxHadp(x_Ex, y_Ex, **kwargs)
 
-    XY_Ex = fxHadp(X_Ex, Y_Ex, **kwargs)
-    fxAssert(X_Ex, Y_Ex, geq=XY_Ex, **kwargs)
-
-    xHadpY_Ex = fxExpectation(W, fxHadp(X, Y, **kwargs), **kwargs)
-    fxAssert(X_Ex, Y_Ex, geq=xHadpY_Ex, **kwargs)
-
-    if xHadpY_Ex < XY_Ex:
-        return fxZero(**kwargs)
-
-    ret = fxReflect(fxRatio(XY_Ex+1, xHadpY_Ex+1, **kwargs), **kwargs)
-    assert np.isscalar(ret)
+    # Dep = 1 - E[X]E[Y]/E[X*Y], equivalent to (E[X|Y] - E[X]) / E[X|Y].
+    isZero = (0 == x_Ex) | (0 == y_Ex) | (xHadpY_Ex < XY_Ex)
+    ret = np.where(isZero, fxZero(**kwargs),
+                   fxReflect(fxRatios(_fxNumerator(XY_Ex),
+                                      _fxNumerator(xHadpY_Ex), **kwargs),
+                             **kwargs))[()]
 
+    fxAssert(ret, **kwargs)
     return ret
 # }}} def fxDep
 
 def fxCov(W, X, Y, **kwargs): # {{{
     '''Calculate Cov(X,Y)
 
-    Take rows W, X, Y of equal length, and a threshold epsilon.
-    Return a scalar.
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a scalar, or an array as fxEx().
+
+    x_Ex, y_Ex, xHadpY_Ex optionally provide pre-calculated E[X], E[Y],
+    E[X*Y].
+
+    Absolute like ndCov(), so negative covariance is reflected.
+    Cov is zero where E[X], E[Y], or E[X]E[Y] is close to zero.
 
     https://en.wikipedia.org/wiki/Window_function
     https://en.wikipedia.org/wiki/Variance
     https://en.wikipedia.org/wiki/Covariance
     '''
-    fxAssert(W, X, Y, **kwargs)
+    fxAssert(X, Y, **kwargs)
     nBits = _fxGetKwargs(**kwargs)
     dtype1 = fxDtype(nBits)
 
-    X_Ex = fxExpectation(W, X, **kwargs)
-
-    if 0 == X_Ex: # NOTE: Close to zero, not equal to zero.
-        return fxZero(**kwargs)
+    _x_Ex = kwargs.get("x_Ex", None)
+    x_Ex = fxEx(W, X, **kwargs) if _x_Ex is None else _x_Ex
 
-    Y_Ex = fxExpectation(W, Y, **kwargs)
+    _y_Ex = kwargs.get("y_Ex", None)
+    y_Ex = fxEx(W, Y, **kwargs) if _y_Ex is None else _y_Ex
 
-    if 0 == Y_Ex: # NOTE: Close to zero, not equal to zero.
-        return fxZero(**kwargs)
+    _xHadpY_Ex = kwargs.get("xHadpY_Ex", None)
+    xHadpY_Ex = fxEx(W, fxHadp(X, Y, **kwargs), **kwargs) \
+        if _xHadpY_Ex is None else _xHadpY_Ex
 
-    XY_Ex = fxHadp(X_Ex, Y_Ex, **kwargs)
-    fxAssert(X_Ex, Y_Ex, geq=XY_Ex, **kwargs)
+    XY_Ex = fxHadp(x_Ex, y_Ex, **kwargs)
 
-    if 0 == XY_Ex: # NOTE: Close to zero, not equal to zero.
-        return fxZero(**kwargs)
-
-    xHadpY_Ex = fxExpectation(W, fxHadp(X, Y, **kwargs), **kwargs)
-    fxAssert(X_Ex, Y_Ex, geq=xHadpY_Ex, **kwargs)
-
-    if xHadpY_Ex < XY_Ex:
-        return fxZero(**kwargs)
-
-    s = fxSub(xHadpY_Ex, XY_Ex, **kwargs)
-    fxAssert(s, leq=(fxOne(**kwargs) >> 2).astype(dtype1), **kwargs)
-
-    ret = (s * 4 + 3).astype(dtype1) # 4(s+1)-1 = 4s+3
-    assert np.isscalar(ret)
+    # 4(s+1)-1 = 4s+3, where s = |E[X*Y] - E[X]E[Y]|.
+    s = fxSub(np.maximum(xHadpY_Ex, XY_Ex), np.minimum(xHadpY_Ex, XY_Ex),
+              **kwargs).astype(np.int64)
+    isZero = (0 == x_Ex) | (0 == y_Ex) | (0 == XY_Ex)
+    ret = np.where(isZero, 0, np.minimum(s * 4 + 3, 2**nBits - 1)) \
+        .astype(dtype1)[()]
 
     fxAssert(ret, **kwargs)
     return ret
 # }}} def fxCov
 
+def fxMetricsFromEx(x_Ex, y_Ex, xHadpY_Ex, xDiffY_Ex, xDiffY2_Ex,
+                    x_Ex2, y_Ex2, **kwargs): # {{{
+    '''Calculate every metric from expectations only.
+
+    Take scalars or arrays of equal/broadcastable shape for
+    E[X], E[Y], E[X*Y], E[|X-Y|], E[|X-Y|^2], E[X^2], E[Y^2].
+    Return a dict of metric names to results of the same shape.
+
+    Each result is equal to the corresponding fx*() given the same
+    expectations.
+    '''
+    pre = {
+        "x_Ex": x_Ex,
+        "y_Ex": y_Ex,
+        "xHadpY_Ex": xHadpY_Ex,
+        "xDiffY_Ex": xDiffY_Ex,
+        "xDiffY2_Ex": xDiffY2_Ex,
+        "x_Ex2": x_Ex2,
+        "y_Ex2": y_Ex2,
+    }
+    kw = dict(kwargs, **pre)
+
+    # Every expectation is given so W, X, Y are never used, only the dtype
+    # and shape of X, Y for assertions.
+    X = np.asarray(xHadpY_Ex)
+    fs = {
+        "Cex": fxCex,
+        "Cls": fxCls,
+        "Cos": fxCos,
+        "Cov": fxCov,
+        "Dep": fxDep,
+        "Ham": fxHam,
+        "Tmt": fxTmt,
+    }
+
+    return {nm: f(None, X, X, **kw) for nm,f in fs.items()}
+# }}} def fxMetricsFromEx
+
+def fxAllMetrics(W, X, Y, **kwargs): # {{{
+    '''Every metric between arrays X and Y, from one pass over the data.
+
+    Take weights W and arrays X, Y of equal shape and equal dtype.
+    Return a dict of metric names to scalars, or arrays as fxEx().
+
+    The elementwise terms are stacked so that all weighted sums are taken
+    together, like ndAllMetrics().
+    Results are equal to calling fxCex(), fxCls(), etc. separately.
+    '''
+    fxAssert(X, Y, **kwargs)
+
+    xDiffY = fxAbsDiff(X, Y, **kwargs)
+    terms = np.stack((X, Y,
+                      fxHadp(X, Y, **kwargs),
+                      xDiffY,
+                      fxHadp(xDiffY, xDiffY, **kwargs),
+                      fxHadp(X, X, **kwargs),
+                      fxHadp(Y, Y, **kwargs)))
+
+    return fxMetricsFromEx(*fxEx(W, terms, **kwargs), **kwargs)
+# }}} def fxAllMetrics
+
 if __name__ == "__main__":
     assert False, "Not a standalone script."
@@ -3,9 +3,20 @@
 from __future__ import absolute_import
 from __future__ import division
 
+from collections import OrderedDict
 import hashlib
 import math
+import os
 import sys
+import tempfile
+import threading
+
+# Number of SVG strings kept in memory by identiconSpriteSvg().
+identiconCacheSize = 1024
+
+# { <digest>: <SVG string>, ... } in order of use, least recent first.
+_identiconCache = OrderedDict()
+_identiconCacheLock = threading.Lock()
 
 def identiconSprite(x, nRows=5, nCols=5): # {{{
     '''Generate a vertically symmetrical square boolean identicon.
@@ -60,13 +71,69 @@ def asciiart2dBool(x, t='#', f=' '): # {{{
     return '\n'.join((''.join([(t if r else f) for r in row])) for row in x)
 # }}} def asciiart2dBool
 
+def identiconDigest(x, **kwargs): # {{{
+    '''Return a hex string which identifies the SVG produced by
+       identiconSpriteSvg() for x and the same keyword arguments.
+
+    Used as a content address, so equal digests mean equal SVGs.
+    '''
+    kwargs.pop("cacheDir", None)
+    opts = sorted((k, tuple(v) if isinstance(v, list) else v) \
+                  for k,v in kwargs.items())
+
+    h = hashlib.md5(repr((str(x), opts)).encode())
+    return h.hexdigest()
+# }}} def identiconDigest
+
 def identiconSpriteSvg(x, **kwargs): # {{{
     '''Take a stringable object x and produce an SVG of a sprite identicon.
 
     nRows, nCols set the arrangement of squares comprising the sprite.
 
+    Results are memoized in an LRU of identiconCacheSize entries, keyed by
+    identiconDigest().
+    cacheDir optionally names a directory of SVG files, also keyed by
+    identiconDigest(), which is shared by all processes using it.
+    The directory is only used if it exists.
+
     NOTE: CSS can be used to set colors.
     '''
+    cacheDir = kwargs.pop("cacheDir", None)
+    digest = identiconDigest(x, **kwargs)
+
+    with _identiconCacheLock:
+        ret = _identiconCache.pop(digest, None)
+        if ret is not None:
+            _identiconCache[digest] = ret # Most recently used.
+            return ret
+
+    fname = None if cacheDir is None or not os.path.isdir(cacheDir) else \
+        os.path.join(cacheDir, digest + ".svg")
+
+    if fname is not None and os.path.isfile(fname):
+        with open(fname, 'r') as fd:
+            ret = fd.read()
+    else:
+        ret = _identiconSpriteSvg(x, **kwargs)
+
+        if fname is not None:
+            # Write then rename so other processes never read partial SVGs.
+            fd, tmpFname = tempfile.mkstemp(dir=cacheDir, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                f.write(ret)
+            os.rename(tmpFname, fname)
+
+    with _identiconCacheLock:
+        _identiconCache[digest] = ret
+        while len(_identiconCache) > identiconCacheSize:
+            _ = _identiconCache.popitem(last=False)
+
+    return ret
+# }}} def identiconSpriteSvg
+
+def _identiconSpriteSvg(x, **kwargs): # {{{
+    '''Implementation of identiconSpriteSvg, without caching.
+    '''
 
     nRows = kwargs.get("nRows", 5)
     nCols = kwargs.get("nCols", 5)
@@ -128,7 +195,7 @@ def identiconSpriteSvg(x, **kwargs): # {{{
         ret_.append('</svg>')
 
     return '\n'.join(ret_)
-# }}} def identiconSpriteSvg
+# }}} def _identiconSpriteSvg
 
 
 if __name__ == "__main__":
@@ -401,8 +401,38 @@ ptPairsDistance = functools.partial(_ptPairsOp, ptPairDistance)
 # TODO: bezPt, bezPts, bezAngle, bezLength
 # TODO: Support NumPy arrays as points.
 
-def subsample(x, factor, algorithm="xor", padding="reflect", prng=None): # {{{
-    '''Subsample axis0 of a NumPy ndarray `x` by an integer `factor`.
+samplePadding = [
+    "reflect",
+    "edge",
+    "wrap",
+    "minimum",
+    "maximum",
+    "mean",
+    "median",
+]
+
+def padMultiple(x, factor, axis=0, padding="reflect"): # {{{
+    '''Pad the end of one axis of a NumPy ndarray `x` to a multiple of `factor`
+       in length.
+
+    Return `x` unchanged if already a multiple.
+    `padding` is one of the NumPy-supported modes in samplePadding.
+    '''
+    assert padding in samplePadding, padding
+
+    nMissing = -x.shape[axis] % factor
+    if 0 == nMissing:
+        return x
+
+    padWidth = [(0, 0)] * x.ndim
+    padWidth[axis] = (0, nMissing)
+
+    return np.pad(x, padWidth, padding)
+# }}} def padMultiple
+
+def subsample(x, factor, algorithm="xor", padding="reflect", prng=None,
+              axis=0): # {{{
+    '''Subsample one axis of a NumPy ndarray `x` by an integer `factor`.
 
     Subsampling is where the value of a chosen element is used to represent the
     surrounding region.
@@ -411,6 +441,9 @@ def subsample(x, factor, algorithm="xor", padding="reflect", prng=None): # {{{
 
     Each result element is chosen from a base+offset where base defines the
     surrounding region.
+    The same offsets are used for every position on the other axes, so a 2D
+    array of many measures along axis=1 is subsampled in one call with the
+    same result as subsampling each row separately.
     `algorithm` in {uniform, xor} specifies how the offset is chosen.
       uniform:
         A uniform random offset is chosen for each region.
@@ -421,9 +454,9 @@ def subsample(x, factor, algorithm="xor", padding="reflect", prng=None): # {{{
 
     `prng` may supply a pseudo-random number generator which must have a
     '.next()' method.
-    If none is given then the standard library random.random() is used.
+    If none is given then the standard library random.randrange() is used.
 
-    Axis0 of `x` is padded to a multiple of `factor` in length using one of the
+    The axis is padded to a multiple of `factor` in length using one of the
     NumPy-supported modes.
       reflect:
         Pads with the reflection of the vector mirrored on the first and
@@ -438,63 +471,43 @@ def subsample(x, factor, algorithm="xor", padding="reflect", prng=None): # {{{
         Pads with the minimum/maximum/mean/median value of the vector along
         each axis.
     '''
-    l = x.shape[0]
+    assert isinstance(axis, int), type(axis)
+    assert -x.ndim <= axis < x.ndim, (axis, x.shape)
+    l = x.shape[axis]
     assert 0 < l, "x must contain at least one data point, length=%d." % l
 
     assert algorithm in ["uniform", "xor"], algorithm
-
-    allowedPadding = [
-        "reflect",
-        "minimum",
-        "maximum",
-        "mean",
-        "median",
-        "wrap",
-    ]
-    assert padding in allowedPadding, padding
+    assert padding in samplePadding, padding
 
     assert isinstance(factor, (int, long)), type(factor)
     assert 0 < factor, factor
     if factor == 1: return x
 
-    if prng is None:
-        prng = random
-        prng.next = functools.partial(prng.randrange, 0, factor)
-
-    # Pad x to multiple of factor in length.
-    nMissing = factor - (l % factor)
-    xPadded = np.pad(x, (0, nMissing), padding)
-    lPadded = xPadded.shape[0]
-    assert 0 == (lPadded % factor), (lPadded, xPadded.shape, factor, nMissing)
+    nxt = functools.partial(random.randrange, 0, factor) \
+        if prng is None else prng.next
 
-    k = lPadded // factor # Length of result.
+    xPadded = padMultiple(x, factor, axis, padding)
+    k = xPadded.shape[axis] // factor # Length of result.
     assert 0 < k, k
-    retShape = [k] + list(xPadded.shape[1:])
 
-    # Allocate uninitialized row in memory.
-    ret_ = np.empty(retShape, dtype=xPadded.dtype)
-
-    # Select and copy elements from x.
+    # Choose one offset into each region.
+    i = np.arange(k)
     if algorithm == "uniform":
-        for i in range(k):
-            offset = prng.next() % factor
-            assert 0 <= offset < factor
-            ret_[i] = xPadded[i*factor + offset]
+        offsets = np.fromiter((nxt() % factor for _ in range(k)),
+                              dtype=np.int64, count=k)
     elif algorithm == "xor":
         assert isPow2(factor), factor
-        r = prng.next() & (factor - 1)
-        for i in range(k):
-            offset = (i & (factor - 1)) ^ r
-            assert 0 <= offset < factor, (k, i, r, lPadded, offset, factor)
-            ret_[i] = xPadded[i*factor + offset]
+        r = nxt() & (factor - 1)
+        offsets = (i & (factor - 1)) ^ r
     else:
         assert False, "Unsupported algorithm: %s" % algorithm
+    assert np.all((0 <= offsets) & (offsets < factor))
 
-    return ret_
+    return np.take(xPadded, i*factor + offsets, axis=axis)
 # }}} def subsample
 
-def downsample(x, factor, algorithm="mean", padding="reflect"): # {{{
-    '''Downsample axis0 of a NumPy ndarray `x` by an integer `factor`.
+def downsample(x, factor, algorithm="mean", padding="reflect", axis=0): # {{{
+    '''Downsample one axis of a NumPy ndarray `x` by an integer `factor`.
 
     Downsampling is where some sort of average is used to represent a region.
     NOTE: Different from subsampling which selects and copies an element to
@@ -502,70 +515,44 @@ def downsample(x, factor, algorithm="mean", padding="reflect"): # {{{
 
     `algorithm` in {mean, median, min, max} specifies the type of average used
     to represent each region.
+    The result has the dtype of the NumPy reduction, i.e. floating point for
+    mean and median, or the dtype of `x` for min and max.
+    Other axes are independent, so a 2D array of many measures along axis=1
+    is downsampled in one call.
 
-    Axis0 of `x` is padded to a multiple of `factor` in length using one of the
-    NumPy-supported modes.
-      reflect:
-        Pads with the reflection of the vector mirrored on the first and
-        last values of the vector along each axis.
-      edge:
-        Pads with the edge values of array.
-      wrap:
-        Pads with the wrap of the vector along the axis.
-        The first values are used to pad the end and the end values are used to
-        pad the beginning.
-      minimum/maximum/mean/median:
-        Pads with the minimum/maximum/mean/median value of the vector along
-        each axis.
+    The axis is padded to a multiple of `factor` in length using one of the
+    NumPy-supported modes, as with subsample.
     '''
-    l = x.shape[0]
+    assert isinstance(axis, int), type(axis)
+    assert -x.ndim <= axis < x.ndim, (axis, x.shape)
+    l = x.shape[axis]
     assert 0 < l, "x must contain at least one data point, length=%d." % l
 
     assert algorithm in ["mean", "median", "min", "max"], algorithm
-
-    allowedPadding = [
-        "reflect",
-        "minimum",
-        "maximum",
-        "mean",
-        "median",
-        "wrap",
-    ]
-    assert padding in allowedPadding, padding
+    assert padding in samplePadding, padding
 
     assert isinstance(factor, (int, long)), type(factor)
     assert 0 < factor, factor
     if factor == 1: return x
 
-    # Pad x to multiple of factor in length.
-    nMissing = factor - (l % factor)
-    xPadded = np.pad(x, (0, nMissing), padding)
-    lPadded = xPadded.shape[0]
-    assert 0 == (lPadded % factor), (lPadded, xPadded.shape, factor, nMissing)
-
-    k = lPadded // factor # Length of result.
+    xPadded = padMultiple(x, factor, axis, padding)
+    axis %= xPadded.ndim
+    k = xPadded.shape[axis] // factor # Length of result.
     assert 0 < k, k
-    retShape = [k] + list(xPadded.shape[1:])
-
-    # Allocate uninitialized row in memory.
-    ret_ = np.empty(retShape, dtype=xPadded.dtype)
-
-    # Calculate averages from x to fill in result.
-    if algorithm in ["mean", "median", "min", "max"]:
-        f = {
-            "mean": np.mean,
-            "median": np.median,
-            "min": np.min,
-            "max": np.max,
-        }[algorithm]
-
-        for i in range(ds_l):
-            base = i * factor
-            ret[i] = f(X[base:base+factor])
-    else:
-        assert False, "Unsupported algorithm: %s" % algorithm
 
-    return ret_
+    # Split the axis into (<region>, <element of region>) then reduce over
+    # the elements of each region.
+    regions = xPadded.reshape(xPadded.shape[:axis] + (k, factor) +
+                              xPadded.shape[axis+1:])
+
+    f = {
+        "mean": np.mean,
+        "median": np.median,
+        "min": np.min,
+        "max": np.max,
+    }[algorithm]
+
+    return f(regions, axis=axis+1)
 # }}} def downsample
 
 if __name__ == "__main__":
@@ -2,6 +2,8 @@
 from __future__ import absolute_import
 from __future__ import division
 
+from contextlib import contextmanager
+import threading
 import numpy as np
 
 # TODO: eva
@@ -9,6 +11,43 @@ import numpy as np
 #   downsample
 #   deltashift
 
+# Nesting depth of ndTrusted() in each thread, non-zero means inputs are
+# already validated.
+_trusted = threading.local()
+
+def _trustedDepth(): # {{{
+    return getattr(_trusted, "depth", 0)
+# }}} def _trustedDepth
+
+def ndIsTrusted(**kwargs): # {{{
+    '''Return True if full-array checks on inputs should be skipped.
+
+    Either the trusted keyword is set, or inside an ndTrusted() context.
+    '''
+    return kwargs.get("trusted", False) or (0 < _trustedDepth())
+# }}} def ndIsTrusted
+
+@contextmanager
+def ndTrusted(): # {{{
+    '''Context manager for running nd*() and fx*() on data which has already
+       been validated, e.g. by rdEvs().
+
+    Shape/dtype checks are still done, but elementwise checks which make
+    extra full passes over the data are skipped.
+    Only calls in the same thread are affected.
+
+    E.g. Use like:
+        assert ndAssert(x, y)
+        with ndTrusted():
+            for ...: ndCov(w, x[...], y[...])
+    '''
+    _trusted.depth = _trustedDepth() + 1
+    try:
+        yield
+    finally:
+        _trusted.depth -= 1
+# }}} def ndTrusted
+
 def ndAssertScalarNorm(x, **kwargs): # {{{
     '''Assert x is a scalar in normal range [0, 1]
     '''
@@ -27,13 +66,16 @@ def ndAssert(*args, **kwargs): # {{{
 
     Optionally set the eq,leq,geq,lt,gt keywords to an array of the same shape
     as the NumPy arrays in args to assert comparison properties.
+
+    Elementwise checks are skipped with trusted, or inside ndTrusted().
     '''
     # Set to disable all elementwise numpy asserts, like when args is a
     # dummy because data comes from correlation counters.
     if kwargs.get("disable_ndAssert", False):
         return
 
-    assertRange = kwargs.get("assertRange", True)
+    trusted = ndIsTrusted(**kwargs)
+    assertRange = kwargs.get("assertRange", True) and not trusted
 
     for i,a in enumerate(args):
         b = args[i-1]
@@ -45,6 +87,8 @@ def ndAssert(*args, **kwargs): # {{{
         if assertRange:
             assert np.all(np.logical_and(0.0 <= a, a <= 1.0))
 
+    if trusted:
+        return True
 
     eq = kwargs.get("eq")
     if eq is not None:
@@ -124,6 +168,7 @@ def ndEx(w, x, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
     w_Area optionally provides pre-calculated sum of weights.
 
     https://en.wikipedia.org/wiki/Expected_value
@@ -154,6 +199,7 @@ def ndCex(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
     y_Ex optionally provides pre-calculated E[Y].
 
     https://en.wikipedia.org/wiki/Bayesian_inference
@@ -190,6 +236,7 @@ def ndHam(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
 
     https://en.wikipedia.org/wiki/Hamming_distance
     https://en.wikipedia.org/wiki/Expected_value
@@ -215,6 +262,7 @@ def ndTmt(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
 
     https://en.wikipedia.org/wiki/Jaccard_index
     https://en.wikipedia.org/wiki/Expected_value
@@ -249,6 +297,7 @@ def ndCls(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
 
     https://en.wikipedia.org/wiki/Closeness_(mathematics)
     https://en.wikipedia.org/wiki/Euclidean_distance
@@ -275,6 +324,7 @@ def ndCos(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
 
     https://en.wikipedia.org/wiki/Cosine_similarity
     https://en.wikipedia.org/wiki/Expected_value
@@ -310,6 +360,7 @@ def ndCov(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
 
     https://en.wikipedia.org/wiki/Variance
     https://en.wikipedia.org/wiki/Covariance
@@ -344,6 +395,7 @@ def ndDep(w, x, y, **kwargs): # {{{
     Return a scalar.
 
     assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
 
     https://en.wikipedia.org/wiki/Bayesian_inference
     https://en.wikipedia.org/wiki/Independence_(probability_theory)
@@ -367,5 +419,272 @@ def ndDep(w, x, y, **kwargs): # {{{
     return ret
 # }}} def ndDep
 
+def ndCovBound(x_Ex, y_Ex): # {{{
+    '''Upper bound of ndCov from only E[X] and E[Y].
+
+    Take scalars or ndarrays of equal/broadcastable shape.
+    Return the same shape.
+
+    For X, Y in [0, 1], E[XY] lies within the Frechet bounds:
+        max(0, E[X] + E[Y] - 1) <= E[XY] <= min(E[X], E[Y])
+    Bound is exact for real numbers so callers should allow for floating
+    point rounding.
+
+    https://en.wikipedia.org/wiki/Fr%C3%A9chet_inequalities
+    '''
+    x_Ex, y_Ex = np.asarray(x_Ex), np.asarray(y_Ex)
+    xy = x_Ex * y_Ex
+
+    ret = 4 * np.maximum(np.minimum(x_Ex, y_Ex) - xy,
+                         xy - np.maximum(0.0, x_Ex + y_Ex - 1.0))
+
+    return ret
+# }}} def ndCovBound
+
+def ndDepBound(x_Ex, y_Ex): # {{{
+    '''Upper bound of ndDep from only E[X] and E[Y].
+
+    Take scalars or ndarrays of equal/broadcastable shape.
+    Return the same shape.
+
+    E[X|Y] = E[XY]/E[Y] <= min(E[X], E[Y])/E[Y] so
+    Dep <= 1 - max(E[X], E[Y]), and Dep is 0 where E[X] or E[Y] is 0.
+    Bound is exact for real numbers so callers should allow for floating
+    point rounding.
+    '''
+    x_Ex, y_Ex = np.asarray(x_Ex), np.asarray(y_Ex)
+
+    ret = np.where(np.logical_and(0.0 < x_Ex, 0.0 < y_Ex),
+                   1.0 - np.maximum(x_Ex, y_Ex), 0.0)
+
+    return ret
+# }}} def ndDepBound
+
+def ndMetricsFromEx(x_Ex, y_Ex, xHadpY_Ex, xDiffY_Ex, xDiffY2_Ex,
+                    x_Ex2, y_Ex2): # {{{
+    '''Calculate every metric from expectations only.
+
+    Take scalars or ndarrays of equal/broadcastable shape for
+    E[X], E[Y], E[X*Y], E[|X-Y|], E[|X-Y|^2], E[X^2], E[Y^2].
+    Return a dict of metric names to results of the same shape.
+
+    Each result is equal to the corresponding nd*() given the same
+    expectations.
+    '''
+    x_Ex, y_Ex = np.asarray(x_Ex), np.asarray(y_Ex)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_Cex_Y = np.where(0.0 == y_Ex, np.nan, xHadpY_Ex / y_Ex)
+
+        tmtDenominator = x_Ex + y_Ex - xHadpY_Ex
+
+        ret = {
+            "Cex": x_Cex_Y,
+            "Cls": 1.0 - np.sqrt(np.maximum(0.0, xDiffY2_Ex)),
+            "Cos": np.where(np.logical_or(0.0 == x_Ex2, 0.0 == y_Ex2), 0.0,
+                            np.minimum(1.0, xHadpY_Ex /
+                                            (np.sqrt(x_Ex2) * np.sqrt(y_Ex2)))),
+            "Cov": 4 * np.fabs(xHadpY_Ex - (x_Ex * y_Ex)),
+            "Dep": np.where(x_Cex_Y > x_Ex, (x_Cex_Y - x_Ex) / x_Cex_Y, 0.0),
+            "Ham": 1.0 - xDiffY_Ex,
+            "Tmt": np.where(0.0 == tmtDenominator, 0.0,
+                            xHadpY_Ex / tmtDenominator),
+        }
+
+    # Unwrap 0d arrays to scalars.
+    return {nm: v[()] for nm,v in ret.items()}
+# }}} def ndMetricsFromEx
+
+def ndAllMetrics(w, x, y, **kwargs): # {{{
+    '''Every metric between ndarrays X and Y, from one pass over the data.
+
+    Take weights w and ndarrays x, y of equal shape.
+    Return a dict of metric names to scalars.
+
+    The elementwise terms are stacked so that all weighted sums are taken
+    together, rather than each nd*() making its own passes.
+    Results are equal to calling ndCex(), ndCls(), etc. separately.
+
+    assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
+    w_Area optionally provides pre-calculated sum of weights.
+    '''
+    assert ndAssert(w, x, y, **kwargs)
+
+    _w_Area = kwargs.get("w_Area", None)
+    w_Area = np.sum(w) if _w_Area is None else _w_Area
+    assert np.isscalar(w_Area), type(w_Area)
+
+    xDiffY = ndAbsDiff(x, y)
+    terms = np.stack((x, y,
+                      ndHadp(x, y),
+                      xDiffY,
+                      ndHadp(xDiffY, xDiffY),
+                      ndHadp(x, x),
+                      ndHadp(y, y)))
+
+    # Sum along the last axis of each row, like ndEx().
+    wHadpT_Areas = np.sum(ndHadp(w, terms), axis=-1)
+    (x_Ex, y_Ex, xHadpY_Ex, xDiffY_Ex, xDiffY2_Ex, x_Ex2, y_Ex2) = \
+        (wHadpT_Areas / w_Area) if 0.0 < abs(w_Area) else \
+        np.full(len(terms), w_Area)
+
+    ret = ndMetricsFromEx(x_Ex, y_Ex, xHadpY_Ex, xDiffY_Ex, xDiffY2_Ex,
+                          x_Ex2, y_Ex2)
+    assert all(ndAssertScalarNorm(v, allowNan=True) for v in ret.values())
+
+    return ret
+# }}} def ndAllMetrics
+
+def ndAllMetricsMatrix(w, X, Y, **kwargs): # {{{
+    '''Every metric between every row of X and every row of Y.
+
+    Take weights w of shape (n,), and ndarrays X of shape (m, n) and Y of
+    shape (k, n).
+    Return a dict of metric names to ndarrays of shape (m, k) where
+    ret[<name>][i][j] is the metric between X[i] and Y[j].
+
+    Weighted sums are taken with matrix multiplication over blocks of
+    samples, so memory is bounded and all pairs share each pass over the data.
+    Where both rows are binary E[|X-Y|] = E[|X-Y|^2] = E[X] + E[Y] - 2E[X*Y],
+    otherwise these are summed per row of X.
+    Results match ndAllMetrics() to within floating point rounding.
+
+    assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
+    w_Area optionally provides pre-calculated sum of weights.
+    '''
+    assert 1 == len(w.shape), w.shape
+    assert 2 == len(X.shape), X.shape
+    assert 2 == len(Y.shape), Y.shape
+    assert X.shape[1] == Y.shape[1] == w.shape[0], (w.shape, X.shape, Y.shape)
+    assert ndAssert(w, **kwargs)
+    assert ndAssert(X, **kwargs)
+    assert ndAssert(Y, **kwargs)
+
+    (m, n), k = X.shape, Y.shape[0]
+
+    _w_Area = kwargs.get("w_Area", None)
+    w_Area = np.sum(w) if _w_Area is None else _w_Area
+    assert np.isscalar(w_Area), type(w_Area)
+
+    def isBinary(A): # {{{
+        return np.ones(A.shape[0], dtype=np.bool_) if np.bool_ == A.dtype else \
+            np.all(np.logical_or(0 == A, 1 == A), axis=1)
+    # }}} def isBinary
+
+    isBinaryX, isBinaryY = isBinary(X), isBinary(Y)
+
+    x_Area, x2_Area = np.zeros(m), np.zeros(m)
+    y_Area, y2_Area = np.zeros(k), np.zeros(k)
+    xHadpY_Area = np.zeros((m, k))
+    xDiffY_Area = np.zeros((m, k))
+    xDiffY2_Area = np.zeros((m, k))
+
+    # Limit temporary float64 copies to around 8MiB.
+    blockSize = max(1, 2**20 // max(1, m + k))
+    for s in range(0, n, blockSize):
+        e = min(n, s + blockSize)
+        wB = w[s:e].astype(np.float64)
+        XB = X[:, s:e].astype(np.float64)
+        YB = Y[:, s:e].astype(np.float64)
+
+        wHadpXB = XB * wB
+        wHadpYB = YB * wB
+
+        x_Area += np.sum(wHadpXB, axis=1)
+        x2_Area += np.sum(wHadpXB * XB, axis=1)
+        y_Area += np.sum(wHadpYB, axis=1)
+        y2_Area += np.sum(wHadpYB * YB, axis=1)
+        xHadpY_Area += np.dot(wHadpXB, YB.T)
+
+        for i in range(m):
+            js = np.ones(k, dtype=np.bool_) if not isBinaryX[i] else \
+                 np.logical_not(isBinaryY)
+            if np.any(js):
+                xDiffYB = np.fabs(XB[i] - YB[js])
+                xDiffY_Area[i, js] += np.dot(xDiffYB, wB)
+                xDiffY2_Area[i, js] += np.dot(xDiffYB * xDiffYB, wB)
+
+    (x_Ex, x_Ex2, y_Ex, y_Ex2, xHadpY_Ex, xDiffY_Ex, xDiffY2_Ex) = \
+        ((a / w_Area) if 0.0 < abs(w_Area) else a \
+         for a in (x_Area, x2_Area, y_Area, y2_Area,
+                   xHadpY_Area, xDiffY_Area, xDiffY2_Area))
+
+    x_Ex, x_Ex2 = x_Ex[:, np.newaxis], x_Ex2[:, np.newaxis]
+    y_Ex, y_Ex2 = y_Ex[np.newaxis, :], y_Ex2[np.newaxis, :]
+
+    bothBinary = np.logical_and(isBinaryX[:, np.newaxis],
+                                isBinaryY[np.newaxis, :])
+    binaryDiffY_Ex = np.maximum(0.0, x_Ex + y_Ex - 2*xHadpY_Ex)
+    xDiffY_Ex = np.where(bothBinary, binaryDiffY_Ex, xDiffY_Ex)
+    xDiffY2_Ex = np.where(bothBinary, binaryDiffY_Ex, xDiffY2_Ex)
+
+    ret = ndMetricsFromEx(x_Ex, y_Ex, xHadpY_Ex, xDiffY_Ex, xDiffY2_Ex,
+                          x_Ex2, y_Ex2)
+
+    # Rounding in the sums may take results just outside [0, 1].
+    return {nm: np.clip(v, 0.0, 1.0) for nm,v in ret.items()}
+# }}} def ndAllMetricsMatrix
+
+def ndRollingEx(w, X, starts, **kwargs): # {{{
+    '''Expected value, E[X] of many windows along the last axis of X.
+
+    Take weights w of shape (n,), ndarray X of shape (..., N), and integer
+    start indices of windows.
+    Return an ndarray of shape (..., len(starts)) where
+    ret[..., j] = ndEx(w, X[..., starts[j]:starts[j]+n]).
+
+    With a rectangular window, where all weights are equal, the weighted sum
+    of every window is a difference of cumulative sums so the cost is
+    O(N + len(starts)) regardless of window size or overlap.
+    Integer and boolean X are summed exactly.
+    Otherwise, a strided view of the windows is multiplied by w in one
+    matmul.
+    Results match ndEx() to within floating point rounding.
+
+    assertRange optionally disables asserts allowing values in x outside [0,1].
+    trusted optionally skips elementwise asserts on already validated inputs.
+    w_Area optionally provides pre-calculated sum of weights.
+    '''
+    assert 1 == len(w.shape), w.shape
+    assert ndAssert(w, **kwargs)
+    assert ndAssert(X, **kwargs)
+
+    n, N = w.shape[0], X.shape[-1]
+
+    starts = np.asarray(starts, dtype=np.int64)
+    assert 1 == len(starts.shape), starts.shape
+    assert 0 == len(starts) or 0 <= np.min(starts), starts
+    assert 0 == len(starts) or np.max(starts) + n <= N, (starts, n, N)
+
+    _w_Area = kwargs.get("w_Area", None)
+    w_Area = np.sum(w) if _w_Area is None else _w_Area
+    assert np.isscalar(w_Area), type(w_Area)
+
+    if np.all(w == w[0]):
+        exact = X.dtype.kind in "bui"
+        C = np.zeros(X.shape[:-1] + (N + 1,),
+                     dtype=np.int64 if exact else np.float64)
+        np.cumsum(X, axis=-1, dtype=C.dtype, out=C[..., 1:])
+
+        wHadpX_Areas = (C[..., starts + n] - C[..., starts]) * w[0]
+    else:
+        # Read-only view of every window, windows[..., i, :] == X[..., i:i+n]
+        # NOTE: sliding_window_view() would be simpler but needs NumPy 1.20.
+        X = np.asarray(X)
+        windows = np.lib.stride_tricks.as_strided(X,
+            shape=X.shape[:-1] + (N - n + 1, n),
+            strides=X.strides + X.strides[-1:],
+            writeable=False)
+        wHadpX_Areas = np.matmul(windows[..., starts, :], w)
+
+    ret = (wHadpX_Areas / w_Area) \
+        if 0.0 < abs(w_Area) else \
+        np.full(wHadpX_Areas.shape, w_Area)
+
+    return ret
+# }}} def ndRollingEx
+
 if __name__ == "__main__":
     assert False, "Not a standalone script."
@@ -824,6 +824,34 @@ def rdMetadata(fname): # {{{
     return timejumps_, mapVarIdToTimejumps_, mapVarIdToNumChanges_
 # }}} def rdMetadata
 
+def mergeTimechunks(timechunks): # {{{
+    '''Merge consecutive timechunks referring to the same time.
+
+    Streaming equivalent of the merging performed by vcdClean, so input is
+    only read once, and may come from STDIN.
+    Where a varId changes multiple times, the last change wins.
+    Timechunks must already be in monotonic increasing time order, which is
+    the case for the output of most simulators.
+    '''
+    prevTime_, changes_ = None, {}
+
+    for newTime,changedVarIds,newValues in timechunks:
+        if newTime != prevTime_:
+            assert prevTime_ is None or prevTime_ < newTime, \
+                "Timechunk out of order at time %d, use vcdClean first." % \
+                newTime
+
+            if 0 < len(changes_):
+                yield (prevTime_, list(changes_.keys()), list(changes_.values()))
+
+            prevTime_, changes_ = newTime, {}
+
+        changes_.update(zip(changedVarIds, newValues))
+
+    if 0 < len(changes_):
+        yield (prevTime_, list(changes_.keys()), list(changes_.values()))
+# }}} def mergeTimechunks
+
 def vcdClean(fnamei, fnameo, comment=None): # {{{
     '''Read in VCD with forgiving reader and write out cleaned version with
        strict writer.
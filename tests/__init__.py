@@ -2,6 +2,7 @@
 from .test_base import *
 from .test_color import *
 from .test_fx import *
+from .test_identicon import *
 from .test_math import *
 from .test_nd import *
 from .test_prng import *
@@ -16,5 +17,14 @@ from .test_parvec import *
 from .test_vcd_utils import *
 
 # Tests for expeniments
+from .test_eva_cache import *
+from .test_eva_stats import *
 from .test_eva_common import *
 from .test_eva_init import *
+from .test_eva_precompute import *
+from .test_eva_shard import *
+from .test_eva_sparse import *
+from .test_eva_html_table import *
+from .test_eva_api import *
+from .test_eva_httpd import *
+from .test_eva_bench import *
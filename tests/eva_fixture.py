@@ -0,0 +1,55 @@
+from dmppl.experiments.eva.eva_common import \
+    appPaths, paths, initPaths, MeaDbWriter, saveVcdInfo
+from dmppl.base import Bunch, joinP
+from dmppl.toml import loadToml, saveToml
+import random
+import tempfile
+
+# Measures of a small random database, as used by most eva tests.
+randomNames = [
+    "event.orig.a",
+    "bstate.orig.b",
+    "bstate.refl.b",
+    "bstate.rise.b",
+    "bstate.fall.b",
+]
+
+def mkRandomMeaDb(names=randomNames, **cfgUpdates): # {{{
+    '''Create a database of 64 times of random changes to names, in a new
+       temporary directory, with the default config for windows of 16.
+
+    Names may be any of randomNames, then optionally "normal.orig.c".
+    cfgUpdates optionally change the config before it's saved.
+    Return (<temporary directory>, <cfg>), where the directory is for the
+    caller to remove.
+    '''
+    tstDir = tempfile.mkdtemp()
+    initPaths(joinP(tstDir, "foo"))
+
+    prng = random.Random(1)
+    times = list(range(64))
+    with MeaDbWriter(names) as meaDb:
+        for t in times:
+            b = prng.random() < 0.5
+            values = {
+                "event.orig.a": int(prng.random() < 0.3),
+                "bstate.orig.b": int(b),
+                "bstate.refl.b": int(not b),
+                "bstate.rise.b": 0,
+                "bstate.fall.b": 0,
+            }
+            if "normal.orig.c" in names:
+                values["normal.orig.c"] = prng.random()
+            meaDb.wrTimechunk((t, names, [values[nm] for nm in names]))
+
+    saveVcdInfo({"unitIntervalVarNames": names, "timechunkTimes": times})
+
+    cfg = Bunch(loadToml(appPaths.configDefault))
+    cfg.windowsize = 16
+    cfg.deltabk = 4
+    cfg.deltafw = 1
+    cfg.__dict__.update(cfgUpdates)
+    saveToml(cfg.__dict__, paths.fname_cfg)
+
+    return tstDir, cfg
+# }}} def mkRandomMeaDb
@@ -0,0 +1,276 @@
+from dmppl.experiments.eva.eva_common import *
+from dmppl.experiments.eva.eva_api import *
+import dmppl.experiments.eva.eva_httpd as httpd
+from dmppl.experiments.eva.eva_precompute import sortedDsfDeltas
+from dmppl.experiments.eva.eva_html_table import calculateTableData
+from dmppl.experiments.eva.eva_svg_netgraph import calculateEdges
+from dmppl.base import Bunch
+from .eva_fixture import mkRandomMeaDb
+import gzip
+import json
+import numpy as np
+import shutil
+import sys
+import threading
+import unittest
+
+if sys.version_info[0] == 3:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+
+class Test_apiEncode(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.meta = {"view": "table", 'a': "Cex", 'u': None}
+        self.arrays = {
+            "f": np.array([[0.5, np.nan, np.inf], [1.0, 0.0, -0.25]]),
+            "g": np.arange(5, dtype=np.uint32),
+            "h": np.array([-1, 2, -3], dtype=">i4"),
+            "e": np.zeros((2, 0)),
+        }
+
+    def test_Json(self):
+        result = json.loads(apiJson(self.meta, self.arrays).decode("utf-8"))
+
+        self.assertEqual(result["view"], "table")
+        self.assertIsNone(result['u'])
+        self.assertEqual(result["arrays"]["f"],
+                         [[0.5, None, None], [1.0, 0.0, -0.25]])
+        self.assertEqual(result["arrays"]["g"], [0, 1, 2, 3, 4])
+        self.assertEqual(result["arrays"]["h"], [-1, 2, -3])
+        self.assertEqual(result["arrays"]["e"], [[], []])
+
+    def test_Binary(self):
+        buf = apiBinary(self.meta, self.arrays)
+        self.assertEqual(buf[:4], b"EVAB")
+        self.assertEqual(0, len(buf) % 8)
+
+        meta, arrays = apiBinaryLoads(buf)
+        self.assertEqual(meta["view"], "table")
+        self.assertIsNone(meta['u'])
+        self.assertEqual(sorted(arrays.keys()), sorted(self.arrays.keys()))
+
+        for nm,arr in self.arrays.items():
+            self.assertIn(arrays[nm].dtype.byteorder, "<|=")
+            self.assertEqual(arrays[nm].shape, arr.shape)
+            self.assertTrue(np.array_equal(arrays[nm], arr, equal_nan=True))
+
+        # Offsets are aligned for JavaScript typed arrays.
+        hdrLen = int.from_bytes(buf[4:8], "little")
+        hdr = json.loads(buf[8:8+hdrLen].decode("utf-8"))
+        for d in hdr["arrays"]:
+            self.assertEqual(0, d["offset"] % 8)
+            self.assertLessEqual(8 + hdrLen, d["offset"])
+
+    def test_Etag(self):
+        request = {'a': "Cex", 'u': "16", 'fmt': "json"}
+        etag = apiEtag("abc", request)
+        self.assertEqual(etag, apiEtag("abc", dict(request)))
+        self.assertNotEqual(etag, apiEtag("abd", request))
+        self.assertNotEqual(etag, apiEtag("abc", request, "gzip"))
+        self.assertNotEqual(etag, apiEtag("abc", {'a': "Cex", 'u': "16",
+                                                  'fmt': "bin"}))
+
+        self.assertTrue(etagMatches(etag, etag))
+        self.assertTrue(etagMatches(etag, '"x", W/%s' % etag))
+        self.assertTrue(etagMatches(etag, '*'))
+        self.assertFalse(etagMatches(etag, '"x"'))
+        self.assertFalse(etagMatches(etag, None))
+
+# }}} class Test_apiEncode
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_evaApiBytes(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir, self.cfg = mkRandomMeaDb()
+
+        self.vcdInfo = loadVcdInfo()
+        self.dsfDeltas = sortedDsfDeltas(self.cfg)
+
+        self.args = Bunch({
+            "info": False,
+            "n_jobs": 1,
+            "httpd_port": 8080,
+            "httpd_timeout": 60.0,
+            "cache_mem": 0,
+            "cache_disk": 0,
+        })
+
+        # Cache from any previous test refers to a removed directory.
+        httpd.resultCache = None
+
+    def tearDown(self):
+        httpd.resultCache = None
+        shutil.rmtree(self.tstDir)
+
+    def request(self, **kwargs):
+        ret = {k: None for k in ('a', 'b', 'u', 'x', 'y', 'fmt')}
+        ret.update(kwargs)
+        return ret
+
+    def test_Table(self):
+        x = "event.orig.a"
+        golden = calculateTableData("Cov", "Dep", 16, x, None,
+                                    self.cfg, self.dsfDeltas, self.vcdInfo)
+
+        bufJson = httpd.evaApiBytes(self.args, self.cfg,
+            self.request(a="Cov", b="Dep", u="16", x=x))
+        resultJson = json.loads(bufJson.decode("utf-8"))
+
+        bufBin = httpd.evaApiBytes(self.args, self.cfg,
+            self.request(a="Cov", b="Dep", u="16", x=x, fmt="bin"))
+        meta, arrays = apiBinaryLoads(bufBin)
+
+        for result in (resultJson, meta):
+            self.assertEqual(result["view"], "table")
+            self.assertEqual(result["u"], 16)
+            self.assertEqual(result["varCol"], list(golden[3]))
+            self.assertEqual(result["dsfDeltas"],
+                             [list(sd) for sd in self.dsfDeltas])
+
+        self.assertTrue(np.array_equal(arrays["fnUXY"], golden[2],
+                                       equal_nan=True))
+        self.assertTrue(np.array_equal(arrays["xEx"], golden[0]))
+
+        fnUXY = np.array(resultJson["arrays"]["fnUXY"], dtype=np.float64)
+        self.assertTrue(np.array_equal(fnUXY, golden[2], equal_nan=True))
+
+    def test_TableVaryingU(self):
+        x, y = "event.orig.a", "bstate.orig.b"
+        golden = calculateTableData("Cex", None, None, x, y,
+                                    self.cfg, self.dsfDeltas, self.vcdInfo)
+
+        meta, arrays = apiBinaryLoads(httpd.evaApiBytes(self.args, self.cfg,
+            self.request(a="Cex", u="0", x=x, y=y, fmt="bin")))
+
+        self.assertIsNone(meta["u"])
+        self.assertNotIn("varCol", meta)
+        self.assertEqual(list(arrays["varCol"]), list(golden[3]))
+        self.assertTrue(np.array_equal(arrays["fnUXY"], golden[2],
+                                       equal_nan=True))
+
+        meta, arrays = apiBinaryLoads(httpd.evaApiBytes(self.args, self.cfg,
+            self.request(a="Cex", x=x, y=y, fmt="bin",
+                         page="1", rowsPerPage="3")))
+
+        self.assertEqual((meta["page"], meta["rowsPerPage"], meta["nPages"]),
+                         (1, 3, 2))
+        self.assertEqual(list(arrays["varCol"]), list(golden[3][3:]))
+        self.assertTrue(np.array_equal(arrays["fnUXY"], golden[2][:, 3:],
+                                       equal_nan=True))
+
+        # Assertions are caught first in debug mode.
+        with self.assertRaises((AssertionError, httpd.EvaHTMLException)):
+            httpd.evaApiBytes(self.args, self.cfg,
+                self.request(a="Cex", x=x, y=y, page="2", rowsPerPage="3"))
+
+    def test_Edges(self):
+        golden = list(calculateEdges("Ham", "Cos", 16,
+                                     self.cfg, self.dsfDeltas, self.vcdInfo))
+
+        meta, arrays = apiBinaryLoads(httpd.evaApiBytes(self.args, self.cfg,
+            self.request(a="Ham", b="Cos", u="16", fmt="bin")))
+
+        self.assertEqual(meta["view"], "edges")
+        self.assertEqual(len(golden), len(arrays["dstIdx"]))
+        for i,e in enumerate(golden):
+            self.assertEqual(meta["measureNames"][arrays["dstIdx"][i]],
+                             e["dstName"])
+            self.assertEqual(meta["measureNames"][arrays["srcIdx"][i]],
+                             e["srcName"])
+            self.assertEqual(arrays["srcDelta"][i], e["srcDelta"])
+            self.assertEqual(arrays["sampleFactor"][i], e["sampleFactor"])
+            self.assertEqual(arrays["dstEx"][i], e["dstEx"])
+            for nm in metricNames:
+                self.assertTrue(np.array_equal(arrays[nm][i], e[nm],
+                                               equal_nan=True))
+
+    def test_EdgesFixedPoint(self):
+        golden = list(calculateEdges("Cov", "Dep", 16,
+                                     self.cfg, self.dsfDeltas, self.vcdInfo))
+
+        self.cfg.fxbits = 16
+        meta, arrays = apiBinaryLoads(httpd.evaApiBytes(self.args, self.cfg,
+            self.request(a="Cov", b="Dep", u="16", fmt="bin")))
+
+        self.assertEqual(meta["fxbits"], 16)
+        self.assertEqual(len(golden), len(arrays["dstIdx"]))
+        for i,e in enumerate(golden):
+            self.assertEqual(meta["measureNames"][arrays["dstIdx"][i]],
+                             e["dstName"])
+            self.assertEqual(arrays["srcDelta"][i], e["srcDelta"])
+            self.assertAlmostEqual(arrays["dstEx"][i], e["dstEx"], places=4)
+            for nm in metricNames:
+                self.assertEqual(np.float64, arrays[nm].dtype)
+                self.assertAlmostEqual(arrays[nm][i], e[nm], delta=2**-8)
+
+    def test_EdgesMaxmem(self):
+        # Tiling under a memory budget doesn't change edges or their order.
+        for fxbits in (0, 16):
+            self.cfg.fxbits = fxbits
+            self.cfg.maxmem = 0
+            golden = list(calculateEdges("Cov", "Dep", 16,
+                                         self.cfg, self.dsfDeltas,
+                                         self.vcdInfo))
+            goldenHtml = httpd.evaHtmlString(self.args, self.cfg,
+                self.request(a="Cov", b="Dep", u="16"))
+
+            for maxmem in (1, 1000):
+                self.cfg.maxmem = maxmem
+                result = list(calculateEdges("Cov", "Dep", 16,
+                                             self.cfg, self.dsfDeltas,
+                                             self.vcdInfo))
+                self.assertLess(0, len(result))
+                self.assertEqual(len(golden), len(result))
+                for g,r in zip(golden, result):
+                    self.assertEqual(sorted(g.keys()), sorted(r.keys()))
+                    for k in g.keys():
+                        if isinstance(g[k], str):
+                            self.assertEqual(g[k], r[k])
+                        else:
+                            self.assertTrue(np.array_equal(g[k], r[k],
+                                                           equal_nan=True), k)
+
+                self.assertEqual(goldenHtml, httpd.evaHtmlString(self.args,
+                    self.cfg, self.request(a="Cov", b="Dep", u="16")))
+
+    def test_Httpd(self):
+        server = httpd.EvaHTTPServer(("127.0.0.1", 0),
+                                     httpd.EvaHTTPRequestHandler)
+        thread = threading.Thread(target=server.serve_forever,
+                                  args=(self.args, self.cfg))
+        thread.start()
+        try:
+            url = "http://127.0.0.1:%d/api?a=Cex&u=16&fmt=bin" % \
+                server.server_address[1]
+
+            with urlopen(Request(url)) as r:
+                self.assertEqual(r.status, 200)
+                self.assertEqual(r.headers["Content-Type"],
+                                 "application/octet-stream")
+                self.assertIsNone(r.headers["Content-Encoding"])
+                etag = r.headers["ETag"]
+                plain = r.read()
+
+            with urlopen(Request(url,
+                                 headers={"Accept-Encoding": "gzip"})) as r:
+                self.assertEqual(r.headers["Content-Encoding"], "gzip")
+                etagGzip = r.headers["ETag"]
+                self.assertEqual(plain, gzip.decompress(r.read()))
+            self.assertNotEqual(etag, etagGzip)
+
+            # Revalidation with a matching ETag has no body.
+            with self.assertRaises(HTTPError) as cm:
+                urlopen(Request(url, headers={"If-None-Match": etag}))
+            self.assertEqual(cm.exception.code, 304)
+
+            with self.assertRaises(HTTPError) as cm:
+                urlopen(Request(url.replace("fmt=bin", "fmt=xml")))
+            self.assertEqual(cm.exception.code, 404)
+        finally:
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+# }}} class Test_evaApiBytes
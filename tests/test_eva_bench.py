@@ -0,0 +1,90 @@
+from dmppl.experiments.eva.eva_common import __version__
+from dmppl.experiments.eva.eva_bench import *
+from dmppl.base import joinP
+import json
+import os
+import tempfile
+import shutil
+import sys
+import unittest
+
+class Test_scaledVcd(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        self.fnamei = joinP(self.tstDir, "foo.vcd")
+        with open(self.fnamei, 'w') as fd:
+            fd.write('\n'.join([
+                "$timescale 1ns $end",
+                "$var wire 1 ! a $end",
+                "$enddefinitions $end",
+                "$dumpvars",
+                "0!",
+                "$end",
+                "#0",
+                "1!",
+                "#15",
+                "0!",
+            ]) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def rdLines(self, fname):
+        with open(fname, 'r') as fd:
+            return fd.read().splitlines()
+
+    def test_One(self):
+        fnameo = joinP(self.tstDir, "bar.vcd")
+        scaledVcd(self.fnamei, fnameo, 1)
+        self.assertEqual(self.rdLines(self.fnamei), self.rdLines(fnameo))
+
+    def test_Timestep(self):
+        fnameo = joinP(self.tstDir, "bar.vcd")
+        scaledVcd(self.fnamei, fnameo, 3, timestep=10)
+        result = self.rdLines(fnameo)
+
+        # Header and $dumpvars only in the first copy.
+        self.assertEqual(1, result.count("$enddefinitions $end"))
+        self.assertEqual(1, result.count("$dumpvars"))
+
+        times = [int(line[1:]) for line in result if line.startswith('#')]
+        self.assertEqual([0, 15, 20, 35, 40, 55], times)
+
+# }}} class Test_scaledVcd
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_benchReport(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Basic2(self):
+        report = benchReport(["basic2"], [1, 2], self.tstDir)
+
+        # Report is suitable for JSON.
+        report = json.loads(json.dumps(report))
+        self.assertEqual(__version__, report["version"])
+
+        benchmarks = report["benchmarks"]
+        self.assertEqual([("basic2", 1), ("basic2", 2)],
+                         [(b["trace"], b["scale"]) for b in benchmarks])
+        self.assertLess(benchmarks[0]["lastTime"], benchmarks[1]["lastTime"])
+
+        for b in benchmarks:
+            self.assertEqual(["init"], list(b["phases"].keys()))
+            self.assertGreater(b["phases"]["init"]["wall"], 0.0)
+
+            views = set(r["view"] for r in b["requests"])
+            self.assertEqual({"netgraph", "tableU", "tableX", "tableY"}, views)
+
+            for r in b["requests"]:
+                self.assertLess(0, r["nBytes"])
+                self.assertEqual(1, r["warm"]["stages"]["counts"]["cacheHits"])
+
+        self.assertTrue(os.path.isdir(joinP(self.tstDir, "basic2_x2.eva")))
+
+# }}} class Test_benchReport
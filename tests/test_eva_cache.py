@@ -0,0 +1,150 @@
+from dmppl.experiments.eva.eva_common import paths, initPaths, saveVcdInfo
+from dmppl.experiments.eva.eva_cache import *
+from dmppl.base import Bunch, joinP, mkDirP
+import numpy as np
+import os
+import pickle
+import tempfile
+import shutil
+import sys
+import time
+import unittest
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_ResultCache(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        initPaths(joinP(self.tstDir, "foo"))
+        mkDirP(paths.dname_mea)
+        saveVcdInfo({"timechunkTimes": [0, 1]})
+
+        self.cfg = Bunch({"windowsize": 8, "epsilon": {"Cex": 0.1}})
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_MemLru(self):
+        arr = np.arange(100, dtype=np.float32)
+        nBytes = len(dumpsResult(arr))
+
+        # Only space for two arrays, and no disk.
+        cache = ResultCache(2*nBytes, 0)
+        fp = cache.validate(self.cfg)
+
+        self.assertIs(cache.put(fp, "a", arr), arr)
+        cache.put(fp, "b", arr + 1)
+        self.assertIsNotNone(cache.get(fp, "a")) # a now most recently used.
+        cache.put(fp, "c", arr + 2) # Evicts b.
+
+        self.assertIsNone(cache.get(fp, "b"))
+        self.assertTrue(np.array_equal(arr, cache.get(fp, "a")))
+        self.assertTrue(np.array_equal(arr + 2, cache.get(fp, "c")))
+        self.assertLessEqual(cache.memUsed, 2*nBytes)
+        self.assertFalse(os.path.exists(paths.dname_cache))
+
+    def test_Disk(self):
+        edges = [{"Cex": 0.5, "dstName": "x", "srcName": "y"}]
+
+        cacheA = ResultCache(2**20, 2**20)
+        fp = cacheA.validate(self.cfg)
+        cacheA.put(fp, ("edges", "Cex", None, 0), edges)
+
+        # Another process only shares the disk.
+        cacheB = ResultCache(2**20, 2**20)
+        self.assertEqual(fp, cacheB.validate(self.cfg))
+        self.assertEqual(edges, cacheB.get(fp, ("edges", "Cex", None, 0)))
+        self.assertIsNone(cacheB.get(fp, ("edges", "Cex", None, 1)))
+
+    def test_DiskBudget(self):
+        arr = np.arange(100, dtype=np.float32)
+        nBytes = len(dumpsResult(arr))
+
+        cache = ResultCache(0, 2*nBytes)
+        fp = cache.validate(self.cfg)
+        for i in range(5):
+            cache.put(fp, i, arr + i)
+
+        # Evicted down to the low water mark when over budget.
+        fnames = os.listdir(joinP(paths.dname_cache, fp))
+        self.assertEqual(1, len(fnames))
+        self.assertTrue(np.array_equal(arr + 4, cache.get(fp, 4)))
+
+        # The running total matches the directory, which is only scanned
+        # when over budget.
+        _listdir, os.listdir = os.listdir, None
+        try:
+            cache.put(fp, 5, arr + 5)
+        except TypeError:
+            self.fail("Scanned while under budget.")
+        finally:
+            os.listdir = _listdir
+        d = joinP(paths.dname_cache, fp)
+        self.assertEqual(2*nBytes, cache.diskUsed)
+        self.assertEqual(cache.diskUsed,
+                         sum(os.stat(joinP(d, fname)).st_size \
+                             for fname in os.listdir(d)))
+
+    def test_Encoding(self):
+        arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+        tableA = (arr, arr + 1, arr.reshape(1, 3, 4), [0, 16, 32])
+        tableB = (arr, arr, arr.reshape(1, 3, 4), [u"event.orig.a", u"b"])
+        edges = [{"Cex": float("nan"), 'a': "Cex", 'b': None,
+                  "srcDelta": -2, "dstName": "x", "srcName": "y"}]
+
+        # Results read from disk by another process have the same types.
+        cacheA = ResultCache(0, 2**20)
+        fp = cacheA.validate(self.cfg)
+        cacheB = ResultCache(0, 2**20)
+        self.assertEqual(fp, cacheB.validate(self.cfg))
+
+        for value in (tableA, tableB):
+            cacheA.put(fp, "table", value)
+            result = cacheB.get(fp, "table")
+            self.assertIsInstance(result, tuple)
+            for g,r in zip(value[:3], result[:3]):
+                self.assertEqual(g.dtype, r.dtype)
+                self.assertTrue(np.array_equal(g, r))
+            self.assertEqual(value[3], result[3])
+            self.assertIsInstance(result[3][0], type(value[3][0]))
+
+        cacheA.put(fp, "edges", edges)
+        result = cacheB.get(fp, "edges")
+        self.assertTrue(np.isnan(result[0].pop("Cex")))
+        self.assertEqual({k: v for k,v in edges[0].items() if k != "Cex"},
+                         result[0])
+
+        # Pickles, or anything else not written by the cache, are misses.
+        fname = cacheA.fname(fp, "pickle")
+        with open(fname, 'wb') as fd:
+            fd.write(pickle.dumps([1, 2, 3]))
+        self.assertIsNone(cacheB.get(fp, "pickle"))
+        for b in (dumpsResult(tableA)[:64], dumpsResult(arr)[:32]):
+            with open(fname, 'wb') as fd:
+                fd.write(b)
+            self.assertIsNone(cacheB.get(fp, "pickle"))
+
+    def test_Invalidate(self):
+        cache = ResultCache(2**20, 2**20)
+        fpA = cache.validate(self.cfg)
+        cache.put(fpA, "a", 123)
+
+        # Changing cfg gives a new fingerprint, removing old results.
+        self.cfg.windowsize = 16
+        fpB = cache.validate(self.cfg)
+        self.assertNotEqual(fpA, fpB)
+        self.assertIsNone(cache.get(fpB, "a"))
+        self.assertEqual([], os.listdir(paths.dname_cache))
+        cache.put(fpB, "a", 456)
+        self.assertEqual([fpB], os.listdir(paths.dname_cache))
+
+        # Rewriting the database also gives a new fingerprint.
+        time.sleep(0.01)
+        saveVcdInfo({"timechunkTimes": [0, 1, 2]})
+        fpC = cache.validate(self.cfg)
+        self.assertNotEqual(fpB, fpC)
+        self.assertIsNone(cache.get(fpC, "a"))
+        self.assertEqual({"nTimechunks": 3, "firstTime": 0, "lastTime": 2},
+                         cache.loadVcdInfo(fpC))
+
+# }}} class Test_ResultCache
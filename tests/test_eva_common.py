@@ -1,10 +1,14 @@
 from dmppl.experiments.eva.eva_common import *
+import dmppl.experiments.eva.eva_common as common
 from dmppl.base import rdTxt, Bunch, joinP, mkDirP
 from dmppl.test import runEntryPoint
+from dmppl.math import subsample
 from os import path
+import os
 import tempfile
 import shutil
 import sys
+import numpy as np
 import toml
 import unittest
 
@@ -78,6 +82,262 @@ class Test_meaSearch(unittest.TestCase): # {{{
 
 # }}} class Test_meaSearch
 
+class Test_rdEvs(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        initPaths(joinP(self.tstDir, "foo"))
+
+        names = ["bstate.orig.foo", "normal.orig.bar"]
+        with MeaDbWriter(names) as meaDb:
+            meaDb.wrTimechunk((3, names, [1, 0.25]))
+            meaDb.wrTimechunk((7, names, [0, 0.5]))
+            meaDb.wrTimechunk((8, names, [1, 0.75]))
+        self.names = names
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Basic0(self):
+        evs = rdEvs(self.names, 0, 12)
+        self.assertEqual([0,0,0,1,1,1,1,0,1,1,1,1],
+                         evs["bstate.orig.foo"].astype(int).tolist())
+        self.assertEqual([0,0,0,0.25,0.25,0.25,0.25,0.5,0.75,0.75,0.75,0.75],
+                         evs["normal.orig.bar"].tolist())
+
+    def test_Windows(self):
+        # Values before startTime are held, regardless of where reading
+        # starts.
+        golden = rdEvs(self.names, -4, 12)
+        for startTime in range(-4, 11):
+            evs = rdEvs(self.names, startTime, 12)
+            for nm in self.names:
+                self.assertEqual(golden[nm][startTime+4:].tolist(),
+                                 evs[nm].tolist(), (nm, startTime))
+
+    def test_NegativeIndex(self):
+        # The first change read is before startTime, at index -1, which must
+        # not wrap around to the end of the array.
+        evs = rdEvs(self.names, 4, 7)
+        self.assertEqual([1,1,1], evs["bstate.orig.foo"].astype(int).tolist())
+        self.assertEqual([0.25,0.25,0.25], evs["normal.orig.bar"].tolist())
+
+# }}} class Test_rdEvs
+
+class Test_meaPyramid(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        initPaths(joinP(self.tstDir, "foo"))
+
+        names = ["bstate.orig.foo", "normal.orig.bar"]
+        times = list(range(0, 100, 3))
+        with MeaDbWriter(names) as meaDb:
+            for t in times:
+                meaDb.wrTimechunk((t, names, [(t // 3) % 2, t / 128.0]))
+        saveVcdInfo({"unitIntervalVarNames": names, "timechunkTimes": times})
+        self.names = names
+        self.nTimes = times[-1] + 1
+
+        self.cfg = Bunch({"windowsize": 32, "deltabk": 8, "deltafw": 8,
+                          "deltazoom": 2})
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Levels(self):
+        meaPyramid(self.cfg)
+
+        dsfs = sorted(set(dsf for dsf,_ in cfgDsfDeltas(self.cfg)))
+        self.assertEqual([1, 2, 4], dsfs)
+        self.assertEqual(["2", "4"], sorted(os.listdir(paths.dname_pyramid)))
+
+        evs = rdEvs(self.names, 0, self.nTimes)
+        for dsf in dsfs[1:]:
+            sfEvs = rdEvs(self.names, 0, -(-self.nTimes // dsf), dsf=dsf)
+            for nm in self.names:
+                golden = subsample(evs[nm], dsf, prng=pyramidPrng(dsf))
+                self.assertEqual(golden.tolist(), sfEvs[nm].tolist(),
+                                 (nm, dsf))
+
+            # Any window is a slice of the whole level.
+            win = rdEvs(self.names, 5, 9, dsf=dsf)
+            for nm in self.names:
+                self.assertEqual(sfEvs[nm][5:9].tolist(), win[nm].tolist())
+
+    def test_Deterministic(self):
+        meaPyramid(self.cfg)
+        fname = joinP(paths.dname_pyramid, "4", self.names[1])
+        with open(fname, 'rb') as fd:
+            golden = fd.read()
+
+        shutil.rmtree(paths.dname_pyramid)
+        meaPyramid(self.cfg)
+        with open(fname, 'rb') as fd:
+            self.assertEqual(golden, fd.read())
+
+    def test_Chunked(self):
+        def rdLevels():
+            ret = {}
+            for dsf in os.listdir(paths.dname_pyramid):
+                for nm in self.names:
+                    with open(joinP(paths.dname_pyramid, dsf, nm), 'rb') as fd:
+                        ret[(dsf, nm)] = fd.read()
+            return ret
+
+        meaPyramid(self.cfg)
+        golden = rdLevels()
+
+        # Record the size of every read.
+        reads_ = []
+        def recordRdEvs(names, startTime, finishTime, *args, **kwargs):
+            reads_.append((len(names), startTime, finishTime))
+            return _rdEvs(names, startTime, finishTime, *args, **kwargs)
+        _rdEvs, _batchSamples = common.rdEvs, common.pyramidBatchSamples
+        common.rdEvs = recordRdEvs
+
+        try:
+            # Limits below one chunk of each level, between levels, and
+            # leaving tails shorter than a chunk.
+            for batchSamples in (1, 8, 20, 50, 99):
+                common.pyramidBatchSamples = batchSamples
+                shutil.rmtree(paths.dname_pyramid)
+                reads_ = []
+                meaPyramid(self.cfg)
+                self.assertEqual(golden, rdLevels(), batchSamples)
+
+                # Chunks are within the limit, except where a level needs a
+                # longer chunk, and never read past the end.
+                for nNames,startTime,finishTime in reads_:
+                    self.assertLessEqual(nNames * (finishTime - startTime),
+                                         max(batchSamples, 2 * 16), reads_)
+                    self.assertLessEqual(finishTime, self.nTimes)
+                self.assertLess(2, len(reads_))
+        finally:
+            common.rdEvs = _rdEvs
+            common.pyramidBatchSamples = _batchSamples
+
+# }}} class Test_meaPyramid
+
+class Test_VcdInfo(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        initPaths(joinP(self.tstDir, "foo"))
+        mkDirP(paths.outdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Basic0(self):
+        names = ["bstate.orig.foo", "normal.orig.bar"]
+        times = [0, 1, 5, 8, 13]
+        saveVcdInfo({"unitIntervalVarNames": names, "timechunkTimes": times})
+
+        # Only small fields are kept in TOML.
+        self.assertNotIn("timechunkTimes", toml.load(paths.fname_meainfo))
+
+        self.assertEqual({"unitIntervalVarNames": names,
+                          "nTimechunks": 5,
+                          "firstTime": 0,
+                          "lastTime": 13}, loadVcdInfo())
+
+        result = loadTimechunkTimes()
+        self.assertIsInstance(result, np.memmap)
+        self.assertEqual(times, result.tolist())
+
+    def test_Previous(self):
+        # Results from before signals.times.npy.
+        names = ["bstate.orig.foo"]
+        times = [2, 3, 7]
+        with open(paths.fname_meainfo, 'w') as fd:
+            toml.dump({"unitIntervalVarNames": names, "timechunkTimes": times},
+                      fd)
+
+        self.assertEqual({"unitIntervalVarNames": names,
+                          "nTimechunks": 3,
+                          "firstTime": 2,
+                          "lastTime": 7}, loadVcdInfo())
+        self.assertEqual(times, loadTimechunkTimes().tolist())
+
+    def test_Append(self):
+        names = ["bstate.orig.foo"]
+        saveVcdInfo({"unitIntervalVarNames": names,
+                     "timechunkTimes": [0, 1, 5, 8, 13]})
+
+        # Times from appendIdx are replaced by the new times.
+        saveVcdInfo({"unitIntervalVarNames": names,
+                     "timechunkTimes": [9, 10, 11],
+                     "appendIdx": 4})
+
+        self.assertEqual({"unitIntervalVarNames": names,
+                          "nTimechunks": 7,
+                          "firstTime": 0,
+                          "lastTime": 11}, loadVcdInfo())
+        self.assertEqual([0, 1, 5, 8, 9, 10, 11],
+                         loadTimechunkTimes().tolist())
+
+    def test_AppendPrevious(self):
+        # Results from before signals.times.npy are written in full.
+        names = ["bstate.orig.foo"]
+        with open(paths.fname_meainfo, 'w') as fd:
+            toml.dump({"unitIntervalVarNames": names,
+                       "timechunkTimes": [2, 3, 7]}, fd)
+
+        saveVcdInfo({"unitIntervalVarNames": names,
+                     "timechunkTimes": [4, 5],
+                     "appendIdx": 2})
+
+        self.assertEqual([2, 3, 4, 5], loadTimechunkTimes().tolist())
+        self.assertEqual(4, loadVcdInfo()["nTimechunks"])
+
+# }}} class Test_VcdInfo
+
+class Test_appendNpy(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        self.fname = joinP(self.tstDir, "foo.npy")
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_InPlace(self):
+        np.save(self.fname, np.arange(10, dtype=np.int64))
+
+        # Elements before idx aren't written again.
+        with open(self.fname, 'r+b') as fd:
+            fd.seek(-10*8, os.SEEK_END)
+            fd.write(np.full(3, 7, dtype=np.int64).tobytes())
+
+        result = appendNpy(self.fname, 3, [30, 40])
+        self.assertEqual([7, 7, 7, 30, 40], result.tolist())
+        self.assertEqual(result.tolist(), np.load(self.fname).tolist())
+
+        result = appendNpy(self.fname, 5, np.arange(100, 1100))
+        self.assertEqual(1005, len(result))
+        self.assertEqual(list(range(100, 1100)), result[5:].tolist())
+
+        result = appendNpy(self.fname, 0, [])
+        self.assertEqual(0, len(np.load(self.fname)))
+
+    def test_Rewrite(self):
+        # Header without padding, so it must grow.
+        arr = np.arange(9, dtype=np.int64)
+        header = repr({"descr": np.lib.format.dtype_to_descr(arr.dtype),
+                       "fortran_order": False,
+                       "shape": arr.shape}).encode("latin1") + b'\n'
+        with open(self.fname, 'wb') as fd:
+            fd.write(np.lib.format.magic(1, 0))
+            fd.write(np.uint16(len(header)).astype("<u2").tobytes())
+            fd.write(header)
+            fd.write(arr.tobytes())
+
+        result = appendNpy(self.fname, 9, [10, 11])
+        self.assertEqual(list(range(9)) + [10, 11], result.tolist())
+
+# }}} class Test_appendNpy
+
 class Test_dsfDeltas(unittest.TestCase): # {{{
 
     def test_Basic0(self):
@@ -275,6 +535,72 @@ class Test_dsfDeltas(unittest.TestCase): # {{{
 
 # }}} class Test_dsfDeltas
 
+class Test_winStartTimes(unittest.TestCase): # {{{
+
+    def test_Paged(self):
+        for startTime,finishTime,winSize,winOverlap in \
+                ((0, 64, 16, 0), (5, 100, 8, 3), (10, 11, 4, 0)):
+            golden = winStartTimes(startTime, finishTime, winSize, winOverlap)
+
+            for rowsPerPage in (1, 3, 4, 100):
+                nPages = nWinPages(startTime, finishTime, winSize, winOverlap,
+                                   rowsPerPage)
+
+                pages = [winStartTimes(startTime, finishTime,
+                                       winSize, winOverlap,
+                                       page, rowsPerPage) \
+                         for page in range(nPages + 1)]
+
+                self.assertTrue(all(0 < len(p) <= rowsPerPage \
+                                    for p in pages[:-1]))
+                self.assertEqual(pages[-1], [])
+                self.assertEqual(golden, sum(pages, []))
+
+# }}} class Test_winStartTimes
+
+class Test_metric(unittest.TestCase): # {{{
+
+    def test_Trusted(self):
+        # Inputs are validated unless trusted is requested.
+        x = np.linspace(0.0, 1.0, 16)
+        y = x.copy()
+        y[3] = 1.5 # Outside [0, 1]
+
+        self.assertRaises(AssertionError, metric("Cov", 16, 2), x, y)
+        self.assertRaises(AssertionError, allMetrics(16, 2), x, y)
+        _ = metric("Cov", 16, 2, trusted=True)(x, y)
+        _ = allMetrics(16, 2, trusted=True)(x, y)
+
+# }}} class Test_metric
+
+class Test_maxmemBlocks(unittest.TestCase): # {{{
+
+    def test_Unlimited(self):
+        items = list("abcdef")
+        self.assertEqual([items], maxmemBlocks(items, 100, 0))
+        self.assertEqual([], maxmemBlocks([], 100, 10))
+
+    def test_Greedy(self):
+        items = list("abcdef")
+        self.assertEqual([["a", "b"], ["c", "d"], ["e", "f"]],
+                         maxmemBlocks(items, 4, 10))
+        self.assertEqual([["a", "b"], ["c"], ["d"], ["e", "f"]],
+                         maxmemBlocks(items, [8, 1, 2, 9, 5, 5], 10))
+
+    def test_Oversize(self):
+        # Every block has at least one item, even when it's too large.
+        items = list("abc")
+        self.assertEqual([["a"], ["b"], ["c"]], maxmemBlocks(items, 11, 10))
+
+    def test_MaxLen(self):
+        items = list(range(7))
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]],
+                         maxmemBlocks(items, 1, 0, maxLen=3))
+        self.assertEqual([[0, 1], [2, 3], [4, 5], [6]],
+                         maxmemBlocks(items, 1, 2, maxLen=3))
+
+# }}} class Test_maxmemBlocks
+
 class Test_measureSiblings(unittest.TestCase): # {{{
 
     def test_Event0(self):
@@ -0,0 +1,151 @@
+from dmppl.experiments.eva.eva_common import *
+from dmppl.experiments.eva.eva_html_table import *
+from .eva_fixture import mkRandomMeaDb, randomNames
+import numpy as np
+import shutil
+import sys
+import unittest
+
+@unittest.skipIf(sys.version_info < (3, 8), "Shared memory requires 3.8+")
+class Test_calculateTableData(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir, self.cfg = mkRandomMeaDb(randomNames + ["normal.orig.c"])
+
+        self.vcdInfo = loadVcdInfo()
+        self.dsfDeltas = sorted(cfgDsfDeltas(self.cfg),
+                                key=lambda dsf_d: dsf_d[1])
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Parallel(self):
+        x, y = "event.orig.a", "normal.orig.c"
+
+        for a,b in (("Cex", None), ("Cov", "Dep")):
+            for u,x_,y_ in ((16, x, None), (32, None, y), (None, x, y)):
+                golden = calculateTableData(a, b, u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo)
+                result = calculateTableData(a, b, u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo, nJobs=2)
+
+                self.assertTrue(np.array_equal(golden[2], result[2],
+                                               equal_nan=True))
+                self.assertEqual(list(golden[3]), list(result[3]))
+
+    def test_Paged(self):
+        x, y = "event.orig.a", "normal.orig.c"
+
+        golden = calculateTableData("Cov", "Dep", None, x, y,
+                                    self.cfg, self.dsfDeltas, self.vcdInfo)
+
+        nPages = nWinPages(self.vcdInfo["firstTime"], self.vcdInfo["lastTime"],
+                           self.cfg.windowsize, self.cfg.windowoverlap, 3)
+        self.assertEqual(nPages, 2)
+
+        results = [calculateTableData("Cov", "Dep", None, x, y,
+                                      self.cfg, self.dsfDeltas, self.vcdInfo,
+                                      page=page, rowsPerPage=3) \
+                   for page in range(nPages)]
+        self.assertEqual([len(r[3]) for r in results], [3, 1])
+
+        for i in range(3):
+            result = np.concatenate([r[i] for r in results], axis=-2)
+            self.assertTrue(np.array_equal(golden[i], result, equal_nan=True))
+        self.assertEqual(list(golden[3]), sum((list(r[3]) for r in results), []))
+
+    def test_Rolling(self):
+        # Golden values are calculated per cell from separate windows.
+        for alpha,overlap in ((0, 0), (0, 8), (2, 0), (2, 12)):
+            self.cfg.windowalpha = alpha
+            self.cfg.windowoverlap = overlap
+
+            for x,y in (("event.orig.a", "bstate.orig.b"),
+                        ("bstate.refl.b", "normal.orig.c")):
+
+                xEx, yEx, fnUXY, varCol = \
+                    calculateTableData("Cov", "Cls", None, x, y,
+                                       self.cfg, self.dsfDeltas, self.vcdInfo)
+
+                evs = rdEvs(measureSiblings(x) + measureSiblings(y),
+                            -self.cfg.deltabk,
+                            varCol[-1] + self.cfg.windowsize +
+                            self.cfg.deltafw + 1, 0)
+                fns = [metric(nm, self.cfg.windowsize, alpha) \
+                       for nm in ("Cov", "Cls")]
+                fnEx = metric("Ex", self.cfg.windowsize, alpha)
+
+                for rowNum,u in enumerate(varCol):
+                    i = u + self.cfg.deltabk
+                    xWin = evs[x][i:i+self.cfg.windowsize]
+
+                    for colNum,nm in enumerate(measureSiblings(x)):
+                        self.assertAlmostEqual(xEx[rowNum][colNum],
+                            fnEx(evs[nm][i:i+self.cfg.windowsize]), places=6)
+
+                    for colNum,(dsf,d) in enumerate(self.dsfDeltas):
+                        yWin = evs[y][i+d:i+d+self.cfg.windowsize]
+                        for fnNum,fn in enumerate(fns):
+                            self.assertAlmostEqual(fnUXY[fnNum][rowNum][colNum],
+                                                   fn(xWin, yWin), places=6)
+
+    def test_FixedPoint(self):
+        # Results are returned as floats, close to the floating point
+        # implementation where that is defined.
+        x, y = "event.orig.a", "normal.orig.c"
+
+        for a,b in (("Cov", "Dep"), ("Ham", "Tmt")):
+            for u,x_,y_ in ((16, x, None), (32, None, y), (None, x, y)):
+                self.cfg.fxbits = 0
+                golden = calculateTableData(a, b, u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo)
+
+                self.cfg.fxbits = 16
+                result = calculateTableData(a, b, u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo)
+                resultParallel = calculateTableData(a, b, u, x_, y_,
+                                                    self.cfg, self.dsfDeltas,
+                                                    self.vcdInfo, nJobs=2)
+
+                self.assertTrue(np.array_equal(result[2], resultParallel[2]))
+                self.assertEqual(list(golden[3]), list(result[3]))
+                for g,r in zip(golden[:3], result[:3]):
+                    self.assertEqual(np.float32, r.dtype)
+                    # Padding is NaN, not uninitialized.
+                    self.assertTrue(np.array_equal(np.isnan(g), np.isnan(r)))
+                    isDefined = np.isfinite(g)
+                    self.assertTrue(np.all(np.abs(g - r)[isDefined] < 2**-10))
+
+    def test_Maxmem(self):
+        # Blocks of rows under a memory budget give the same results.
+        x, y = "event.orig.a", "normal.orig.c"
+
+        for fxbits in (0, 16):
+            self.cfg.fxbits = fxbits
+
+            for u,x_,y_ in ((16, x, None), (None, x, y)):
+                self.cfg.maxmem = 0
+                golden = calculateTableData("Cov", "Dep", u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo)
+
+                self.cfg.maxmem = 1
+                result = calculateTableData("Cov", "Dep", u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo)
+
+                self.assertEqual(list(golden[3]), list(result[3]))
+                for g,r in zip(golden[:3], result[:3]):
+                    self.assertEqual(g.shape, r.shape)
+                    if 0 < fxbits:
+                        self.assertTrue(np.array_equal(g, r, equal_nan=True))
+                    else:
+                        # Rolling sums are rounded differently in each block.
+                        self.assertTrue(np.allclose(g, r, atol=1e-6,
+                                                    equal_nan=True))
+
+# }}} class Test_calculateTableData
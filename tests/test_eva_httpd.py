@@ -0,0 +1,518 @@
+from dmppl.experiments.eva.eva_common import *
+import dmppl.experiments.eva.eva_httpd as httpd
+from dmppl.experiments.eva.eva_precompute import sortedDsfDeltas
+from dmppl.experiments.eva.eva_svg_netgraph import calculateEdges
+from dmppl.base import Bunch
+from .eva_fixture import mkRandomMeaDb
+import gzip
+import json
+import socket
+import shutil
+import sys
+import threading
+import time
+import unittest
+
+if sys.version_info[0] == 3:
+    from http.client import HTTPConnection, IncompleteRead
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_EvaHTTPServer(unittest.TestCase): # {{{
+
+    # Calculations in handler threads, or with more, in worker processes.
+    nJobs = 1
+
+    def setUp(self):
+        self.tstDir, self.cfg = mkRandomMeaDb()
+
+        self.vcdInfo = loadVcdInfo()
+        self.dsfDeltas = sortedDsfDeltas(self.cfg)
+
+        self.args = Bunch({
+            "info": False,
+            "n_jobs": self.nJobs,
+            "httpd_port": 8080,
+            "httpd_timeout": 60.0,
+            "cache_mem": 2**20,
+            "cache_disk": 0,
+        })
+
+        # Cache from any previous test refers to a removed directory.
+        httpd.resultCache = None
+
+        self.server = httpd.EvaHTTPServer(("127.0.0.1", 0),
+                                          httpd.EvaHTTPRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(self.args, self.cfg))
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        httpd.resultCache = None
+        shutil.rmtree(self.tstDir)
+
+    def request(self, **kwargs):
+        ret = {k: None for k in ('a', 'b', 'u', 'x', 'y')}
+        ret.update(kwargs)
+        return ret
+
+    def get(self, path, headers={}):
+        conn = HTTPConnection(*self.server.server_address)
+        try:
+            conn.request("GET", path, headers=headers)
+            r = conn.getresponse()
+            return r.status, dict(r.getheaders()), r.read()
+        finally:
+            conn.close()
+
+    def test_Chunked(self):
+        golden = httpd.evaHtmlString(self.args, self.cfg,
+            self.request(a="Cex", u="16", x="event.orig.a"))
+
+        status, headers, body = self.get("/?a=Cex&u=16&x=event.orig.a")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers.get("Transfer-Encoding"), "chunked")
+        self.assertNotIn("Content-Length", headers)
+        self.assertEqual(golden, body.decode("utf-8"))
+
+    def test_Gzip(self):
+        golden = httpd.evaHtmlString(self.args, self.cfg,
+            self.request(a="Cov", b="Dep", x="event.orig.a",
+                         y="bstate.orig.b"))
+
+        status, headers, body = \
+            self.get("/?a=Cov&b=Dep&x=event.orig.a&y=bstate.orig.b",
+                     {"Accept-Encoding": "gzip"})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers.get("Content-Encoding"), "gzip")
+        self.assertEqual(golden, gzip.decompress(body).decode("utf-8"))
+
+    def test_Netgraph(self):
+        # Edges are calculated while streaming, then cached.
+        status, headers, body = self.get("/?a=Ham&b=Cos&u=16")
+        self.assertEqual(status, 200)
+
+        cache = httpd.resultCache
+        cached = cache.get(cache.validate(self.cfg), ("edges", "Ham", "Cos", 16))
+        golden = list(calculateEdges("Ham", "Cos", 16,
+                                     self.cfg, self.dsfDeltas, self.vcdInfo))
+        self.assertLess(0, len(golden))
+        self.assertEqual(len(golden), len(cached))
+        for g,c in zip(golden, cached):
+            self.assertEqual(g["dstName"], c["dstName"])
+            self.assertEqual(g["srcName"], c["srcName"])
+            self.assertEqual(g["srcDelta"], c["srcDelta"])
+
+        self.assertEqual(httpd.evaHtmlString(self.args, self.cfg,
+                                             self.request(a="Ham", b="Cos",
+                                                          u="16")),
+                         body.decode("utf-8"))
+
+        # Each identicon is embedded once, by its sibling group.
+        baseNames = set(measureNameParts(nm)[2] \
+                        for nm in self.vcdInfo["unitIntervalVarNames"])
+        for bn in baseNames:
+            self.assertEqual(1, body.count(("<title>%s</title>" % bn) \
+                                           .encode("utf-8")))
+        self.assertEqual(0, body.count(b"<use "))
+
+    def test_KeepAlive(self):
+        conn = HTTPConnection(*self.server.server_address)
+        try:
+            for path,golden in (("/?a=Cex&u=16&x=event.orig.a", 200),
+                                ("/foo.txt", 404),
+                                ("/?a=Cex&u=0&y=bstate.orig.b", 200)):
+                conn.request("GET", path)
+                r = conn.getresponse()
+                r.read()
+                self.assertEqual(r.status, golden)
+
+                # Errors close the connection.
+                if 200 != r.status:
+                    conn.close()
+                    conn = HTTPConnection(*self.server.server_address)
+        finally:
+            conn.close()
+
+    def test_Http10(self):
+        s = socket.create_connection(self.server.server_address)
+        try:
+            s.sendall(b"GET /?a=Cex&u=16&x=event.orig.a HTTP/1.0\r\n\r\n")
+            response_ = []
+            while True:
+                b = s.recv(4096)
+                if 0 == len(b):
+                    break
+                response_.append(b)
+        finally:
+            s.close()
+
+        head, body = b''.join(response_).split(b"\r\n\r\n", 1)
+        self.assertNotIn(b"chunked", head)
+        self.assertIn(b"Content-Length: %d" % len(body), head)
+
+    def test_Stats(self):
+        # Statistics are added after each response is sent, so requests on
+        # one connection are handled in order by the same thread.
+        conn = HTTPConnection(*self.server.server_address)
+
+        def get(path):
+            conn.request("GET", path)
+            r = conn.getresponse()
+            return r.status, dict(r.getheaders()), r.read()
+
+        try:
+            status, headers, _ = get("/?a=Cov&b=Dep&u=16")
+            self.assertEqual(status, 200)
+
+            # Only stages before the body are in the header, but the network
+            # graph is calculated while it's streamed.
+            self.assertIn("rdEvs;dur=", headers["Server-Timing"])
+            self.assertEqual("Server-Timing", headers["Trailer"])
+
+            # Tables are calculated before the body.
+            status, headers, _ = get("/api?a=Cex&u=16&x=event.orig.a")
+            self.assertEqual(status, 200)
+            timing = dict(m.split(';', 1) \
+                          for m in headers["Server-Timing"].split(", "))
+            self.assertNotEqual('desc="0"', timing["pairsEvaluated"])
+            self.assertNotEqual('desc="0"', timing["bytesRead"])
+
+            # Cached result of the first request.
+            self.assertEqual(200, get("/?a=Cov&b=Dep&u=16")[0])
+
+            status, headers, body = get("/stats")
+            self.assertEqual(status, 200)
+            self.assertEqual("application/json", headers["Content-Type"])
+        finally:
+            conn.close()
+
+        result = json.loads(body.decode("utf-8"))
+        self.assertEqual(3, result["nRequests"])
+        self.assertEqual(["?a=Cov&b=Dep&u=16",
+                          "api?a=Cex&u=16&x=event.orig.a",
+                          "?a=Cov&b=Dep&u=16"],
+                         [r["path"] for r in result["recent"]])
+
+        first, _, cached = result["recent"]
+        self.assertLess(0, first["counts"]["pairsEvaluated"])
+        self.assertLess(0, first["wall"]["metrics"])
+        self.assertLess(0, first["wall"]["send"])
+        self.assertEqual(0, first["counts"]["cacheHits"])
+        self.assertEqual(0, cached["counts"]["pairsEvaluated"])
+        self.assertEqual(1, cached["counts"]["cacheHits"])
+        self.assertEqual(1, result["counts"]["cacheHits"])
+
+# }}} class Test_EvaHTTPServer
+
+def slowWorker(fn, args, cfg, request): # {{{
+    '''Like evaWorker, but taking at least slowWorkerSeconds.
+    '''
+    time.sleep(slowWorkerSeconds)
+    return _evaWorker(fn, args, cfg, request)
+# }}} def slowWorker
+
+def slowEdges(*args, **kwargs): # {{{
+    '''Like calculateEdges, but taking slowWorkerSeconds before the first
+       edge.
+    '''
+    time.sleep(slowWorkerSeconds)
+    for edge in _calculateEdges(*args, **kwargs):
+        yield edge
+# }}} def slowEdges
+
+def pollingSleep(): # {{{
+    '''Sleep for slowWorkerSeconds, polling for abandonment like a long
+       calculation.
+    '''
+    tmStart = time.time()
+    while time.time() - tmStart < slowWorkerSeconds:
+        pollAbandon()
+        time.sleep(httpd.httpdPollPeriod / 4)
+# }}} def pollingSleep
+
+def pollingEdges(*args, **kwargs): # {{{
+    '''Like calculateEdges, but polling for slowWorkerSeconds before the
+       first edge.
+    '''
+    pollingSleep()
+    for edge in _calculateEdges(*args, **kwargs):
+        yield edge
+# }}} def pollingEdges
+
+def pollingTableData(*args, **kwargs): # {{{
+    '''Like calculateTableData, but polling for slowWorkerSeconds first.
+    '''
+    pollingSleep()
+    return _calculateTableData(*args, **kwargs)
+# }}} def pollingTableData
+
+def recordAbandoned(tc): # {{{
+    '''Record each response abandoned by timeout or disconnection in
+       tc.abandoned_, and restore anything patched by the test.
+    '''
+    tc.abandoned_ = []
+    checkAbandoned = httpd.EvaHTTPRequestHandler.checkAbandoned
+
+    def recordingCheckAbandoned(handler, tmStart):
+        try:
+            checkAbandoned(handler, tmStart)
+        except Exception as e:
+            tc.abandoned_.append((type(e), time.time()))
+            raise
+
+    def restore():
+        httpd.evaWorker = _evaWorker
+        httpd.calculateEdges = _calculateEdges
+        httpd.calculateTableData = _calculateTableData
+        httpd.EvaHTTPRequestHandler.checkAbandoned = checkAbandoned
+    tc.addCleanup(restore)
+    httpd.EvaHTTPRequestHandler.checkAbandoned = recordingCheckAbandoned
+# }}} def recordAbandoned
+
+_evaWorker = httpd.evaWorker
+_calculateEdges = httpd.calculateEdges
+_calculateTableData = httpd.calculateTableData
+slowWorkerSeconds = 1.0
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_EvaHTTPPool(unittest.TestCase): # {{{
+
+    nJobs = 2
+
+    tearDown = Test_EvaHTTPServer.tearDown
+    request = Test_EvaHTTPServer.request
+    get = Test_EvaHTTPServer.get
+
+    def setUp(self):
+        recordAbandoned(self)
+        Test_EvaHTTPServer.setUp(self)
+
+        # Pool is ready before any requests.
+        self.assertEqual(200, self.get("/stats")[0])
+        self.assertIsNotNone(self.server.pool)
+
+    def slowPool(self, worker=slowWorker, edges=_calculateEdges):
+        '''Replace the pool with workers forked after patching.
+        '''
+        httpd.evaWorker = worker
+        httpd.calculateEdges = edges
+
+        self.server.pool.shutdown()
+        self.server.pool = httpd.EvaWorkerPool(self.nJobs, paths.fname_evc)
+
+        return self.server.pool
+
+    def test_Streamed(self):
+        golden = httpd.evaHtmlString(self.args, self.cfg,
+                                     self.request(a="Cex", u="16"))
+        self.slowPool(_evaWorker, slowEdges)
+
+        # Headers are sent before the network graph is calculated in the
+        # worker, then the body is streamed.
+        conn = HTTPConnection(*self.server.server_address)
+        try:
+            tmStart = time.time()
+            conn.request("GET", "/?a=Cex&u=16")
+            r = conn.getresponse()
+            tmHeaders = time.time()
+            body = r.read()
+            tmBody = time.time()
+        finally:
+            conn.close()
+
+        self.assertEqual(200, r.status)
+        self.assertEqual("chunked", r.getheader("Transfer-Encoding"))
+        self.assertLess(tmHeaders - tmStart, slowWorkerSeconds / 2)
+        self.assertLessEqual(slowWorkerSeconds, tmBody - tmStart)
+        self.assertEqual(golden, body.decode("utf-8"))
+
+        # Statistics from the worker are merged into the trailer.
+        self.assertIn("metrics;dur=", r.getheader("Server-Timing"))
+
+    def test_Concurrent(self):
+        paths_ = ["/?a=Cex&u=16&x=event.orig.a",
+                  "/?a=Cov&b=Dep&x=event.orig.a&y=bstate.orig.b",
+                  "/api?a=Cex&u=0&y=bstate.orig.b"]
+        goldens = [httpd.evaHtmlString(self.args, self.cfg,
+                       self.request(a="Cex", u="16", x="event.orig.a")),
+                   httpd.evaHtmlString(self.args, self.cfg,
+                       self.request(a="Cov", b="Dep", x="event.orig.a",
+                                    y="bstate.orig.b")),
+                   httpd.evaApiBytes(self.args, self.cfg,
+                       self.request(a="Cex", u="0", y="bstate.orig.b"))]
+        self.slowPool()
+
+        results = [None] * len(paths_)
+        def getResult(i):
+            results[i] = self.get(paths_[i])
+
+        tmStart = time.time()
+        threads = [threading.Thread(target=getResult, args=(i,)) \
+                   for i in range(len(paths_))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.time() - tmStart
+
+        # Each response is for its own request, and with two workers, three
+        # slow calculations take two periods rather than three.
+        self.assertEqual([200]*3, [r[0] for r in results])
+        for golden,(_, _, body) in zip(goldens[:2], results):
+            self.assertEqual(golden, body.decode("utf-8"))
+        self.assertEqual(goldens[2], results[2][2])
+        self.assertLess(elapsed, 3*slowWorkerSeconds)
+        self.assertEqual([], self.abandoned_)
+
+        # Statistics are added after each response is sent.
+        tmWait = time.time()
+        nRequests = 0
+        while nRequests < 3 and time.time() - tmWait < slowWorkerSeconds:
+            status, _, body = self.get("/stats")
+            nRequests = json.loads(body.decode("utf-8"))["nRequests"]
+        self.assertEqual(3, nRequests)
+
+    def test_Timeout(self):
+        pool = self.slowPool()
+        procs = [p for p,_ in pool.workers_]
+        self.args.httpd_timeout = slowWorkerSeconds / 4
+
+        for path in ("/?a=Cex&u=16&x=event.orig.a",
+                     "/api?a=Cex&u=16&x=event.orig.a"):
+            tmStart = time.time()
+            status, _, _ = self.get(path)
+            self.assertEqual(503, status)
+            self.assertLess(time.time() - tmStart, slowWorkerSeconds)
+
+        self.assertEqual([httpd.EvaHTTPTimeout]*2,
+                         [e for e,_ in self.abandoned_])
+
+        # Workers running the abandoned calculations are stopped, after the
+        # error is sent, rather than left to finish.
+        tmWait = time.time()
+        while any(p.is_alive() for p in procs) and \
+              time.time() - tmWait < slowWorkerSeconds / 2:
+            time.sleep(httpd.httpdPollPeriod / 4)
+        self.assertFalse(any(p.is_alive() for p in procs))
+
+        # Timed out responses are not in statistics.
+        status, _, body = self.get("/stats")
+        self.assertEqual(0, json.loads(body.decode("utf-8"))["nRequests"])
+
+    def test_Disconnect(self):
+        self.slowPool()
+
+        # Client gives up before the calculation finishes.
+        tmStart = time.time()
+        s = socket.create_connection(self.server.server_address)
+        s.sendall(b"GET /?a=Cex&u=16&x=event.orig.a HTTP/1.1\r\n"
+                  b"Host: localhost\r\n\r\n")
+        time.sleep(slowWorkerSeconds / 4)
+        s.close()
+
+        # Handler notices within a poll period, not when the worker finishes.
+        tmWait = time.time()
+        while 0 == len(self.abandoned_) and \
+              time.time() - tmWait < 5*slowWorkerSeconds:
+            time.sleep(httpd.httpdPollPeriod)
+        self.assertEqual([httpd.EvaHTTPCancelled],
+                         [e for e,_ in self.abandoned_])
+        self.assertLess(self.abandoned_[0][1] - tmStart, slowWorkerSeconds)
+
+        status, _, body = self.get("/stats")
+        self.assertEqual(0, json.loads(body.decode("utf-8"))["nRequests"])
+
+# }}} class Test_EvaHTTPPool
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_EvaHTTPNoPool(unittest.TestCase): # {{{
+
+    nJobs = 1
+
+    tearDown = Test_EvaHTTPServer.tearDown
+    request = Test_EvaHTTPServer.request
+    get = Test_EvaHTTPServer.get
+
+    def setUp(self):
+        recordAbandoned(self)
+        Test_EvaHTTPServer.setUp(self)
+
+        # Calculations are in handler threads.
+        self.assertEqual(200, self.get("/stats")[0])
+        self.assertIsNone(self.server.pool)
+
+    def test_Polled(self):
+        # Calculations poll within their loops, not only between results.
+        def abandon():
+            raise httpd.EvaHTTPCancelled
+
+        with abandonCheck(abandon):
+            self.assertRaises(httpd.EvaHTTPCancelled, _calculateTableData,
+                              "Cov", "Dep", None, "event.orig.a",
+                              "bstate.orig.b", self.cfg, self.dsfDeltas,
+                              self.vcdInfo)
+            self.assertRaises(httpd.EvaHTTPCancelled, next,
+                              _calculateEdges("Cov", "Dep", 16, self.cfg,
+                                              self.dsfDeltas, self.vcdInfo))
+
+        # Nothing is polled outside of abandonCheck.
+        pollAbandon()
+        self.assertLess(0, len(list(_calculateEdges("Cov", "Dep", 16,
+            self.cfg, self.dsfDeltas, self.vcdInfo))))
+
+    def test_Timeout(self):
+        httpd.calculateTableData = pollingTableData
+        httpd.calculateEdges = pollingEdges
+        self.args.httpd_timeout = slowWorkerSeconds / 4
+
+        # Tables are calculated before the response begins.
+        for path in ("/?a=Cex&x=event.orig.a&y=bstate.orig.b",
+                     "/api?a=Cex&x=event.orig.a&y=bstate.orig.b"):
+            tmStart = time.time()
+            status, _, _ = self.get(path)
+            self.assertEqual(503, status)
+            self.assertLess(time.time() - tmStart, slowWorkerSeconds)
+
+        # Network graphs are calculated while streamed, so the connection is
+        # closed before the body is complete.
+        tmStart = time.time()
+        self.assertRaises(IncompleteRead, self.get, "/?a=Cex&u=16")
+        self.assertLess(time.time() - tmStart, slowWorkerSeconds)
+
+        self.assertEqual([httpd.EvaHTTPTimeout]*3,
+                         [e for e,_ in self.abandoned_])
+
+        # Timed out responses are not in statistics, or cached.
+        httpd.calculateTableData = _calculateTableData
+        httpd.calculateEdges = _calculateEdges
+        status, _, body = self.get("/stats")
+        self.assertEqual(0, json.loads(body.decode("utf-8"))["nRequests"])
+        self.assertEqual(0, json.loads(body.decode("utf-8"))["counts"]["cacheHits"])
+
+    def test_Disconnect(self):
+        httpd.calculateEdges = pollingEdges
+
+        # Client gives up before the calculation finishes.
+        tmStart = time.time()
+        s = socket.create_connection(self.server.server_address)
+        s.sendall(b"GET /?a=Cex&u=16 HTTP/1.1\r\n"
+                  b"Host: localhost\r\n\r\n")
+        time.sleep(slowWorkerSeconds / 4)
+        s.close()
+
+        # Calculation stops within a poll period, not when it finishes.
+        tmWait = time.time()
+        while 0 == len(self.abandoned_) and \
+              time.time() - tmWait < 5*slowWorkerSeconds:
+            time.sleep(httpd.httpdPollPeriod)
+        self.assertEqual([httpd.EvaHTTPCancelled],
+                         [e for e,_ in self.abandoned_])
+        self.assertLess(self.abandoned_[0][1] - tmStart, slowWorkerSeconds)
+
+        status, _, body = self.get("/stats")
+        self.assertEqual(0, json.loads(body.decode("utf-8"))["nRequests"])
+
+# }}} class Test_EvaHTTPNoPool
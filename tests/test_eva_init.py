@@ -3,6 +3,7 @@ from dmppl.experiments.eva.eva_init import *
 from dmppl.base import rdTxt, Bunch
 from dmppl.test import runEntryPoint
 from os import path
+import os
 import tempfile
 import shutil
 import sys
@@ -181,6 +182,33 @@ class Test_ExpandEvc(unittest.TestCase): # {{{
 
 # }}} class Test_ExpandEvc
 
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_FirHoldGap(unittest.TestCase): # {{{
+
+    def test_Basic0(self):
+        # Compare against holding and smoothing one sample at a time.
+        history = [0.7, -3.25, 11.0, 0.1]
+        fir = [0.107, 0.241, 0.303, 0.241, 0.107]
+        lo, hi = 5.0, -1.0
+
+        expectedSmooth_, expectedClipnorm_ = [], []
+        zs_ = history
+        for _ in range(9):
+            zs_ = [zs_[0]] + zs_
+            expectedSmooth_.append(dotp(zs_, fir))
+            expectedClipnorm_.append(clipNorm(expectedSmooth_[-1], lo, hi))
+            zs_ = zs_[:-1]
+
+        resultSmooth, resultClipnorm = firHoldGap(history, fir, 9, lo, hi)
+        self.assertListEqual(expectedSmooth_, resultSmooth)
+        self.assertListEqual(expectedClipnorm_, resultClipnorm)
+
+        resultSmooth, resultClipnorm = firHoldGap(history, fir, 2, lo, hi)
+        self.assertListEqual(expectedSmooth_[:2], resultSmooth)
+        self.assertListEqual(expectedClipnorm_[:2], resultClipnorm)
+
+# }}} class Test_FirHoldGap
+
 @unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
 class Test_EvaInit(unittest.TestCase): # {{{
 
@@ -192,6 +220,11 @@ class Test_EvaInit(unittest.TestCase): # {{{
         args = Bunch()
         args.info = False
         args.input = path.join(_tstd, "basic2.vcd")
+        args.clean = True
+        args.vcd = True
+        args.precompute = False
+        args.resume = False
+        args.append = None
 
         evaInit(args)
 
@@ -199,4 +232,225 @@ class Test_EvaInit(unittest.TestCase): # {{{
         goldenMeasureVcd = rdTxt(path.join(_tstd, "basic2.signals.golden.vcd"))
         self.assertEqual(goldenMeasureVcd, resultMeasureVcd)
 
+    @unittest.skipIf(sys.version_info[0] == 2, "Unicode mess before Python3")
+    def test_OnePass(self):
+        self.maxDiff = None
+        initPaths(path.join(_tstd, "basic2"))
+        assert paths._INITIALIZED
+        args = Bunch()
+        args.info = False
+        args.input = path.join(_tstd, "basic2.vcd")
+        args.vcd = True
+        args.precompute = False
+        args.resume = False
+        args.append = None
+
+        def rdResults():
+            fnames = sorted(os.listdir(paths.dname_mea))
+            db = {fname: open(path.join(paths.dname_mea, fname), 'rb').read() \
+                  for fname in fnames}
+            meainfo = toml.load(paths.fname_meainfo)
+            return db, meainfo
+
+        args.clean = True
+        evaInit(args)
+        goldenDb, goldenMeainfo = rdResults()
+
+        args.clean = False
+        evaInit(args)
+        resultDb, resultMeainfo = rdResults()
+
+        # Without vcdClean, only the comment in signals.vcd is different.
+        resultMeasureVcd = rdTxt(path.join(_tstd, "basic2.eva", "signals.vcd"))
+        goldenMeasureVcd = rdTxt(path.join(_tstd, "basic2.signals.golden.vcd"))
+        self.assertEqual(goldenMeasureVcd.replace(" <<< dmppl.vcd.vcdClean >>>", ''),
+                         resultMeasureVcd)
+
+        self.assertDictEqual(goldenMeainfo, resultMeainfo)
+        self.assertDictEqual(goldenDb, resultDb)
+
+    @unittest.skipIf(sys.version_info[0] == 2, "Unicode mess before Python3")
+    def test_NoVcd(self):
+        self.maxDiff = None
+        initPaths(path.join(_tstd, "basic2"))
+        assert paths._INITIALIZED
+        args = Bunch()
+        args.info = False
+        args.input = path.join(_tstd, "basic2.vcd")
+        args.clean = False
+        args.precompute = False
+        args.resume = False
+        args.append = None
+
+        def rdResults():
+            db = {}
+            for fname in sorted(os.listdir(paths.dname_mea)):
+                with open(path.join(paths.dname_mea, fname), 'rb') as fd:
+                    db[fname] = fd.read()
+            return db, loadVcdInfo()
+
+        args.vcd = True
+        evaInit(args)
+        goldenDb, goldenVcdInfo = rdResults()
+
+        # Without signals.vcd, holding normals through gaps only writes
+        # timechunks up to the length of the FIR, which are the same changes.
+        args.vcd = False
+        evaInit(args)
+        resultDb, resultVcdInfo = rdResults()
+
+        self.assertDictEqual(goldenDb, resultDb)
+        self.assertLess(resultVcdInfo["nTimechunks"],
+                        goldenVcdInfo["nTimechunks"])
+        self.assertEqual(goldenVcdInfo["lastTime"], resultVcdInfo["lastTime"])
+
+    @unittest.skipIf(sys.version_info[0] == 2, "Unicode mess before Python3")
+    def test_Append(self):
+        self.maxDiff = None
+        initPaths(path.join(_tstd, "basic2"))
+        assert paths._INITIALIZED
+        args = Bunch()
+        args.info = False
+        args.input = path.join(_tstd, "basic2.vcd")
+        args.clean = False
+        args.vcd = False
+        args.precompute = False
+        args.resume = False
+        args.append = None
+
+        def rdResults():
+            db = {}
+            for fname in sorted(os.listdir(paths.dname_mea)):
+                with open(path.join(paths.dname_mea, fname), 'rb') as fd:
+                    db[fname] = fd.read()
+            meainfo = toml.load(paths.fname_meainfo)
+            meainfo["timechunkTimes"] = loadTimechunkTimes().tolist()
+            return db, meainfo
+
+        evaInit(args)
+        goldenDb, goldenMeainfo = rdResults()
+
+        # Split input into VCDs with the same header, each continuing the
+        # previous one.
+        vcdLines = rdTxt(args.input).splitlines(True)
+        nHeader = vcdLines.index("$enddefinitions $end\n") + 1
+        header, body = vcdLines[:nHeader], vcdLines[nHeader:]
+        timeIdxs = [i for i,line in enumerate(body) if line.startswith('#')]
+
+        tmpd = tempfile.mkdtemp()
+        try:
+            for splits in ([2], [5], [1, 6], [3, 4, 5, 6, 7]):
+                fnames = []
+                for j,(lo,hi) in enumerate(zip([None] + splits,
+                                               splits + [None])):
+                    fname = path.join(tmpd, "part%d.vcd" % j)
+                    with open(fname, 'w') as fd:
+                        lo = 0 if lo is None else timeIdxs[lo]
+                        hi = len(body) if hi is None else timeIdxs[hi]
+                        fd.write(''.join(header + body[lo:hi]))
+                    fnames.append(fname)
+
+                args.input, args.append = fnames[0], None
+                evaInit(args)
+                for fname in fnames[1:]:
+                    args.append = fname
+                    evaInit(args)
+
+                resultDb, resultMeainfo = rdResults()
+                self.assertDictEqual(goldenMeainfo, resultMeainfo)
+                self.assertDictEqual(goldenDb, resultDb)
+        finally:
+            shutil.rmtree(tmpd)
+
+    @unittest.skipIf(sys.version_info[0] == 2, "Unicode mess before Python3")
+    def test_Order(self):
+        tmpd = tempfile.mkdtemp()
+        try:
+            shutil.copyfile(path.join(_tstd, "basic2.evc"),
+                            path.join(tmpd, "foo.evc"))
+            initPaths(path.join(tmpd, "foo"))
+
+            # Swap the last two timechunks.
+            vcdLines = rdTxt(path.join(_tstd, "basic2.vcd")).splitlines(True)
+            timeIdxs = [i for i,line in enumerate(vcdLines) \
+                        if line.startswith('#')]
+            a, b = timeIdxs[-2], timeIdxs[-1]
+            fname = path.join(tmpd, "foo.vcd")
+            with open(fname, 'w') as fd:
+                fd.write(''.join(vcdLines[:a] + vcdLines[b:] + vcdLines[a:b]))
+
+            args = Bunch()
+            args.info = False
+            args.input = fname
+            args.clean = False
+            args.vcd = False
+            args.precompute = False
+            args.resume = False
+            args.append = None
+
+            self.assertRaises(EVCError_VcdOrder, evaInit, args)
+
+            args.clean = True
+            evaInit(args)
+        finally:
+            shutil.rmtree(tmpd)
+            initPaths(path.join(_tstd, "basic2"))
+
+    @unittest.skipIf(sys.version_info[0] == 2, "Unicode mess before Python3")
+    def test_AppendErrors(self):
+        tmpd = tempfile.mkdtemp()
+        try:
+            shutil.copyfile(path.join(_tstd, "basic2.evc"),
+                            path.join(tmpd, "foo.evc"))
+            initPaths(path.join(tmpd, "foo"))
+
+            # Split input into two VCDs with the same header.
+            vcdLines = rdTxt(path.join(_tstd, "basic2.vcd")).splitlines(True)
+            nHeader = vcdLines.index("$enddefinitions $end\n") + 1
+            timeIdxs = [i for i,line in enumerate(vcdLines) \
+                        if line.startswith('#')]
+            fnames = [path.join(tmpd, "part%d.vcd" % j) for j in range(2)]
+            with open(fnames[0], 'w') as fd:
+                fd.write(''.join(vcdLines[:timeIdxs[4]]))
+            with open(fnames[1], 'w') as fd:
+                fd.write(''.join(vcdLines[:nHeader] + vcdLines[timeIdxs[4]:]))
+
+            args = Bunch()
+            args.info = False
+            args.input = fnames[0]
+            args.clean = False
+            args.vcd = False
+            args.precompute = False
+            args.resume = False
+            args.append = None
+            evaInit(args)
+
+            def rdDb():
+                db = {}
+                for fname in sorted(os.listdir(paths.dname_mea)):
+                    with open(path.join(paths.dname_mea, fname), 'rb') as fd:
+                        db[fname] = fd.read()
+                return db
+
+            # signals.vcd cannot be continued.
+            args.append, args.vcd = fnames[1], True
+            self.assertRaises(EVCError_Append, evaInit, args)
+            args.vcd = False
+
+            # State from before the database was extended is rejected without
+            # truncating the database.
+            shutil.copyfile(paths.fname_meastate, path.join(tmpd, "state"))
+            evaInit(args)
+            shutil.copyfile(path.join(tmpd, "state"), paths.fname_meastate)
+            db = rdDb()
+            self.assertRaises(EVCError_Append, evaInit, args)
+            self.assertDictEqual(db, rdDb())
+
+            # No saved state.
+            os.remove(paths.fname_meastate)
+            self.assertRaises(EVCError_Append, evaInit, args)
+        finally:
+            shutil.rmtree(tmpd)
+            initPaths(path.join(_tstd, "basic2"))
+
 # }}} class Test_EvaInit
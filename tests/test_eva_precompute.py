@@ -0,0 +1,201 @@
+from dmppl.experiments.eva.eva_common import *
+from dmppl.experiments.eva.eva_precompute import *
+import dmppl.experiments.eva.eva_precompute as precompute
+from dmppl.experiments.eva.eva_html_table import calculateTableData
+from dmppl.experiments.eva.eva_svg_netgraph import calculateEdges
+from dmppl.base import joinP
+from dmppl.toml import saveToml
+from .eva_fixture import mkRandomMeaDb
+import numpy as np
+import os
+import shutil
+import sys
+import unittest
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_Precompute(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir, self.cfg = mkRandomMeaDb()
+
+        self.vcdInfo = loadVcdInfo()
+        self.dsfDeltas = sortedDsfDeltas(self.cfg)
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def assertEdgesClose(self, golden, result):
+        # The cube is float32, so metrics are only equal to within rounding.
+        self.assertEqual(len(golden), len(result))
+        for g,r in zip(golden, result):
+            self.assertEqual(sorted(g.keys()), sorted(r.keys()))
+            for k,v in g.items():
+                if isinstance(v, float):
+                    self.assertTrue(np.isclose(v, r[k], rtol=1e-6,
+                                               equal_nan=True), (k, v, r[k]))
+                else:
+                    self.assertEqual(v, r[k], k)
+
+    def test_Table(self):
+        x, y = "event.orig.a", "bstate.orig.b"
+
+        self.assertIsNone(cubeTableData("Cex", None, 16, x, None,
+                                        self.cfg, self.dsfDeltas, self.vcdInfo))
+
+        evaPrecompute(self.cfg, 1)
+
+        for a,b in (("Cex", None), ("Cov", "Dep")):
+            for u,x_,y_ in ((16, x, None), (32, None, y), (None, x, y)):
+                result = cubeTableData(a, b, u, x_, y_,
+                                       self.cfg, self.dsfDeltas, self.vcdInfo)
+                golden = calculateTableData(a, b, u, x_, y_,
+                                            self.cfg, self.dsfDeltas,
+                                            self.vcdInfo)
+
+                for i in range(3):
+                    self.assertTrue(np.array_equal(golden[i], result[i],
+                                                   equal_nan=True))
+                self.assertEqual(list(golden[3]), list(result[3]))
+
+        # Pages of windows are the same slices of the cube.
+        for page in (0, 1):
+            result = cubeTableData("Cov", "Dep", None, x, y,
+                                   self.cfg, self.dsfDeltas, self.vcdInfo,
+                                   page=page, rowsPerPage=3)
+            golden = calculateTableData("Cov", "Dep", None, x, y,
+                                        self.cfg, self.dsfDeltas, self.vcdInfo,
+                                        page=page, rowsPerPage=3)
+            for i in range(3):
+                self.assertTrue(np.array_equal(golden[i], result[i],
+                                               equal_nan=True))
+            self.assertEqual(list(golden[3]), list(result[3]))
+
+        # The manifest is checked once per request, not for every window.
+        nManifests_ = []
+        _cubeManifest = precompute.cubeManifest
+        def countingManifest(*args):
+            nManifests_.append(args)
+            return _cubeManifest(*args)
+        precompute.cubeManifest = countingManifest
+        try:
+            result = cubeTableData("Cov", "Dep", None, x, y,
+                                   self.cfg, self.dsfDeltas, self.vcdInfo)
+        finally:
+            precompute.cubeManifest = _cubeManifest
+        self.assertIsNotNone(result)
+        self.assertLess(1, len(result[3]))
+        self.assertEqual(1, len(nManifests_))
+
+    def test_Edges(self):
+        for a,b in (("Cex", None), ("Ham", "Cos"), ("Cov", "Dep")):
+            for u in (0, 16, 48):
+                cube = precomputeWindow(u, self.cfg, self.dsfDeltas,
+                                        self.vcdInfo)
+                golden = list(calculateEdges(a, b, u, self.cfg,
+                                             self.dsfDeltas, self.vcdInfo))
+
+                fnameCube, fnameEx = cubeFnames(u)
+                mkDirP(paths.dname_cube)
+                np.save(fnameCube, cube[0])
+                np.save(fnameEx, cube[1])
+                saveToml(cubeManifest(self.cfg, self.vcdInfo),
+                         paths.fname_cubeinfo)
+
+                result = cubeEdges(a, b, u, self.cfg, self.dsfDeltas,
+                                   self.vcdInfo)
+                self.assertLess(0, len(golden))
+                self.assertEdgesClose(golden, result)
+
+    def test_EdgesPyramid(self):
+        # Deltas beyond the zoom factor are subsampled.
+        self.cfg.deltabk = 8
+        self.cfg.deltafw = 8
+        self.cfg.deltazoom = 2
+        dsfDeltas = sortedDsfDeltas(self.cfg)
+        self.assertLess(1, max(dsf for dsf,_ in dsfDeltas))
+        meaPyramid(self.cfg)
+
+        for u in (0, 16, 48):
+            cube = precomputeWindow(u, self.cfg, dsfDeltas, self.vcdInfo)
+            _loadCube, precompute.loadCube = \
+                precompute.loadCube, (lambda *args: cube)
+            try:
+                result = cubeEdges("Cex", None, u, self.cfg, dsfDeltas,
+                                   self.vcdInfo)
+            finally:
+                precompute.loadCube = _loadCube
+            golden = list(calculateEdges("Cex", None, u, self.cfg,
+                                         dsfDeltas, self.vcdInfo))
+            self.assertLess(0, len(golden))
+            self.assertEdgesClose(golden, result)
+
+            # Reading from the pyramid is deterministic.
+            self.assertEqual(golden,
+                             list(calculateEdges("Cex", None, u, self.cfg,
+                                                 dsfDeltas, self.vcdInfo)))
+
+    def test_FixedPoint(self):
+        # Fixed point results are stored as floats, as calculateTableData
+        # returns them.
+        self.cfg.fxbits = 16
+        saveToml(self.cfg.__dict__, paths.fname_cfg)
+        x, y = "event.orig.a", "bstate.orig.b"
+
+        evaPrecompute(self.cfg, 1)
+        cube, ex = loadCube(16, self.cfg, self.dsfDeltas, self.vcdInfo)
+        self.assertEqual(np.float32, cube.dtype)
+        self.assertEqual(np.float32, ex.dtype)
+
+        for u,x_,y_ in ((16, x, None), (None, x, y)):
+            result = cubeTableData("Cov", "Dep", u, x_, y_,
+                                   self.cfg, self.dsfDeltas, self.vcdInfo)
+            golden = calculateTableData("Cov", "Dep", u, x_, y_,
+                                        self.cfg, self.dsfDeltas, self.vcdInfo)
+            for i in range(3):
+                self.assertTrue(np.array_equal(golden[i], result[i],
+                                               equal_nan=True))
+
+        result = cubeEdges("Ham", "Cos", 16, self.cfg, self.dsfDeltas,
+                           self.vcdInfo)
+        golden = list(calculateEdges("Ham", "Cos", 16, self.cfg,
+                                     self.dsfDeltas, self.vcdInfo))
+        self.assertLess(0, len(golden))
+        self.assertEdgesClose(golden, result)
+
+    def test_Maxmem(self):
+        # Blocks of X and Y under a memory budget give the same cube.
+        for u in (0, 16):
+            golden = precomputeWindow(u, self.cfg, self.dsfDeltas,
+                                      self.vcdInfo)
+
+            self.cfg.maxmem = 1
+            result = precomputeWindow(u, self.cfg, self.dsfDeltas,
+                                      self.vcdInfo)
+            self.cfg.maxmem = 0
+
+            for g,r in zip(golden, result):
+                self.assertTrue(np.array_equal(g, r, equal_nan=True))
+
+    def test_Resume(self):
+        evaPrecompute(self.cfg, 1)
+        fnames = sorted(os.listdir(paths.dname_cube))
+        self.assertEqual(2*4, len(fnames)) # 4 windows
+
+        # Only missing windows are recalculated.
+        fnameCube, _ = cubeFnames(16)
+        os.remove(fnameCube)
+        mtimes = {fname: os.stat(joinP(paths.dname_cube, fname)).st_mtime \
+                  for fname in fnames if not fname.startswith("16.")}
+        evaPrecompute(self.cfg, 1)
+        self.assertEqual(fnames, sorted(os.listdir(paths.dname_cube)))
+        for fname,mtime in mtimes.items():
+            self.assertEqual(mtime,
+                             os.stat(joinP(paths.dname_cube, fname)).st_mtime)
+
+        # Changing cfg discards all results.
+        self.cfg.windowsize = 32
+        self.assertIsNone(loadCube(0, self.cfg, self.dsfDeltas, self.vcdInfo))
+        evaPrecompute(self.cfg, 1)
+        self.assertEqual(2*2, len(os.listdir(paths.dname_cube)))
+
+# }}} class Test_Precompute
@@ -0,0 +1,140 @@
+from dmppl.experiments.eva.eva_common import *
+from dmppl.experiments.eva.eva_precompute import *
+from dmppl.experiments.eva.eva_shard import *
+import dmppl.experiments.eva.eva_shard as shard
+from dmppl.base import joinP
+from .eva_fixture import mkRandomMeaDb, randomNames
+import numpy as np
+import os
+import shutil
+import sys
+import unittest
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_Shard(unittest.TestCase): # {{{
+
+    def setUp(self):
+        # Four binary measures, or one real measure, in each block, so each
+        # window has 9 shards.
+        self.tstDir, self.cfg = \
+            mkRandomMeaDb(randomNames + ["normal.orig.c"],
+                          deltabk=8, deltafw=8, deltazoom=2,
+                          maxmem=4 * 33 * 4)
+
+        self.vcdInfo = loadVcdInfo()
+        self.dsfDeltas = sortedDsfDeltas(self.cfg)
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def rdCube(self):
+        # { <fname>: <array>, ... }
+        return {fname: np.load(joinP(paths.dname_cube, fname)) \
+                for fname in os.listdir(paths.dname_cube)}
+
+    def assertCubeEqual(self, golden, result):
+        self.assertEqual(sorted(golden.keys()), sorted(result.keys()))
+        for k in golden.keys():
+            self.assertEqual(np.float32, result[k].dtype, k)
+            self.assertTrue(np.array_equal(golden[k], result[k],
+                                           equal_nan=True), k)
+
+    def test_Blocks(self):
+        blocks = shardBlocks(self.cfg, self.vcdInfo["unitIntervalVarNames"])
+        self.assertEqual([[0, 1, 2, 3], [4], [5]], blocks)
+
+    def test_Queue(self):
+        vcdInfo, todo, blocks = shardEnqueue(self.cfg)
+        self.assertEqual(4, len(todo))
+        self.assertEqual(3, len(blocks))
+
+        dnameTodo = joinP(paths.dname_shard, "todo")
+        self.assertEqual(4 * 9, len(os.listdir(dnameTodo)))
+
+        # Each shard is claimed once, earliest window first.
+        name, shard = shardClaim()
+        self.assertEqual("0.0.0", name)
+        self.assertEqual({"u": 0, "xIdxs": [0, 1, 2, 3],
+                          "yIdxs": [0, 1, 2, 3]}, shard)
+        self.assertEqual(4 * 9 - 1, len(os.listdir(dnameTodo)))
+
+        # Queueing again skips claimed shards.
+        _ = shardEnqueue(self.cfg)
+        self.assertEqual(4 * 9 - 1, len(os.listdir(dnameTodo)))
+
+        # Only stale claims are queued again.
+        self.assertEqual(0, shardRequeue(timeout=60.0))
+        self.assertEqual(1, shardRequeue(timeout=0.0))
+        self.assertEqual(4 * 9, len(os.listdir(dnameTodo)))
+
+    def test_ClaimTime(self):
+        _ = shardEnqueue(self.cfg)
+
+        # Shards queued long ago are claimed with the current time, even by
+        # a requeue as soon as the claim is visible.
+        dnameTodo = joinP(paths.dname_shard, "todo")
+        for fname in os.listdir(dnameTodo):
+            os.utime(joinP(dnameTodo, fname), (0, 0))
+
+        requeued_ = []
+        _rename = os.rename
+        def renameThenRequeue(src, dst):
+            _rename(src, dst)
+            requeued_.append(shardRequeue(timeout=60.0))
+        shard.os.rename = renameThenRequeue
+        try:
+            name, _ = shardClaim()
+        finally:
+            shard.os.rename = _rename
+
+        self.assertEqual([0], requeued_)
+        self.assertTrue(os.path.isfile(shardFnames(name)["claim"]))
+
+    def test_WorkerFails(self):
+        _shardWorkerProcess = shard.shardWorkerProcess
+        shard.shardWorkerProcess = failingWorkerProcess
+        try:
+            self.assertRaises(ShardWorkerError, evaShard, self.cfg, 2)
+        finally:
+            shard.shardWorkerProcess = _shardWorkerProcess
+
+        # Nothing was calculated by the coordinator instead.
+        self.assertEqual([], os.listdir(joinP(paths.dname_shard, "part")))
+
+    def test_Worker(self):
+        evaPrecompute(self.cfg, 1)
+        golden = self.rdCube()
+        shutil.rmtree(paths.dname_cube)
+
+        vcdInfo, todo, blocks = shardEnqueue(self.cfg)
+        self.assertEqual(4 * 9, shardWorker(paths.fname_evc))
+        self.assertIsNone(shardClaim())
+
+        for u in todo:
+            self.assertTrue(shardMerge(u, self.cfg, self.dsfDeltas, vcdInfo,
+                                       blocks))
+        self.assertEqual([], os.listdir(joinP(paths.dname_shard, "part")))
+
+        self.assertCubeEqual(golden, self.rdCube())
+
+    def test_Parallel(self):
+        # Results are identical to unsharded precompute.
+        evaPrecompute(self.cfg, 1)
+        golden = self.rdCube()
+        shutil.rmtree(paths.dname_cube)
+
+        evaShard(self.cfg, 2)
+        self.assertCubeEqual(golden, self.rdCube())
+
+        # Completed windows aren't calculated again.
+        vcdInfo, todo, blocks = shardEnqueue(self.cfg)
+        self.assertEqual([], todo)
+        self.assertEqual([], os.listdir(joinP(paths.dname_shard, "todo")))
+
+# }}} class Test_Shard
+
+def failingWorkerProcess(fnameEvc): # {{{
+    '''Like shardWorkerProcess, but exiting with an error before any shards.
+    '''
+    os._exit(3)
+# }}} def failingWorkerProcess
@@ -0,0 +1,117 @@
+from dmppl.experiments.eva.eva_common import *
+from dmppl.experiments.eva.eva_sparse import *
+from dmppl.base import joinP
+import numpy as np
+import tempfile
+import shutil
+import sys
+import unittest
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_rdChanges(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        initPaths(joinP(self.tstDir, "foo"))
+
+        self.names = ["bstate.orig.foo", "event.orig.bar", "event.orig.baz"]
+        with MeaDbWriter(self.names) as meaDb:
+            meaDb.wrTimechunk((3, self.names, [1, 1, 0]))
+            meaDb.wrTimechunk((7, self.names, [0, 0, 0]))
+            meaDb.wrTimechunk((8, self.names, [1, 0, 0]))
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Dense(self):
+        # Change lists expand to the same as rdEvs.
+        for startTime in range(-4, 11):
+            for finishTime in range(max(1, startTime+1), 13):
+                evs = rdEvs(self.names, startTime, finishTime)
+                changes = rdChanges(self.names, startTime, finishTime)
+                for nm in self.names:
+                    c = changes[nm]
+                    result = np.zeros(finishTime - startTime, dtype=np.bool_)
+                    for i in range(0, len(c), 2):
+                        result[c[i]:(c[i+1] if i+1 < len(c) else None)] = 1
+                    self.assertEqual(evs[nm].tolist(), result.tolist(),
+                                     (nm, startTime, finishTime))
+
+    def test_Window(self):
+        c = rdChanges(self.names, 0, 12)["bstate.orig.foo"]
+        self.assertEqual([3, 7, 8], c.tolist())
+        self.assertEqual([0, 2, 3], clWindow(c, 5, 10).tolist())
+        self.assertEqual([], clWindow(c, 0, 3).tolist())
+        self.assertEqual([0], clWindow(c, 8, 12).tolist())
+
+# }}} class Test_rdChanges
+
+class Test_clMetric(unittest.TestCase): # {{{
+
+    def test_Random(self):
+        # Same results as dense implementations, to within rounding.
+        prng = np.random.RandomState(1)
+        winSize = 256
+        for _ in range(50):
+            p, q = prng.random_sample(2) * 0.1
+            x = prng.random_sample(winSize) < p
+            y = np.logical_or(prng.random_sample(winSize) < q,
+                              np.roll(x, 1))
+            cx = np.flatnonzero(np.diff(np.concatenate(([0], x))))
+            cy = np.flatnonzero(np.diff(np.concatenate(([0], y))))
+
+            for nm in ["Ex"] + metricNames:
+                fn = metric(nm, winSize, 1)
+                clFn = clMetric(nm, winSize, 1)
+                if "Ex" == nm:
+                    golden, result = fn(x), clFn(cx)
+                else:
+                    golden, result = fn(x, y), clFn(cx, cy)
+
+                if np.isnan(golden):
+                    self.assertTrue(np.isnan(result))
+                else:
+                    self.assertAlmostEqual(golden, result, places=9)
+
+    def test_Hadp(self):
+        self.assertEqual([2, 3, 5, 6],
+                         clHadp(np.array([1, 3, 5]),
+                                np.array([2, 4, 5, 6])).tolist())
+
+# }}} class Test_clMetric
+
+@unittest.skipIf(sys.version_info[0] == 2, "Import confusion before Python3")
+class Test_SparseEvs(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        initPaths(joinP(self.tstDir, "foo"))
+
+        self.names = ["event.orig.quiet", "event.orig.busy", "normal.orig.x"]
+        with MeaDbWriter(self.names) as meaDb:
+            for t in range(1024):
+                meaDb.wrTimechunk((t, self.names,
+                                   [int(t == 500), t % 2, (t % 4) / 4.0]))
+
+    def tearDown(self):
+        shutil.rmtree(self.tstDir)
+
+    def test_Pair(self):
+        evs = SparseEvs(self.names, 0, 1024)
+
+        sparse, x, y = evs.pair("event.orig.quiet", 0,
+                                "event.orig.quiet", 256, 512)
+        self.assertTrue(sparse)
+        self.assertEqual(([500, 501], [244, 245]), (x.tolist(), y.tolist()))
+        self.assertEqual({}, evs.denseEvs) # Nothing expanded.
+
+        sparse, x, y = evs.pair("event.orig.quiet", 0,
+                                "event.orig.busy", 0, 512)
+        self.assertFalse(sparse)
+        self.assertEqual((512,), x.shape)
+
+        sparse, x = evs.single("normal.orig.x", 0, 512)
+        self.assertFalse(sparse)
+        self.assertEqual(0.75, x[3])
+
+# }}} class Test_SparseEvs
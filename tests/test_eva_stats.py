@@ -0,0 +1,110 @@
+from dmppl.experiments.eva.eva_stats import *
+import pickle
+import threading
+import time
+import unittest
+
+class Test_RequestStats(unittest.TestCase): # {{{
+
+    def test_Exclusive(self):
+        # Time in an inner stage isn't counted in the outer stage.
+        with collectStats(RequestStats()) as stats:
+            with stageTimer("html"):
+                time.sleep(0.02)
+                with stageTimer("metrics"):
+                    time.sleep(0.05)
+                time.sleep(0.02)
+
+        self.assertGreater(stats.wall["metrics"], 0.045)
+        self.assertGreater(stats.wall["html"], 0.035)
+        self.assertLess(stats.wall["html"], 0.045 + 0.01)
+        self.assertEqual(0.0, stats.wall["rdEvs"])
+        self.assertEqual([], stats.stack_)
+
+    def test_TimedIter(self):
+        def slowGen():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        with collectStats(RequestStats()) as stats:
+            with stageTimer("html"):
+                result = []
+                for i in timedIter("metrics", slowGen()):
+                    time.sleep(0.01)
+                    result.append(i)
+
+        self.assertEqual([0, 1, 2], result)
+        self.assertGreater(stats.wall["metrics"], 0.025)
+        self.assertGreater(stats.wall["html"], 0.025)
+
+    def test_Counters(self):
+        countStat("cacheHits") # Ignored outside of collectStats.
+
+        with collectStats(RequestStats()) as stats:
+            countStat("cacheHits")
+            countStat("bytesRead", 123)
+            countStat("bytesRead", 4)
+
+        self.assertIsNone(requestStats())
+        self.assertEqual(1, stats.counts["cacheHits"])
+        self.assertEqual(127, stats.counts["bytesRead"])
+        self.assertEqual(0, stats.counts["pairsPruned"])
+
+    def test_Threads(self):
+        # Statistics are only collected by the thread which set them.
+        other = []
+
+        with collectStats(RequestStats()) as stats:
+            t = threading.Thread(target=lambda: other.append(requestStats()))
+            t.start()
+            t.join()
+            countStat("pairsEvaluated", 5)
+
+        self.assertEqual([None], other)
+        self.assertEqual(5, stats.counts["pairsEvaluated"])
+
+    def test_Merge(self):
+        # Statistics from a worker are pickled.
+        with collectStats(RequestStats()) as worker:
+            with stageTimer("metrics"):
+                countStat("pairsEvaluated", 7)
+                received = pickle.loads(pickle.dumps(worker))
+
+        self.assertEqual([], received.stack_)
+
+        with collectStats(RequestStats()) as stats:
+            countStat("pairsEvaluated", 1)
+            stats.merge(worker)
+
+        self.assertEqual(8, stats.counts["pairsEvaluated"])
+        self.assertEqual(worker.wall["metrics"], stats.wall["metrics"])
+
+    def test_ServerTiming(self):
+        stats = RequestStats()
+        stats.wall["rdEvs"], stats.cpu["rdEvs"] = 0.0125, 0.01
+        stats.counts["bytesRead"] = 4096
+
+        result = stats.serverTiming().split(", ")
+        self.assertEqual(len(statsStages) + len(statsCounters), len(result))
+        self.assertIn('rdEvs;dur=12.500;desc="cpu=10.000"', result)
+        self.assertIn('bytesRead;desc="4096"', result)
+
+# }}} class Test_RequestStats
+
+class Test_StatsTotals(unittest.TestCase): # {{{
+
+    def test_Recent(self):
+        totals = StatsTotals(nRecent=2)
+
+        for i in range(3):
+            stats = RequestStats()
+            stats.counts["cacheHits"] = i
+            totals.add("?u=%d" % i, stats)
+
+        result = totals.asDict()
+        self.assertEqual(3, result["nRequests"])
+        self.assertEqual(3, result["counts"]["cacheHits"])
+        self.assertEqual(["?u=1", "?u=2"], [r["path"] for r in result["recent"]])
+
+# }}} class Test_StatsTotals
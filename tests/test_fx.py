@@ -1,4 +1,6 @@
 from dmppl.fx import *
+from dmppl.math import isEven, powsineCoeffs
+from dmppl.nd import ndAllMetrics
 import numpy as np
 import unittest
 
@@ -896,3 +898,124 @@ class Test_fxCovariance(unittest.TestCase): # {{{
 
 # }}} class Test_fxCovariance
 
+
+class Test_fxSqrt(unittest.TestCase): # {{{
+
+    def test_Quarter(self):
+        for i in range(2, 31+1, 2): # Exact root only with even nBits.
+            h,q,e,s,t = getFracs(i)
+            self.assertEqual(fxSqrt(q, nBits=i), h)
+
+    def test_Limits(self):
+        for i in range(2, 31+1):
+            self.assertEqual(fxSqrt(fxOne(nBits=i), nBits=i), fxOne(nBits=i))
+
+            # Root of the point closest to zero is only exact with even nBits.
+            if isEven(i):
+                self.assertEqual(fxToFloat(fxSqrt(fxZero(nBits=i), nBits=i),
+                                           nBits=i), 2**-(i // 2))
+
+    def test_Floor(self):
+        x = np.arange(2**12, dtype=fxDtype(12))
+        result = fxToFloat(fxSqrt(x, nBits=12), nBits=12)
+        golden = np.sqrt(fxToFloat(x, nBits=12))
+        self.assertTrue(np.all(result <= golden))
+        self.assertTrue(np.all(golden - result < 2**-12))
+
+# }}} class Test_fxSqrt
+
+class Test_fxRatios(unittest.TestCase): # {{{
+
+    def test_Fracs(self):
+        for i in range(2, 31+1):
+            h,q,e,s,t = getFracs(i)
+            result = fxRatios(np.array([1, 1, 3, 5, 7]),
+                              np.array([2, 4, 4, 4, 7]), nBits=i)
+            golden = np.array([h, q, t, fxOne(nBits=i), fxOne(nBits=i)])
+            self.assertTrue(np.all(result == golden), (i, result, golden))
+
+    def test_Large(self):
+        for i in range(2, 31+1):
+            h,q,e,s,t = getFracs(i)
+            self.assertEqual(fxRatios(2**50, 2**51, nBits=i), h)
+
+# }}} class Test_fxRatios
+
+class Test_fxEx(unittest.TestCase): # {{{
+
+    def test_Window(self):
+        # Non-uniform weights, where the exact weighted mean is known.
+        for i in range(2, 31+1):
+            h,q,e,s,t = getFracs(i)
+            W = np.array([h, h, fxOne(nBits=i), fxOne(nBits=i)],
+                         dtype=fxDtype(i))
+            X = np.array([fxOne(nBits=i), fxOne(nBits=i), h, h],
+                         dtype=fxDtype(i))
+            # (0.5 + 0.5 + 0.5 + 0.5) / 3 = 2/3
+            self.assertEqual(fxEx(W, X, nBits=i),
+                             fxRatios(2, 3, nBits=i))
+
+    def test_Rows(self):
+        i = 16
+        prng = np.random.RandomState(1)
+        W = prng.randint(0, 2**i, 64).astype(fxDtype(i))
+        X = prng.randint(0, 2**i, (3, 5, 64)).astype(fxDtype(i))
+        result = fxEx(W, X, nBits=i)
+        self.assertEqual(result.shape, (3, 5))
+        for idx in np.ndindex(3, 5):
+            self.assertEqual(result[idx], fxEx(W, X[idx], nBits=i))
+
+        golden = np.dot(fxToFloat(X, nBits=i), fxToFloat(W, nBits=i)) / \
+            np.sum(fxToFloat(W, nBits=i))
+        self.assertTrue(np.all(np.abs(fxToFloat(result, nBits=i) - golden)
+                               <= 2**-i))
+
+# }}} class Test_fxEx
+
+class Test_fxAllMetrics(unittest.TestCase): # {{{
+
+    def setUp(self):
+        prng = np.random.RandomState(1)
+        self.w = powsineCoeffs(32, 2)
+        self.xs = (prng.random_sample((4, 32)) < 0.4).astype(np.float64)
+        self.ys = np.vstack((self.xs[1:],
+                             prng.random_sample((1, 32)))) # One real row.
+
+    def fxArgs(self, i):
+        return fxFromFloat(self.w, nBits=i), \
+            fxFromFloat(self.xs, nBits=i), \
+            fxFromFloat(self.ys, nBits=i)
+
+    def test_Separate(self):
+        fns = {
+            "Cex": fxCex,
+            "Cls": fxCls,
+            "Cos": fxCos,
+            "Cov": fxCov,
+            "Dep": fxDep,
+            "Ham": fxHam,
+            "Tmt": fxTmt,
+        }
+        for i in (8, 16, 31):
+            W, X, Y = self.fxArgs(i)
+            result = fxAllMetrics(W, X, Y, nBits=i)
+            for nm,fn in fns.items():
+                self.assertTrue(np.all(result[nm] == fn(W, X, Y, nBits=i)),
+                                (i, nm))
+
+    def test_Float(self):
+        # Close to floating point, except where results depend on the square
+        # root of a value close to zero.
+        i = 16
+        W, X, Y = self.fxArgs(i)
+        result = fxAllMetrics(W, X, Y, nBits=i)
+        for r in range(self.xs.shape[0]):
+            golden = ndAllMetrics(self.w, self.xs[r], self.ys[r])
+            for nm,v in golden.items():
+                self.assertAlmostEqual(fxToFloat(result[nm][r], nBits=i),
+                                       np.nan_to_num(v),
+                                       delta=2**-8 if nm in ("Cls", "Cos") \
+                                             else 2**-12,
+                                       msg=(r, nm))
+
+# }}} class Test_fxAllMetrics
@@ -1,4 +1,8 @@
 from dmppl.identicon import *
+import dmppl.identicon
+import os
+import shutil
+import tempfile
 import unittest
 
 class Test_identiconSprite(unittest.TestCase): # {{{
@@ -109,3 +113,65 @@ class Test_asciiart2dBool(unittest.TestCase): # {{{
 
 # }}} class Test_asciiart2dBool
 
+class Test_identiconSpriteSvg(unittest.TestCase): # {{{
+
+    def setUp(self):
+        self.tstDir = tempfile.mkdtemp()
+        dmppl.identicon._identiconCache.clear()
+
+    def tearDown(self):
+        dmppl.identicon._identiconCache.clear()
+        shutil.rmtree(self.tstDir)
+
+    def test_Digest(self):
+        self.assertEqual(identiconDigest("a", fill="red"),
+                         identiconDigest("a", fill="red", cacheDir="foo"))
+        self.assertEqual(identiconDigest("a", classList=["b", "c"]),
+                         identiconDigest("a", classList=("b", "c")))
+        self.assertNotEqual(identiconDigest("a"), identiconDigest("b"))
+        self.assertNotEqual(identiconDigest("a"),
+                            identiconDigest("a", fill="red"))
+
+    def test_Memoized(self):
+        golden = identiconSpriteSvg("a", fill="red", classList=["b"])
+        self.assertIn('fill="red"', golden)
+        self.assertIn('class="b"', golden)
+        self.assertEqual(1, len(dmppl.identicon._identiconCache))
+
+        result = identiconSpriteSvg("a", fill="red", classList=["b"])
+        self.assertEqual(golden, result)
+        self.assertEqual(1, len(dmppl.identicon._identiconCache))
+
+        self.assertNotEqual(golden, identiconSpriteSvg("a", fill="blue"))
+        self.assertEqual(2, len(dmppl.identicon._identiconCache))
+
+    def test_Lru(self):
+        size = dmppl.identicon.identiconCacheSize
+        dmppl.identicon.identiconCacheSize = 2
+        try:
+            for x in ("a", "b", "a", "c"):
+                _ = identiconSpriteSvg(x)
+        finally:
+            dmppl.identicon.identiconCacheSize = size
+
+        self.assertEqual([identiconDigest("a"), identiconDigest("c")],
+                         list(dmppl.identicon._identiconCache.keys()))
+
+    def test_CacheDir(self):
+        golden = identiconSpriteSvg("a", fill="red", cacheDir=self.tstDir)
+
+        fname = os.path.join(self.tstDir,
+                             identiconDigest("a", fill="red") + ".svg")
+        self.assertEqual([os.path.basename(fname)], os.listdir(self.tstDir))
+        with open(fname, 'r') as fd:
+            self.assertEqual(golden, fd.read())
+
+        # Read back from disk by a process without the SVG in memory.
+        dmppl.identicon._identiconCache.clear()
+        with open(fname, 'w') as fd:
+            fd.write("<svg/>")
+        self.assertEqual("<svg/>",
+                         identiconSpriteSvg("a", fill="red",
+                                            cacheDir=self.tstDir))
+
+# }}} class Test_identiconSpriteSvg
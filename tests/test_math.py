@@ -1,6 +1,8 @@
 from dmppl.math import *
+import functools
 import math
 import os
+import random
 import tempfile
 import shutil
 import unittest
@@ -817,3 +819,103 @@ class Test_ptsMkPolygon(unittest.TestCase): # {{{
 
 # }}} class Test_ptsMkPolygon
 
+
+class Test_subsample(unittest.TestCase): # {{{
+
+    def prng(self, factor, seed=1):
+        ret = random.Random(seed)
+        ret.next = functools.partial(ret.randrange, 0, factor)
+        return ret
+
+    def test_Xor(self):
+        x = np.arange(16)
+        result = subsample(x, 4, prng=self.prng(4))
+        r = self.prng(4).next()
+        golden = [4*i + (i ^ r) % 4 for i in range(4)]
+        self.assertListEqual(result.tolist(), golden)
+
+    def test_Uniform(self):
+        x = np.arange(12)
+        result = subsample(x, 3, algorithm="uniform", prng=self.prng(3))
+        prng = self.prng(3)
+        golden = [3*i + prng.next() for i in range(4)]
+        self.assertListEqual(result.tolist(), golden)
+
+    def test_Padding(self):
+        x = np.arange(5)
+        self.assertEqual(subsample(x, 4, padding="edge").shape, (2,))
+        self.assertEqual(subsample(x[:4], 4).shape, (1,))
+        self.assertEqual(subsample(x[:1], 4).tolist(), [0])
+
+        result = subsample(x, 2, algorithm="uniform", padding="edge",
+                           prng=self.prng(2, 0))
+        self.assertEqual(result.shape, (3,))
+        self.assertEqual(result[-1], 4)
+
+    def test_Batched(self):
+        prng = np.random.RandomState(0)
+        X = prng.randint(0, 100, size=(5, 37))
+
+        for algorithm in ("xor", "uniform"):
+            result = subsample(X, 8, algorithm=algorithm,
+                               prng=self.prng(8), axis=1)
+            self.assertEqual(result.shape, (5, 5))
+            for row,x in zip(result, X):
+                golden = subsample(x, 8, algorithm=algorithm,
+                                   prng=self.prng(8))
+                self.assertListEqual(row.tolist(), golden.tolist())
+
+            resultT = subsample(X.T, 8, algorithm=algorithm,
+                                prng=self.prng(8), axis=0)
+            self.assertListEqual(resultT.T.tolist(), result.tolist())
+
+            resultN = subsample(X, 8, algorithm=algorithm,
+                                prng=self.prng(8), axis=-1)
+            self.assertListEqual(resultN.tolist(), result.tolist())
+
+    def test_Factor1(self):
+        x = np.arange(5)
+        self.assertIs(subsample(x, 1), x)
+
+# }}} class Test_subsample
+
+class Test_downsample(unittest.TestCase): # {{{
+
+    def test_Basic0(self):
+        x = np.arange(8, dtype=np.float64)
+        self.assertListEqual(downsample(x, 2).tolist(), [0.5, 2.5, 4.5, 6.5])
+        self.assertListEqual(downsample(x, 4, "min").tolist(), [0.0, 4.0])
+        self.assertListEqual(downsample(x, 4, "max").tolist(), [3.0, 7.0])
+        self.assertListEqual(downsample(x, 8, "median").tolist(), [3.5])
+
+    def test_Padding(self):
+        x = np.arange(5)
+        self.assertListEqual(downsample(x, 2, "max", padding="edge").tolist(),
+                             [1, 3, 4])
+        self.assertListEqual(downsample(x, 2, "max").tolist(), [1, 3, 4])
+        self.assertListEqual(downsample(x, 4, "min",
+                                        padding="minimum").tolist(), [0, 0])
+
+    def test_Batched(self):
+        prng = np.random.RandomState(0)
+        X = prng.random_sample((3, 4, 21))
+
+        for algorithm in ("mean", "median", "min", "max"):
+            result = downsample(X, 4, algorithm, axis=2)
+            self.assertEqual(result.shape, (3, 4, 6))
+            for i in range(3):
+                for j in range(4):
+                    golden = downsample(X[i, j], 4, algorithm)
+                    np.testing.assert_allclose(result[i, j], golden)
+
+            resultM = downsample(X, 2, algorithm, axis=1)
+            self.assertEqual(resultM.shape, (3, 2, 21))
+            np.testing.assert_allclose(resultM[:, 1, :],
+                {"mean": np.mean, "median": np.median,
+                 "min": np.min, "max": np.max}[algorithm](X[:, 2:, :], axis=1))
+
+    def test_Factor1(self):
+        x = np.arange(5)
+        self.assertIs(downsample(x, 1), x)
+
+# }}} class Test_downsample
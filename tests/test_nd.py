@@ -2,6 +2,7 @@
 import math
 from dmppl.math import powsineCoeffs
 from dmppl.nd import *
+import threading
 import unittest
 
 class Test_ndAssertScalarNorm(unittest.TestCase): # {{{
@@ -149,6 +150,59 @@ class Test_ndAssert(unittest.TestCase): # {{{
 
 # }}} class Test_ndAssert
 
+class Test_ndTrusted(unittest.TestCase): # {{{
+
+    def test_Kwarg(self):
+        w = np.array([True, False, True])
+        x = np.array([0.1, 0.2, 0.3, 0.4])
+        y = np.array([0, -4.4, 5.5])
+
+        self.assertTrue(ndAssert(y, trusted=True))
+        self.assertTrue(ndAssert(w, y, eq=w, trusted=True))
+        self.assertRaises(AssertionError, ndAssert, y, trusted=False)
+        self.assertRaises(AssertionError, ndAssert, w, x, trusted=True)
+
+    def test_Context(self):
+        w = np.array([True, False, True])
+        x = np.array([0.1, 0.2, 0.3, 0.4])
+        y = np.array([0, -4.4, 5.5])
+
+        self.assertFalse(ndIsTrusted())
+        with ndTrusted():
+            self.assertTrue(ndIsTrusted())
+            with ndTrusted():
+                self.assertTrue(ndAssert(y))
+            self.assertTrue(ndAssert(w, y))
+            self.assertRaises(AssertionError, ndAssert, w, x)
+        self.assertFalse(ndIsTrusted())
+
+        self.assertRaises(AssertionError, ndAssert, y)
+
+    def test_Threads(self):
+        # Trusted context in one thread doesn't affect another.
+        other = []
+        with ndTrusted():
+            t = threading.Thread(target=lambda: other.append(ndIsTrusted()))
+            t.start()
+            t.join()
+            self.assertTrue(ndIsTrusted())
+
+        self.assertEqual([False], other)
+
+    def test_Metric(self):
+        w = powsineCoeffs(16, 1)
+        x = np.linspace(0.0, 1.0, 16)
+        y = x[::-1].copy()
+
+        for fn in (ndEx, ndCex, ndCls, ndCos, ndCov, ndDep, ndHam, ndTmt):
+            args = (w, x) if fn is ndEx else (w, x, y)
+            golden = fn(*args)
+            self.assertEqual(golden, fn(*args, trusted=True))
+            with ndTrusted():
+                self.assertEqual(golden, fn(*args))
+
+# }}} class Test_ndTrusted
+
 class Test_ndAbsDiff(unittest.TestCase): # {{{
 
     def test_Float(self):
@@ -693,3 +747,150 @@ class Test_ndDep(unittest.TestCase): # {{{
         self.assertAlmostEqual(result, 0.5)
 
 # }}} class Test_ndDep
+
+class Test_ndBound(unittest.TestCase): # {{{
+
+    def test_Sparse(self):
+        # Rarely active measures give small bounds for Cov.
+        self.assertAlmostEqual(ndCovBound(0.01, 0.5), 0.02)
+        self.assertAlmostEqual(ndCovBound(0.0, 0.5), 0.0)
+        self.assertAlmostEqual(ndCovBound(1.0, 0.5), 0.0)
+        self.assertAlmostEqual(ndDepBound(0.0, 0.5), 0.0)
+        self.assertAlmostEqual(ndDepBound(0.25, 0.5), 0.5)
+
+    def test_Broadcast(self):
+        xs = np.array([0.0, 0.25, 0.5])[:, None]
+        ys = np.array([0.5, 1.0])[None, :]
+        self.assertEqual((3, 2), ndCovBound(xs, ys).shape)
+        self.assertEqual((3, 2), ndDepBound(xs, ys).shape)
+
+    def test_Random(self):
+        # Bounds are never exceeded by actual values.
+        prng = np.random.RandomState(1)
+        w = powsineCoeffs(64, 1)
+        for _ in range(200):
+            p, q = prng.random_sample(2)
+            x = prng.random_sample(64) < p
+            y = np.logical_xor(x, prng.random_sample(64) < q)
+            x_Ex, y_Ex = ndEx(w, x), ndEx(w, y)
+            self.assertLessEqual(ndCov(w, x, y),
+                                 ndCovBound(x_Ex, y_Ex) + 1e-9)
+            self.assertLessEqual(ndDep(w, x, y),
+                                 ndDepBound(x_Ex, y_Ex) + 1e-9)
+
+# }}} class Test_ndBound
+
+class Test_ndAllMetrics(unittest.TestCase): # {{{
+
+    fns = {
+        "Cex": ndCex,
+        "Cls": ndCls,
+        "Cos": ndCos,
+        "Cov": ndCov,
+        "Dep": ndDep,
+        "Ham": ndHam,
+        "Tmt": ndTmt,
+    }
+
+    def setUp(self):
+        prng = np.random.RandomState(1)
+        n = 100
+        self.w = powsineCoeffs(n, 1)
+        self.bits = np.vstack((prng.rand(3, n) < 0.3,
+                               np.zeros((1, n), dtype=np.bool_)))
+        self.reals = prng.rand(3, n).astype(np.float32)
+
+    def assertMetricEqual(self, golden, result, places=7):
+        if np.isnan(golden):
+            self.assertTrue(np.isnan(result))
+        else:
+            self.assertAlmostEqual(golden, result, places=places)
+
+    def test_Scalar(self):
+        w = self.w
+        rows = list(self.bits) + list(self.reals)
+
+        for x in rows:
+            for y in rows:
+                result = ndAllMetrics(w, x, y)
+                self.assertEqual(sorted(self.fns.keys()), sorted(result.keys()))
+                for nm,fn in self.fns.items():
+                    golden = fn(w, x, y)
+                    if np.isnan(golden):
+                        self.assertTrue(np.isnan(result[nm]))
+                    else:
+                        self.assertEqual(golden, result[nm])
+
+    def test_Matrix(self):
+        w = self.w
+
+        for X,Y in ((self.bits, self.bits[::-1]),
+                    (self.reals, self.bits),
+                    (self.bits.astype(np.float32), self.reals)):
+            result = ndAllMetricsMatrix(w, X, Y)
+            for nm,fn in self.fns.items():
+                self.assertEqual((len(X), len(Y)), result[nm].shape)
+                for i,x in enumerate(X):
+                    for j,y in enumerate(Y):
+                        self.assertMetricEqual(fn(w, x, y), result[nm][i][j])
+
+# }}} class Test_ndAllMetrics
+
+class Test_ndRollingEx(unittest.TestCase): # {{{
+
+    def setUp(self):
+        prng = np.random.RandomState(1)
+        self.bits = prng.rand(3, 200) < 0.3
+        self.reals = prng.rand(3, 200).astype(np.float32)
+        self.starts = [0, 5, 16, 17, 100, 184]
+
+    def golden(self, w, X):
+        n = w.shape[0]
+        return np.array([[ndEx(w, row[s:s+n]) for s in self.starts] \
+                         for row in X])
+
+    def test_Rectangular(self):
+        w = powsineCoeffs(16, 0)
+
+        # Exact for bits.
+        result = ndRollingEx(w, self.bits, self.starts)
+        self.assertEqual(result.shape, (3, len(self.starts)))
+        self.assertTrue(np.array_equal(self.golden(w, self.bits), result))
+
+        result = ndRollingEx(w, self.reals, self.starts)
+        self.assertTrue(np.allclose(self.golden(w, self.reals), result,
+                                    rtol=0, atol=1e-12))
+
+    def test_General(self):
+        for alpha in (1, 2):
+            w = powsineCoeffs(16, alpha)
+            for X in (self.bits, self.reals):
+                result = ndRollingEx(w, X, self.starts)
+                self.assertTrue(np.allclose(self.golden(w, X), result,
+                                            rtol=0, atol=1e-12))
+
+    def test_1D(self):
+        w = powsineCoeffs(16, 0)
+        result = ndRollingEx(w, self.bits[0], self.starts)
+        self.assertEqual(result.shape, (len(self.starts),))
+        self.assertTrue(np.array_equal(self.golden(w, self.bits[:1])[0],
+                                       result))
+
+    def test_Strided(self):
+        # Windows of non-contiguous and 1D inputs, where weights differ.
+        w = powsineCoeffs(16, 2)
+        X = np.asfortranarray(self.reals)[:, ::-1]
+        result = ndRollingEx(w, X, self.starts)
+        self.assertTrue(np.allclose(self.golden(w, X), result,
+                                    rtol=0, atol=1e-12))
+
+        result = ndRollingEx(w, self.reals[1], self.starts)
+        self.assertTrue(np.allclose(self.golden(w, self.reals[1:2])[0], result,
+                                    rtol=0, atol=1e-12))
+
+    def test_Bounds(self):
+        w = powsineCoeffs(16, 0)
+        self.assertRaises(AssertionError, ndRollingEx, w, self.bits, [185])
+        self.assertRaises(AssertionError, ndRollingEx, w, self.bits, [-1])
+
+# }}} class Test_ndRollingEx